@@ -17,12 +17,18 @@ from app.core.database import Base
 # Import all models here to ensure they are registered
 from app.models.user import User
 from app.models.asset import Asset
-from app.models.position import AssetPosition
+from app.models.position import AssetPosition, PositionCheckpoint
 from app.models.transaction import Transaction
-from app.models.proceed import Proceed
+from app.models.proceed import Proceed, ProceedMonthlyRollup
 from app.models.cei_credentials import CEICredentials
-from app.models.fixed_income import FixedIncomeInvestment
+from app.models.fixed_income import FixedIncomeInvestment, IndexerRate, TesouroPrice
 from app.models.notification import Notification
+from app.models.portfolio_snapshot import PortfolioSnapshot
+from app.models.price_history import PriceBar
+from app.models.portfolio_history import PortfolioDailyValue
+from app.models.tax import RealizedGain, MonthlyTaxSummary
+from app.models.dividend import DividendEvent, DividendEstimate, BarsiScreenerEntry
+from app.models.corporate_action import CorporateAction
 
 # this is the Alembic Config object
 config = context.config
@@ -0,0 +1,42 @@
+"""Add portfolio snapshots table
+
+Revision ID: 5b7e2c1d9a3f
+Revises: 32444dfd29d2
+Create Date: 2026-10-19 09:10:41.218311
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e2c1d9a3f'
+down_revision: Union[str, None] = '32444dfd29d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('portfolio_snapshots',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('total_value', sa.Float(), nullable=False),
+    sa.Column('total_invested', sa.Float(), nullable=False),
+    sa.Column('positions_count', sa.Integer(), nullable=False),
+    sa.Column('allocation_by_type', sa.JSON(), nullable=False),
+    sa.Column('allocation_by_sector', sa.JSON(), nullable=False),
+    sa.Column('top_positions', sa.JSON(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_portfolio_snapshots_id'), 'portfolio_snapshots', ['id'], unique=False)
+    op.create_index(op.f('ix_portfolio_snapshots_user_id'), 'portfolio_snapshots', ['user_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_portfolio_snapshots_user_id'), table_name='portfolio_snapshots')
+    op.drop_index(op.f('ix_portfolio_snapshots_id'), table_name='portfolio_snapshots')
+    op.drop_table('portfolio_snapshots')
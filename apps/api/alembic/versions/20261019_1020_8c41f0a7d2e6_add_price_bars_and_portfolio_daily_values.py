@@ -0,0 +1,54 @@
+"""Add price bars and portfolio daily values tables
+
+Revision ID: 8c41f0a7d2e6
+Revises: 5b7e2c1d9a3f
+Create Date: 2026-10-19 10:20:12.604719
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c41f0a7d2e6'
+down_revision: Union[str, None] = '5b7e2c1d9a3f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('price_bars',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('ticker', sa.String(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('open', sa.Float(), nullable=True),
+    sa.Column('high', sa.Float(), nullable=True),
+    sa.Column('low', sa.Float(), nullable=True),
+    sa.Column('close', sa.Float(), nullable=False),
+    sa.Column('volume', sa.Float(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('ticker', 'date', name='uq_price_bars_ticker_date')
+    )
+    op.create_index(op.f('ix_price_bars_id'), 'price_bars', ['id'], unique=False)
+    op.create_table('portfolio_daily_values',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('value', sa.Float(), nullable=False),
+    sa.Column('invested', sa.Float(), nullable=False),
+    sa.Column('net_cash_flow', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'date', name='uq_portfolio_daily_values_user_date')
+    )
+    op.create_index(op.f('ix_portfolio_daily_values_id'), 'portfolio_daily_values', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_portfolio_daily_values_id'), table_name='portfolio_daily_values')
+    op.drop_table('portfolio_daily_values')
+    op.drop_index(op.f('ix_price_bars_id'), table_name='price_bars')
+    op.drop_table('price_bars')
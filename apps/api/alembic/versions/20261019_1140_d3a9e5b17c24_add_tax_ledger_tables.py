@@ -0,0 +1,77 @@
+"""Add tax ledger tables
+
+Revision ID: d3a9e5b17c24
+Revises: 8c41f0a7d2e6
+Create Date: 2026-10-19 11:40:27.319842
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3a9e5b17c24'
+down_revision: Union[str, None] = '8c41f0a7d2e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('realized_gains',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('transaction_id', sa.Integer(), nullable=False),
+    sa.Column('asset_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('bucket', sa.Enum('ACOES', 'OUTROS', 'FII', 'DAY_TRADE', name='taxbucket'), nullable=False),
+    sa.Column('quantity', sa.Float(), nullable=False),
+    sa.Column('sale_value', sa.Float(), nullable=False),
+    sa.Column('cost_basis', sa.Float(), nullable=False),
+    sa.Column('gain', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.ForeignKeyConstraint(['asset_id'], ['assets.id'], ),
+    sa.ForeignKeyConstraint(['transaction_id'], ['transactions.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_realized_gains_id'), 'realized_gains', ['id'], unique=False)
+    op.create_index(op.f('ix_realized_gains_transaction_id'), 'realized_gains', ['transaction_id'], unique=False)
+    op.create_index(op.f('ix_realized_gains_asset_id'), 'realized_gains', ['asset_id'], unique=False)
+    op.create_index('ix_realized_gains_user_date', 'realized_gains', ['user_id', 'date'], unique=False)
+    op.create_table('monthly_tax_summaries',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Integer(), nullable=False),
+    sa.Column('bucket', postgresql.ENUM('ACOES', 'OUTROS', 'FII', 'DAY_TRADE', name='taxbucket', create_type=False), nullable=False),
+    sa.Column('sales_total', sa.Float(), nullable=False),
+    sa.Column('net_result', sa.Float(), nullable=False),
+    sa.Column('exempt', sa.Boolean(), nullable=False),
+    sa.Column('loss_used', sa.Float(), nullable=False),
+    sa.Column('loss_carry_forward', sa.Float(), nullable=False),
+    sa.Column('taxable_base', sa.Float(), nullable=False),
+    sa.Column('tax_rate', sa.Float(), nullable=False),
+    sa.Column('irrf', sa.Float(), nullable=False),
+    sa.Column('tax_due', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'year', 'month', 'bucket', name='uq_monthly_tax_summaries_period')
+    )
+    op.create_index(op.f('ix_monthly_tax_summaries_id'), 'monthly_tax_summaries', ['id'], unique=False)
+    op.create_index('ix_monthly_tax_summaries_user_period', 'monthly_tax_summaries', ['user_id', 'year', 'month'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_monthly_tax_summaries_user_period', table_name='monthly_tax_summaries')
+    op.drop_index(op.f('ix_monthly_tax_summaries_id'), table_name='monthly_tax_summaries')
+    op.drop_table('monthly_tax_summaries')
+    op.drop_index('ix_realized_gains_user_date', table_name='realized_gains')
+    op.drop_index(op.f('ix_realized_gains_asset_id'), table_name='realized_gains')
+    op.drop_index(op.f('ix_realized_gains_transaction_id'), table_name='realized_gains')
+    op.drop_index(op.f('ix_realized_gains_id'), table_name='realized_gains')
+    op.drop_table('realized_gains')
+    sa.Enum(name='taxbucket').drop(op.get_bind(), checkfirst=True)
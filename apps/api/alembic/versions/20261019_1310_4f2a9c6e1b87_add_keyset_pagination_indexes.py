@@ -0,0 +1,30 @@
+"""Add keyset pagination indexes
+
+Revision ID: 4f2a9c6e1b87
+Revises: d3a9e5b17c24
+Create Date: 2026-10-19 13:10:42.516309
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f2a9c6e1b87'
+down_revision: Union[str, None] = 'd3a9e5b17c24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_transactions_user_date_id', 'transactions', ['user_id', 'date', 'id'], unique=False)
+    op.create_index('ix_proceeds_user_date_id', 'proceeds', ['user_id', 'date', 'id'], unique=False)
+    op.create_index('ix_notifications_user_id_id', 'notifications', ['user_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_notifications_user_id_id', table_name='notifications')
+    op.drop_index('ix_proceeds_user_date_id', table_name='proceeds')
+    op.drop_index('ix_transactions_user_date_id', table_name='transactions')
@@ -0,0 +1,41 @@
+"""Add proceed monthly rollups
+
+Revision ID: 6e1d4b8a2f93
+Revises: 4f2a9c6e1b87
+Create Date: 2026-10-19 14:20:08.731462
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e1d4b8a2f93'
+down_revision: Union[str, None] = '4f2a9c6e1b87'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('proceed_monthly_rollups',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('year', sa.Integer(), nullable=False),
+    sa.Column('month', sa.Integer(), nullable=False),
+    sa.Column('type', postgresql.ENUM('DIVIDEND', 'JCP', 'RENDIMENTO', 'BONIFICACAO', 'DIREITO', name='proceedtype', create_type=False), nullable=False),
+    sa.Column('total_value', sa.Float(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'year', 'month', 'type', name='uq_proceed_monthly_rollups_period')
+    )
+    op.create_index(op.f('ix_proceed_monthly_rollups_id'), 'proceed_monthly_rollups', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_proceed_monthly_rollups_id'), table_name='proceed_monthly_rollups')
+    op.drop_table('proceed_monthly_rollups')
@@ -0,0 +1,53 @@
+"""Add dividend events and estimates
+
+Revision ID: a7c3e9f15d42
+Revises: 6e1d4b8a2f93
+Create Date: 2026-10-19 15:10:51.204877
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7c3e9f15d42'
+down_revision: Union[str, None] = '6e1d4b8a2f93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('dividend_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('ticker', sa.String(), nullable=False),
+    sa.Column('payment_date', sa.Date(), nullable=False),
+    sa.Column('value_per_share', sa.Float(), nullable=False),
+    sa.Column('label', sa.String(), nullable=True),
+    sa.Column('source', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('ticker', 'payment_date', 'value_per_share', name='uq_dividend_events_payment')
+    )
+    op.create_index(op.f('ix_dividend_events_id'), 'dividend_events', ['id'], unique=False)
+    op.create_table('dividend_estimates',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('ticker', sa.String(), nullable=False),
+    sa.Column('trailing_12m', sa.Float(), nullable=False),
+    sa.Column('annual_estimate', sa.Float(), nullable=False),
+    sa.Column('monthly_profile', sa.JSON(), nullable=False),
+    sa.Column('years_analyzed', sa.Integer(), nullable=False),
+    sa.Column('last_payment_date', sa.Date(), nullable=True),
+    sa.Column('computed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('ticker')
+    )
+    op.create_index(op.f('ix_dividend_estimates_id'), 'dividend_estimates', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_dividend_estimates_id'), table_name='dividend_estimates')
+    op.drop_table('dividend_estimates')
+    op.drop_index(op.f('ix_dividend_events_id'), table_name='dividend_events')
+    op.drop_table('dividend_events')
@@ -0,0 +1,26 @@
+"""Add data_version to users
+
+Revision ID: b8d2f6a4c931
+Revises: a7c3e9f15d42
+Create Date: 2026-10-19 16:00:37.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8d2f6a4c931'
+down_revision: Union[str, None] = 'a7c3e9f15d42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('data_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'data_version')
@@ -0,0 +1,47 @@
+"""Add barsi screener table
+
+Revision ID: c4e8a1d7f230
+Revises: b8d2f6a4c931
+Create Date: 2026-10-19 16:50:12.640391
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e8a1d7f230'
+down_revision: Union[str, None] = 'b8d2f6a4c931'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('barsi_screener',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('ticker', sa.String(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('sector', sa.String(), nullable=True),
+    sa.Column('current_price', sa.Float(), nullable=False),
+    sa.Column('price_date', sa.Date(), nullable=False),
+    sa.Column('average_annual_dividend', sa.Float(), nullable=False),
+    sa.Column('price_target', sa.Float(), nullable=False),
+    sa.Column('current_yield', sa.Float(), nullable=False),
+    sa.Column('upside_to_target', sa.Float(), nullable=False),
+    sa.Column('margin_of_safety', sa.Float(), nullable=False),
+    sa.Column('years_analyzed', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.Integer(), nullable=False),
+    sa.Column('computed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('ticker')
+    )
+    op.create_index(op.f('ix_barsi_screener_id'), 'barsi_screener', ['id'], unique=False)
+    op.create_index('ix_barsi_screener_rank', 'barsi_screener', ['rank'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_barsi_screener_rank', table_name='barsi_screener')
+    op.drop_index(op.f('ix_barsi_screener_id'), table_name='barsi_screener')
+    op.drop_table('barsi_screener')
@@ -0,0 +1,37 @@
+"""Add indexer rates table
+
+Revision ID: d9b3f5e2a816
+Revises: c4e8a1d7f230
+Create Date: 2026-10-19 17:20:41.318207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9b3f5e2a816'
+down_revision: Union[str, None] = 'c4e8a1d7f230'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('indexer_rates',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('indexer', postgresql.ENUM('SELIC', 'CDI', 'IPCA', 'IGPM', 'PREFIXADO', 'TR', 'OUTRO', name='indexertype', create_type=False), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('value', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('indexer', 'date', name='uq_indexer_rates_indexer_date')
+    )
+    op.create_index(op.f('ix_indexer_rates_id'), 'indexer_rates', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_indexer_rates_id'), table_name='indexer_rates')
+    op.drop_table('indexer_rates')
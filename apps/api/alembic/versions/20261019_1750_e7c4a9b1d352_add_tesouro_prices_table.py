@@ -0,0 +1,42 @@
+"""Add tesouro prices table
+
+Revision ID: e7c4a9b1d352
+Revises: d9b3f5e2a816
+Create Date: 2026-10-19 17:50:08.274119
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7c4a9b1d352'
+down_revision: Union[str, None] = 'd9b3f5e2a816'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('tesouro_prices',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('bond_type', sa.String(), nullable=False),
+    sa.Column('maturity_date', sa.Date(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('buy_rate', sa.Float(), nullable=True),
+    sa.Column('sell_rate', sa.Float(), nullable=True),
+    sa.Column('buy_price', sa.Float(), nullable=True),
+    sa.Column('sell_price', sa.Float(), nullable=True),
+    sa.Column('base_price', sa.Float(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('bond_type', 'maturity_date', 'date', name='uq_tesouro_prices_bond_date')
+    )
+    op.create_index(op.f('ix_tesouro_prices_id'), 'tesouro_prices', ['id'], unique=False)
+    op.create_index('ix_tesouro_prices_date', 'tesouro_prices', ['date'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tesouro_prices_date', table_name='tesouro_prices')
+    op.drop_index(op.f('ix_tesouro_prices_id'), table_name='tesouro_prices')
+    op.drop_table('tesouro_prices')
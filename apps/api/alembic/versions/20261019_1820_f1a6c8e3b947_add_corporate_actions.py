@@ -0,0 +1,43 @@
+"""Add corporate actions and adjusted closes
+
+Revision ID: f1a6c8e3b947
+Revises: e7c4a9b1d352
+Create Date: 2026-10-19 18:20:33.905716
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1a6c8e3b947'
+down_revision: Union[str, None] = 'e7c4a9b1d352'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('corporate_actions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('ticker', sa.String(), nullable=False),
+    sa.Column('ex_date', sa.Date(), nullable=False),
+    sa.Column('type', sa.Enum('SPLIT', 'REVERSE_SPLIT', 'BONUS', name='corporateactiontype'), nullable=False),
+    sa.Column('factor', sa.Float(), nullable=False),
+    sa.Column('description', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('ticker', 'ex_date', 'type', name='uq_corporate_actions_event')
+    )
+    op.create_index(op.f('ix_corporate_actions_id'), 'corporate_actions', ['id'], unique=False)
+    op.create_index(op.f('ix_corporate_actions_ticker'), 'corporate_actions', ['ticker'], unique=False)
+    op.add_column('price_bars', sa.Column('adj_close', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('price_bars', 'adj_close')
+    op.drop_index(op.f('ix_corporate_actions_ticker'), table_name='corporate_actions')
+    op.drop_index(op.f('ix_corporate_actions_id'), table_name='corporate_actions')
+    op.drop_table('corporate_actions')
+    sa.Enum(name='corporateactiontype').drop(op.get_bind(), checkfirst=True)
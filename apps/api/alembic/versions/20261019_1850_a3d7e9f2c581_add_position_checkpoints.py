@@ -0,0 +1,39 @@
+"""Add position checkpoints table
+
+Revision ID: a3d7e9f2c581
+Revises: f1a6c8e3b947
+Create Date: 2026-10-19 18:50:12.418207
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3d7e9f2c581'
+down_revision: Union[str, None] = 'f1a6c8e3b947'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('position_checkpoints',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('asset_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('quantity', sa.Float(), nullable=False),
+    sa.Column('cost', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['asset_id'], ['assets.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'date', 'asset_id', name='uq_position_checkpoints_user_date_asset')
+    )
+    op.create_index(op.f('ix_position_checkpoints_id'), 'position_checkpoints', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_position_checkpoints_id'), table_name='position_checkpoints')
+    op.drop_table('position_checkpoints')
@@ -0,0 +1,26 @@
+"""Add ex-date to dividend events
+
+Revision ID: b8e2f4a6d193
+Revises: a3d7e9f2c581
+Create Date: 2026-10-19 19:20:41.207315
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e2f4a6d193'
+down_revision: Union[str, None] = 'a3d7e9f2c581'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('dividend_events', sa.Column('ex_date', sa.Date(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('dividend_events', 'ex_date')
@@ -38,6 +38,10 @@ class Settings(BaseSettings):
     # Without token: only PETR4, VALE3, ITUB4, MGLU3 are available
     BRAPI_TOKEN: str = ""
 
+    # Tesouro Transparente price file (URL or local path) imported nightly
+    # Empty: prices come only from uploads to /fixed-income/tesouro/import
+    TESOURO_PRICES_URL: str = ""
+
     # Scheduler
     ENABLE_SCHEDULER: bool = True  # Enable background sync scheduler
     SYNC_INTERVAL_HOURS: int = 24  # Sync interval in hours
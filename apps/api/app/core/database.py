@@ -1,6 +1,7 @@
 """
 Database configuration and session management
 """
+from fastapi import Depends
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
@@ -29,7 +30,15 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
-def get_db():
+def get_session_factory() -> sessionmaker:
+    """
+    Dependency for the session factory, for work that outlives the
+    request session (e.g. streamed responses)
+    """
+    return SessionLocal
+
+
+def get_db(session_factory: sessionmaker = Depends(get_session_factory)):
     """
     Dependency for getting database session
     
@@ -38,7 +47,7 @@ def get_db():
         def endpoint(db: Session = Depends(get_db)):
             ...
     """
-    db = SessionLocal()
+    db = session_factory()
     try:
         yield db
     finally:
@@ -55,3 +55,18 @@ async def get_current_user(
 
     return user
 
+
+
+async def get_current_superuser(
+    current_user: User = Depends(get_current_user),
+) -> User:
+    """
+    Dependency for administrative endpoints: the authenticated user must
+    be a superuser
+    """
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Acesso restrito a administradores",
+        )
+    return current_user
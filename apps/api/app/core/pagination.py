@@ -0,0 +1,112 @@
+"""
+Keyset (cursor) pagination
+
+Listings are ordered newest first by (sort column, id), or by id alone.
+A cursor is an opaque base64 token holding the last row's key, and the
+next page is fetched with a row-value comparison that walks the matching
+composite index instead of skipping rows like OFFSET does. Clients get
+the cursor of the next page in the X-Next-Cursor response header.
+"""
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, List, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import literal, tuple_
+from sqlalchemy.orm import Query
+
+MAX_PAGE_SIZE = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(value: Any, row_id: int) -> str:
+    """Encode the (sort value, id) key of the last row of a page"""
+    if isinstance(value, datetime):
+        key = ["t", value.isoformat(), row_id]
+    elif isinstance(value, date):
+        key = ["d", value.isoformat(), row_id]
+    else:
+        key = ["v", value, row_id]
+    raw = json.dumps(key, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    """
+    Decode a cursor produced by encode_cursor
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        kind, value, row_id = json.loads(raw)
+        if kind == "t":
+            value = datetime.fromisoformat(value)
+        elif kind == "d":
+            value = date.fromisoformat(value)
+        return value, int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor inválido",
+        )
+
+
+def paginate(
+    query: Query,
+    sort_column: Any,
+    id_column: Any,
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Fetch one page of a query, newest first
+
+    The sort column must be written by the application (not a database
+    default), so stored values and cursor values share one format. Pass
+    sort_column=None to key on the id alone, e.g. for server-side
+    created_at timestamps, whose id order matches insertion order.
+
+    Args:
+        query: Filtered query (without ordering)
+        sort_column: Column ordering the listing (date), or None
+        id_column: Primary key column, used as tie-breaker
+        limit: Page size (capped at MAX_PAGE_SIZE)
+        cursor: Cursor returned with the previous page
+
+    Returns:
+        Tuple of (rows, next cursor or None on the last page)
+
+    Raises:
+        HTTPException: 400 if the cursor is malformed or does not move the
+            listing forward (e.g. a crafted key of the wrong type)
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    columns = [id_column] if sort_column is None else [sort_column, id_column]
+
+    if cursor:
+        value, row_id = decode_cursor(cursor)
+        if sort_column is None:
+            query = query.filter(id_column < row_id)
+        else:
+            # Bind with the column's own type so both sides use its storage format
+            query = query.filter(
+                tuple_(sort_column, id_column)
+                < tuple_(literal(value, type_=sort_column.type), literal(row_id, type_=id_column.type))
+            )
+
+    rows = query.order_by(*[column.desc() for column in columns]).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        value = None if sort_column is None else getattr(last, sort_column.key)
+        next_cursor = encode_cursor(value, getattr(last, id_column.key))
+        if next_cursor == cursor:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor inválido",
+            )
+    return rows, next_cursor
@@ -0,0 +1,88 @@
+"""
+Versioned response cache
+
+Portfolio read endpoints are cached per (user, data version, endpoint,
+query params). The user's `data_version` is bumped by the portfolio
+change hooks on every transaction, proceed or price write, so a cached
+body is valid exactly as long as its version is current.
+
+The ETag is derived from that key alone: a client revalidating with
+If-None-Match gets a 304 straight from the version loaded with the
+authenticated user, without rebuilding (or even looking up) the body.
+"""
+import hashlib
+import json
+from collections import OrderedDict
+from typing import Any, Callable, Optional, Tuple
+from fastapi import Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from app.models.user import User
+
+ETAG_HEADER = "ETag"
+IF_NONE_MATCH_HEADER = "If-None-Match"
+
+
+class ResponseCache:
+    """In-process LRU of serialized responses, one entry per user/endpoint/params"""
+
+    MAX_ENTRIES = 2048
+
+    # (user_id, endpoint, params) -> (data_version, etag, body)
+    _cache: "OrderedDict[Tuple[int, str, str], Tuple[int, str, bytes]]" = OrderedDict()
+
+    @staticmethod
+    def etag(user_id: int, version: int, endpoint: str, params: str) -> str:
+        """Strong ETag of a (user, version, endpoint, params) key"""
+        digest = hashlib.sha1(f"{user_id}:{version}:{endpoint}:{params}".encode()).hexdigest()
+        return f'"{digest[:32]}"'
+
+    @staticmethod
+    def invalidate(user_id: Optional[int] = None) -> None:
+        """Drop cached bodies of a user (None = everyone)"""
+        if user_id is None:
+            ResponseCache._cache.clear()
+            return
+        for key in [k for k in ResponseCache._cache if k[0] == user_id]:
+            del ResponseCache._cache[key]
+
+    @staticmethod
+    def respond(
+        request: Request,
+        user: User,
+        endpoint: str,
+        build: Callable[[], Any],
+    ) -> Response:
+        """
+        Serve `endpoint` for `user` from the cache
+
+        Args:
+            request: Incoming request (query params and If-None-Match)
+            user: Authenticated user, carrying its data_version
+            endpoint: Name of the cached endpoint
+            build: Computes the response payload on a miss
+
+        Returns:
+            304 if the client's ETag is current, otherwise the JSON body
+        """
+        params = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+        version = user.data_version or 0
+        etag = ResponseCache.etag(user.id, version, endpoint, params)
+        headers = {ETAG_HEADER: etag, "Cache-Control": "private, no-cache"}
+
+        if_none_match = request.headers.get(IF_NONE_MATCH_HEADER, "")
+        if etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        key = (user.id, endpoint, params)
+        entry = ResponseCache._cache.get(key)
+        if entry is not None and entry[0] == version:
+            ResponseCache._cache.move_to_end(key)
+            body = entry[2]
+        else:
+            body = json.dumps(jsonable_encoder(build()), separators=(",", ":")).encode()
+            ResponseCache._cache[key] = (version, etag, body)
+            ResponseCache._cache.move_to_end(key)
+            while len(ResponseCache._cache) > ResponseCache.MAX_ENTRIES:
+                ResponseCache._cache.popitem(last=False)
+
+        return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,46 @@
+"""
+Corporate action database model
+
+Splits, reverse splits and bonus shares per ticker, shared by every user.
+Positions and price history are expressed in today's shares by the
+cumulative factor of the actions after each date.
+"""
+from sqlalchemy import Column, Integer, Float, String, Date, DateTime, Enum, UniqueConstraint
+from sqlalchemy.sql import func
+import enum
+from app.core.database import Base
+
+
+class CorporateActionType(enum.Enum):
+    """Corporate action type enumeration"""
+
+    SPLIT = "SPLIT"  # Desdobramento
+    REVERSE_SPLIT = "REVERSE_SPLIT"  # Grupamento
+    BONUS = "BONUS"  # Bonificação em ações
+
+
+class CorporateAction(Base):
+    """
+    CorporateAction model - one share-count event of a ticker
+
+    `factor` is the number of shares held after the event per share held
+    before it: 2.0 for a 1:2 split, 0.1 for a 10:1 reverse split, 1.1 for
+    a 10% bonus. Holdings on the day before `ex_date` are entitled.
+    """
+
+    __tablename__ = "corporate_actions"
+    __table_args__ = (
+        UniqueConstraint("ticker", "ex_date", "type", name="uq_corporate_actions_event"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    ticker = Column(String, nullable=False, index=True)
+    ex_date = Column(Date, nullable=False)
+    type = Column(Enum(CorporateActionType), nullable=False)
+    factor = Column(Float, nullable=False)
+    description = Column(String, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<CorporateAction(ticker={self.ticker}, ex_date={self.ex_date}, type={self.type}, factor={self.factor})>"
@@ -0,0 +1,92 @@
+"""
+Dividend database models
+
+Local per-ticker dividend history, the per-share estimates derived from
+it and the Barsi screener ranking, shared by every user.
+"""
+from sqlalchemy import Column, Integer, Float, String, Date, DateTime, JSON, UniqueConstraint, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class DividendEvent(Base):
+    """DividendEvent model - one cash payment per share of a ticker"""
+
+    __tablename__ = "dividend_events"
+    __table_args__ = (
+        UniqueConstraint("ticker", "payment_date", "value_per_share", name="uq_dividend_events_payment"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    ticker = Column(String, nullable=False)
+    payment_date = Column(Date, nullable=False)
+    value_per_share = Column(Float, nullable=False)
+    # First day traded without the right: holders at the end of the day
+    # before are entitled. NULL when the provider does not report it
+    ex_date = Column(Date, nullable=True)
+    label = Column(String, nullable=True)  # Dividendo, JCP, Rendimento...
+    source = Column(String, nullable=False, default="provider")  # provider | proceeds
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<DividendEvent(ticker={self.ticker}, date={self.payment_date}, value={self.value_per_share})>"
+
+
+class DividendEstimate(Base):
+    """
+    DividendEstimate model - expected per-share payments of a ticker
+
+    monthly_profile holds 12 values (January..December): the average amount
+    per share paid in that calendar month over the analysed years.
+    """
+
+    __tablename__ = "dividend_estimates"
+
+    id = Column(Integer, primary_key=True, index=True)
+    ticker = Column(String, unique=True, nullable=False)
+
+    trailing_12m = Column(Float, nullable=False, default=0.0)  # Pago nos últimos 12 meses
+    annual_estimate = Column(Float, nullable=False, default=0.0)  # Soma do perfil mensal
+    monthly_profile = Column(JSON, nullable=False, default=list)
+    years_analyzed = Column(Integer, nullable=False, default=0)
+    last_payment_date = Column(Date, nullable=True)
+
+    computed_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<DividendEstimate(ticker={self.ticker}, annual={self.annual_estimate})>"
+
+
+class BarsiScreenerEntry(Base):
+    """
+    BarsiScreenerEntry model - Barsi price target of a dividend-paying ticker
+
+    Rebuilt by the nightly screener job; rank 1 is the largest margin of
+    safety.
+    """
+
+    __tablename__ = "barsi_screener"
+    __table_args__ = (
+        Index("ix_barsi_screener_rank", "rank"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    ticker = Column(String, unique=True, nullable=False)
+    name = Column(String, nullable=True)
+    sector = Column(String, nullable=True)
+
+    current_price = Column(Float, nullable=False)
+    price_date = Column(Date, nullable=False)
+    average_annual_dividend = Column(Float, nullable=False)
+    price_target = Column(Float, nullable=False)  # Preço Teto
+    current_yield = Column(Float, nullable=False)  # % sobre o preço atual
+    upside_to_target = Column(Float, nullable=False)
+    margin_of_safety = Column(Float, nullable=False)
+    years_analyzed = Column(Integer, nullable=False, default=0)
+    rank = Column(Integer, nullable=False)
+
+    computed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<BarsiScreenerEntry(ticker={self.ticker}, target={self.price_target}, rank={self.rank})>"
@@ -3,7 +3,7 @@ Fixed Income (Renda Fixa) database model
 
 Supports: Tesouro Direto, CDB, LCI, LCA, Debêntures, etc.
 """
-from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime, Enum, Date
+from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime, Enum, Date, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import date, datetime
@@ -41,6 +41,61 @@ class IndexerType(enum.Enum):
     OUTRO = "OUTRO"
 
 
+class IndexerRate(Base):
+    """
+    IndexerRate model - one published value of an indexer series
+
+    `value` is the rate as published by the BCB (SGS): % per business day
+    for CDI and Selic, % per month (dated on the 1st) for IPCA and IGP-M.
+    """
+
+    __tablename__ = "indexer_rates"
+    __table_args__ = (
+        UniqueConstraint("indexer", "date", name="uq_indexer_rates_indexer_date"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    indexer = Column(Enum(IndexerType), nullable=False)
+    date = Column(Date, nullable=False)
+    value = Column(Float, nullable=False)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<IndexerRate(indexer={self.indexer}, date={self.date}, value={self.value})>"
+
+
+class TesouroPrice(Base):
+    """
+    TesouroPrice model - daily rates and unit prices (PU) of a Tesouro
+    Direto bond, as published in the Tesouro Transparente price file
+
+    `bond_type` is the file's "Tipo Titulo" (e.g. "Tesouro IPCA+").
+    Buy values are what an investor pays, sell values what the Treasury
+    pays back on an early redemption.
+    """
+
+    __tablename__ = "tesouro_prices"
+    __table_args__ = (
+        UniqueConstraint("bond_type", "maturity_date", "date", name="uq_tesouro_prices_bond_date"),
+        Index("ix_tesouro_prices_date", "date"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    bond_type = Column(String, nullable=False)
+    maturity_date = Column(Date, nullable=False)
+    date = Column(Date, nullable=False)
+
+    buy_rate = Column(Float, nullable=True)  # Taxa Compra Manhã (% a.a.)
+    sell_rate = Column(Float, nullable=True)  # Taxa Venda Manhã (% a.a.)
+    buy_price = Column(Float, nullable=True)  # PU Compra Manhã
+    sell_price = Column(Float, nullable=True)  # PU Venda Manhã
+    base_price = Column(Float, nullable=True)  # PU Base Manhã
+
+    def __repr__(self):
+        return f"<TesouroPrice(bond={self.bond_type}, maturity={self.maturity_date}, date={self.date})>"
+
+
 class FixedIncomeInvestment(Base):
     """Fixed income investment model"""
     
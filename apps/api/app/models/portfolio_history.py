@@ -0,0 +1,34 @@
+"""
+Portfolio History database model
+"""
+from sqlalchemy import Column, Integer, Float, ForeignKey, Date, UniqueConstraint
+from sqlalchemy.orm import relationship
+from app.core.database import Base
+
+
+class PortfolioDailyValue(Base):
+    """
+    PortfolioDailyValue model - value of a user's portfolio at the end of a day
+
+    net_cash_flow is money put into (buys) minus money taken out of (sells)
+    the portfolio on that day, fees included.
+    """
+
+    __tablename__ = "portfolio_daily_values"
+    __table_args__ = (
+        UniqueConstraint("user_id", "date", name="uq_portfolio_daily_values_user_date"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    date = Column(Date, nullable=False)
+
+    value = Column(Float, nullable=False, default=0.0)  # Valor de mercado
+    invested = Column(Float, nullable=False, default=0.0)  # Custo das posições
+    net_cash_flow = Column(Float, nullable=False, default=0.0)  # Aportes - resgates
+
+    # Relationships
+    user = relationship("User")
+
+    def __repr__(self):
+        return f"<PortfolioDailyValue(user_id={self.user_id}, date={self.date}, value={self.value})>"
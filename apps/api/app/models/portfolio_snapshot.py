@@ -0,0 +1,56 @@
+"""
+Portfolio Snapshot database model
+"""
+from sqlalchemy import Column, Integer, Float, ForeignKey, DateTime, JSON
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class PortfolioSnapshot(Base):
+    """
+    PortfolioSnapshot model - materialized overview of a user's portfolio
+
+    One row per user, kept up to date whenever positions or prices change,
+    so the dashboard overview is a single-row read.
+    """
+
+    __tablename__ = "portfolio_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(
+        Integer, ForeignKey("users.id"), nullable=False, unique=True, index=True
+    )
+
+    # Totals
+    total_value = Column(Float, nullable=False, default=0.0)
+    total_invested = Column(Float, nullable=False, default=0.0)
+    positions_count = Column(Integer, nullable=False, default=0)
+
+    # Breakdowns (lists of dicts, already in response format)
+    allocation_by_type = Column(JSON, nullable=False, default=list)
+    allocation_by_sector = Column(JSON, nullable=False, default=list)
+    top_positions = Column(JSON, nullable=False, default=list)
+
+    # Metadata
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+    # Relationships
+    user = relationship("User", back_populates="portfolio_snapshot")
+
+    @property
+    def profit_loss(self) -> float:
+        """Profit or loss (total_value - total_invested)"""
+        return self.total_value - self.total_invested
+
+    @property
+    def profit_loss_percentage(self) -> float:
+        """Profit or loss percentage"""
+        if self.total_invested > 0:
+            return (self.profit_loss / self.total_invested) * 100
+        return 0.0
+
+    def __repr__(self):
+        return f"<PortfolioSnapshot(user_id={self.user_id}, total_value={self.total_value})>"
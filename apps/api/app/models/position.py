@@ -1,7 +1,7 @@
 """
 Asset Position database model
 """
-from sqlalchemy import Column, Integer, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, Float, ForeignKey, Date, DateTime, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -58,3 +58,32 @@ class AssetPosition(Base):
     def __repr__(self):
         return f"<AssetPosition(user_id={self.user_id}, asset_id={self.asset_id}, quantity={self.quantity})>"
 
+
+
+class PositionCheckpoint(Base):
+    """
+    PositionCheckpoint model - a user's holding of an asset at the end of a month
+
+    Quantities are in the shares of the checkpoint date (later corporate
+    actions are applied when reading); cost is the average-cost basis.
+    Only assets held on that date have a row.
+    """
+
+    __tablename__ = "position_checkpoints"
+    __table_args__ = (
+        UniqueConstraint("user_id", "date", "asset_id", name="uq_position_checkpoints_user_date_asset"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    asset_id = Column(Integer, ForeignKey("assets.id"), nullable=False)
+    date = Column(Date, nullable=False)
+
+    quantity = Column(Float, nullable=False)
+    cost = Column(Float, nullable=False, default=0.0)  # Custo da posição
+
+    # Relationships
+    asset = relationship("Asset")
+
+    def __repr__(self):
+        return f"<PositionCheckpoint(user_id={self.user_id}, date={self.date}, asset_id={self.asset_id})>"
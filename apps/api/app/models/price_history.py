@@ -0,0 +1,40 @@
+"""
+Price History database model
+
+Local store of daily OHLCV bars fetched from market data providers,
+shared by every user holding the ticker.
+"""
+from sqlalchemy import Column, Integer, Float, String, Date, DateTime, UniqueConstraint
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class PriceBar(Base):
+    """PriceBar model - one daily bar of a ticker"""
+
+    __tablename__ = "price_bars"
+    __table_args__ = (
+        UniqueConstraint("ticker", "date", name="uq_price_bars_ticker_date"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    ticker = Column(String, nullable=False)
+    date = Column(Date, nullable=False)
+
+    # Bar data
+    open = Column(Float, nullable=True)
+    high = Column(Float, nullable=True)
+    low = Column(Float, nullable=True)
+    close = Column(Float, nullable=False)
+    volume = Column(Float, nullable=True)
+
+    # Close in today's shares (corporate actions after `date`); NULL = close
+    adj_close = Column(Float, nullable=True)
+
+    # Metadata
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+    def __repr__(self):
+        return f"<PriceBar(ticker={self.ticker}, date={self.date}, close={self.close})>"
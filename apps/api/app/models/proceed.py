@@ -1,7 +1,8 @@
 """
 Proceed (Provento) database model
 """
-from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime, Enum, Date
+from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime, Enum, Date, Index, UniqueConstraint
+from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import enum
 from app.core.database import Base
@@ -21,6 +22,9 @@ class Proceed(Base):
     """Proceed model - represents income from assets (dividends, JCP, etc.)"""
 
     __tablename__ = "proceeds"
+    __table_args__ = (
+        Index("ix_proceeds_user_date_id", "user_id", "date", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
@@ -43,3 +47,33 @@ class Proceed(Base):
     def __repr__(self):
         return f"<Proceed(type={self.type}, asset_id={self.asset_id}, value={self.total_value}, date={self.date})>"
 
+
+
+class ProceedMonthlyRollup(Base):
+    """
+    ProceedMonthlyRollup model - a user's proceeds summed per month and type
+
+    Built for users with large histories; monthly totals are read from it
+    instead of grouping every proceed row.
+    """
+
+    __tablename__ = "proceed_monthly_rollups"
+    __table_args__ = (
+        UniqueConstraint("user_id", "year", "month", "type", name="uq_proceed_monthly_rollups_period"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    type = Column(Enum(ProceedType), nullable=False)
+
+    total_value = Column(Float, nullable=False, default=0.0)
+    count = Column(Integer, nullable=False, default=0)
+
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+    def __repr__(self):
+        return f"<ProceedMonthlyRollup(user_id={self.user_id}, {self.year}-{self.month:02d}, type={self.type}, total={self.total_value})>"
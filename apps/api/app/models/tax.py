@@ -0,0 +1,96 @@
+"""
+Tax (IR) database models
+
+Realized gains ledger and monthly tax summaries for stock exchange sales.
+"""
+from sqlalchemy import (
+    Column, Integer, Float, Boolean, ForeignKey, Date, DateTime, Enum,
+    UniqueConstraint, Index,
+)
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+import enum
+from app.core.database import Base
+
+
+class TaxBucket(enum.Enum):
+    """Tax bucket enumeration (each bucket has its own rate)"""
+
+    ACOES = "ACOES"  # Ações swing trade - 15%, isenção de R$20 mil/mês em vendas
+    OUTROS = "OUTROS"  # ETFs/BDRs swing trade - 15%, sem isenção
+    FII = "FII"  # Fundos Imobiliários - 20%
+    DAY_TRADE = "DAY_TRADE"  # Day trade - 20%
+
+
+class RealizedGain(Base):
+    """
+    RealizedGain model - gain or loss realized by (part of) a sale
+
+    A sale produces one entry per bucket: shares bought and sold on the same
+    day are day trade, the rest is swing trade against the average cost.
+    """
+
+    __tablename__ = "realized_gains"
+    __table_args__ = (
+        Index("ix_realized_gains_user_date", "user_id", "date"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    transaction_id = Column(
+        Integer, ForeignKey("transactions.id", ondelete="CASCADE"), nullable=False, index=True
+    )
+    asset_id = Column(Integer, ForeignKey("assets.id"), nullable=False, index=True)
+
+    date = Column(Date, nullable=False)
+    bucket = Column(Enum(TaxBucket), nullable=False)
+    quantity = Column(Float, nullable=False)
+    sale_value = Column(Float, nullable=False)  # Valor de venda (líquido de taxas)
+    cost_basis = Column(Float, nullable=False)  # Custo médio das ações vendidas
+    gain = Column(Float, nullable=False)  # Lucro (ou prejuízo, se negativo)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relationships
+    asset = relationship("Asset")
+
+    def __repr__(self):
+        return f"<RealizedGain(user_id={self.user_id}, date={self.date}, bucket={self.bucket}, gain={self.gain})>"
+
+
+class MonthlyTaxSummary(Base):
+    """
+    MonthlyTaxSummary model - running monthly result of a tax bucket
+
+    loss_carry_forward is the balance of the bucket's loss pool after the
+    month (ACOES and OUTROS share one pool), so later months start from it.
+    """
+
+    __tablename__ = "monthly_tax_summaries"
+    __table_args__ = (
+        UniqueConstraint("user_id", "year", "month", "bucket", name="uq_monthly_tax_summaries_period"),
+        Index("ix_monthly_tax_summaries_user_period", "user_id", "year", "month"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    bucket = Column(Enum(TaxBucket), nullable=False)
+
+    sales_total = Column(Float, nullable=False, default=0.0)  # Total de vendas
+    net_result = Column(Float, nullable=False, default=0.0)  # Lucros - prejuízos
+    exempt = Column(Boolean, nullable=False, default=False)  # Isento (vendas <= R$20 mil)
+    loss_used = Column(Float, nullable=False, default=0.0)  # Prejuízo compensado
+    loss_carry_forward = Column(Float, nullable=False, default=0.0)  # Prejuízo a compensar
+    taxable_base = Column(Float, nullable=False, default=0.0)  # Base de cálculo
+    tax_rate = Column(Float, nullable=False, default=0.0)
+    irrf = Column(Float, nullable=False, default=0.0)  # IR retido na fonte ("dedo-duro")
+    tax_due = Column(Float, nullable=False, default=0.0)  # Imposto a pagar
+
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
+
+    def __repr__(self):
+        return f"<MonthlyTaxSummary(user_id={self.user_id}, {self.year}-{self.month:02d}, bucket={self.bucket}, tax_due={self.tax_due})>"
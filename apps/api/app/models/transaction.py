@@ -1,7 +1,7 @@
 """
 Transaction database model
 """
-from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime, Enum
+from sqlalchemy import Column, Integer, Float, String, ForeignKey, DateTime, Enum, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -19,6 +19,9 @@ class Transaction(Base):
     """Transaction model - represents a buy/sell transaction"""
 
     __tablename__ = "transactions"
+    __table_args__ = (
+        Index("ix_transactions_user_date_id", "user_id", "date", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
@@ -17,6 +17,8 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     is_active = Column(Boolean, default=True, nullable=False)
     is_superuser = Column(Boolean, default=False, nullable=False)
+    # Bumped on every write to the user's transactions, proceeds or prices
+    data_version = Column(Integer, default=0, server_default="0", nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(
         DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
@@ -32,6 +34,9 @@ class User(Base):
     fixed_income_investments = relationship(
         "FixedIncomeInvestment", back_populates="user"
     )
+    portfolio_snapshot = relationship(
+        "PortfolioSnapshot", back_populates="user", uselist=False
+    )
     
     # Personal Finance
     pf_accounts = relationship("BankAccount", back_populates="user")
@@ -1,13 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any, Optional
+from typing import Optional
 from datetime import datetime, timedelta, date
 from app.core.database import get_db
 from app.core.deps import get_current_user
 from app.models.user import User
-from app.models.transaction import Transaction, TransactionType
-from app.models.asset import Asset
-from app.services.brapi_service import BrapiService
+from app.services.portfolio_history_service import PortfolioHistoryService
+from app.services.performance_service import PerformanceService
+from app.services.proceeds_service import ProceedsService
+from app.services.dividend_service import DividendService
+from app.services.risk_service import RiskService
+from app.services.optimizer_service import OptimizerService
 
 
 router = APIRouter(tags=["Analytics"])
@@ -21,14 +24,13 @@ async def get_portfolio_history(
     """
     Get portfolio value history based on transaction history and historical prices.
     
-    This performs a day-by-day replay of transactions to calculate the exact portfolio value
-    at each point in time.
+    Values are read from the persisted daily series (portfolio_daily_values),
+    which is backfilled on transaction edits and extended by the nightly job.
+    The series is built on first access if it does not exist yet.
     """
     
     # 1. Determine start date
     today = datetime.now().date()
-    start_date = today
-    interval = "1d"
     
     if period_range == "1d":
         start_date = today - timedelta(days=1)
@@ -44,134 +46,55 @@ async def get_portfolio_history(
         start_date = date(today.year, 1, 1)
     else:
         start_date = today - timedelta(days=30) # Default
-        
-    # 2. Get all user transactions
-    transactions = db.query(Transaction).filter(
-        Transaction.user_id == current_user.id
-    ).order_by(Transaction.date.asc()).all()
-    
-    if not transactions:
-        return {"dates": [], "values": []}
-    
-    # Adjust start_date if first transaction is later (but logic handles it by 0 quantity)
-    # However, if we want full history, we might adjust.
-    # For now, stick to requested range.
-    
-    # 3. Identify assets involved in the period or currently held
-    # Getting unique assets from ANY transaction is safer
-    asset_ids = set([t.asset_id for t in transactions])
-    assets = db.query(Asset).filter(Asset.id.in_(asset_ids)).all()
-    ticker_map = {a.id: a.ticker for a in assets}
-    tickers = [a.ticker for a in assets]
-    
-    # 4. Fetch historical prices for ALL involved assets
-    # This might be slow if many assets. In production, caching is essential.
-    # For MVP, we fetch sequentially or use a bulk endpoint if brapi has it (get_quotes is current only)
-    # Brapi get_historical takes one ticker usually.
-    
-    price_history = {} # {ticker: {date_str: price}}
-    
-    import asyncio
-    
-    async def fetch_history(ticker):
-        # Map range to brapi range
-        brapi_range = period_range if period_range in ["1mo", "3mo", "6mo", "1y", "ytd"] else "1mo"
-        if period_range == "1d": brapi_range = "5d" # Shortest history
-        
-        hist = await BrapiService.get_historical(ticker, range=brapi_range)
-        if hist["success"]:
-            # Process history into a dict day -> close price
-            prices = {}
-            for day in hist["data"]["historical"]:
-                # Brapi date format usually unix timestamp or "2024-01-01"
-                # Check brapi output format. Service returns raw 'historicalDataPrice' list
-                # Assuming entries have 'date' and 'close'
-                d_val = day.get("date") # 16789... or string
-                price = day.get("close")
-                
-                if d_val and price:
-                    # Parse date
-                    try:
-                        if isinstance(d_val, int):
-                            d_obj = datetime.fromtimestamp(d_val).date()
-                        else:
-                             # Could be string, try parsing - simplistic 
-                             d_obj = datetime.fromtimestamp(int(d_val)).date() 
-                    except:
-                       continue
-                    
-                    prices[d_obj] = price
-            price_history[ticker] = prices
+    
+    # 2. Build the series on first access, then range-scan it
+    await PortfolioHistoryService.ensure(db, current_user.id)
+    rows = PortfolioHistoryService.get_range(db, current_user.id, start_date, today)
+    
+    # Only days with value (before the first buy the portfolio is empty)
+    return [
+        {"date": row.date.isoformat(), "value": round(row.value, 2)}
+        for row in rows
+        if row.value > 0
+    ]
 
-    # Run fetches concurrently-ish
-    # Note: Requests are async in service
-    tasks = [fetch_history(t) for t in tickers]
-    await asyncio.gather(*tasks)
-    
-    # 5. Replay Transactions
-    # We iterate day by day from start_date to today
-    
-    current_quantities = {t: 0 for t in tickers}
-    portfolio_history = []
-    
-    # Pre-calculate quantities BEFORE start_date
-    # Fix: Ensure we compare date objects (t.date is datetime)
-    pre_transactions = [t for t in transactions if t.date.date() < start_date]
-    for tx in pre_transactions:
-        tick = ticker_map.get(tx.asset_id)
-        if not tick: continue
-        if tx.type == TransactionType.BUY:
-            current_quantities[tick] += tx.quantity
-        else:
-            current_quantities[tick] -= tx.quantity
-            
-    # Iterate days
-    delta = timedelta(days=1)
-    d = start_date
-    
-    while d <= today:
-        # Apply transactions of day d
-        day_cw_transactions = [t for t in transactions if t.date.date() == d]
-        for tx in day_cw_transactions:
-            tick = ticker_map.get(tx.asset_id)
-            if not tick: continue
-            if tx.type == TransactionType.BUY:
-                current_quantities[tick] += tx.quantity
-            else:
-                current_quantities[tick] -= tx.quantity
-        
-        # Calculate Value
-        day_total = 0.0
-        
-        for tick, qty in current_quantities.items():
-            if qty > 0:
-                # Find price for day d
-                # If no price (weekend/holiday), use last known price
-                ph = price_history.get(tick, {})
-                price = ph.get(d)
-                
-                # Fallback logic: look back X days
-                if price is None:
-                    lookback = d
-                    for _ in range(5): # Look back 5 days max
-                        lookback -= delta
-                        price = ph.get(lookback)
-                        if price: break
-                
-                if price:
-                    day_total += qty * price
-                # If still no price (e.g. recent IPO or fetch failed), maybe use cost basis? 
-                # Ignoring for now or could use current fallback if desperate.
-        
-        if day_total > 0: # Only add if we have value (filters out holidays if fallback fails)
-             portfolio_history.append({
-                 "date": d.isoformat(),
-                 "value": round(day_total, 2)
-             })
-        
-        d += delta
-        
-    return portfolio_history
+@router.get("/performance")
+async def get_portfolio_performance(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Get portfolio time-weighted (TWR) and money-weighted (MWR) returns.
+    
+    Without dates, returns the 1m, 6m, ytd, 1y and inception periods.
+    With start_date/end_date, returns a single "custom" period.
+    Returns are percentages; mwr_annualized is the XIRR.
+    """
+    if start_date and end_date and start_date > end_date:
+        raise HTTPException(status_code=400, detail="start_date must be before end_date")
+    
+    return await PerformanceService.get_portfolio_performance(
+        db, current_user.id, start=start_date, end=end_date
+    )
+
+@router.get("/performance/assets")
+async def get_assets_performance(
+    period: str = "1y", # 1m, 6m, ytd, 1y, inception
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Get TWR/MWR per asset for a period, largest positions first.
+    """
+    if period not in PerformanceService.PERIODS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid period. Use one of: {', '.join(PerformanceService.PERIODS)}",
+        )
+    
+    return await PerformanceService.get_asset_performance(db, current_user.id, period)
 
 @router.get("/dividends")
 async def get_dividends_history(
@@ -190,14 +113,7 @@ async def get_dividends_history(
     elif range == "12mo":
         start_date = today - timedelta(days=365)
         
-    # 2. Query Proceeds
-    from app.models.proceed import Proceed
-    proceeds = db.query(Proceed).filter(
-        Proceed.user_id == current_user.id,
-        Proceed.date >= start_date
-    ).order_by(Proceed.date.asc()).all()
-    
-    # 3. Aggregate by Month
+    # 2. Monthly totals straight from the database (GROUP BY month)
     monthly_data = {} # "YYYY-MM" -> value
     
     # Initialize months if range is 12mo or YTD to ensure 0s
@@ -213,11 +129,9 @@ async def get_dividends_history(
             else:
                 current = date(current.year, current.month + 1, 1)
 
-    for p in proceeds:
-        month_key = p.date.strftime("%Y-%m")
-        if month_key not in monthly_data:
-             monthly_data[month_key] = 0.0
-        monthly_data[month_key] += p.total_value
+    # 3. Merge the aggregated months (whole months from start_date)
+    for month in ProceedsService.monthly_totals(db, current_user.id, start=start_date):
+        monthly_data[month["month"]] = month["total"]
 
     # 4. Format Result
     # Sorted list of dicts
@@ -227,3 +141,85 @@ async def get_dividends_history(
     ]
     
     return result
+
+
+@router.get("/dividends/projection")
+async def get_dividend_projection(
+    months: int = 12,
+    method: str = "seasonal",
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Projected dividend cash flow for the next months.
+    
+    Holdings x per-share monthly estimates precomputed from the local
+    dividend history. `method` is "seasonal" (average paid per calendar
+    month over the last years) or "trailing" (last 12 months, same shape).
+    """
+    if not 1 <= months <= 36:
+        raise HTTPException(status_code=400, detail="months deve estar entre 1 e 36")
+    
+    DividendService.ensure(db, current_user.id)
+    try:
+        return DividendService.project(db, current_user.id, months=months, method=method)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/risk")
+async def get_portfolio_risk(
+    method: str = "sample", # sample, ewma
+    lookback_days: int = RiskService.DEFAULT_LOOKBACK_DAYS,
+    halflife: int = RiskService.DEFAULT_HALFLIFE,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Covariance-based risk of the user's variable-income positions.
+    
+    Positions are weighted by market value. Returns the portfolio
+    volatility, the diversification ratio, each position's marginal risk
+    and share of the total risk, and the correlation matrix.
+    """
+    if not 60 <= lookback_days <= 1825:
+        raise HTTPException(status_code=400, detail="lookback_days deve estar entre 60 e 1825")
+    if halflife < 1:
+        raise HTTPException(status_code=400, detail="halflife deve ser positivo")
+    
+    try:
+        return await RiskService.analyze_user(
+            db, current_user.id, lookback_days=lookback_days, method=method, halflife=halflife
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/optimizer")
+async def get_allocation_optimizer(
+    lookback_days: int = RiskService.DEFAULT_LOOKBACK_DAYS,
+    max_weight: float = 1.0,
+    points: int = OptimizerService.DEFAULT_POINTS,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    Efficient frontier and optimal allocations for the user's tickers.
+    
+    Returns the mean-variance frontier, the minimum-variance and
+    risk-parity weights (long-only, each weight capped at max_weight) and
+    where the current allocation sits in return/volatility terms.
+    """
+    if not 60 <= lookback_days <= 1825:
+        raise HTTPException(status_code=400, detail="lookback_days deve estar entre 60 e 1825")
+    if not 0 < max_weight <= 1:
+        raise HTTPException(status_code=400, detail="max_weight deve estar entre 0 e 1")
+    if not 2 <= points <= 100:
+        raise HTTPException(status_code=400, detail="points deve estar entre 2 e 100")
+    
+    try:
+        return await OptimizerService.optimize_user(
+            db, current_user.id, lookback_days=lookback_days, max_weight=max_weight, points=points
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -3,20 +3,22 @@ Fixed Income Routes
 
 Endpoints for managing fixed income investments (Tesouro Direto, CDB, LCI, etc.)
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import date, datetime
 from pydantic import BaseModel, Field
 from enum import Enum
 
-from app.core.deps import get_current_user, get_db
+from app.core.deps import get_current_superuser, get_current_user, get_db
 from app.models.user import User
 from app.models.fixed_income import (
     FixedIncomeInvestment,
     FixedIncomeType,
     IndexerType,
 )
+from app.services.fixed_income_service import FixedIncomeService
+from app.services.tesouro_service import TesouroService
 from app.core.logging import logger
 
 router = APIRouter(prefix="/fixed-income", tags=["Fixed Income"])
@@ -77,6 +79,10 @@ class FixedIncomeResponse(BaseModel):
     current_value: Optional[float]
     profit_loss: float
     profit_loss_percentage: float
+    iof: float = 0.0
+    income_tax: float = 0.0
+    net_value: Optional[float] = None
+    tax_exempt: bool = False
     purchase_date: str
     maturity_date: Optional[str]
     days_invested: int
@@ -101,9 +107,19 @@ class FixedIncomeListResponse(BaseModel):
     total_current_value: float
     total_profit_loss: float
     total_profit_loss_percentage: float
+    total_net_value: float = 0.0
     investments: List[FixedIncomeResponse]
 
 
+class TesouroImportResponse(BaseModel):
+    """Response for importing a Tesouro Direto price file"""
+    rows: int
+    inserted: int
+    bonds: int
+    revalued: int
+    marked_to_market: int
+
+
 class UpdateValuesResponse(BaseModel):
     """Response for updating fixed income values"""
     success: bool
@@ -126,8 +142,18 @@ def get_rate_description(indexer: IndexerType, rate: float, is_percentage: bool)
         return f"{indexer_name} + {rate}%"
 
 
-def investment_to_response(inv: FixedIncomeInvestment) -> FixedIncomeResponse:
+def investments_to_responses(investments: List[FixedIncomeInvestment]) -> List[FixedIncomeResponse]:
+    """Convert database models to responses, with redemption taxes computed for all at once"""
+    taxes = FixedIncomeService.investment_taxes(investments)
+    return [
+        investment_to_response(inv, {name: float(values[i]) for name, values in taxes.items()})
+        for i, inv in enumerate(investments)
+    ]
+
+
+def investment_to_response(inv: FixedIncomeInvestment, taxes: Optional[Dict[str, float]] = None) -> FixedIncomeResponse:
     """Convert database model to response"""
+    taxes = taxes or {}
     return FixedIncomeResponse(
         id=inv.id,
         name=inv.name,
@@ -137,6 +163,10 @@ def investment_to_response(inv: FixedIncomeInvestment) -> FixedIncomeResponse:
         current_value=inv.current_value,
         profit_loss=inv.profit_loss,
         profit_loss_percentage=inv.profit_loss_percentage,
+        iof=taxes.get("iof", 0.0),
+        income_tax=taxes.get("income_tax", 0.0),
+        net_value=taxes.get("net_value"),
+        tax_exempt=inv.type in FixedIncomeService.TAX_EXEMPT_TYPES,
         purchase_date=inv.purchase_date.isoformat(),
         maturity_date=inv.maturity_date.isoformat() if inv.maturity_date else None,
         days_invested=inv.days_invested,
@@ -203,7 +233,7 @@ async def add_fixed_income(
     
     logger.info(f"User {current_user.id} added fixed income: {investment.name}")
     
-    return investment_to_response(investment)
+    return investments_to_responses([investment])[0]
 
 
 @router.get("/list", response_model=FixedIncomeListResponse)
@@ -232,6 +262,7 @@ async def list_fixed_income(
     total_profit_loss_percentage = (
         (total_profit_loss / total_invested * 100) if total_invested > 0 else 0
     )
+    responses = investments_to_responses(investments)
     
     return FixedIncomeListResponse(
         total_count=len(investments),
@@ -239,7 +270,8 @@ async def list_fixed_income(
         total_current_value=round(total_current_value, 2),
         total_profit_loss=round(total_profit_loss, 2),
         total_profit_loss_percentage=round(total_profit_loss_percentage, 2),
-        investments=[investment_to_response(inv) for inv in investments],
+        total_net_value=round(sum(r.net_value for r in responses), 2),
+        investments=responses,
     )
 
 
@@ -263,7 +295,7 @@ async def get_fixed_income(
             detail="Investment not found"
         )
     
-    return investment_to_response(investment)
+    return investments_to_responses([investment])[0]
 
 
 @router.delete("/{investment_id}")
@@ -342,6 +374,36 @@ async def update_fixed_income_values(
     )
 
 
+@router.post("/tesouro/import", response_model=TesouroImportResponse)
+async def import_tesouro_prices(
+    file: UploadFile = File(...),
+    current_user: User = Depends(get_current_superuser),
+    db: Session = Depends(get_db),
+):
+    """
+    Import a Tesouro Transparente price file (PrecoTaxaTesouroDireto.csv)
+    and mark every Tesouro Direto investment to market.
+    
+    Administrators only: prices are shared by all users.
+    """
+    if not file.filename.lower().endswith(".csv"):
+        raise HTTPException(status_code=400, detail="Arquivo deve ser .csv")
+    
+    try:
+        imported = TesouroService.import_prices(db, await file.read())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    revalued = FixedIncomeService.revalue(db)
+    logger.info(f"User {current_user.id} imported {imported['inserted']} Tesouro prices")
+    
+    return TesouroImportResponse(
+        **imported,
+        revalued=revalued["updated"],
+        marked_to_market=revalued["marked_to_market"],
+    )
+
+
 @router.get("/types/list")
 async def list_investment_types():
     """
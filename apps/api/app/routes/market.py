@@ -9,7 +9,9 @@ import logging
 
 logger = logging.getLogger(__name__)
 from pydantic import BaseModel
+from sqlalchemy.orm import Session
 from app.services.brapi_service import BrapiService
+from app.core.database import get_db
 from app.core.deps import get_current_user
 from app.models.user import User
 
@@ -389,6 +391,30 @@ from app.services.barsi_calculator import BarsiCalculator
 from dataclasses import asdict
 
 
+@router.get("/barsi/screener")
+async def barsi_screener(
+    sector: Optional[str] = Query(None, description="Setor (ex: Financeiro)"),
+    min_yield: Optional[float] = Query(None, description="Dividend yield mínimo (%)"),
+    min_margin: Optional[float] = Query(None, description="Margem de segurança mínima (%)"),
+    sort: str = Query("margin", description="margin, yield, upside ou target"),
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    """
+    Screener Barsi sobre todo o universo de pagadores de dividendos.
+    
+    Lê o ranking recalculado pelo job noturno (histórico local de
+    dividendos x última cotação), sem chamadas a provedores.
+    """
+    try:
+        return BarsiCalculator.screen(
+            db, sector=sector, min_yield=min_yield, min_margin=min_margin,
+            sort_by=sort, limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/barsi/{ticker}")
 async def calculate_barsi_price_target(ticker: str):
     """
@@ -438,6 +464,7 @@ async def analyze_portfolio_barsi(
 # ================================
 
 from app.services.market_intelligence import MarketIntelligence
+from app.services.var_service import VarService
 
 
 @router.get("/intelligence/volatility/{ticker}")
@@ -477,16 +504,18 @@ async def get_anomalies(ticker: str):
 
 @router.get("/intelligence/portfolio-risk")
 async def analyze_portfolio_risk(
-    tickers: str = Query(..., description="Comma-separated list of tickers (e.g., PETR4,BBAS3,ITSA4)")
+    tickers: str = Query(..., description="Comma-separated list of tickers (e.g., PETR4,BBAS3,ITSA4)"),
+    db: Session = Depends(get_db),
 ):
     """
     Analisa o risco de uma carteira inteira.
     
     Retorna:
-    - Volatilidade média da carteira
+    - Volatilidade da carteira (considerando as correlações, pesos iguais)
     - Quantidade de ativos em alta volatilidade
     - Anomalias detectadas
     - Nível de risco geral
+    - Matriz de correlação e contribuição de cada ativo para o risco
     """
     ticker_list = [t.strip().upper() for t in tickers.split(",") if t.strip()]
     
@@ -496,10 +525,45 @@ async def analyze_portfolio_risk(
     if len(ticker_list) > 20:
         raise HTTPException(status_code=400, detail="Máximo de 20 ativos por análise")
     
-    result = await MarketIntelligence.analyze_portfolio_risk(ticker_list)
+    result = await MarketIntelligence.analyze_portfolio_risk(ticker_list, db=db)
     return result
 
 
+@router.get("/intelligence/portfolio-var")
+async def get_portfolio_var(
+    horizons: str = Query("1,10,21", description="Horizons in trading days (e.g., 1,10,21)"),
+    confidence: str = Query("0.95,0.99", description="Confidence levels (e.g., 0.95,0.99)"),
+    paths: int = Query(VarService.DEFAULT_PATHS, description="Number of simulated paths"),
+    method: str = Query("montecarlo", description="montecarlo or bootstrap"),
+    seed: Optional[int] = Query(None, description="Seed for a reproducible simulation"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """
+    VaR e CVaR simulados da carteira do usuário.
+    
+    - montecarlo: retornos normais correlacionados (covariância da carteira)
+    - bootstrap: reamostragem de dias do histórico de retornos
+    
+    Retorna a perda máxima esperada (VaR) e a perda média além dela (CVaR)
+    para cada horizonte e nível de confiança. Com `seed`, o resultado é
+    reproduzível; sem ele, a semente usada é devolvida na resposta.
+    """
+    try:
+        horizon_list = [int(h) for h in horizons.split(",") if h.strip()]
+        confidence_list = [float(c) for c in confidence.split(",") if c.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Horizontes ou níveis de confiança inválidos")
+    
+    try:
+        return await VarService.portfolio_var(
+            db, current_user.id, horizon_list, confidence_list,
+            n_paths=paths, method=method, seed=seed,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.get("/intelligence/full/{ticker}")
 async def get_full_analysis(ticker: str):
     """
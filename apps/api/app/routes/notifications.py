@@ -1,13 +1,14 @@
 """
 Notifications routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 from sqlalchemy import func
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 from app.core.database import get_db
 from app.core.deps import get_current_user
+from app.core.pagination import NEXT_CURSOR_HEADER, paginate
 from app.models.user import User
 from app.models.notification import Notification
 from app.models.asset import Asset
@@ -23,30 +24,35 @@ router = APIRouter()
 
 @router.get("/", response_model=List[NotificationWithAsset])
 async def get_notifications(
+    response: Response,
     skip: int = 0,
     limit: int = 50,
     unread_only: bool = False,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     """
     Get user notifications
     
-    - **skip**: Number of notifications to skip (for pagination)
+    - **skip**: Number of notifications to skip (deprecated, prefer cursor)
     - **limit**: Maximum number of notifications to return
     - **unread_only**: If True, return only unread notifications
+    - **cursor**: Value of the X-Next-Cursor header of the previous page
     """
     query = db.query(Notification).filter(Notification.user_id == current_user.id)
     
     if unread_only:
         query = query.filter(Notification.is_read == False)
     
-    notifications = (
-        query.order_by(Notification.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
+    if skip and not cursor:
+        query = query.order_by(Notification.created_at.desc(), Notification.id.desc()).offset(skip)
+        notifications, next_cursor = query.limit(limit).all(), None
+    else:
+        # created_at is a server default; ids follow the same order
+        notifications, next_cursor = paginate(query, None, Notification.id, limit, cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     
     # Enrich with asset information
     result = []
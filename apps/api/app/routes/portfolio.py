@@ -1,13 +1,14 @@
 """
 Portfolio routes
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from typing import List, Dict, Any
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from app.core.database import get_db
 from app.core.deps import get_current_user
+from app.core.response_cache import ResponseCache
 from app.models.user import User
 from app.models.position import AssetPosition
 from app.models.transaction import Transaction
@@ -16,12 +17,15 @@ from app.models.asset import Asset, AssetType
 from app.schemas.position import PositionWithAsset
 from app.schemas.transaction import TransactionWithAsset
 from app.schemas.proceed import ProceedWithAsset
+from app.services.portfolio_snapshot_service import PortfolioSnapshotService
+from app.services.position_checkpoint_service import PositionCheckpointService
 
 router = APIRouter()
 
 
 @router.get("/overview")
 async def get_portfolio_overview(
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> Dict[str, Any]:
@@ -34,137 +38,78 @@ async def get_portfolio_overview(
     - Profit/Loss (amount and percentage)
     - Asset allocation by type
     - Top 5 positions
-    """
-    # Get all user positions with assets
-    positions = (
-        db.query(AssetPosition)
-        .join(Asset)
-        .filter(AssetPosition.user_id == current_user.id)
-        .all()
-    )
-
-    if not positions:
-        return {
-            "total_value": 0.0,
-            "total_invested": 0.0,
-            "profit_loss": 0.0,
-            "profit_loss_percentage": 0.0,
-            "allocation_by_type": [],
-            "allocation_by_sector": [],
-            "top_positions": [],
-            "positions_count": 0,
-        }
-
-    # Calculate totals
-    total_value = sum(p.total_value for p in positions)
-    total_invested = sum(p.total_invested for p in positions)
-    profit_loss = total_value - total_invested
-    profit_loss_percentage = (
-        (profit_loss / total_invested * 100) if total_invested > 0 else 0.0
-    )
 
-    # Allocation by asset type
-    allocation_by_type = {}
-    allocation_by_sector = {}
-
-    for position in positions:
-        asset = db.query(Asset).filter(Asset.id == position.asset_id).first()
-
-        # By type
-        asset_type = asset.type.value
-        if asset_type not in allocation_by_type:
-            allocation_by_type[asset_type] = 0.0
-        allocation_by_type[asset_type] += position.total_value
-
-        # By sector
-        if asset.sector:
-            if asset.sector not in allocation_by_sector:
-                allocation_by_sector[asset.sector] = 0.0
-            allocation_by_sector[asset.sector] += position.total_value
-
-    # Convert to percentages
-    allocation_by_type_list = [
-        {
-            "type": type_name,
-            "value": value,
-            "percentage": round((value / total_value * 100) if total_value > 0 else 0, 2),
-        }
-        for type_name, value in allocation_by_type.items()
-    ]
-
-    allocation_by_sector_list = [
-        {
-            "sector": sector_name,
-            "value": value,
-            "percentage": round((value / total_value * 100) if total_value > 0 else 0, 2),
-        }
-        for sector_name, value in allocation_by_sector.items()
-    ]
+    Served from the materialized portfolio snapshot, which is refreshed
+    whenever positions or prices change, through the versioned response
+    cache (ETag / If-None-Match).
+    """
+    def build():
+        snapshot = PortfolioSnapshotService.get_or_build(db, current_user.id)
+        return PortfolioSnapshotService.to_overview(snapshot)
 
-    # Top 5 positions
-    sorted_positions = sorted(positions, key=lambda p: p.total_value, reverse=True)[:5]
-    top_positions = []
-
-    for position in sorted_positions:
-        asset = db.query(Asset).filter(Asset.id == position.asset_id).first()
-        top_positions.append({
-            "ticker": asset.ticker,
-            "name": asset.name,
-            "value": round(position.total_value, 2),
-            "percentage": round((position.total_value / total_value * 100) if total_value > 0 else 0, 2),
-            "profit_loss_percentage": round(position.profit_loss_percentage, 2),
-        })
-
-    return {
-        "total_value": round(total_value, 2),
-        "total_invested": round(total_invested, 2),
-        "profit_loss": round(profit_loss, 2),
-        "profit_loss_percentage": round(profit_loss_percentage, 2),
-        "allocation_by_type": allocation_by_type_list,
-        "allocation_by_sector": allocation_by_sector_list,
-        "top_positions": top_positions,
-        "positions_count": len(positions),
-    }
+    return ResponseCache.respond(request, current_user, "portfolio.overview", build)
 
 
 @router.get("/assets", response_model=List[PositionWithAsset])
 async def get_portfolio_assets(
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
     """
     Get list of all assets in portfolio with details
+
+    Served through the versioned response cache (ETag / If-None-Match).
     """
-    positions = (
-        db.query(AssetPosition)
-        .filter(AssetPosition.user_id == current_user.id)
-        .all()
-    )
+    def build():
+        rows = (
+            db.query(AssetPosition, Asset)
+            .join(Asset, Asset.id == AssetPosition.asset_id)
+            .filter(AssetPosition.user_id == current_user.id)
+            .all()
+        )
+        return [
+            PositionWithAsset(
+                id=position.id,
+                user_id=position.user_id,
+                asset_id=position.asset_id,
+                quantity=position.quantity,
+                average_price=position.average_price,
+                current_price=position.current_price,
+                total_value=position.total_value,
+                total_invested=position.total_invested,
+                profit_loss=position.profit_loss,
+                profit_loss_percentage=position.profit_loss_percentage,
+                last_updated=position.last_updated,
+                created_at=position.created_at,
+                asset=asset,
+            )
+            for position, asset in rows
+        ]
 
-    result = []
-    for position in positions:
-        asset = db.query(Asset).filter(Asset.id == position.asset_id).first()
-        
-        # Convert to dict and add asset
-        position_dict = {
-            "id": position.id,
-            "user_id": position.user_id,
-            "asset_id": position.asset_id,
-            "quantity": position.quantity,
-            "average_price": position.average_price,
-            "current_price": position.current_price,
-            "total_value": position.total_value,
-            "total_invested": position.total_invested,
-            "profit_loss": position.profit_loss,
-            "profit_loss_percentage": position.profit_loss_percentage,
-            "last_updated": position.last_updated,
-            "created_at": position.created_at,
-            "asset": asset,
-        }
-        
-        result.append(PositionWithAsset(**position_dict))
+    return ResponseCache.respond(request, current_user, "portfolio.assets", build)
 
-    return result
+
+@router.get("/as-of/{as_of}")
+async def get_positions_as_of(
+    as_of: date,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> Dict[str, Any]:
+    """
+    Get the positions held at the end of a past date
+
+    Built from the nearest month-end checkpoint plus the transactions
+    after it. Quantities and prices are in the shares of that date,
+    values use the last close on or before it.
+    """
+    if as_of > date.today():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Data não pode estar no futuro",
+        )
+
+    return PositionCheckpointService.positions_as_of(db, current_user.id, as_of)
 
 
 @router.get("/assets/{ticker}")
@@ -294,6 +239,7 @@ async def generate_portfolio_report(
     Usa Gemini 2.5-flash-lite para análise profunda.
     """
     from app.services.report_service import ReportService
+    from app.services.dividend_service import DividendService
     from dataclasses import asdict
     
     # Buscar posições do usuário
@@ -323,8 +269,14 @@ async def generate_portfolio_report(
                 "sector": pos.asset.sector
             })
         
+        # Projeção de dividendos determinística (estimativas em cache)
+        DividendService.ensure(db, current_user.id)
+        projection = DividendService.project(db, current_user.id)
+        
         # Gerar relatório
-        report = await ReportService.generate_report(portfolio_assets)
+        report = await ReportService.generate_report(
+            portfolio_assets, dividend_projection=DividendService.summary_text(projection)
+        )
         
         return {
             "success": True,
@@ -3,11 +3,13 @@ Portfolio Management Routes
 
 Endpoints for manually adding transactions, positions, and uploading CSV files.
 """
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session
-from typing import List, Optional, Dict
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session, sessionmaker
+from typing import Any, Callable, List, Optional, Dict, Iterator
 from datetime import date, datetime
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, conint, confloat
+from dataclasses import asdict
 import csv
 import io
 import asyncio
@@ -15,13 +17,25 @@ import logging
 
 logger = logging.getLogger(__name__)
 
-from app.core.deps import get_current_user, get_db
+from app.core.database import get_session_factory
+from app.core.deps import get_current_superuser, get_current_user, get_db
+from app.core.pagination import NEXT_CURSOR_HEADER, paginate
+from app.core.response_cache import ResponseCache
 from app.models.user import User
 from app.models.asset import Asset, AssetType
 from app.models.transaction import Transaction, TransactionType
 from app.models.position import AssetPosition
+from app.models.corporate_action import CorporateAction, CorporateActionType
 from app.models.personal_finance import BankAccount, PersonalTransaction, TransactionCategory
 from app.models.personal_finance import TransactionType as PFTransactionType
+from app.services import portfolio_events
+from app.services.rebalance_service import RebalanceService
+from app.services.archive_service import ArchiveService
+from app.services.proceeds_service import ProceedsService
+from app.services.rolling_stats import RollingStatsService
+from app.services.corporate_action_service import CorporateActionService
+from app.services.risk_service import RiskService
+from app.services.optimizer_service import OptimizerService
 
 router = APIRouter(prefix="/portfolio/manage", tags=["Portfolio Management"])
 
@@ -103,6 +117,54 @@ class RebalanceResponse(BaseModel):
     actions: List[RebalanceAction]
 
 
+class RebalanceOptimizeRequest(BaseModel):
+    """Rebalance targets (percentage 0-100) at type, sector and ticker level"""
+    type_targets: Dict[str, float] = Field(default_factory=dict, description='e.g. {"ACAO": 60, "FII": 40}')
+    sector_targets: Dict[str, float] = Field(default_factory=dict, description='e.g. {"Financeiro": 20}')
+    ticker_targets: Dict[str, float] = Field(default_factory=dict, description='e.g. {"PETR4": 10}')
+    contribution: float = Field(0, ge=0, description="New money to invest")
+    mode: str = Field("full", description="full or contribution_only (buys only)")
+    lot_sizes: Dict[str, conint(ge=1)] = Field(default_factory=dict, description="Lot size per ticker")
+    default_lot_size: int = Field(1, ge=1, description="Lot size for other tickers (1 = fractional)")
+    min_trade_value: float = Field(0, ge=0, description="Skip trades smaller than this value")
+    drift_tolerance: float = Field(
+        0.5, ge=0, le=100, description="Drop trades while the final drift stays within this (percentage points)"
+    )
+    prices: Dict[str, confloat(gt=0)] = Field(default_factory=dict, description="Price overrides per ticker")
+
+
+class RebalanceOptimizeItem(BaseModel):
+    """Planned trade for one ticker"""
+    ticker: str
+    type: Optional[str]
+    sector: str
+    price: float
+    lot_size: int
+    current_quantity: float
+    current_value: float
+    current_percentage: float
+    target_percentage: float
+    target_value: float
+    trade_quantity: float # Positive = Buy, Negative = Sell
+    trade_value: float
+    final_percentage: float
+    action: str # "COMPRAR" or "VENDER" or "MANTER"
+
+
+class RebalanceOptimizeResponse(BaseModel):
+    """Ticker-level rebalancing plan"""
+    mode: str
+    total_value: float
+    contribution: float
+    total_buy: float
+    total_sell: float
+    cash_left: float
+    drift_before: float
+    drift_after: float
+    trades: int
+    items: List[RebalanceOptimizeItem]
+
+
 # Helper functions
 def get_or_create_asset(db: Session, ticker: str, name: Optional[str], asset_type: str) -> Asset:
     """Get existing asset or create a new one"""
@@ -137,12 +199,18 @@ def update_position(db: Session, user_id: int, asset_id: int) -> Optional[AssetP
     """
     Recalculate position based on all transactions.
     Uses FIFO method for average price calculation.
+    Quantities and prices are adjusted for splits and bonus shares.
     """
     # Get all transactions for this user and asset
     transactions = db.query(Transaction).filter(
         Transaction.user_id == user_id,
         Transaction.asset_id == asset_id
     ).order_by(Transaction.date.asc()).all()
+    if transactions:
+        ticker = db.query(Asset.ticker).filter(Asset.id == asset_id).scalar()
+        transactions = CorporateActionService.adjust_transactions(
+            db, transactions, [ticker] * len(transactions)
+        )
     
     if not transactions:
         # Remove position if no transactions
@@ -173,6 +241,9 @@ def update_position(db: Session, user_id: int, asset_id: int) -> Optional[AssetP
                 total_cost -= sold_cost
                 total_cost = max(0, total_cost)  # Ensure non-negative
     
+    # Adjusted quantities carry float noise (e.g. 100 x 0.1)
+    total_quantity = round(total_quantity, 8)
+    
     # Get or create position
     position = db.query(AssetPosition).filter(
         AssetPosition.user_id == user_id,
@@ -316,6 +387,9 @@ async def add_transaction(
     
     # Update position
     position = update_position(db, current_user.id, asset.id)
+    portfolio_events.on_transactions_changed(
+        db, current_user.id, since=transaction.date, asset_ids=[asset.id]
+    )
     
     logger.info(
         f"User {current_user.id} added transaction: "
@@ -384,6 +458,7 @@ async def upload_csv(
         transactions_failed = 0
         errors = []
         affected_assets = set()
+        earliest_date = None
         
         for row_num, row in enumerate(reader, start=2):  # Start at 2 (header is 1)
             try:
@@ -442,6 +517,7 @@ async def upload_csv(
                 db.add(transaction)
                 transactions_created += 1
                 affected_assets.add(asset.id)
+                earliest_date = data if earliest_date is None else min(earliest_date, data)
                 
             except Exception as e:
                 transactions_failed += 1
@@ -453,6 +529,9 @@ async def upload_csv(
         # Update positions for all affected assets
         for asset_id in affected_assets:
             update_position(db, current_user.id, asset_id)
+        portfolio_events.on_transactions_changed(
+            db, current_user.id, since=earliest_date, asset_ids=affected_assets
+        )
         
         logger.info(
             f"User {current_user.id} imported CSV: "
@@ -507,15 +586,19 @@ async def analyze_note(
 
 @router.get("/transactions", response_model=List[TransactionResponse])
 async def list_transactions(
+    response: Response,
     ticker: Optional[str] = None,
     limit: int = 50,
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
-    List user transactions.
+    List user transactions, newest first.
     
-    Optionally filter by ticker and limit results.
+    Optionally filter by ticker. Results are paginated by keyset: when
+    there are more rows, the X-Next-Cursor header holds the cursor to pass
+    as `cursor` for the next page.
     """
     query = db.query(Transaction).filter(Transaction.user_id == current_user.id)
     
@@ -524,7 +607,9 @@ async def list_transactions(
         if asset:
             query = query.filter(Transaction.asset_id == asset.id)
     
-    transactions = query.order_by(Transaction.date.desc()).limit(limit).all()
+    transactions, next_cursor = paginate(query, Transaction.date, Transaction.id, limit, cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     
     result = []
     for tx in transactions:
@@ -565,41 +650,50 @@ async def delete_transaction(
         raise HTTPException(status_code=404, detail="Transaction not found")
     
     asset_id = transaction.asset_id
+    transaction_date = transaction.date
     
     db.delete(transaction)
     db.commit()
     
     # Recalculate position
     update_position(db, current_user.id, asset_id)
+    portfolio_events.on_transactions_changed(
+        db, current_user.id, since=transaction_date, asset_ids=[asset_id]
+    )
     
     return {"message": "Transaction deleted successfully"}
 
 
 @router.get("/positions", response_model=List[PositionSummary])
 async def get_positions(
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """
     Get all current positions for the user.
+
+    Served through the versioned response cache (ETag / If-None-Match).
     """
-    positions = db.query(AssetPosition).filter(
-        AssetPosition.user_id == current_user.id
-    ).all()
-    
-    result = []
-    for pos in positions:
-        asset = db.query(Asset).filter(Asset.id == pos.asset_id).first()
-        if asset:
-            result.append(PositionSummary(
+    def build():
+        rows = (
+            db.query(AssetPosition, Asset)
+            .join(Asset, Asset.id == AssetPosition.asset_id)
+            .filter(AssetPosition.user_id == current_user.id)
+            .all()
+        )
+        return [
+            PositionSummary(
                 ticker=asset.ticker,
                 name=asset.name,
                 quantity=pos.quantity,
                 average_price=pos.average_price,
                 total_invested=pos.quantity * pos.average_price,
-            ))
-    
-    return result
+            )
+            for pos, asset in rows
+        ]
+
+    return ResponseCache.respond(request, current_user, "manage.positions", build)
 
 
 @router.get("/csv-template")
@@ -644,6 +738,7 @@ class PriceUpdateResponse(BaseModel):
     failed_count: int
     updated_assets: List[dict]
     failed_assets: List[dict]
+    anomalies: List[dict] = []
 
 
 @router.get("/sync_prices", response_model=PriceUpdateResponse)
@@ -695,6 +790,7 @@ async def sync_portfolio_prices(
     
     updated_assets = []
     failed_assets = []
+    anomalies = []
     
     # Get unique tickers (remove duplicates)
     unique_tickers = list(set(tickers))
@@ -706,6 +802,7 @@ async def sync_portfolio_prices(
         
         if result["success"]:
             quotes_data = {q["ticker"]: q for q in result["data"]}
+            RollingStatsService.warm_up(db, unique_tickers)
             
             for ticker in unique_tickers:
                 if ticker in quotes_data:
@@ -713,6 +810,12 @@ async def sync_portfolio_prices(
                     price = data.get("price")
                     
                     if price is not None:
+                        # O(1) z-scores against the ticker's rolling statistics
+                        anomalies.extend(
+                            asdict(alert) for alert in
+                            RollingStatsService.quote_anomalies(ticker, price, data.get("volume"))
+                        )
+                        
                         # Update all positions for this ticker
                         if ticker in ticker_to_positions:
                             for position in ticker_to_positions[ticker]:
@@ -756,6 +859,7 @@ async def sync_portfolio_prices(
     
     # Commit all changes
     db.commit()
+    portfolio_events.on_prices_changed(db, [current_user.id])
     
     # Build response message
     success = len(failed_assets) == 0
@@ -775,6 +879,7 @@ async def sync_portfolio_prices(
         failed_count=len(failed_assets),
         updated_assets=updated_assets,
         failed_assets=failed_assets,
+        anomalies=anomalies,
     )
 
 
@@ -788,19 +893,18 @@ async def calculate_rebalancing(
     Calculate rebalancing plan based on target percentages.
     """
     # 1. Get current portfolio state
-    positions = (
-        db.query(AssetPosition)
-        .join(Asset)
+    rows = (
+        db.query(AssetPosition, Asset.type)
+        .join(Asset, Asset.id == AssetPosition.asset_id)
         .filter(AssetPosition.user_id == current_user.id)
         .all()
     )
     
-    total_value = sum(p.total_value for p in positions)
+    total_value = sum(p.total_value for p, _ in rows)
     current_allocation = {}
     
-    for p in positions:
-        asset = db.query(Asset).filter(Asset.id == p.asset_id).first()
-        atype = asset.type.value
+    for p, asset_type in rows:
+        atype = asset_type.value
         current_allocation[atype] = current_allocation.get(atype, 0.0) + p.total_value
         
     # 2. Calculate actions
@@ -840,6 +944,48 @@ async def calculate_rebalancing(
     )
 
 
+@router.post("/rebalance/optimize", response_model=RebalanceOptimizeResponse)
+async def optimize_rebalancing(
+    request: RebalanceOptimizeRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Calculate a ticker-level rebalancing plan in whole lots.
+    
+    Targets may be set by asset type, sector and ticker (ticker > sector > type).
+    In contribution_only mode the plan only buys, using the new money.
+    Trades are dropped, smallest first, while the final drift stays within
+    drift_tolerance.
+    """
+    holdings = RebalanceService.load_holdings(
+        db,
+        current_user.id,
+        extra_tickers=list(request.ticker_targets),
+        prices=request.prices,
+    )
+    if not holdings:
+        raise HTTPException(status_code=400, detail="Nenhum ativo na carteira para rebalancear")
+    
+    try:
+        plan = RebalanceService.optimize(
+            holdings,
+            type_targets=request.type_targets,
+            sector_targets=request.sector_targets,
+            ticker_targets=request.ticker_targets,
+            contribution=request.contribution,
+            mode=request.mode,
+            lot_sizes=request.lot_sizes,
+            default_lot_size=request.default_lot_size,
+            min_trade_value=request.min_trade_value,
+            drift_tolerance=request.drift_tolerance,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return plan
+
+
 @router.get("/prices-status")
 async def get_prices_status(
     current_user: User = Depends(get_current_user),
@@ -963,6 +1109,7 @@ async def add_proceed(
     db.add(proceed)
     db.commit()
     db.refresh(proceed)
+    portfolio_events.on_proceeds_changed(db, current_user.id, since=proceed.date)
     
     logger.info(f"User {current_user.id} added proceed: {asset.ticker} - {proceed_type.value} - R${total_value:.2f}")
     
@@ -984,16 +1131,22 @@ async def add_proceed(
 
 @router.get("/proceeds")
 async def list_proceeds(
+    response: Response,
     ticker: Optional[str] = None,
     proceed_type: Optional[str] = None,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
     limit: int = 100,
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    List user's proceeds with optional filters
+    List user's proceeds with optional filters, newest first
+    
+    Paginated by keyset: when there are more rows, the X-Next-Cursor
+    header holds the cursor to pass as `cursor` for the next page. Totals
+    and counts cover every proceed matching the filters (all pages).
     """
     query = db.query(Proceed).filter(Proceed.user_id == current_user.id)
     
@@ -1015,21 +1168,27 @@ async def list_proceeds(
     if end_date:
         query = query.filter(Proceed.date <= end_date)
     
-    proceeds = query.order_by(Proceed.date.desc()).limit(limit).all()
+    # Totals by type in one GROUP BY over the filtered set
+    totals_by_type = {
+        proceed_type_value.value: (total or 0.0, count)
+        for proceed_type_value, total, count in query.with_entities(
+            Proceed.type, func.sum(Proceed.total_value), func.count(Proceed.id)
+        ).group_by(Proceed.type)
+    }
     
-    # Calculate totals
-    total_value = sum(p.total_value for p in proceeds)
+    proceeds, next_cursor = paginate(query, Proceed.date, Proceed.id, limit, cursor)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
     
-    # Get totals by type
-    totals_by_type = {}
-    for p in proceeds:
-        type_name = p.type.value
-        totals_by_type[type_name] = totals_by_type.get(type_name, 0) + p.total_value
+    assets = {
+        asset.id: asset
+        for asset in db.query(Asset).filter(Asset.id.in_({p.asset_id for p in proceeds}))
+    }
     
     # Format response
     proceeds_list = []
     for p in proceeds:
-        asset = db.query(Asset).filter(Asset.id == p.asset_id).first()
+        asset = assets.get(p.asset_id)
         proceeds_list.append({
             "id": p.id,
             "ticker": asset.ticker if asset else "N/A",
@@ -1044,9 +1203,9 @@ async def list_proceeds(
     
     return {
         "proceeds": proceeds_list,
-        "total_count": len(proceeds_list),
-        "total_value": round(total_value, 2),
-        "totals_by_type": {k: round(v, 2) for k, v in totals_by_type.items()},
+        "total_count": sum(count for _, count in totals_by_type.values()),
+        "total_value": round(sum(total for total, _ in totals_by_type.values()), 2),
+        "totals_by_type": {k: round(total, 2) for k, (total, _) in totals_by_type.items()},
     }
 
 
@@ -1067,8 +1226,10 @@ async def delete_proceed(
     if not proceed:
         raise HTTPException(status_code=404, detail="Proceed not found")
     
+    proceed_date = proceed.date
     db.delete(proceed)
     db.commit()
+    portfolio_events.on_proceeds_changed(db, current_user.id, since=proceed_date)
     
     return {"success": True, "message": "Provento excluído com sucesso"}
 
@@ -1081,42 +1242,21 @@ async def get_proceeds_summary(
 ):
     """
     Get a summary of proceeds by month and asset
-    """
-    query = db.query(Proceed).filter(Proceed.user_id == current_user.id)
     
-    if year:
-        from sqlalchemy import extract
-        query = query.filter(extract('year', Proceed.date) == year)
-    
-    proceeds = query.order_by(Proceed.date).all()
-    
-    # Group by month
-    months = {}
-    for p in proceeds:
-        month_key = p.date.strftime("%Y-%m")
-        if month_key not in months:
-            months[month_key] = {"total": 0, "count": 0}
-        months[month_key]["total"] += p.total_value
-        months[month_key]["count"] += 1
-    
-    # Group by asset
-    assets = {}
-    for p in proceeds:
-        asset = db.query(Asset).filter(Asset.id == p.asset_id).first()
-        ticker = asset.ticker if asset else "N/A"
-        if ticker not in assets:
-            assets[ticker] = {"total": 0, "count": 0}
-        assets[ticker]["total"] += p.total_value
-        assets[ticker]["count"] += 1
+    Both groupings are computed by the database (monthly totals come from
+    the rollup table for users with large histories).
+    """
+    start = date(year, 1, 1) if year else None
+    end = date(year, 12, 31) if year else None
     
-    # Sort by total
-    sorted_assets = sorted(assets.items(), key=lambda x: x[1]["total"], reverse=True)
+    by_month = ProceedsService.monthly_totals(db, current_user.id, start, end)
+    by_asset = ProceedsService.asset_totals(db, current_user.id, start, end)
     
     return {
-        "by_month": [{"month": k, "total": round(v["total"], 2), "count": v["count"]} for k, v in sorted(months.items())],
-        "by_asset": [{"ticker": k, "total": round(v["total"], 2), "count": v["count"]} for k, v in sorted_assets],
-        "total": round(sum(p.total_value for p in proceeds), 2),
-        "total_count": len(proceeds),
+        "by_month": by_month,
+        "by_asset": [{"ticker": a["ticker"], "total": a["total"], "count": a["count"]} for a in by_asset],
+        "total": round(sum(m["total"] for m in by_month), 2),
+        "total_count": sum(m["count"] for m in by_month),
     }
 
 
@@ -1126,59 +1266,94 @@ async def get_proceeds_summary(
 
 from fastapi.responses import StreamingResponse
 
+EXPORT_BATCH_SIZE = 1000  # Rows fetched per round trip (yield_per)
+EXPORT_CHUNK_ROWS = 500  # Rows per streamed CSV chunk
+
+
+def _stream_query(session_factory: sessionmaker, build_query: Callable[[Session], Any]) -> Iterator[Any]:
+    """
+    Iterate an export query on its own session.
+
+    The request session is closed before a streamed body is sent, so the
+    rows are fetched with a session owned (and closed) by the generator.
+    """
+    session = session_factory()
+    try:
+        yield from build_query(session).yield_per(EXPORT_BATCH_SIZE)
+    finally:
+        session.close()
+
+
+def _stream_csv(header: List[str], rows) -> Iterator[str]:
+    """
+    Yield CSV text chunk by chunk.
+
+    The header goes out immediately; rows are buffered EXPORT_CHUNK_ROWS
+    at a time, so memory stays constant whatever the number of rows.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate(0)
+
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
 
 @router.get("/export/positions")
 async def export_positions_csv(
-    db: Session = Depends(get_db),
+    session_factory: sessionmaker = Depends(get_session_factory),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Export all positions to CSV format
+    Export all positions to CSV format (streamed)
     """
-    positions = (
-        db.query(AssetPosition)
-        .filter(AssetPosition.user_id == current_user.id)
-        .filter(AssetPosition.quantity > 0)
-        .all()
-    )
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
+    user_id = current_user.id
+    
+    def build_query(session: Session):
+        return (
+            session.query(AssetPosition, Asset)
+            .join(Asset, Asset.id == AssetPosition.asset_id)
+            .filter(AssetPosition.user_id == user_id)
+            .filter(AssetPosition.quantity > 0)
+        )
     
-    # Header
-    writer.writerow([
+    def rows():
+        for pos, asset in _stream_query(session_factory, build_query):
+            current_price = pos.current_price or pos.average_price
+            total_value = pos.quantity * current_price if current_price else 0
+            invested = pos.quantity * pos.average_price if pos.average_price else 0
+            profit_loss = total_value - invested
+            profit_pct = (profit_loss / invested * 100) if invested else 0
+            
+            yield [
+                asset.ticker,
+                asset.name or asset.ticker,
+                asset.type.value if asset.type else "N/A",
+                pos.quantity,
+                f"{pos.average_price:.2f}" if pos.average_price else "0.00",
+                f"{current_price:.2f}" if current_price else "0.00",
+                f"{total_value:.2f}",
+                f"{profit_loss:.2f}",
+                f"{profit_pct:.2f}%"
+            ]
+    
+    header = [
         "Ticker", "Nome", "Tipo", "Quantidade", "Preço Médio", 
         "Preço Atual", "Valor Total", "Lucro/Prejuízo", "Rentabilidade %"
-    ])
-    
-    for pos in positions:
-        asset = db.query(Asset).filter(Asset.id == pos.asset_id).first()
-        ticker = asset.ticker if asset else pos.ticker or "N/A"
-        name = asset.name if asset else pos.asset_name or ticker
-        asset_type = asset.type.value if asset and asset.type else pos.asset_type or "N/A"
-        
-        current_price = pos.current_price or pos.average_price
-        total_value = pos.quantity * current_price if current_price else 0
-        invested = pos.quantity * pos.average_price if pos.average_price else 0
-        profit_loss = total_value - invested
-        profit_pct = (profit_loss / invested * 100) if invested else 0
-        
-        writer.writerow([
-            ticker,
-            name,
-            asset_type,
-            pos.quantity,
-            f"{pos.average_price:.2f}" if pos.average_price else "0.00",
-            f"{current_price:.2f}" if current_price else "0.00",
-            f"{total_value:.2f}",
-            f"{profit_loss:.2f}",
-            f"{profit_pct:.2f}%"
-        ])
-    
-    output.seek(0)
+    ]
     
     return StreamingResponse(
-        iter([output.getvalue()]),
+        _stream_csv(header, rows()),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename=posicoes_{date.today().isoformat()}.csv"}
     )
@@ -1188,50 +1363,47 @@ async def export_positions_csv(
 async def export_transactions_csv(
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
-    db: Session = Depends(get_db),
+    session_factory: sessionmaker = Depends(get_session_factory),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Export all transactions to CSV format
+    Export all transactions to CSV format (streamed)
     """
-    query = db.query(Transaction).filter(Transaction.user_id == current_user.id)
-    
-    if start_date:
-        query = query.filter(Transaction.date >= start_date)
-    if end_date:
-        query = query.filter(Transaction.date <= end_date)
-    
-    transactions = query.order_by(Transaction.date.desc()).all()
+    user_id = current_user.id
     
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Header
-    writer.writerow([
+    def build_query(session: Session):
+        query = (
+            session.query(Transaction, Asset.ticker)
+            .join(Asset, Asset.id == Transaction.asset_id)
+            .filter(Transaction.user_id == user_id)
+        )
+        if start_date:
+            query = query.filter(Transaction.date >= start_date)
+        if end_date:
+            query = query.filter(Transaction.date <= end_date)
+        return query.order_by(Transaction.date.desc())
+    
+    def rows():
+        for tx, ticker in _stream_query(session_factory, build_query):
+            yield [
+                tx.date.strftime("%d/%m/%Y") if tx.date else "",
+                ticker,
+                tx.type.value if tx.type else "N/A",
+                tx.quantity,
+                f"{tx.price:.2f}" if tx.price else "0.00",
+                f"{tx.total_amount:.2f}" if tx.total_amount else "0.00",
+                f"{tx.fees:.2f}" if tx.fees else "0.00",
+                tx.broker or "",
+                tx.notes or ""
+            ]
+    
+    header = [
         "Data", "Ticker", "Tipo", "Quantidade", "Preço Unitário", 
         "Valor Total", "Taxas", "Corretora", "Notas"
-    ])
-    
-    for tx in transactions:
-        asset = db.query(Asset).filter(Asset.id == tx.asset_id).first()
-        ticker = asset.ticker if asset else tx.ticker or "N/A"
-        
-        writer.writerow([
-            tx.date.strftime("%d/%m/%Y") if tx.date else "",
-            ticker,
-            tx.type.value if tx.type else tx.transaction_type or "N/A",
-            tx.quantity,
-            f"{tx.price:.2f}" if tx.price else "0.00",
-            f"{tx.total_amount:.2f}" if tx.total_amount else "0.00",
-            f"{tx.fees:.2f}" if tx.fees else "0.00",
-            tx.broker or "",
-            tx.notes or ""
-        ])
-    
-    output.seek(0)
+    ]
     
     return StreamingResponse(
-        iter([output.getvalue()]),
+        _stream_csv(header, rows()),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename=transacoes_{date.today().isoformat()}.csv"}
     )
@@ -1240,47 +1412,234 @@ async def export_transactions_csv(
 @router.get("/export/proceeds")
 async def export_proceeds_csv(
     year: Optional[int] = None,
+    session_factory: sessionmaker = Depends(get_session_factory),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Export all proceeds to CSV format (streamed)
+    """
+    from sqlalchemy import extract
+    user_id = current_user.id
+    
+    def build_query(session: Session):
+        query = (
+            session.query(Proceed, Asset.ticker, Asset.name)
+            .join(Asset, Asset.id == Proceed.asset_id)
+            .filter(Proceed.user_id == user_id)
+        )
+        if year:
+            query = query.filter(extract('year', Proceed.date) == year)
+        return query.order_by(Proceed.date.desc())
+    
+    def rows():
+        for p, ticker, name in _stream_query(session_factory, build_query):
+            yield [
+                p.date.strftime("%d/%m/%Y") if p.date else "",
+                ticker,
+                name,
+                p.type.value if p.type else "N/A",
+                f"{p.value_per_share:.4f}" if p.value_per_share else "0.00",
+                p.quantity,
+                f"{p.total_value:.2f}" if p.total_value else "0.00",
+                p.description or ""
+            ]
+    
+    header = [
+        "Data", "Ticker", "Nome", "Tipo", "Valor por Ação", 
+        "Quantidade", "Valor Total", "Descrição"
+    ]
+    
+    return StreamingResponse(
+        _stream_csv(header, rows()),
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=proventos_{date.today().isoformat()}.csv"}
+    )
+
+
+@router.get("/export/archive")
+async def export_archive(
+    format: str = "parquet",
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    Export all proceeds to CSV format
+    Export the full ledger as a zip of columnar files
+    
+    Contains transactions, proceeds, positions and fixed_income as
+    Parquet (format=parquet) or Arrow IPC (format=arrow) files, plus a
+    manifest.json. Loads directly into pandas/DuckDB.
     """
-    query = db.query(Proceed).filter(Proceed.user_id == current_user.id)
+    try:
+        content = ArchiveService.export_archive(db, current_user.id, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    
+    return Response(
+        content=content,
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=carteira_{date.today().isoformat()}_{format}.zip"}
+    )
+
+
+@router.post("/import/archive")
+async def import_archive(
+    file: UploadFile = File(...),
+    replace: bool = Form(False),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Import a ledger archive produced by /export/archive
     
-    if year:
-        from sqlalchemy import extract
-        query = query.filter(extract('year', Proceed.date) == year)
+    With replace=true the current transactions, proceeds and fixed income
+    are deleted first; otherwise rows are appended. Positions are
+    recalculated from the imported transactions.
+    """
+    if not file.filename.endswith('.zip'):
+        raise HTTPException(status_code=400, detail="Arquivo deve ser .zip")
     
-    proceeds = query.order_by(Proceed.date.desc()).all()
+    content = await file.read()
+    try:
+        result = ArchiveService.import_archive(db, current_user.id, content, replace=replace)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    
+    for asset_id in result["asset_ids"]:
+        position = update_position(db, current_user.id, asset_id)
+        if position and position.asset.ticker in result["prices"]:
+            position.current_price = result["prices"][position.asset.ticker]
+    db.commit()
     
-    output = io.StringIO()
-    writer = csv.writer(output)
+    portfolio_events.on_transactions_changed(
+        db, current_user.id,
+        since=None if replace else result["since"],
+        asset_ids=None if replace else result["asset_ids"],
+    )
+    portfolio_events.on_proceeds_changed(
+        db, current_user.id, since=None if replace else result["proceeds_since"]
+    )
     
-    # Header
-    writer.writerow([
-        "Data", "Ticker", "Nome", "Tipo", "Valor por Ação", 
-        "Quantidade", "Valor Total", "Descrição"
-    ])
+    logger.info(
+        f"User {current_user.id} imported archive: "
+        f"{result['transactions']} transactions, {result['proceeds']} proceeds"
+    )
     
-    for p in proceeds:
-        asset = db.query(Asset).filter(Asset.id == p.asset_id).first()
-        
-        writer.writerow([
-            p.date.strftime("%d/%m/%Y") if p.date else "",
-            asset.ticker if asset else "N/A",
-            asset.name if asset else "N/A",
-            p.type.value if p.type else "N/A",
-            f"{p.value_per_share:.4f}" if p.value_per_share else "0.00",
-            p.quantity,
-            f"{p.total_value:.2f}" if p.total_value else "0.00",
-            p.description or ""
-        ])
-    
-    output.seek(0)
+    return {
+        "message": "Arquivo importado com sucesso",
+        "transactions": result["transactions"],
+        "proceeds": result["proceeds"],
+        "fixed_income": result["fixed_income"],
+    }
+
+
+# ============== CORPORATE ACTIONS ==============
+
+class AddCorporateActionRequest(BaseModel):
+    """Request to record a split, reverse split or bonus"""
+    ticker: str = Field(..., min_length=3, max_length=20, description="Stock ticker (e.g., PETR4)")
+    ex_date: date = Field(..., description="First date traded in post-action shares")
+    action_type: str = Field(..., description="SPLIT, REVERSE_SPLIT or BONUS")
+    factor: float = Field(..., gt=0, description="New shares per old share (e.g. 2 for 1:2, 0.1 for 10:1, 1.1 for 10% bonus)")
+    description: Optional[str] = Field(None, description="Additional notes")
+
+
+class CorporateActionResponse(BaseModel):
+    """Corporate action"""
+    id: int
+    ticker: str
+    ex_date: str
+    action_type: str
+    factor: float
+    description: Optional[str] = None
+
+
+class AddCorporateActionResponse(CorporateActionResponse):
+    """Corporate action and the number of holders whose positions were rebuilt"""
+    users_updated: int
+
+
+def _corporate_action_response(action: CorporateAction) -> Dict[str, Any]:
+    return {
+        "id": action.id,
+        "ticker": action.ticker,
+        "ex_date": action.ex_date.isoformat(),
+        "action_type": action.type.value,
+        "factor": action.factor,
+        "description": action.description,
+    }
+
+
+@router.post("/corporate-actions", response_model=AddCorporateActionResponse)
+async def add_corporate_action(
+    request: AddCorporateActionRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_superuser)
+):
+    """
+    Record a corporate action and rebuild every holder's position,
+    history and tax ledger from the ex-date on.
     
-    return StreamingResponse(
-        iter([output.getvalue()]),
-        media_type="text/csv",
-        headers={"Content-Disposition": f"attachment; filename=proventos_{date.today().isoformat()}.csv"}
+    Administrators only: actions apply to every user holding the ticker.
+    """
+    try:
+        action_type = CorporateActionType[request.action_type.upper()]
+    except KeyError:
+        valid_types = [t.name for t in CorporateActionType]
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid action type. Valid types: {valid_types}"
+        )
+    
+    try:
+        action = CorporateActionService.add_action(
+            db, request.ticker, request.ex_date, action_type, request.factor, request.description
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    asset = db.query(Asset).filter(Asset.ticker == action.ticker).first()
+    user_ids = []
+    if asset:
+        user_ids = [
+            user_id for (user_id,) in db.query(Transaction.user_id)
+            .filter(Transaction.asset_id == asset.id)
+            .distinct()
+        ]
+        for user_id in user_ids:
+            update_position(db, user_id, asset.id)
+        db.commit()
+        for user_id in user_ids:
+            portfolio_events.on_transactions_changed(
+                db, user_id, since=action.ex_date, asset_ids=[asset.id]
+            )
+    
+    # Adjusted closes changed: drop the statistics and matrices built on them
+    RollingStatsService.reset(action.ticker)
+    RiskService.invalidate()
+    OptimizerService.invalidate()
+    
+    logger.info(
+        f"User {current_user.id} added {action_type.value} x{action.factor} for {action.ticker}: "
+        f"{len(user_ids)} holders updated"
     )
+    
+    return {**_corporate_action_response(action), "users_updated": len(user_ids)}
+
+
+@router.get("/corporate-actions/{ticker}", response_model=List[CorporateActionResponse])
+async def list_corporate_actions(
+    ticker: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    List the corporate actions of a ticker, oldest first
+    """
+    actions = db.query(CorporateAction).filter(
+        CorporateAction.ticker == ticker.upper()
+    ).order_by(CorporateAction.ex_date.asc()).all()
+    return [_corporate_action_response(action) for action in actions]
@@ -0,0 +1,78 @@
+"""
+Tax (IR) routes
+
+Monthly income tax on stock exchange sales, read from the realized gains
+ledger.
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List, Dict, Any, Optional
+from app.core.deps import get_current_user, get_db
+from app.models.user import User
+from app.services.tax_service import TaxService
+
+router = APIRouter(prefix="/tax", tags=["Tax"])
+
+
+def _validate_period(year: int, month: Optional[int] = None) -> None:
+    if year < 1900 or year > 2100:
+        raise HTTPException(status_code=400, detail="Ano inválido")
+    if month is not None and not 1 <= month <= 12:
+        raise HTTPException(status_code=400, detail="Mês inválido")
+
+
+@router.get("/darf/{year}/{month}")
+async def get_monthly_darf(
+    year: int,
+    month: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> Dict[str, Any]:
+    """
+    Get the DARF summary of a month.
+    
+    Per bucket (ACOES, OUTROS, FII, DAY_TRADE): sales, net result,
+    exemption, loss compensation, IRRF and tax due, plus the loss
+    carry-forward balances after the month.
+    """
+    _validate_period(year, month)
+    return TaxService.get_month(db, current_user.id, year, month)
+
+
+@router.get("/darf/{year}")
+async def get_yearly_darf(
+    year: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> Dict[str, Any]:
+    """
+    Get the monthly DARF summaries of a year
+    """
+    _validate_period(year)
+    return TaxService.get_year(db, current_user.id, year)
+
+
+@router.get("/gains")
+async def list_realized_gains(
+    year: int,
+    month: Optional[int] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> List[Dict[str, Any]]:
+    """
+    List realized gains (ledger entries) of a year or month
+    """
+    _validate_period(year, month)
+    return TaxService.list_gains(db, current_user.id, year, month)
+
+
+@router.post("/rebuild")
+async def rebuild_tax_ledger(
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+) -> Dict[str, Any]:
+    """
+    Rebuild the whole ledger from the transaction history
+    """
+    TaxService.on_transactions_changed(db, current_user.id)
+    return {"message": "Apuração de IR recalculada com sucesso"}
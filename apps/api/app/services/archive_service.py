@@ -0,0 +1,375 @@
+"""
+Archive Service
+
+Columnar export/import of a user's full ledger (transactions, proceeds,
+positions and fixed income) as a zip of Parquet or Arrow IPC files.
+
+Files carry typed columns (dates, floats, enums as strings) with the
+asset ticker denormalized, so they load straight into pandas/DuckDB and
+can be imported back into any account.
+"""
+import enum
+import io
+import json
+import zipfile
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Set
+from sqlalchemy.orm import Session
+from app.models.asset import Asset, AssetType
+from app.models.fixed_income import FixedIncomeInvestment, FixedIncomeType, IndexerType
+from app.models.position import AssetPosition
+from app.models.proceed import Proceed, ProceedType
+from app.models.transaction import Transaction, TransactionType
+from app.core.logging import logger
+
+
+def _require_pyarrow():
+    """Lazy import: pyarrow is only needed by the archive endpoints"""
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise RuntimeError("pyarrow não está instalado no servidor") from e
+    return pa
+
+
+def _naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Timestamps are stored as naive UTC"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class ArchiveService:
+    """Service for Parquet/Arrow ledger archives"""
+
+    FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+    BATCH_SIZE = 5000  # Rows per cursor batch / record batch
+    ARCHIVE_VERSION = 1
+
+    @staticmethod
+    def _schemas(pa) -> Dict[str, Any]:
+        """Arrow schema of each archived table"""
+        return {
+            "transactions": pa.schema([
+                ("ticker", pa.string()),
+                ("asset_name", pa.string()),
+                ("asset_type", pa.string()),
+                ("type", pa.string()),
+                ("date", pa.timestamp("us")),
+                ("quantity", pa.float64()),
+                ("price", pa.float64()),
+                ("total_amount", pa.float64()),
+                ("fees", pa.float64()),
+                ("broker", pa.string()),
+                ("notes", pa.string()),
+            ]),
+            "proceeds": pa.schema([
+                ("ticker", pa.string()),
+                ("asset_name", pa.string()),
+                ("asset_type", pa.string()),
+                ("type", pa.string()),
+                ("date", pa.date32()),
+                ("value_per_share", pa.float64()),
+                ("quantity", pa.float64()),
+                ("total_value", pa.float64()),
+                ("description", pa.string()),
+            ]),
+            "positions": pa.schema([
+                ("ticker", pa.string()),
+                ("asset_type", pa.string()),
+                ("quantity", pa.float64()),
+                ("average_price", pa.float64()),
+                ("current_price", pa.float64()),
+            ]),
+            "fixed_income": pa.schema([
+                ("name", pa.string()),
+                ("type", pa.string()),
+                ("issuer", pa.string()),
+                ("invested_amount", pa.float64()),
+                ("purchase_date", pa.date32()),
+                ("maturity_date", pa.date32()),
+                ("indexer", pa.string()),
+                ("rate", pa.float64()),
+                ("is_percentage_of_indexer", pa.int32()),
+                ("current_value", pa.float64()),
+                ("gross_value", pa.float64()),
+                ("notes", pa.string()),
+            ]),
+        }
+
+    @staticmethod
+    def _queries(db: Session, user_id: int) -> Dict[str, Any]:
+        """Column queries matching the schemas, ordered for stable files"""
+        return {
+            "transactions": (
+                db.query(
+                    Asset.ticker, Asset.name, Asset.type, Transaction.type, Transaction.date,
+                    Transaction.quantity, Transaction.price, Transaction.total_amount,
+                    Transaction.fees, Transaction.broker, Transaction.notes,
+                )
+                .join(Asset, Asset.id == Transaction.asset_id)
+                .filter(Transaction.user_id == user_id)
+                .order_by(Transaction.date.asc(), Transaction.id.asc())
+            ),
+            "proceeds": (
+                db.query(
+                    Asset.ticker, Asset.name, Asset.type, Proceed.type, Proceed.date,
+                    Proceed.value_per_share, Proceed.quantity, Proceed.total_value,
+                    Proceed.description,
+                )
+                .join(Asset, Asset.id == Proceed.asset_id)
+                .filter(Proceed.user_id == user_id)
+                .order_by(Proceed.date.asc(), Proceed.id.asc())
+            ),
+            "positions": (
+                db.query(
+                    Asset.ticker, Asset.type, AssetPosition.quantity,
+                    AssetPosition.average_price, AssetPosition.current_price,
+                )
+                .join(Asset, Asset.id == AssetPosition.asset_id)
+                .filter(AssetPosition.user_id == user_id)
+                .order_by(Asset.ticker.asc())
+            ),
+            "fixed_income": (
+                db.query(
+                    FixedIncomeInvestment.name, FixedIncomeInvestment.type,
+                    FixedIncomeInvestment.issuer, FixedIncomeInvestment.invested_amount,
+                    FixedIncomeInvestment.purchase_date, FixedIncomeInvestment.maturity_date,
+                    FixedIncomeInvestment.indexer, FixedIncomeInvestment.rate,
+                    FixedIncomeInvestment.is_percentage_of_indexer,
+                    FixedIncomeInvestment.current_value, FixedIncomeInvestment.gross_value,
+                    FixedIncomeInvestment.notes,
+                )
+                .filter(FixedIncomeInvestment.user_id == user_id)
+                .order_by(FixedIncomeInvestment.purchase_date.asc(), FixedIncomeInvestment.id.asc())
+            ),
+        }
+
+    @staticmethod
+    def _to_cell(value: Any) -> Any:
+        """DB value to an Arrow-compatible Python value"""
+        if isinstance(value, enum.Enum):
+            return value.value
+        if isinstance(value, datetime):
+            return _naive_utc(value)
+        return value
+
+    @staticmethod
+    def export_archive(db: Session, user_id: int, fmt: str = "parquet") -> bytes:
+        """
+        Build the zip archive of a user's ledger.
+
+        Each table is written record batch by record batch straight from
+        the cursor (yield_per), so rows are never materialized as ORM objects.
+
+        Raises:
+            ValueError: Unknown format
+            RuntimeError: pyarrow not installed
+        """
+        if fmt not in ArchiveService.FORMATS:
+            raise ValueError(f"Formato inválido. Use: {', '.join(ArchiveService.FORMATS)}")
+
+        pa = _require_pyarrow()
+        schemas = ArchiveService._schemas(pa)
+        queries = ArchiveService._queries(db, user_id)
+
+        counts = {}
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w", compression=zipfile.ZIP_STORED) as zf:
+            for table, schema in schemas.items():
+                sink = io.BytesIO()
+                if fmt == "parquet":
+                    writer = pa.parquet.ParquetWriter(sink, schema, compression="zstd")
+                    write = writer.write_batch
+                else:
+                    writer = pa.ipc.new_file(sink, schema)
+                    write = writer.write_batch
+
+                rows = 0
+                batch: List[tuple] = []
+                for row in queries[table].yield_per(ArchiveService.BATCH_SIZE):
+                    batch.append(row)
+                    if len(batch) == ArchiveService.BATCH_SIZE:
+                        write(ArchiveService._record_batch(pa, schema, batch))
+                        rows += len(batch)
+                        batch = []
+                if batch or rows == 0:
+                    write(ArchiveService._record_batch(pa, schema, batch))
+                    rows += len(batch)
+                writer.close()
+
+                counts[table] = rows
+                zf.writestr(f"{table}{ArchiveService.FORMATS[fmt]}", sink.getvalue())
+
+            zf.writestr("manifest.json", json.dumps({
+                "version": ArchiveService.ARCHIVE_VERSION,
+                "format": fmt,
+                "exported_at": datetime.utcnow().isoformat(),
+                "tables": counts,
+            }, indent=2))
+
+        logger.info(f"User {user_id} exported {fmt} archive", extra={"user_id": user_id, **counts})
+        return archive.getvalue()
+
+    @staticmethod
+    def _record_batch(pa, schema, rows: List[tuple]):
+        """Build a typed record batch from row tuples (column-wise)"""
+        columns = list(zip(*rows)) if rows else [[] for _ in schema]
+        arrays = [
+            pa.array([ArchiveService._to_cell(v) for v in column], type=field.type)
+            for column, field in zip(columns, schema)
+        ]
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    @staticmethod
+    def read_archive(data: bytes) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Read the tables of an archive (Parquet or Arrow IPC files).
+
+        Raises:
+            ValueError: Not a valid archive
+        """
+        pa = _require_pyarrow()
+        schemas = ArchiveService._schemas(pa)
+
+        try:
+            zf = zipfile.ZipFile(io.BytesIO(data))
+        except zipfile.BadZipFile as e:
+            raise ValueError("Arquivo não é um arquivo .zip válido") from e
+
+        tables = {}
+        with zf:
+            names = set(zf.namelist())
+            for table, schema in schemas.items():
+                if f"{table}.parquet" in names:
+                    arrow_table = pa.parquet.read_table(io.BytesIO(zf.read(f"{table}.parquet")))
+                elif f"{table}.arrow" in names:
+                    arrow_table = pa.ipc.open_file(pa.BufferReader(zf.read(f"{table}.arrow"))).read_all()
+                else:
+                    tables[table] = []
+                    continue
+
+                missing = set(schema.names) - set(arrow_table.column_names)
+                if missing:
+                    raise ValueError(f"Colunas ausentes em {table}: {', '.join(sorted(missing))}")
+                tables[table] = arrow_table.select(schema.names).to_pylist()
+
+        if not any(tables.values()) and "manifest.json" not in names:
+            raise ValueError("Arquivo não contém tabelas reconhecidas")
+        return tables
+
+    @staticmethod
+    def import_archive(db: Session, user_id: int, data: bytes, replace: bool = False) -> Dict[str, Any]:
+        """
+        Bulk insert an archive into a user's ledger.
+
+        Positions are not inserted (they derive from transactions); their
+        archived current prices are returned for the caller to re-apply.
+
+        Args:
+            replace: Delete the user's transactions, proceeds and fixed
+                income before importing
+
+        Returns:
+            Dict with inserted counts, affected asset ids, earliest
+            transaction and proceed dates and archived prices by ticker
+        """
+        tables = ArchiveService.read_archive(data)
+
+        if replace:
+            from app.models.tax import RealizedGain, MonthlyTaxSummary
+            for model in (RealizedGain, MonthlyTaxSummary, Transaction, Proceed,
+                          AssetPosition, FixedIncomeInvestment):
+                db.query(model).filter(model.user_id == user_id).delete(synchronize_session=False)
+
+        assets = ArchiveService._resolve_assets(db, tables["transactions"] + tables["proceeds"])
+
+        try:
+            transactions = [
+                {
+                    "user_id": user_id,
+                    "asset_id": assets[row["ticker"]],
+                    "type": TransactionType(row["type"]),
+                    "date": row["date"],
+                    "quantity": row["quantity"],
+                    "price": row["price"],
+                    "total_amount": row["total_amount"],
+                    "fees": row["fees"] or 0.0,
+                    "broker": row["broker"],
+                    "notes": row["notes"],
+                }
+                for row in tables["transactions"]
+            ]
+            proceeds = [
+                {
+                    "user_id": user_id,
+                    "asset_id": assets[row["ticker"]],
+                    "type": ProceedType(row["type"]),
+                    "date": row["date"],
+                    "value_per_share": row["value_per_share"],
+                    "quantity": row["quantity"],
+                    "total_value": row["total_value"],
+                    "description": row["description"],
+                }
+                for row in tables["proceeds"]
+            ]
+            fixed_income = [
+                {
+                    **row,
+                    "user_id": user_id,
+                    "type": FixedIncomeType(row["type"]),
+                    "indexer": IndexerType(row["indexer"]),
+                }
+                for row in tables["fixed_income"]
+            ]
+        except (KeyError, ValueError) as e:
+            db.rollback()
+            raise ValueError(f"Valor inválido no arquivo: {e}") from e
+
+        db.bulk_insert_mappings(Transaction, transactions)
+        db.bulk_insert_mappings(Proceed, proceeds)
+        db.bulk_insert_mappings(FixedIncomeInvestment, fixed_income)
+        db.commit()
+
+        dates = [row["date"] for row in transactions]
+        proceed_dates = [row["date"] for row in proceeds]
+        return {
+            "transactions": len(transactions),
+            "proceeds": len(proceeds),
+            "fixed_income": len(fixed_income),
+            "asset_ids": {row["asset_id"] for row in transactions},
+            "since": min(dates).date() if dates else None,
+            "proceeds_since": min(proceed_dates) if proceed_dates else None,
+            "prices": {
+                row["ticker"]: row["current_price"]
+                for row in tables["positions"]
+                if row["current_price"] is not None
+            },
+        }
+
+    @staticmethod
+    def _resolve_assets(db: Session, rows: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Map archived tickers to asset ids, creating unknown assets"""
+        tickers: Set[str] = {row["ticker"] for row in rows}
+        if not tickers:
+            return {}
+
+        existing = {
+            ticker: asset_id
+            for asset_id, ticker in db.query(Asset.id, Asset.ticker).filter(Asset.ticker.in_(tickers))
+        }
+        for row in rows:
+            ticker = row["ticker"]
+            if ticker in existing:
+                continue
+            try:
+                asset_type = AssetType(row["asset_type"])
+            except ValueError:
+                asset_type = AssetType.ACAO
+            asset = Asset(ticker=ticker, name=row["asset_name"] or ticker, type=asset_type)
+            db.add(asset)
+            db.flush()
+            existing[ticker] = asset.id
+        return existing
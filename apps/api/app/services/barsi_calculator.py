@@ -3,12 +3,23 @@ Barsi Price Target Calculator Service
 
 Implementa a metodologia do Luiz Barsi para calcular o Preço Teto de ações.
 Fórmula: Preço Teto = Dividendo Médio Anual / Taxa Mínima de Retorno (6%)
+
+O screener aplica a mesma fórmula a todo o universo de pagadores de
+dividendos do histórico local (`dividend_events` + última cotação em
+`price_bars`) numa única passada vetorizada, e grava o ranking em
+`barsi_screener`.
 """
 import httpx
 import logging
-from datetime import datetime, timedelta
+import numpy as np
+from datetime import date, datetime, timedelta
 from typing import Dict, Any, Optional, List
 from dataclasses import dataclass
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session
+from app.models.asset import Asset
+from app.models.dividend import DividendEvent, BarsiScreenerEntry
+from app.models.price_history import PriceBar
 
 logger = logging.getLogger(__name__)
 
@@ -260,3 +271,188 @@ class BarsiCalculator:
         analyses.sort(key=lambda x: x.margin_of_safety, reverse=True)
         
         return analyses
+    
+    # ================================
+    # SCREENER
+    # ================================
+    
+    SCREENER_SORT = {
+        "margin": BarsiScreenerEntry.margin_of_safety,
+        "yield": BarsiScreenerEntry.current_yield,
+        "upside": BarsiScreenerEntry.upside_to_target,
+        "target": BarsiScreenerEntry.price_target,
+    }
+    
+    @staticmethod
+    def compute_screener(db: Session, as_of: Optional[date] = None) -> int:
+        """
+        Recalcula o Preço Teto de todo o universo numa passada vetorizada.
+        
+        A média anual segue `_calculate_average_dividend`: anos completos
+        (últimos YEARS_HISTORY) com pagamento; sem nenhum, todos os anos
+        com pagamento, incluindo o corrente.
+        
+        Returns:
+            Número de ativos no ranking
+        """
+        as_of = as_of or date.today()
+        first_year = as_of.year - BarsiCalculator.YEARS_HISTORY
+        
+        events = db.query(
+            DividendEvent.ticker, DividendEvent.payment_date, DividendEvent.value_per_share
+        ).filter(
+            DividendEvent.payment_date >= date(first_year, 1, 1),
+            DividendEvent.payment_date <= as_of,
+            DividendEvent.value_per_share > 0,
+        ).all()
+        
+        latest = (
+            db.query(PriceBar.ticker, func.max(PriceBar.date).label("date"))
+            .filter(PriceBar.date <= as_of)
+            .group_by(PriceBar.ticker)
+            .subquery()
+        )
+        quotes = {
+            ticker: (bar_date, close)
+            for ticker, bar_date, close in db.query(PriceBar.ticker, PriceBar.date, PriceBar.close)
+            .join(latest, and_(PriceBar.ticker == latest.c.ticker, PriceBar.date == latest.c.date))
+            .filter(PriceBar.close > 0)
+        }
+        
+        events = [e for e in events if e[0] in quotes]
+        names = sorted({e[0] for e in events})
+        db.query(BarsiScreenerEntry).delete(synchronize_session=False)
+        if not names:
+            db.commit()
+            return 0
+        
+        index = {name: i for i, name in enumerate(names)}
+        rows = np.fromiter((index[e[0]] for e in events), dtype=int, count=len(events))
+        years = np.fromiter((e[1].year - first_year for e in events), dtype=int, count=len(events))
+        values = np.fromiter((e[2] for e in events), dtype=float, count=len(events))
+        
+        yearly = np.zeros((len(names), BarsiCalculator.YEARS_HISTORY + 1))
+        np.add.at(yearly, (rows, years), values)
+        
+        complete = yearly[:, :-1]
+        complete_years = (complete > 0).sum(axis=1)
+        paid_years = (yearly > 0).sum(axis=1)
+        average = np.where(
+            complete_years > 0,
+            complete.sum(axis=1) / np.maximum(complete_years, 1),
+            yearly.sum(axis=1) / np.maximum(paid_years, 1),
+        )
+        
+        price = np.array([quotes[name][1] for name in names])
+        target = average / BarsiCalculator.MINIMUM_YIELD
+        current_yield = average / price * 100
+        upside = (target - price) / price * 100
+        margin = np.where(price < target, upside, 0.0)
+        
+        # Maior margem primeiro; empate pelo maior yield
+        order = np.lexsort((-current_yield, -margin))
+        rank = np.empty(len(names), dtype=int)
+        rank[order] = np.arange(1, len(names) + 1)
+        
+        assets = {
+            ticker: (name, sector)
+            for ticker, name, sector in db.query(Asset.ticker, Asset.name, Asset.sector)
+            .filter(Asset.ticker.in_(names))
+        }
+        db.bulk_insert_mappings(BarsiScreenerEntry, [
+            {
+                "ticker": name,
+                "name": assets.get(name, (None, None))[0],
+                "sector": assets.get(name, (None, None))[1],
+                "current_price": round(float(price[i]), 2),
+                "price_date": quotes[name][0],
+                "average_annual_dividend": round(float(average[i]), 4),
+                "price_target": round(float(target[i]), 2),
+                "current_yield": round(float(current_yield[i]), 2),
+                "upside_to_target": round(float(upside[i]), 2),
+                "margin_of_safety": round(float(margin[i]), 2),
+                "years_analyzed": int(min(paid_years[i], BarsiCalculator.YEARS_HISTORY)),
+                "rank": int(rank[i]),
+            }
+            for name, i in index.items()
+        ])
+        db.commit()
+        return len(names)
+    
+    @staticmethod
+    async def run_nightly(db: Session) -> Dict[str, int]:
+        """Job noturno: atualiza as cotações do universo e refaz o ranking"""
+        from app.services.price_history_service import PriceHistoryService
+        
+        universe = {t for (t,) in db.query(DividendEvent.ticker).distinct()}
+        if universe:
+            await PriceHistoryService.refresh(db, universe, range="5d")
+        ranked = BarsiCalculator.compute_screener(db)
+        
+        logger.info(f"Barsi screener ranked {ranked} tickers")
+        return {"tickers": ranked}
+    
+    @staticmethod
+    def screen(
+        db: Session,
+        sector: Optional[str] = None,
+        min_yield: Optional[float] = None,
+        min_margin: Optional[float] = None,
+        sort_by: str = "margin",
+        limit: int = 50,
+    ) -> Dict[str, Any]:
+        """
+        Consulta o ranking gravado pelo screener.
+        
+        Args:
+            sector: Filtra pelo setor (sem diferenciar maiúsculas)
+            min_yield: Yield atual mínimo (%)
+            min_margin: Margem de segurança mínima (%)
+            sort_by: "margin", "yield", "upside" ou "target" (decrescente)
+            limit: Máximo de resultados
+        """
+        if sort_by not in BarsiCalculator.SCREENER_SORT:
+            raise ValueError(
+                f"Ordenação inválida: {sort_by}. Use {', '.join(BarsiCalculator.SCREENER_SORT)}"
+            )
+        
+        query = db.query(BarsiScreenerEntry)
+        if sector:
+            query = query.filter(func.lower(BarsiScreenerEntry.sector) == sector.lower())
+        if min_yield is not None:
+            query = query.filter(BarsiScreenerEntry.current_yield >= min_yield)
+        if min_margin is not None:
+            query = query.filter(BarsiScreenerEntry.margin_of_safety >= min_margin)
+        
+        total = query.count()
+        entries = (
+            query.order_by(BarsiCalculator.SCREENER_SORT[sort_by].desc(), BarsiScreenerEntry.rank)
+            .limit(limit)
+            .all()
+        )
+        computed_at = db.query(func.max(BarsiScreenerEntry.computed_at)).scalar()
+        
+        return {
+            "computed_at": computed_at.isoformat() if computed_at else None,
+            "total": total,
+            "results": [
+                {
+                    "rank": e.rank,
+                    "ticker": e.ticker,
+                    "name": e.name,
+                    "sector": e.sector,
+                    "current_price": e.current_price,
+                    "price_date": e.price_date.isoformat(),
+                    "average_annual_dividend": e.average_annual_dividend,
+                    "price_target": e.price_target,
+                    "current_yield": e.current_yield,
+                    "upside_to_target": e.upside_to_target,
+                    "margin_of_safety": e.margin_of_safety,
+                    "years_analyzed": e.years_analyzed,
+                    "recommendation": BarsiCalculator._get_recommendation(
+                        e.current_price, e.price_target, e.current_yield, e.average_annual_dividend
+                    ),
+                }
+                for e in entries
+            ],
+        }
@@ -8,8 +8,8 @@ Documentação: https://dadosabertos.bcb.gov.br/
 """
 import httpx
 import logging
-from datetime import datetime
-from typing import Dict, Any, Optional
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
 from dataclasses import dataclass
 
 logger = logging.getLogger(__name__)
@@ -76,6 +76,44 @@ class BCBService:
             logger.error(f"Error fetching BCB serie {serie_code}: {e}")
             return None
     
+    # A API limita consultas de séries diárias a 10 anos por requisição
+    MAX_SERIES_DAYS = 3650
+    
+    @staticmethod
+    async def get_series(serie_code: int, start: date, end: date) -> List[Tuple[date, float]]:
+        """
+        Busca os valores de uma série entre duas datas (inclusive).
+        
+        Returns:
+            Lista de (data, valor) em ordem cronológica
+        """
+        values: List[Tuple[date, float]] = []
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            chunk_start = start
+            while chunk_start <= end:
+                chunk_end = min(end, chunk_start + timedelta(days=BCBService.MAX_SERIES_DAYS))
+                response = await client.get(
+                    f"{BCBService.BASE_URL}.{serie_code}/dados",
+                    params={
+                        "formato": "json",
+                        "dataInicial": chunk_start.strftime("%d/%m/%Y"),
+                        "dataFinal": chunk_end.strftime("%d/%m/%Y"),
+                    },
+                )
+                # 404 = nenhum valor no intervalo
+                if response.status_code != 404:
+                    response.raise_for_status()
+                    for item in response.json():
+                        try:
+                            values.append((
+                                datetime.strptime(item["data"], "%d/%m/%Y").date(),
+                                float(str(item["valor"]).replace(",", ".")),
+                            ))
+                        except (KeyError, TypeError, ValueError):
+                            continue
+                chunk_start = chunk_end + timedelta(days=1)
+        return values
+    
     @staticmethod
     async def get_macro_indicators() -> MacroIndicators:
         """
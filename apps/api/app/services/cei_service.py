@@ -7,6 +7,7 @@ In production, this would use real CEI B3 scraping/API integration.
 import random
 from datetime import datetime, timedelta, date
 from typing import List, Dict, Any
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from app.models.asset import Asset, AssetType
 from app.models.position import AssetPosition
@@ -16,6 +17,7 @@ from app.models.cei_credentials import CEICredentials
 from app.core.security import get_password_hash
 from app.core.logging import logger
 from app.services.notification_service import NotificationService
+from app.services import portfolio_events
 
 
 class CEIService:
@@ -120,12 +122,20 @@ class CEIService:
 
             # 3. Calculate positions from transactions
             positions_synced = CEIService._calculate_positions(db, user_id)
+            if transactions_synced:
+                # Back-dated: rebuild history, tax ledger and checkpoints from the first one
+                earliest = db.query(func.min(Transaction.date)).filter(
+                    Transaction.user_id == user_id
+                ).scalar()
+                portfolio_events.on_transactions_changed(db, user_id, since=earliest)
 
             # 4. Generate mock proceeds (dividends, etc.)
             proceeds_synced = CEIService._generate_mock_proceeds(db, user_id)
+            portfolio_events.on_proceeds_changed(db, user_id)
 
             # 5. Update prices (mock current prices)
             CEIService._update_current_prices(db)
+            portfolio_events.on_prices_changed(db)
 
             # 6. Generate notifications for upcoming dividends
             notifications_created = NotificationService.generate_upcoming_dividend_notifications(
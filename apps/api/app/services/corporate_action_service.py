@@ -0,0 +1,193 @@
+"""
+Corporate Action Service
+
+Splits, reverse splits and bonus shares, applied as cumulative factors.
+
+- The factor of a ticker on a date is the product of the factors of its
+  actions with a later ex-date; multiplying quantities (and dividing
+  prices) by it expresses anything dated then in today's shares
+- Factor tables (ex-dates and suffix products) are cached per ticker, so
+  a replay looks up the factors of all its transactions with one binary
+  search per ticker; the cache is keyed on the table's version (row count
+  and last id), so every worker sees actions recorded by another one
+- Only actions whose ex-date has arrived are recorded: an announced split
+  would otherwise change quantities before prices do
+- Adjusted closes are materialized in `price_bars.adj_close`, rewritten
+  with one UPDATE per interval between ex-dates when actions change
+- Bonus shares enter the position at zero cost
+"""
+from datetime import date, datetime, time
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from sqlalchemy import case, func, literal, update
+from sqlalchemy.orm import Session
+from app.models.corporate_action import CorporateAction, CorporateActionType
+from app.models.price_history import PriceBar
+from app.core.logging import logger
+
+
+def _as_date(value) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+class CorporateActionService:
+    """Service for corporate actions and the adjustments they imply"""
+
+    # ticker -> (ex-dates, cumulative factors); factors[i] is the product
+    # of the factors of actions i.. and the last entry is 1
+    _cache: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+    # (row count, last id) of corporate_actions the cache was built from
+    _cache_version: Optional[Tuple[int, int]] = None
+
+    @staticmethod
+    def invalidate(ticker: Optional[str] = None) -> None:
+        """Drop cached factor tables (None = every ticker)"""
+        if ticker is None:
+            CorporateActionService._cache.clear()
+            CorporateActionService._cache_version = None
+        else:
+            CorporateActionService._cache.pop(ticker.upper(), None)
+
+    @staticmethod
+    def factor_tables(db: Session, tickers: Iterable[str]) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """Factor tables of several tickers, loading the uncached ones in one query"""
+        tickers = {t.upper() for t in tickers}
+        count, last_id = db.query(func.count(CorporateAction.id), func.max(CorporateAction.id)).one()
+        version = (count, last_id or 0)
+        if version != CorporateActionService._cache_version:
+            CorporateActionService._cache.clear()
+            CorporateActionService._cache_version = version
+        missing = tickers - set(CorporateActionService._cache)
+        if missing:
+            actions: Dict[str, List[Tuple[date, float]]] = {t: [] for t in missing}
+            for ticker, ex_date, factor in (
+                db.query(CorporateAction.ticker, CorporateAction.ex_date, CorporateAction.factor)
+                .filter(CorporateAction.ticker.in_(missing))
+                .order_by(CorporateAction.ticker, CorporateAction.ex_date)
+            ):
+                actions[ticker].append((ex_date, factor))
+            for ticker, events in actions.items():
+                ex_dates = np.array([d for d, _ in events], dtype="datetime64[D]")
+                factors = np.array([f for _, f in events], dtype=float)
+                cumulative = np.append(np.cumprod(factors[::-1])[::-1], 1.0)
+                CorporateActionService._cache[ticker] = (ex_dates, cumulative)
+        return {t: CorporateActionService._cache[t] for t in tickers}
+
+    @staticmethod
+    def factors(db: Session, tickers: Sequence[str], dates: Sequence) -> np.ndarray:
+        """
+        Cumulative factor of each (ticker, date) pair.
+
+        An action counts for dates before its ex-date: a trade on the
+        ex-date is already in post-action shares.
+        """
+        result = np.ones(len(tickers))
+        if not len(tickers):
+            return result
+        tickers = np.array([t.upper() for t in tickers])
+        days = np.array([_as_date(d) for d in dates], dtype="datetime64[D]")
+        for ticker, (ex_dates, cumulative) in CorporateActionService.factor_tables(db, set(tickers)).items():
+            if len(ex_dates):
+                mask = tickers == ticker
+                result[mask] = cumulative[np.searchsorted(ex_dates, days[mask], side="right")]
+        return result
+
+    @staticmethod
+    def factor_expression(db: Session, ticker: str, date_column):
+        """
+        SQL expression of a ticker's cumulative factor at each row's date
+        (a CASE over its ex-dates), for set-based adjustments.
+        """
+        ticker = ticker.upper()
+        ex_dates, cumulative = CorporateActionService.factor_tables(db, [ticker])[ticker]
+        if not len(ex_dates):
+            return literal(1.0)
+        return case(
+            *[
+                (date_column < datetime.combine(ex_date.item(), time.min), factor)
+                for ex_date, factor in zip(ex_dates, cumulative[:-1].tolist())
+            ],
+            else_=1.0,
+        )
+
+    @staticmethod
+    def adjust_transactions(db: Session, transactions: Sequence, tickers: Sequence[str]) -> List:
+        """
+        Copies of transactions in today's shares (quantity x factor,
+        price / factor); amounts and fees are unchanged.
+        """
+        factors = CorporateActionService.factors(db, tickers, [tx.date for tx in transactions])
+        if np.all(factors == 1.0):
+            return list(transactions)
+        return [
+            SimpleNamespace(
+                id=tx.id,
+                date=tx.date,
+                type=tx.type,
+                quantity=round(tx.quantity * f, 8),
+                price=tx.price / f,
+                fees=tx.fees,
+                asset_id=tx.asset_id,
+            )
+            for tx, f in zip(transactions, factors.tolist())
+        ]
+
+    @staticmethod
+    def readjust_bars(db: Session, ticker: str) -> None:
+        """Rewrite the adjusted closes of a ticker, one UPDATE per interval between ex-dates"""
+        ticker = ticker.upper()
+        ex_dates, cumulative = CorporateActionService.factor_tables(db, [ticker])[ticker]
+        bounds = [None] + [d.item() for d in ex_dates] + [None]
+        for i, factor in enumerate(cumulative.tolist()):
+            statement = update(PriceBar).where(PriceBar.ticker == ticker)
+            if bounds[i] is not None:
+                statement = statement.where(PriceBar.date >= bounds[i])
+            if bounds[i + 1] is not None:
+                statement = statement.where(PriceBar.date < bounds[i + 1])
+            adjusted = None if factor == 1.0 else PriceBar.close / factor
+            db.execute(statement.values(adj_close=adjusted).execution_options(synchronize_session=False))
+        db.commit()
+
+    @staticmethod
+    def add_action(
+        db: Session,
+        ticker: str,
+        ex_date: date,
+        action_type: CorporateActionType,
+        factor: float,
+        description: Optional[str] = None,
+    ) -> CorporateAction:
+        """
+        Record a corporate action and re-adjust the ticker's price history.
+
+        Raises:
+            ValueError: If the factor does not match the action type, the
+                ex-date is in the future or the action is already recorded
+        """
+        ticker = ticker.upper()
+        if ex_date > date.today():
+            raise ValueError("Data ex não pode estar no futuro: registre o evento a partir da data ex")
+        if factor <= 0 or factor == 1:
+            raise ValueError("Fator deve ser positivo e diferente de 1")
+        if (action_type == CorporateActionType.REVERSE_SPLIT) != (factor < 1):
+            raise ValueError("Grupamentos têm fator menor que 1; desdobramentos e bonificações, maior que 1")
+        exists = db.query(CorporateAction.id).filter(
+            CorporateAction.ticker == ticker,
+            CorporateAction.ex_date == ex_date,
+            CorporateAction.type == action_type,
+        ).first()
+        if exists:
+            raise ValueError(f"Evento já registrado para {ticker} em {ex_date.isoformat()}")
+
+        action = CorporateAction(
+            ticker=ticker, ex_date=ex_date, type=action_type, factor=factor, description=description
+        )
+        db.add(action)
+        db.commit()
+        db.refresh(action)
+
+        CorporateActionService.invalidate(ticker)
+        CorporateActionService.readjust_bars(db, ticker)
+        logger.info(f"Corporate action {action_type.value} x{factor} for {ticker} on {ex_date}")
+        return action
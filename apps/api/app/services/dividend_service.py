@@ -0,0 +1,537 @@
+"""
+Dividend Service
+
+Deterministic dividend projections from a local dividend history.
+
+- `dividend_events` keeps per-share cash payments per ticker, fetched from
+  the market data providers (or, for tickers they do not cover, taken
+  from the proceeds users registered)
+- `dividend_estimates` holds per-ticker trailing and seasonal estimates,
+  recomputed nightly with one vectorized pass over the events
+- A user's 12-month cash-flow calendar is holdings x cached monthly
+  profiles, so a projection needs no provider (or AI) call
+- Payments with a known ex-date are credited as proceeds to everyone
+  holding the ticker on the day before it, one set-based insert per event
+"""
+import asyncio
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Any, Iterable, List, Optional
+import numpy as np
+from sqlalchemy import case, exists, func, insert, literal, select
+from sqlalchemy.orm import Session
+from app.models.asset import Asset, AssetType
+from app.models.dividend import DividendEvent, DividendEstimate
+from app.models.position import AssetPosition
+from app.models.proceed import Proceed, ProceedType
+from app.models.transaction import Transaction, TransactionType
+from app.services import portfolio_events
+from app.services.corporate_action_service import CorporateActionService
+from app.services.price_history_service import PriceHistoryService
+from app.core.logging import logger
+
+
+def _years_before(value: date, years: int) -> date:
+    try:
+        return value.replace(year=value.year - years)
+    except ValueError:  # 29/02
+        return value.replace(year=value.year - years, day=28)
+
+
+class DividendService:
+    """Service for dividend history, estimates and projections"""
+
+    YEARS_HISTORY = 5  # Years of payments behind the seasonal profile
+    METHODS = ["seasonal", "trailing"]
+    CASH_PROCEEDS = [ProceedType.DIVIDEND, ProceedType.JCP, ProceedType.RENDIMENTO]
+    CREDIT_WINDOW_DAYS = 45  # Payment dates re-checked by the nightly credit job
+
+    @staticmethod
+    def store_events(db: Session, ticker: str, events: List[Dict[str, Any]]) -> int:
+        """
+        Insert provider payments not stored yet.
+
+        Provider data replaces events a ticker had taken from users' proceeds,
+        so the same payment is never counted twice. Stored events still
+        without an ex-date get the one the provider now reports.
+
+        Returns:
+            Number of events inserted
+        """
+        ticker = ticker.upper()
+        payments = set()
+        labels = {}
+        ex_dates = {}
+        for event in events:
+            payment_date = PriceHistoryService.parse_bar_date(event.get("date"))
+            try:
+                value = round(float(event.get("value") or 0), 8)
+            except (TypeError, ValueError):
+                continue
+            if payment_date and value > 0:
+                payments.add((payment_date, value))
+                labels[(payment_date, value)] = event.get("type") or event.get("label")
+                ex_dates[(payment_date, value)] = DividendService._parse_ex_date(event)
+
+        if not payments:
+            return 0
+
+        db.query(DividendEvent).filter(
+            DividendEvent.ticker == ticker, DividendEvent.source == "proceeds"
+        ).delete(synchronize_session=False)
+        existing = {
+            (payment_date, round(value, 8)): (event_id, ex_date)
+            for event_id, payment_date, value, ex_date in db.query(
+                DividendEvent.id, DividendEvent.payment_date, DividendEvent.value_per_share, DividendEvent.ex_date
+            )
+            .filter(DividendEvent.ticker == ticker)
+        }
+
+        new = sorted(payments - set(existing))
+        db.bulk_insert_mappings(DividendEvent, [
+            {
+                "ticker": ticker,
+                "payment_date": payment_date,
+                "value_per_share": value,
+                "ex_date": ex_dates[(payment_date, value)],
+                "label": labels[(payment_date, value)],
+                "source": "provider",
+            }
+            for payment_date, value in new
+        ])
+        db.bulk_update_mappings(DividendEvent, [
+            {"id": event_id, "ex_date": ex_dates[key]}
+            for key, (event_id, ex_date) in existing.items()
+            if ex_date is None and ex_dates.get(key)
+        ])
+        db.commit()
+        return len(new)
+
+    @staticmethod
+    def _parse_ex_date(event: Dict[str, Any]) -> Optional[date]:
+        """Ex-date of a provider payment (the day after the "data com" for BrAPI)"""
+        ex_date = PriceHistoryService.parse_bar_date(event.get("ex_date"))
+        if ex_date:
+            return ex_date
+        last_date_prior = PriceHistoryService.parse_bar_date(event.get("last_date_prior"))
+        return last_date_prior + timedelta(days=1) if last_date_prior else None
+
+    @staticmethod
+    async def refresh(db: Session, tickers: Iterable[str]) -> Dict[str, int]:
+        """
+        Fetch the dividend history of tickers concurrently and store it.
+
+        Returns:
+            Dict mapping ticker to the number of new events
+        """
+        from app.services.market_data import MarketDataService
+
+        tickers = sorted({t.upper() for t in tickers})
+        results = await asyncio.gather(
+            *[MarketDataService.get_dividends_history(t, years=DividendService.YEARS_HISTORY) for t in tickers],
+            return_exceptions=True,
+        )
+
+        stored = {}
+        for ticker, result in zip(tickers, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Could not refresh dividend history for {ticker}")
+                continue
+            stored[ticker] = DividendService.store_events(db, ticker, result or [])
+        return stored
+
+    @staticmethod
+    def absorb_proceeds(db: Session) -> int:
+        """
+        Take per-share payments from users' cash proceeds for tickers the
+        providers have no history for.
+
+        Returns:
+            Number of events inserted
+        """
+        covered = {
+            t for (t,) in db.query(DividendEvent.ticker)
+            .filter(DividendEvent.source == "provider")
+            .distinct()
+        }
+        rows = (
+            db.query(Asset.ticker, Proceed.date, Proceed.value_per_share, Proceed.type)
+            .join(Asset, Asset.id == Proceed.asset_id)
+            .filter(Proceed.type.in_(DividendService.CASH_PROCEEDS), Proceed.value_per_share > 0)
+            .distinct()
+            .all()
+        )
+        existing = {
+            (ticker, payment_date, round(value, 8))
+            for ticker, payment_date, value in db.query(
+                DividendEvent.ticker, DividendEvent.payment_date, DividendEvent.value_per_share
+            )
+        }
+
+        new = {}
+        for ticker, payment_date, value, proceed_type in rows:
+            key = (ticker, payment_date, round(value, 8))
+            if ticker not in covered and key not in existing:
+                new[key] = proceed_type.value
+
+        db.bulk_insert_mappings(DividendEvent, [
+            {
+                "ticker": ticker,
+                "payment_date": payment_date,
+                "value_per_share": value,
+                "label": label,
+                "source": "proceeds",
+            }
+            for (ticker, payment_date, value), label in new.items()
+        ])
+        db.commit()
+        return len(new)
+
+    @staticmethod
+    def proceed_type(label: Optional[str], asset_type: AssetType) -> ProceedType:
+        """Proceed type of a provider payment, from its label"""
+        text = (label or "").upper()
+        if "JCP" in text or "JUROS" in text:
+            return ProceedType.JCP
+        if asset_type == AssetType.FII or "RENDIMENTO" in text:
+            return ProceedType.RENDIMENTO
+        return ProceedType.DIVIDEND
+
+    @staticmethod
+    def credit_proceeds(
+        db: Session,
+        since: Optional[date] = None,
+        as_of: Optional[date] = None,
+    ) -> Dict[str, int]:
+        """
+        Credit provider payments as proceeds to everyone holding the
+        ticker when it went ex, with one INSERT ... SELECT per event.
+
+        Only events with a known ex-date are credited. A user who already
+        has a proceed of the same asset, date and type is skipped, so
+        reruns and proceeds entered by hand are never doubled.
+
+        Args:
+            db: Database session
+            since: Only payments on or after this date (None = all)
+            as_of: Only payments up to this date (default: today)
+
+        Returns:
+            Dict with the events processed, proceeds created and users credited
+        """
+        as_of = as_of or date.today()
+        query = (
+            db.query(DividendEvent, Asset.id, Asset.type)
+            .join(Asset, Asset.ticker == DividendEvent.ticker)
+            .filter(
+                DividendEvent.source == "provider",
+                DividendEvent.ex_date.isnot(None),
+                DividendEvent.ex_date <= as_of,
+                DividendEvent.payment_date <= as_of,
+                Asset.type != AssetType.RENDA_FIXA,
+            )
+        )
+        if since:
+            query = query.filter(DividendEvent.payment_date >= since)
+        events = query.order_by(DividendEvent.payment_date, DividendEvent.id).all()
+
+        last_id = db.query(func.max(Proceed.id)).scalar() or 0
+        for event, asset_id, asset_type in events:
+            DividendService._credit_event(db, event, asset_id, asset_type)
+        db.commit()
+
+        credited = (
+            db.query(Proceed.user_id, func.min(Proceed.date), func.count(Proceed.id))
+            .filter(Proceed.id > last_id)
+            .group_by(Proceed.user_id)
+            .all()
+        )
+        for user_id, first_date, _ in credited:
+            portfolio_events.on_proceeds_changed(db, user_id, since=first_date)
+
+        result = {
+            "events": len(events),
+            "proceeds": sum(count for _, _, count in credited),
+            "users": len(credited),
+        }
+        logger.info(
+            f"Credited {result['proceeds']} proceeds from {result['events']} dividend events",
+            extra=result,
+        )
+        return result
+
+    @staticmethod
+    def _credit_event(db: Session, event: DividendEvent, asset_id: int, asset_type: AssetType) -> None:
+        """
+        Insert the proceeds of one event for all its holders.
+
+        Holdings are the users' transactions before the ex-date summed in
+        today's shares, then brought back to the shares of the day before
+        it (the payment is per share of that day).
+        """
+        proceed_type = DividendService.proceed_type(event.label, asset_type)
+        entitled_factor = float(CorporateActionService.factors(
+            db, [event.ticker], [event.ex_date - timedelta(days=1)]
+        )[0])
+        signed = case(
+            (Transaction.type == TransactionType.BUY, Transaction.quantity),
+            else_=-Transaction.quantity,
+        )
+        shares = func.sum(
+            signed * CorporateActionService.factor_expression(db, event.ticker, Transaction.date)
+        ) / entitled_factor
+        already_credited = exists().where(
+            Proceed.user_id == Transaction.user_id,
+            Proceed.asset_id == asset_id,
+            Proceed.date == event.payment_date,
+            Proceed.type == proceed_type,
+        )
+        holders = (
+            select(
+                Transaction.user_id,
+                literal(asset_id),
+                literal(proceed_type, Proceed.type.type),
+                literal(event.payment_date, Proceed.date.type),
+                literal(event.value_per_share),
+                shares,
+                shares * event.value_per_share,
+                literal(f"{event.label or proceed_type.value} (crédito automático)"),
+            )
+            .where(
+                Transaction.asset_id == asset_id,
+                Transaction.date < datetime.combine(event.ex_date, time.min),
+                ~already_credited,
+            )
+            .group_by(Transaction.user_id)
+            .having(shares > 1e-8)
+        )
+        db.execute(
+            insert(Proceed).from_select(
+                ["user_id", "asset_id", "type", "date", "value_per_share", "quantity", "total_value", "description"],
+                holders,
+            )
+        )
+
+    @staticmethod
+    async def run_proceeds_credit(db: Session) -> Dict[str, int]:
+        """Nightly job: credit the payments of the last CREDIT_WINDOW_DAYS"""
+        return DividendService.credit_proceeds(
+            db, since=date.today() - timedelta(days=DividendService.CREDIT_WINDOW_DAYS)
+        )
+
+    @staticmethod
+    def compute_estimates(
+        db: Session,
+        tickers: Optional[Iterable[str]] = None,
+        as_of: Optional[date] = None,
+    ) -> int:
+        """
+        Recompute per-ticker estimates in one vectorized pass.
+
+        The seasonal profile of a ticker is what it paid per share in each
+        calendar month over the last YEARS_HISTORY years, divided by the
+        number of years it has history for (capped to that window).
+
+        Returns:
+            Number of estimates written
+        """
+        as_of = as_of or date.today()
+        window_start = _years_before(as_of, DividendService.YEARS_HISTORY)
+        trailing_start = _years_before(as_of, 1)
+
+        query = db.query(
+            DividendEvent.ticker, DividendEvent.payment_date, DividendEvent.value_per_share
+        ).filter(DividendEvent.payment_date > window_start, DividendEvent.payment_date <= as_of)
+        if tickers is not None:
+            tickers = sorted({t.upper() for t in tickers})
+            query = query.filter(DividendEvent.ticker.in_(tickers))
+        events = query.all()
+
+        names = sorted({ticker for ticker, _, _ in events} | set(tickers or []))
+        if not names:
+            return 0
+
+        index = {name: i for i, name in enumerate(names)}
+        n = len(names)
+        profile = np.zeros((n, 12))
+        trailing = np.zeros(n)
+        first = np.full(n, as_of.toordinal())
+        last = np.zeros(n, dtype=int)
+
+        if events:
+            rows = np.fromiter((index[e[0]] for e in events), dtype=int, count=len(events))
+            ordinals = np.fromiter((e[1].toordinal() for e in events), dtype=int, count=len(events))
+            months = np.fromiter((e[1].month - 1 for e in events), dtype=int, count=len(events))
+            values = np.fromiter((e[2] for e in events), dtype=float, count=len(events))
+
+            np.add.at(profile, (rows, months), values)
+            np.add.at(trailing, rows, np.where(ordinals > trailing_start.toordinal(), values, 0.0))
+            np.minimum.at(first, rows, ordinals)
+            np.maximum.at(last, rows, ordinals)
+
+        has_events = last > 0
+        years = np.clip(np.ceil((as_of.toordinal() - first) / 365.25), 1, DividendService.YEARS_HISTORY)
+        profile /= years[:, None]
+
+        db.query(DividendEstimate).filter(DividendEstimate.ticker.in_(names)).delete(synchronize_session=False)
+        db.bulk_insert_mappings(DividendEstimate, [
+            {
+                "ticker": name,
+                "trailing_12m": round(float(trailing[i]), 6),
+                "annual_estimate": round(float(profile[i].sum()), 6),
+                "monthly_profile": [round(float(v), 6) for v in profile[i]],
+                "years_analyzed": int(years[i]) if has_events[i] else 0,
+                "last_payment_date": date.fromordinal(int(last[i])) if has_events[i] else None,
+            }
+            for name, i in index.items()
+        ])
+        db.commit()
+        return n
+
+    @staticmethod
+    async def run_nightly(db: Session) -> Dict[str, int]:
+        """
+        Nightly job: refresh the dividend history of held tickers and
+        recompute their estimates.
+        """
+        held = {
+            t for (t,) in db.query(Asset.ticker)
+            .join(AssetPosition, AssetPosition.asset_id == Asset.id)
+            .filter(AssetPosition.quantity > 0, Asset.type != AssetType.RENDA_FIXA)
+            .distinct()
+        }
+        stored = await DividendService.refresh(db, held) if held else {}
+        absorbed = DividendService.absorb_proceeds(db)
+        estimated = DividendService.compute_estimates(db, held)
+
+        logger.info(
+            f"Dividend estimates refreshed for {estimated} tickers",
+            extra={"events": sum(stored.values()) + absorbed, "tickers": estimated},
+        )
+        return {"events": sum(stored.values()) + absorbed, "tickers": estimated}
+
+    @staticmethod
+    def ensure(db: Session, user_id: int) -> int:
+        """
+        Estimate held tickers that have no estimate yet (e.g. bought since
+        the last nightly run), from the local history only.
+
+        Returns:
+            Number of estimates written
+        """
+        missing = [
+            t for (t,) in db.query(Asset.ticker)
+            .join(AssetPosition, AssetPosition.asset_id == Asset.id)
+            .outerjoin(DividendEstimate, DividendEstimate.ticker == Asset.ticker)
+            .filter(
+                AssetPosition.user_id == user_id,
+                AssetPosition.quantity > 0,
+                Asset.type != AssetType.RENDA_FIXA,
+                DividendEstimate.id.is_(None),
+            )
+        ]
+        return DividendService.compute_estimates(db, missing) if missing else 0
+
+    @staticmethod
+    def project(
+        db: Session,
+        user_id: int,
+        months: int = 12,
+        method: str = "seasonal",
+        start: Optional[date] = None,
+    ) -> Dict[str, Any]:
+        """
+        Project a user's dividend cash flow month by month.
+
+        One query loads holdings with their cached estimates; the calendar
+        is the quantities times the (tickers x 12) profile matrix. The
+        "trailing" method rescales each profile to the last 12 months paid.
+
+        Raises:
+            ValueError: Unknown method
+        """
+        if method not in DividendService.METHODS:
+            raise ValueError(f"Método inválido. Use: {', '.join(DividendService.METHODS)}")
+
+        start = (start or date.today()).replace(day=1)
+        rows = (
+            db.query(Asset.ticker, AssetPosition.quantity, DividendEstimate)
+            .join(Asset, Asset.id == AssetPosition.asset_id)
+            .outerjoin(DividendEstimate, DividendEstimate.ticker == Asset.ticker)
+            .filter(
+                AssetPosition.user_id == user_id,
+                AssetPosition.quantity > 0,
+                Asset.type != AssetType.RENDA_FIXA,
+            )
+            .order_by(Asset.ticker.asc())
+            .all()
+        )
+
+        tickers = [ticker for ticker, _, _ in rows]
+        without_history = [ticker for ticker, _, estimate in rows if not estimate or not estimate.annual_estimate]
+        quantities = np.array([quantity for _, quantity, _ in rows], dtype=float)
+        profiles = np.array(
+            [estimate.monthly_profile if estimate and estimate.monthly_profile else [0.0] * 12 for _, _, estimate in rows],
+            dtype=float,
+        ).reshape(len(rows), 12)
+
+        if method == "trailing" and rows:
+            annual = profiles.sum(axis=1)
+            trailing = np.array([estimate.trailing_12m if estimate else 0.0 for _, _, estimate in rows])
+            scale = np.divide(trailing, annual, out=np.zeros_like(trailing), where=annual > 0)
+            profiles = profiles * scale[:, None]
+
+        # Calendar month of each projected month, then holdings x profiles
+        month_index = (start.month - 1 + np.arange(months)) % 12
+        amounts = quantities[:, None] * profiles[:, month_index]  # tickers x months
+
+        calendar = []
+        for k in range(months):
+            year = start.year + (start.month - 1 + k) // 12
+            month = month_index[k] + 1
+            paying = np.nonzero(amounts[:, k] > 0.005)[0]
+            calendar.append({
+                "month": f"{year}-{month:02d}",
+                "total": round(float(amounts[:, k].sum()), 2),
+                "assets": [
+                    {"ticker": tickers[i], "amount": round(float(amounts[i, k]), 2)}
+                    for i in paying[np.argsort(-amounts[paying, k])]
+                ],
+            })
+
+        totals = amounts.sum(axis=1)
+        return {
+            "method": method,
+            "start": start.isoformat(),
+            "total": round(float(totals.sum()), 2),
+            "monthly_average": round(float(totals.sum() / months), 2) if months else 0.0,
+            "calendar": calendar,
+            "by_asset": sorted(
+                [
+                    {"ticker": tickers[i], "total": round(float(totals[i]), 2)}
+                    for i in range(len(rows)) if totals[i] > 0
+                ],
+                key=lambda item: item["total"],
+                reverse=True,
+            ),
+            "without_history": without_history,
+        }
+
+    @staticmethod
+    def summary_text(projection: Dict[str, Any]) -> str:
+        """Plain-language summary of a projection for reports"""
+        if not projection["total"]:
+            return "Sem histórico de dividendos suficiente para projetar os próximos 12 meses."
+
+        best = max(projection["calendar"], key=lambda m: m["total"])
+        top = ", ".join(
+            f"{item['ticker']} (R$ {item['total']:,.2f})" for item in projection["by_asset"][:3]
+        )
+        text = (
+            f"Projeção para os próximos 12 meses: R$ {projection['total']:,.2f} "
+            f"(média de R$ {projection['monthly_average']:,.2f}/mês), com base no histórico "
+            f"de pagamentos por ação e nas posições atuais. Mês de maior recebimento: "
+            f"{best['month']} (R$ {best['total']:,.2f}). Principais pagadores: {top}."
+        )
+        if projection["without_history"]:
+            text += f" Sem histórico: {', '.join(projection['without_history'])}."
+        return text
@@ -0,0 +1,378 @@
+"""
+Fixed Income Service
+
+Revaluation of every fixed-income investment from the published indexer
+series instead of constant rates typed by the user.
+
+- `indexer_rates` keeps the BCB (SGS) series of CDI, Selic, IPCA and
+  IGP-M, extended incrementally by the nightly job
+- Each series becomes a daily log-factor curve; an investment's growth
+  is its cumulative curve at the valuation date minus at the purchase
+  date, so the whole table is valued with array lookups and one curve
+  per distinct (indexer, % of indexer) pair
+- Spreads (IPCA + 5%) and prefixed rates accrue per business day, 252 a year
+- Days after the last published value accrue at that value (IPCA comes
+  out about a month late)
+- Investments on indexers without a series (TR, OUTRO) keep their value
+- Tesouro Direto bonds with imported prices are marked to market
+  instead (TesouroService)
+- Net redemption values apply IOF (first 30 days) and the regressive
+  income tax (22.5% down to 15%) to the gain, as array lookups by days
+  held; LCI, LCA, CRI, CRA and savings are exempt
+"""
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.fixed_income import FixedIncomeInvestment, FixedIncomeType, IndexerRate, IndexerType
+from app.core.config import settings
+from app.services.bcb_service import BCBService
+from app.services.tesouro_service import TesouroService
+from app.core.logging import logger
+
+INDEXERS = list(IndexerType)
+TYPES = list(FixedIncomeType)
+
+
+class FixedIncomeService:
+    """Service for indexer series, fixed-income revaluation and redemption taxes"""
+
+    # SGS codes: CDI and Selic in % per business day, IPCA and IGP-M in % per month
+    SGS_SERIES = {
+        IndexerType.CDI: 12,
+        IndexerType.SELIC: 11,
+        IndexerType.IPCA: 433,
+        IndexerType.IGPM: 189,
+    }
+    MONTHLY_INDEXERS = {IndexerType.IPCA, IndexerType.IGPM}
+    BUSINESS_DAYS_YEAR = 252
+
+    # IOF on the gain by days held (index), zero from day 30 on
+    IOF_BY_DAY = np.array([
+        100, 96, 93, 90, 86, 83, 80, 76, 73, 70, 66, 63, 60, 56, 53,
+        50, 46, 43, 40, 36, 33, 30, 26, 23, 20, 16, 13, 10, 6, 3,
+    ]) / 100
+    # Regressive income tax: up to 180, 360 and 720 days held, and beyond
+    IR_BRACKET_DAYS = np.array([180, 360, 720])
+    IR_RATES = np.array([22.5, 20.0, 17.5, 15.0]) / 100
+    TAX_EXEMPT_TYPES = {
+        FixedIncomeType.LCI,
+        FixedIncomeType.LCA,
+        FixedIncomeType.CRI,
+        FixedIncomeType.CRA,
+        FixedIncomeType.POUPANCA,
+    }
+
+    @staticmethod
+    def store_rates(db: Session, indexer: IndexerType, values: List[Tuple[date, float]]) -> int:
+        """
+        Insert series values not stored yet.
+
+        Returns:
+            Number of values inserted
+        """
+        if not values:
+            return 0
+        existing = {
+            d for (d,) in db.query(IndexerRate.date).filter(
+                IndexerRate.indexer == indexer,
+                IndexerRate.date >= min(d for d, _ in values),
+            )
+        }
+        new = {d: v for d, v in values if d not in existing}
+        db.bulk_insert_mappings(IndexerRate, [
+            {"indexer": indexer, "date": d, "value": v}
+            for d, v in sorted(new.items())
+        ])
+        db.commit()
+        return len(new)
+
+    @staticmethod
+    async def sync_rates(db: Session, end: Optional[date] = None) -> Dict[str, int]:
+        """
+        Fetch the indexer series the investments need, concurrently.
+
+        A series is fetched from the earliest purchase on its indexer the
+        first time (or when an older investment shows up), then only
+        after its last stored value.
+
+        Returns:
+            Dict mapping indexer to the number of new values
+        """
+        end = end or date.today()
+        first_purchase = dict(
+            db.query(FixedIncomeInvestment.indexer, func.min(FixedIncomeInvestment.purchase_date))
+            .group_by(FixedIncomeInvestment.indexer)
+            .all()
+        )
+        stored = {
+            indexer: (first, last)
+            for indexer, first, last in db.query(
+                IndexerRate.indexer, func.min(IndexerRate.date), func.max(IndexerRate.date)
+            ).group_by(IndexerRate.indexer)
+        }
+
+        starts = {}
+        for indexer in FixedIncomeService.SGS_SERIES:
+            if indexer not in first_purchase:
+                continue
+            start = first_purchase[indexer]
+            if indexer in FixedIncomeService.MONTHLY_INDEXERS:
+                start = start.replace(day=1)
+            if indexer in stored and stored[indexer][0] <= start:
+                start = stored[indexer][1] + timedelta(days=1)
+            if start <= end:
+                starts[indexer] = start
+
+        indexers = list(starts)
+        results = await asyncio.gather(
+            *[BCBService.get_series(FixedIncomeService.SGS_SERIES[i], starts[i], end) for i in indexers],
+            return_exceptions=True,
+        )
+
+        inserted = {}
+        for indexer, result in zip(indexers, results):
+            if isinstance(result, Exception):
+                logger.warning(f"Could not fetch {indexer.value} series: {result}")
+                continue
+            inserted[indexer.value] = FixedIncomeService.store_rates(db, indexer, result)
+        return inserted
+
+    @staticmethod
+    def daily_log_rates(
+        db: Session,
+        indexers: Iterable[IndexerType],
+        start: date,
+        end: date,
+    ) -> Dict[IndexerType, np.ndarray]:
+        """
+        Log growth of each indexer on every calendar day of [start, end).
+
+        Daily series accrue on the days they were published; monthly
+        series are spread evenly over the days of their month. Days after
+        the last value repeat it (business days only for daily series).
+
+        Returns:
+            Dict mapping indexer to its daily array (indexers without
+            values are left out)
+        """
+        days = np.arange(np.datetime64(start, "D"), np.datetime64(end, "D"))
+        rows = (
+            db.query(IndexerRate.indexer, IndexerRate.date, IndexerRate.value)
+            .filter(IndexerRate.indexer.in_(list(indexers)), IndexerRate.date < end)
+            .order_by(IndexerRate.indexer, IndexerRate.date)
+            .all()
+        )
+        by_indexer: Dict[IndexerType, List] = {}
+        for indexer, rate_date, value in rows:
+            by_indexer.setdefault(indexer, []).append((rate_date, value))
+
+        curves = {}
+        for indexer, values in by_indexer.items():
+            dates = np.array([d for d, _ in values], dtype="datetime64[D]")
+            logs = np.log1p(np.array([v for _, v in values]) / 100)
+            out = np.zeros(len(days))
+
+            if indexer in FixedIncomeService.MONTHLY_INDEXERS:
+                months = dates.astype("datetime64[M]")
+                month_days = ((months + 1).astype("datetime64[D]") - months.astype("datetime64[D]")).astype(int)
+                per_day = logs / month_days
+                day_months = days.astype("datetime64[M]")
+                pos = np.minimum(np.searchsorted(months, day_months), len(months) - 1)
+                found = months[pos] == day_months
+                out[found] = per_day[pos[found]]
+                out[day_months > months[-1]] = per_day[-1]
+            else:
+                offsets = (dates - days[0]).astype(int) if len(days) else np.array([], dtype=int)
+                inside = (offsets >= 0) & (offsets < len(days))
+                out[offsets[inside]] = logs[inside]
+                out[(days > dates[-1]) & np.is_busday(days)] = logs[-1]
+
+            curves[indexer] = out
+        return curves
+
+    @staticmethod
+    def revalue(db: Session, as_of: Optional[date] = None, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Revalue investments from the stored series, with one bulk update.
+
+        Args:
+            db: Database session
+            as_of: Valuation date (default: today); matured investments
+                are valued at maturity
+            user_id: Restrict to one user (None = every investment)
+
+        Returns:
+            Dict with the number of investments, updated and skipped ones
+            and the total updated value
+        """
+        as_of = as_of or date.today()
+        query = db.query(
+            FixedIncomeInvestment.id,
+            FixedIncomeInvestment.type,
+            FixedIncomeInvestment.invested_amount,
+            FixedIncomeInvestment.purchase_date,
+            FixedIncomeInvestment.maturity_date,
+            FixedIncomeInvestment.indexer,
+            FixedIncomeInvestment.rate,
+            FixedIncomeInvestment.is_percentage_of_indexer,
+        )
+        if user_id is not None:
+            query = query.filter(FixedIncomeInvestment.user_id == user_id)
+        rows = query.all()
+        if not rows:
+            return {"investments": 0, "updated": 0, "skipped": 0, "marked_to_market": 0, "total_value": 0.0}
+
+        today = np.datetime64(as_of, "D")
+        ids = np.array([r.id for r in rows])
+        principal = np.array([r.invested_amount for r in rows], dtype=float)
+        purchase = np.array([r.purchase_date for r in rows], dtype="datetime64[D]")
+        maturity = np.array([r.maturity_date or as_of for r in rows], dtype="datetime64[D]")
+        rates = np.array([r.rate for r in rows], dtype=float)
+        percentage = np.array([bool(r.is_percentage_of_indexer) for r in rows])
+        codes = np.array([INDEXERS.index(r.indexer) for r in rows])
+        end = np.maximum(np.minimum(maturity, today), purchase)
+
+        # Future purchases are not priced, but must not push the curves' start past today
+        start = min(purchase.min(), today)
+        curves = FixedIncomeService.daily_log_rates(
+            db, {r.indexer for r in rows} & set(FixedIncomeService.SGS_SERIES), start.item(), as_of
+        )
+        prefixed = codes == INDEXERS.index(IndexerType.PREFIXADO)
+        has_curve = np.isin(codes, [INDEXERS.index(i) for i in curves])
+        priced = (prefixed | has_curve) & (purchase <= today)
+
+        # Share of the indexer that accrues, and the fixed rate on top of it
+        share = np.where(percentage, rates / 100, 1.0)
+        share[prefixed] = 0.0
+        spread = np.where(percentage & ~prefixed, 0.0, rates)
+
+        # One cumulative curve per distinct (indexer, share)
+        keys, inverse = np.unique(np.column_stack([codes, share]), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        n_days = int((today - start).astype(int))
+        cumulative = np.zeros((len(keys), n_days + 1))
+        for j, (code, part) in enumerate(keys):
+            curve = curves.get(INDEXERS[int(code)])
+            if curve is not None and part:
+                cumulative[j, 1:] = np.cumsum(np.log1p(part * np.expm1(curve)))
+
+        begin_idx = np.clip((purchase - start).astype(int), 0, n_days)
+        end_idx = np.clip((end - start).astype(int), 0, n_days)
+        log_growth = cumulative[inverse, end_idx] - cumulative[inverse, begin_idx]
+        log_growth += (
+            np.busday_count(purchase, end) * np.log1p(spread / 100) / FixedIncomeService.BUSINESS_DAYS_YEAR
+        )
+        values = np.round(principal * np.exp(log_growth), 2)
+
+        # Market prices, where imported, take over the indexer estimate
+        bonds = [
+            (TesouroService.BOND_TYPES[r.type], r.maturity_date)
+            if r.type in TesouroService.BOND_TYPES and r.maturity_date else None
+            for r in rows
+        ]
+        market = TesouroService.market_values(db, bonds, principal, purchase, end)
+        marked = ~np.isnan(market) & (purchase <= today)
+        values = np.where(marked, market, values)
+        priced |= marked
+
+        now = datetime.utcnow()
+        db.bulk_update_mappings(FixedIncomeInvestment, [
+            {"id": int(i), "current_value": float(v), "gross_value": float(v), "last_updated": now}
+            for i, v in zip(ids[priced], values[priced])
+        ])
+        db.commit()
+
+        updated = int(priced.sum())
+        return {
+            "investments": len(rows),
+            "updated": updated,
+            "skipped": len(rows) - updated,
+            "marked_to_market": int(marked.sum()),
+            "total_value": round(float(values[priced].sum()), 2),
+        }
+
+    @staticmethod
+    def net_values(
+        types: List[FixedIncomeType],
+        invested: np.ndarray,
+        gross: np.ndarray,
+        purchase: np.ndarray,
+        redemption: np.ndarray,
+    ) -> Dict[str, np.ndarray]:
+        """
+        IOF, income tax and net value of redeeming each investment.
+
+        IOF applies to the gain and the income tax to the gain net of IOF;
+        losses pay nothing.
+
+        Args:
+            types: Investment types
+            invested: Amounts invested
+            gross: Gross values at redemption
+            purchase: Purchase dates (datetime64[D])
+            redemption: Redemption dates (datetime64[D])
+
+        Returns:
+            Dict of arrays "iof", "income_tax" and "net_value"
+        """
+        days = np.maximum((redemption - purchase).astype(int), 0)
+        gain = np.maximum(gross - invested, 0.0)
+        exempt = np.isin(
+            [TYPES.index(t) for t in types],
+            [TYPES.index(t) for t in FixedIncomeService.TAX_EXEMPT_TYPES],
+        )
+
+        iof_by_day = FixedIncomeService.IOF_BY_DAY
+        iof_rate = np.where(days < len(iof_by_day), iof_by_day[np.minimum(days, len(iof_by_day) - 1)], 0.0)
+        ir_rate = FixedIncomeService.IR_RATES[np.searchsorted(FixedIncomeService.IR_BRACKET_DAYS, days)]
+
+        iof = np.where(exempt, 0.0, gain * iof_rate)
+        income_tax = np.where(exempt, 0.0, (gain - iof) * ir_rate)
+        return {
+            "iof": np.round(iof, 2),
+            "income_tax": np.round(income_tax, 2),
+            "net_value": np.round(gross - iof - income_tax, 2),
+        }
+
+    @staticmethod
+    def investment_taxes(
+        investments: List[FixedIncomeInvestment],
+        as_of: Optional[date] = None,
+    ) -> Dict[str, np.ndarray]:
+        """Taxes and net values of redeeming investments at `as_of` (or at maturity)"""
+        as_of = as_of or date.today()
+        if not investments:
+            return {"iof": np.zeros(0), "income_tax": np.zeros(0), "net_value": np.zeros(0)}
+        purchase = np.array([inv.purchase_date for inv in investments], dtype="datetime64[D]")
+        maturity = np.array([inv.maturity_date or as_of for inv in investments], dtype="datetime64[D]")
+        invested = np.array([inv.invested_amount for inv in investments], dtype=float)
+        gross = np.array([
+            inv.current_value if inv.current_value is not None else inv.invested_amount
+            for inv in investments
+        ], dtype=float)
+        return FixedIncomeService.net_values(
+            [inv.type for inv in investments],
+            invested,
+            gross,
+            purchase,
+            np.minimum(maturity, np.datetime64(as_of, "D")),
+        )
+
+    @staticmethod
+    async def run_nightly(db: Session) -> Dict[str, Any]:
+        """Nightly job: extend the indexer series and Tesouro prices, then revalue every investment"""
+        fetched = await FixedIncomeService.sync_rates(db)
+        if settings.TESOURO_PRICES_URL:
+            try:
+                await TesouroService.import_from_source(db, settings.TESOURO_PRICES_URL)
+            except Exception as e:
+                logger.warning(f"Could not import Tesouro prices: {e}")
+        result = FixedIncomeService.revalue(db)
+        logger.info(
+            f"Fixed income revaluation: {result['updated']} updated, {result['skipped']} skipped",
+            extra={"fetched": fetched, **result},
+        )
+        return result
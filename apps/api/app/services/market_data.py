@@ -189,7 +189,8 @@ class MarketDataService:
                             "date": d["paymentDate"] or d["approvedOn"],
                             "value": d["rate"],
                             "type": d["typeLabel"] or d["relatedTo"],
-                            "label": d["label"]
+                            "label": d["label"],
+                            "last_date_prior": d.get("lastDatePrior"),  # Data com
                         }
                         for d in dividends
                     ]
@@ -252,7 +253,8 @@ class MarketDataService:
                         "date": item_date.isoformat(),
                         "value": float(amount),
                         "type": "Dividend",
-                        "label": "Dividendo"
+                        "label": "Dividendo",
+                        "ex_date": item_date.isoformat(),  # Yahoo indexes by ex-date
                     })
             
             return dividends_list
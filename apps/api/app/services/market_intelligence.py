@@ -9,9 +9,13 @@ Fornece análises quantitativas simples:
 import httpx
 import logging
 import math
-from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
+import warnings
+import numpy as np
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
 from dataclasses import dataclass
+from sqlalchemy import func
+from sqlalchemy.orm import Session
 
 logger = logging.getLogger(__name__)
 
@@ -60,6 +64,10 @@ class MarketIntelligence:
     # Threshold para detectar anomalia (desvios padrão)
     ANOMALY_THRESHOLD = 2.0  # 2 desvios padrão = ~5% de chance
     
+    # Análise em lote: pregões por ativo (~1 mês) e idade máxima do histórico local
+    BATCH_WINDOW = 22
+    STALE_AFTER_DAYS = 4
+    
     @staticmethod
     async def calculate_volatility(ticker: str) -> VolatilityScore:
         """
@@ -144,25 +152,12 @@ class MarketIntelligence:
                     first_price = prices[0]
                     last_price = prices[-1]
                     change_pct = (last_price - first_price) / first_price * 100 if first_price > 0 else 0
-                    
-                    if change_pct > 5:
-                        trend = "alta"
-                    elif change_pct < -5:
-                        trend = "baixa"
-                    else:
-                        trend = "lateral"
+                    trend = MarketIntelligence._get_trend(change_pct)
                 else:
                     trend = "indefinida"
                 
-                # Classificar volatilidade
-                volatility_level = "baixa"
-                for level, (low, high) in MarketIntelligence.VOLATILITY_THRESHOLDS.items():
-                    if low <= volatility_daily < high:
-                        volatility_level = level
-                        break
-                
-                # Score de 1 a 10
-                volatility_score = min(10, max(1, int(volatility_daily / 0.5) + 1))
+                # Classificar volatilidade e score de 1 a 10
+                volatility_level, volatility_score = MarketIntelligence._classify_volatility(volatility_daily)
                 
                 # Recomendação
                 recommendation = MarketIntelligence._get_volatility_recommendation(
@@ -249,24 +244,8 @@ class MarketIntelligence:
                         volume_zscore = (current_volume - avg_volume) / std_volume
                         
                         if abs(volume_zscore) > MarketIntelligence.ANOMALY_THRESHOLD:
-                            deviation_pct = (current_volume - avg_volume) / avg_volume * 100
-                            
-                            if volume_zscore > 0:
-                                severity = "high" if volume_zscore > 3 else "medium"
-                                message = f"📈 Volume {deviation_pct:.0f}% ACIMA da média"
-                            else:
-                                severity = "low"
-                                message = f"📉 Volume {abs(deviation_pct):.0f}% ABAIXO da média"
-                            
-                            anomalies.append(AnomalyAlert(
-                                ticker=ticker.upper(),
-                                anomaly_type="volume",
-                                severity=severity,
-                                current_value=current_volume,
-                                average_value=avg_volume,
-                                deviation_percent=round(deviation_pct, 1),
-                                message=message,
-                                detected_at=datetime.now().isoformat()
+                            anomalies.append(MarketIntelligence._volume_alert(
+                                ticker, current_volume, avg_volume, volume_zscore
                             ))
                 
                 # Estatísticas de variação de preço
@@ -278,19 +257,8 @@ class MarketIntelligence:
                         change_zscore = (abs(current_change) - avg_change) / std_change
                         
                         if change_zscore > MarketIntelligence.ANOMALY_THRESHOLD:
-                            deviation_pct = (abs(current_change) - avg_change) / avg_change * 100 if avg_change > 0 else 0
-                            severity = "high" if change_zscore > 3 else "medium"
-                            
-                            direction = "alta" if current_change > 0 else "queda"
-                            anomalies.append(AnomalyAlert(
-                                ticker=ticker.upper(),
-                                anomaly_type="price",
-                                severity=severity,
-                                current_value=abs(current_change),
-                                average_value=avg_change,
-                                deviation_percent=round(deviation_pct, 1),
-                                message=f"⚠️ Movimento de {direction} atípico: {abs(current_change):.2f}%",
-                                detected_at=datetime.now().isoformat()
+                            anomalies.append(MarketIntelligence._price_alert(
+                                ticker, current_change, avg_change, change_zscore
                             ))
                 
                 return anomalies
@@ -300,33 +268,206 @@ class MarketIntelligence:
             return anomalies
     
     @staticmethod
-    async def analyze_portfolio_risk(tickers: List[str]) -> Dict[str, Any]:
+    def load_recent_bars(db: Session, tickers: List[str], window: int) -> Dict[str, np.ndarray]:
+        """
+        Últimos `window` pregões de cada ticker do histórico local, numa query.
+        
+        Returns:
+            Dict com matrizes N x window ("close" ajustado por eventos
+            societários, "high", "low", "volume"),
+            alinhadas à direita (último pregão na última coluna, NaN antes
+            do início do histórico), e a lista "tickers" das linhas
+        """
+        from app.models.price_history import PriceBar
+        
+        rows = (
+            db.query(
+                PriceBar.ticker, func.coalesce(PriceBar.adj_close, PriceBar.close),
+                PriceBar.high, PriceBar.low, PriceBar.volume,
+            )
+            .filter(
+                PriceBar.ticker.in_(tickers),
+                PriceBar.date >= date.today() - timedelta(days=window * 2 + 10),
+            )
+            .order_by(PriceBar.ticker, PriceBar.date)
+            .all()
+        )
+        by_ticker: Dict[str, List] = {t: [] for t in tickers}
+        for row in rows:
+            by_ticker[row[0]].append(row[1:])
+        
+        fields = ("close", "high", "low", "volume")
+        bars = {field: np.full((len(tickers), window), np.nan) for field in fields}
+        for i, ticker in enumerate(tickers):
+            recent = np.array(by_ticker[ticker][-window:], dtype=float).reshape(-1, len(fields))
+            for j, field in enumerate(fields):
+                bars[field][i, window - recent.shape[0]:] = recent[:, j]
+        bars["tickers"] = tickers
+        return bars
+    
+    @staticmethod
+    async def analyze_batch(db: Session, tickers: List[str]) -> Tuple[List[VolatilityScore], List[AnomalyAlert]]:
+        """
+        Volatilidade e anomalias de vários ativos numa única passada.
+        
+        O histórico vem do armazenamento local (`price_bars`); só os ativos
+        sem pregões recentes são buscados, em paralelo, antes do cálculo.
+        Os indicadores são os mesmos de `calculate_volatility` e
+        `detect_anomalies`, calculados como matrizes (um ativo por linha);
+        o último pregão faz o papel da cotação atual nos z-scores.
+        """
+        from app.models.price_history import PriceBar
+        from app.services.price_history_service import PriceHistoryService
+        
+        tickers = list(dict.fromkeys(t.upper() for t in tickers))
+        latest = dict(
+            db.query(PriceBar.ticker, func.max(PriceBar.date))
+            .filter(PriceBar.ticker.in_(tickers))
+            .group_by(PriceBar.ticker)
+            .all()
+        )
+        stale_before = date.today() - timedelta(days=MarketIntelligence.STALE_AFTER_DAYS)
+        stale = [t for t in tickers if latest.get(t) is None or latest[t] < stale_before]
+        if stale:
+            await PriceHistoryService.refresh(db, stale, range="1mo")
+        
+        window = MarketIntelligence.BATCH_WINDOW
+        bars = MarketIntelligence.load_recent_bars(db, tickers, window)
+        close, high, low, volume = bars["close"], bars["high"], bars["low"], bars["volume"]
+        n_bars = np.sum(~np.isnan(close), axis=1)
+        
+        # Ativos com histórico curto viram linhas NaN, tratadas abaixo
+        with np.errstate(invalid="ignore", divide="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            returns = np.diff(close, axis=1) / close[:, :-1] * 100
+            volatility = np.nanstd(returns, axis=1)
+            day_range = np.where((high > 0) & (low > 0), (high - low) / low * 100, np.nan)
+            avg_range = np.nan_to_num(np.nanmean(day_range, axis=1))
+            
+            peak = np.fmax.accumulate(close, axis=1)
+            drawdown = np.nan_to_num(np.nanmax((peak - close) / peak * 100, axis=1))
+            
+            first = close[np.arange(len(tickers)), np.argmax(~np.isnan(close), axis=1)]
+            last = close[:, -1]
+            change = (last - first) / first * 100
+            
+            # Último pregão contra os anteriores da janela
+            history_volume = np.where(volume[:, :-1] > 0, volume[:, :-1], np.nan)
+            avg_volume = np.nanmean(history_volume, axis=1)
+            volume_z = (volume[:, -1] - avg_volume) / np.nanstd(history_volume, axis=1)
+            abs_changes = np.abs(returns[:, :-1])
+            avg_change = np.nanmean(abs_changes, axis=1)
+            change_z = (np.abs(returns[:, -1]) - avg_change) / np.nanstd(abs_changes, axis=1)
+        
+        volatilities: List[VolatilityScore] = []
+        anomalies: List[AnomalyAlert] = []
+        threshold = MarketIntelligence.ANOMALY_THRESHOLD
+        for i, ticker in enumerate(tickers):
+            if n_bars[i] < 5 or np.isnan(last[i]):
+                volatilities.append(MarketIntelligence._create_error_volatility(ticker))
+                continue
+            
+            level, score = MarketIntelligence._classify_volatility(float(volatility[i]))
+            trend = MarketIntelligence._get_trend(float(change[i]))
+            volatilities.append(VolatilityScore(
+                ticker=ticker,
+                current_price=round(float(last[i]), 2),
+                volatility_daily=round(float(volatility[i]), 2),
+                volatility_score=score,
+                volatility_level=level,
+                avg_daily_range=round(float(avg_range[i]), 2),
+                max_drawdown_30d=round(float(drawdown[i]), 2),
+                trend=trend,
+                recommendation=MarketIntelligence._get_volatility_recommendation(level, trend, float(drawdown[i])),
+            ))
+            
+            if n_bars[i] < 10:
+                continue
+            if np.isfinite(volume_z[i]) and volume[i, -1] > 0 and abs(volume_z[i]) > threshold:
+                anomalies.append(MarketIntelligence._volume_alert(
+                    ticker, float(volume[i, -1]), float(avg_volume[i]), float(volume_z[i])
+                ))
+            if np.isfinite(change_z[i]) and change_z[i] > threshold:
+                anomalies.append(MarketIntelligence._price_alert(
+                    ticker, float(returns[i, -1]), float(avg_change[i]), float(change_z[i])
+                ))
+        
+        return volatilities, anomalies
+    
+    @staticmethod
+    async def scan_holdings(db: Session) -> Dict[str, int]:
+        """
+        Job agendado: procura anomalias em todos os ativos com posição
+        aberta (de qualquer usuário) pelo cálculo em lote e notifica os
+        detentores com uma única inserção.
+        """
+        from app.models.asset import Asset
+        from app.models.position import AssetPosition
+        from app.services.notification_service import NotificationService
+        
+        tickers = [
+            t for (t,) in (
+                db.query(Asset.ticker)
+                .join(AssetPosition, AssetPosition.asset_id == Asset.id)
+                .filter(AssetPosition.quantity > 0)
+                .distinct()
+                .order_by(Asset.ticker)
+            )
+        ]
+        if not tickers:
+            return {"tickers": 0, "anomalies": 0, "notifications": 0}
+        
+        _, anomalies = await MarketIntelligence.analyze_batch(db, tickers)
+        created = NotificationService.create_anomaly_notifications(db, anomalies)
+        
+        logger.info(f"Anomaly scan: {len(tickers)} tickers, {len(anomalies)} anomalies, {created} notifications")
+        return {"tickers": len(tickers), "anomalies": len(anomalies), "notifications": created}
+    
+    @staticmethod
+    async def analyze_portfolio_risk(tickers: List[str], db: Optional[Session] = None) -> Dict[str, Any]:
         """
         Analisa o risco de uma carteira inteira.
         
         Retorna:
-        - Score médio de volatilidade
+        - Volatilidade da carteira (pela covariância, com `db`)
         - Anomalias detectadas
         - Alertas de risco
+        
+        Com uma sessão de banco, os indicadores por ativo saem de uma única
+        passada sobre o histórico local (`analyze_batch`) e a volatilidade
+        da carteira vem do motor de risco (RiskService, pesos iguais), que
+        considera as correlações em vez de só tirar a média das
+        volatilidades individuais.
         """
         import asyncio
         
         volatilities = []
         all_anomalies = []
         
-        for ticker in tickers[:20]:  # Limite de 20 ativos
-            vol = await MarketIntelligence.calculate_volatility(ticker)
-            volatilities.append(vol)
-            
-            anomalies = await MarketIntelligence.detect_anomalies(ticker)
-            all_anomalies.extend(anomalies)
-            
-            await asyncio.sleep(1.0)  # Rate limiting
+        if db is not None:
+            volatilities, all_anomalies = await MarketIntelligence.analyze_batch(db, tickers[:20])
+        else:
+            for ticker in tickers[:20]:  # Limite de 20 ativos
+                vol = await MarketIntelligence.calculate_volatility(ticker)
+                volatilities.append(vol)
+                
+                anomalies = await MarketIntelligence.detect_anomalies(ticker)
+                all_anomalies.extend(anomalies)
+                
+                await asyncio.sleep(1.0)  # Rate limiting
         
         # Calcular métricas agregadas
         valid_vols = [v for v in volatilities if v.volatility_score > 0]
         
         avg_volatility = sum(v.volatility_daily for v in valid_vols) / len(valid_vols) if valid_vols else 0
+        
+        correlation_risk = None
+        portfolio_volatility = avg_volatility
+        if db is not None:
+            from app.services.risk_service import RiskService
+            correlation_risk = await RiskService.analyze_tickers(db, tickers[:20])
+            if correlation_risk["portfolio_volatility_daily"] is not None:
+                portfolio_volatility = correlation_risk["portfolio_volatility_daily"]
         max_volatility = max((v.volatility_daily for v in valid_vols), default=0)
         high_vol_count = sum(1 for v in valid_vols if v.volatility_level in ["alta", "extrema"])
         
@@ -346,7 +487,9 @@ class MarketIntelligence:
             risk_message = "✅ Carteira com volatilidade controlada"
         
         return {
-            "portfolio_volatility": round(avg_volatility, 2),
+            "portfolio_volatility": round(portfolio_volatility, 2),
+            "average_volatility": round(avg_volatility, 2),
+            "correlation_risk": correlation_risk,
             "max_volatility": round(max_volatility, 2),
             "high_volatility_count": high_vol_count,
             "risk_level": risk_level,
@@ -375,6 +518,64 @@ class MarketIntelligence:
             ]
         }
     
+    @staticmethod
+    def _classify_volatility(volatility_daily: float) -> Tuple[str, int]:
+        """Nível e score (1-10) de uma volatilidade diária em %"""
+        volatility_level = "baixa"
+        for level, (low, high) in MarketIntelligence.VOLATILITY_THRESHOLDS.items():
+            if low <= volatility_daily < high:
+                volatility_level = level
+                break
+        return volatility_level, min(10, max(1, int(volatility_daily / 0.5) + 1))
+    
+    @staticmethod
+    def _get_trend(change_pct: float) -> str:
+        """Tendência pela variação do período em %"""
+        if change_pct > 5:
+            return "alta"
+        if change_pct < -5:
+            return "baixa"
+        return "lateral"
+    
+    @staticmethod
+    def _volume_alert(ticker: str, current_volume: float, avg_volume: float, zscore: float) -> AnomalyAlert:
+        """Alerta de volume fora do padrão"""
+        deviation_pct = (current_volume - avg_volume) / avg_volume * 100
+        if zscore > 0:
+            severity = "high" if zscore > 3 else "medium"
+            message = f"📈 Volume {deviation_pct:.0f}% ACIMA da média"
+        else:
+            severity = "low"
+            message = f"📉 Volume {abs(deviation_pct):.0f}% ABAIXO da média"
+        
+        return AnomalyAlert(
+            ticker=ticker.upper(),
+            anomaly_type="volume",
+            severity=severity,
+            current_value=current_volume,
+            average_value=avg_volume,
+            deviation_percent=round(deviation_pct, 1),
+            message=message,
+            detected_at=datetime.now().isoformat()
+        )
+    
+    @staticmethod
+    def _price_alert(ticker: str, current_change: float, avg_change: float, zscore: float) -> AnomalyAlert:
+        """Alerta de variação de preço fora do padrão"""
+        deviation_pct = (abs(current_change) - avg_change) / avg_change * 100 if avg_change > 0 else 0
+        direction = "alta" if current_change > 0 else "queda"
+        
+        return AnomalyAlert(
+            ticker=ticker.upper(),
+            anomaly_type="price",
+            severity="high" if zscore > 3 else "medium",
+            current_value=abs(current_change),
+            average_value=avg_change,
+            deviation_percent=round(deviation_pct, 1),
+            message=f"⚠️ Movimento de {direction} atípico: {abs(current_change):.2f}%",
+            detected_at=datetime.now().isoformat()
+        )
+    
     @staticmethod
     def _get_volatility_recommendation(level: str, trend: str, drawdown: float) -> str:
         """Gera recomendação baseada na análise"""
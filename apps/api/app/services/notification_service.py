@@ -2,14 +2,19 @@
 Notification Service
 Handles creation and management of user notifications
 """
+from sqlalchemy import and_, exists, insert, literal, select, union_all
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import TYPE_CHECKING, Iterable, List, Optional
 from app.models.notification import Notification, NotificationType
+from app.models.position import AssetPosition
 from app.models.proceed import Proceed, ProceedType
 from app.models.asset import Asset
 from app.core.logging import logger
 
+if TYPE_CHECKING:
+    from app.services.market_intelligence import AnomalyAlert
+
 
 class NotificationService:
     """Service for managing notifications"""
@@ -166,6 +171,74 @@ class NotificationService:
         
         return notifications
 
+    @staticmethod
+    def create_anomaly_notifications(
+        db: Session,
+        alerts: Iterable["AnomalyAlert"],
+    ) -> int:
+        """
+        Notify every holder of the flagged tickers, in one INSERT ... SELECT
+
+        The alerts become an inline row set joined to open positions, so
+        the number of statements does not grow with users or tickers. A
+        holder who already got the same alert for the asset today is
+        skipped, which makes repeated scans idempotent.
+
+        Args:
+            db: Database session
+            alerts: Anomaly alerts (one per ticker and anomaly type)
+
+        Returns:
+            Number of notifications created
+        """
+        rows = [
+            select(
+                literal(alert.ticker.upper()).label("ticker"),
+                literal(f"Anomalia de {alert.anomaly_type} em {alert.ticker.upper()}").label("title"),
+                literal(alert.message).label("message"),
+            )
+            for alert in alerts
+        ]
+        if not rows:
+            return 0
+
+        flagged = (union_all(*rows) if len(rows) > 1 else rows[0]).subquery("flagged")
+        today = datetime.now().date()
+        already_sent = exists().where(
+            Notification.user_id == AssetPosition.user_id,
+            Notification.asset_id == Asset.id,
+            Notification.type == NotificationType.ALERT,
+            Notification.title == flagged.c.title,
+            Notification.created_at >= today,
+        )
+        holders = (
+            select(
+                AssetPosition.user_id,
+                literal(NotificationType.ALERT, Notification.type.type),
+                flagged.c.title,
+                flagged.c.message,
+                Asset.id,
+                literal(False),
+            )
+            .select_from(flagged)
+            .join(Asset, Asset.ticker == flagged.c.ticker)
+            .join(AssetPosition, and_(AssetPosition.asset_id == Asset.id, AssetPosition.quantity > 0))
+            .where(~already_sent)
+            .distinct()
+        )
+
+        result = db.execute(
+            insert(Notification).from_select(
+                ["user_id", "type", "title", "message", "asset_id", "is_read"],
+                holders,
+            )
+        )
+        db.commit()
+
+        created = max(result.rowcount or 0, 0)
+        logger.info(f"Created {created} anomaly notifications from {len(rows)} alerts")
+        return created
+
     @staticmethod
     def mark_as_read(
         db: Session,
@@ -0,0 +1,221 @@
+"""
+Optimizer Service
+
+Long-only allocations of a set of tickers from the cached returns and
+covariance of RiskService (annualized):
+
+- Mean-variance efficient frontier, traced by sweeping the risk aversion
+  of  min 0.5 w'Σw - t μ'w  over the box 0 <= w <= max_weight, sum w = 1
+- Minimum-variance weights (the t = 0 end of the frontier)
+- Risk-parity weights (every position contributes the same volatility),
+  projected onto the same box when a weight exceeds max_weight
+
+The quadratic programs are solved with accelerated projected gradient;
+projecting onto the capped simplex is a one-dimensional bisection, so no
+external solver is needed. Results depend only on the ticker set, so they
+are cached per ticker set, lookback and bound.
+"""
+import numpy as np
+from datetime import date, datetime
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.services.risk_service import RiskService
+
+
+def project_capped_simplex(v: np.ndarray, upper: float) -> np.ndarray:
+    """Euclidean projection of v onto {w : 0 <= w <= upper, sum w = 1}"""
+    lo, hi = float(v.min()) - upper, float(v.max())
+    for _ in range(100):
+        tau = (lo + hi) / 2
+        total = np.clip(v - tau, 0.0, upper).sum()
+        if total > 1.0:
+            lo = tau
+        else:
+            hi = tau
+        if hi - lo < 1e-12:
+            break
+    return np.clip(v - (lo + hi) / 2, 0.0, upper)
+
+
+def solve_box_qp(
+    cov: np.ndarray,
+    linear: np.ndarray,
+    upper: float,
+    start: Optional[np.ndarray] = None,
+    max_iter: int = 5000,
+    tol: float = 1e-10,
+) -> np.ndarray:
+    """
+    Minimize 0.5 w'Σw - linear'w over the capped simplex (FISTA).
+
+    The step is 1 / L with L the largest eigenvalue of Σ, so every step
+    decreases the objective; momentum makes it converge in far fewer
+    iterations than plain projected gradient.
+    """
+    n = cov.shape[0]
+    lipschitz = max(float(np.linalg.eigvalsh(cov)[-1]), 1e-12)
+    w = project_capped_simplex(np.full(n, 1.0 / n) if start is None else start, upper)
+    y, momentum = w.copy(), 1.0
+
+    for _ in range(max_iter):
+        grad = cov @ y - linear
+        w_next = project_capped_simplex(y - grad / lipschitz, upper)
+        momentum_next = (1 + np.sqrt(1 + 4 * momentum ** 2)) / 2
+        y = w_next + (momentum - 1) / momentum_next * (w_next - w)
+        if np.abs(w_next - w).max() < tol:
+            w = w_next
+            break
+        w, momentum = w_next, momentum_next
+    return w
+
+
+def risk_parity_weights(
+    cov: np.ndarray, upper: float = 1.0, max_iter: int = 500, tol: float = 1e-10
+) -> np.ndarray:
+    """
+    Long-only equal-risk-contribution weights, capped at `upper`.
+
+    Cyclical coordinate descent on  0.5 y'Σy - sum(log y) / n, whose
+    minimizer normalized to sum 1 has equal risk contributions; each
+    coordinate update is the positive root of a quadratic. Weights above
+    the cap are projected onto the capped simplex, which spreads the
+    excess over the other positions.
+    """
+    n = cov.shape[0]
+    diag = np.maximum(np.diag(cov), 1e-12)
+    y = 1.0 / np.sqrt(diag)
+    budget = 1.0 / n
+
+    for _ in range(max_iter):
+        previous = y.copy()
+        for i in range(n):
+            others = cov[i] @ y - diag[i] * y[i]
+            y[i] = (-others + np.sqrt(others ** 2 + 4 * diag[i] * budget)) / (2 * diag[i])
+        if np.abs(y - previous).max() < tol * np.abs(y).max():
+            break
+    weights = y / y.sum()
+    if weights.max() > upper:
+        weights = project_capped_simplex(weights, upper)
+    return weights
+
+
+class OptimizerService:
+    """Service for frontier, minimum-variance and risk-parity allocations"""
+
+    DEFAULT_POINTS = 20
+
+    # Keyed by ticker set, lookback, end date, bound and points
+    _cache: Dict[Tuple, Dict[str, Any]] = {}
+    _cache_expiry: Dict[Tuple, float] = {}
+    CACHE_DURATION = RiskService.CACHE_DURATION
+
+    @staticmethod
+    def invalidate() -> None:
+        """Drop every cached optimization"""
+        OptimizerService._cache.clear()
+        OptimizerService._cache_expiry.clear()
+
+    @staticmethod
+    def _describe(weights: np.ndarray, mu: np.ndarray, cov: np.ndarray, tickers: List[str]) -> Dict[str, Any]:
+        volatility = float(np.sqrt(max(weights @ cov @ weights, 0.0)))
+        return {
+            "expected_return": round(float(weights @ mu) * 100, 2),
+            "volatility": round(volatility * 100, 2),
+            "weights": {t: round(float(w) * 100, 2) for t, w in zip(tickers, weights)},
+        }
+
+    @staticmethod
+    def optimize(
+        db: Session,
+        tickers: List[str],
+        lookback_days: int = RiskService.DEFAULT_LOOKBACK_DAYS,
+        max_weight: float = 1.0,
+        points: int = DEFAULT_POINTS,
+        end: Optional[date] = None,
+    ) -> Dict[str, Any]:
+        """
+        Efficient frontier, minimum-variance and risk-parity allocations.
+
+        Returns and volatilities are annualized percentages; weights are
+        percentages per ticker.
+
+        Raises:
+            ValueError: If max_weight makes a fully invested portfolio impossible
+        """
+        end = end or date.today()
+        key = RiskService._matrix_key(tickers, lookback_days, end) + (round(max_weight, 4), points)
+        now = datetime.utcnow().timestamp()
+        if now < OptimizerService._cache_expiry.get(key, 0):
+            return OptimizerService._cache[key]
+
+        stats = RiskService.covariance_matrix(db, tickers, lookback_days=lookback_days, end=end)
+        columns = stats["tickers"]
+        result = {
+            "tickers": columns,
+            "lookback_days": lookback_days,
+            "observations": stats["observations"],
+            "max_weight": max_weight,
+            "without_history": stats["without_history"],
+            "min_variance": None,
+            "risk_parity": None,
+            "frontier": [],
+        }
+
+        if stats["cov"] is not None:
+            if max_weight * len(columns) < 1.0 - 1e-9:
+                raise ValueError(
+                    f"max_weight de {max_weight:.0%} não permite investir 100% em {len(columns)} ativos"
+                )
+
+            mu = stats["mean"] * RiskService.TRADING_DAYS
+            cov = stats["cov"] * RiskService.TRADING_DAYS
+
+            def describe(weights: np.ndarray) -> Dict[str, Any]:
+                return OptimizerService._describe(weights, mu, cov, columns)
+
+            min_var = solve_box_qp(cov, np.zeros(len(columns)), max_weight)
+            result["min_variance"] = describe(min_var)
+            result["risk_parity"] = describe(risk_parity_weights(cov, max_weight))
+
+            # Risk aversion grid, scaled so the far end reaches the best-return corner
+            scale = float(np.linalg.eigvalsh(cov)[-1]) / max(float(np.abs(mu).max()), 1e-12)
+            sweep = np.concatenate([[0.0], np.geomspace(1e-3, 1e3, max(points - 1, 1)) * scale])
+            frontier, previous = [], min_var
+            for t in sweep:
+                previous = solve_box_qp(cov, t * mu, max_weight, start=previous)
+                point = describe(previous)
+                if not frontier or abs(point["volatility"] - frontier[-1]["volatility"]) >= 0.01:
+                    frontier.append(point)
+            result["frontier"] = frontier
+
+        OptimizerService._cache[key] = result
+        OptimizerService._cache_expiry[key] = now + OptimizerService.CACHE_DURATION
+        return result
+
+    @staticmethod
+    async def optimize_user(
+        db: Session,
+        user_id: int,
+        lookback_days: int = RiskService.DEFAULT_LOOKBACK_DAYS,
+        max_weight: float = 1.0,
+        points: int = DEFAULT_POINTS,
+    ) -> Dict[str, Any]:
+        """Optimal allocations for the user's tickers, next to the current one"""
+        values = RiskService.holdings(db, user_id)
+        await RiskService.ensure_history(db, values)
+        result = dict(OptimizerService.optimize(
+            db, list(values), lookback_days=lookback_days, max_weight=max_weight, points=points
+        ))
+
+        result["current"] = None
+        stats = RiskService.covariance_matrix(db, values, lookback_days=lookback_days)
+        weights = np.array([values[t] for t in stats["tickers"]])
+        if stats["cov"] is not None and weights.sum() > 0:
+            columns = stats["tickers"]
+            result["current"] = OptimizerService._describe(
+                weights / weights.sum(),
+                stats["mean"] * RiskService.TRADING_DAYS,
+                stats["cov"] * RiskService.TRADING_DAYS,
+                columns,
+            )
+        return result
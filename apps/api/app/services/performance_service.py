@@ -0,0 +1,302 @@
+"""
+Performance Service
+
+Time-weighted (TWR) and money-weighted (MWR / XIRR) returns for the
+portfolio and for each asset, computed from the persisted daily series.
+
+- TWR chain-links daily sub-period returns, neutralizing cash flow timing
+- MWR is the internal rate of return of the period's cash flows, solved
+  with a Newton iteration vectorized over many periods/assets at once
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Optional
+import numpy as np
+from sqlalchemy.orm import Session
+from app.services.portfolio_history_service import PortfolioHistoryService
+
+
+class PerformanceService:
+    """Service for period returns (TWR and MWR)"""
+
+    PERIODS = ["1m", "6m", "ytd", "1y", "inception"]
+
+    # Cache per user, invalidated when transactions change
+    _cache: Dict[int, Dict[str, Any]] = {}
+    _cache_expiry: Dict[int, float] = {}
+    CACHE_DURATION = 3600  # 1 hour (the nightly job appends a new day)
+
+    @staticmethod
+    def invalidate(user_id: Optional[int] = None) -> None:
+        """Drop cached results of a user (None = every user)"""
+        if user_id is None:
+            PerformanceService._cache.clear()
+            PerformanceService._cache_expiry.clear()
+        else:
+            PerformanceService._cache.pop(user_id, None)
+            PerformanceService._cache_expiry.pop(user_id, None)
+
+    @staticmethod
+    def period_start(period: str, today: date) -> Optional[date]:
+        """First day of a named period (None = since inception)"""
+        if period == "1m":
+            return today - timedelta(days=30)
+        if period == "6m":
+            return today - timedelta(days=180)
+        if period == "ytd":
+            return date(today.year, 1, 1)
+        if period == "1y":
+            return today - timedelta(days=365)
+        return None
+
+    @staticmethod
+    def twr(values: np.ndarray, flows: np.ndarray, start_values: np.ndarray) -> np.ndarray:
+        """
+        Chain-linked time-weighted return of each column.
+
+        Contributions are assumed at the start of the day and withdrawals
+        at its end, so the daily return is
+        (V_t + F_out) / (V_t-1 + F_in) - 1 and selling out a position
+        still earns the move up to the sale. Days with no capital count
+        as 0%.
+
+        Args:
+            values: (days x n) end-of-day values
+            flows: (days x n) net cash flows (buys - sells)
+            start_values: (n,) values at the end of the day before the period
+        """
+        previous = np.vstack([start_values[None, :], values[:-1]])
+        base = previous + np.maximum(flows, 0.0)
+        end = values - np.minimum(flows, 0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            daily = np.where(base > 0, end / base - 1.0, 0.0)
+        return np.prod(1.0 + daily, axis=0) - 1.0
+
+    @staticmethod
+    def xirr(
+        amounts: np.ndarray,
+        years: np.ndarray,
+        guess: float = 0.1,
+        tol: float = 1e-9,
+        max_iter: int = 100,
+    ) -> np.ndarray:
+        """
+        Annualized internal rate of return of each row of cash flows.
+
+        Solves sum(a * (1 + r) ** -t) = 0 with Newton's method for every
+        row at once.
+
+        Args:
+            amounts: (n x m) cash flows from the investor's view
+                (contributions negative, withdrawals/final value positive)
+            years: (n x m) or (m,) time of each flow in years
+
+        Returns:
+            (n,) rates, NaN where there is no solution (no sign change)
+        """
+        amounts = np.atleast_2d(amounts)
+        years = np.broadcast_to(years, amounts.shape)
+        rate = np.full(amounts.shape[0], guess)
+
+        solvable = (amounts > 0).any(axis=1) & (amounts < 0).any(axis=1)
+        with np.errstate(over="ignore", divide="ignore", invalid="ignore"):
+            for _ in range(max_iter):
+                base = 1.0 + rate[:, None]
+                discounted = amounts * base ** -years
+                f = discounted.sum(axis=1)
+                df = (-years * discounted / base).sum(axis=1)
+                step = np.where(df != 0, f / df, 0.0)
+                step = np.nan_to_num(step)
+                rate = np.maximum(rate - step, -0.9999)
+                if np.all(np.abs(step[solvable]) < tol):
+                    break
+
+            base = 1.0 + rate[:, None]
+            residual = np.abs((amounts * base ** -years).sum(axis=1))
+        scale = np.abs(amounts).sum(axis=1)
+        converged = solvable & (residual <= 1e-6 * np.maximum(scale, 1.0))
+        return np.where(converged, rate, np.nan)
+
+    @staticmethod
+    def mwr(
+        values: np.ndarray,
+        flows: np.ndarray,
+        start_values: np.ndarray,
+        first_days: np.ndarray,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Money-weighted return of each column over its own period.
+
+        The period of column j starts at row first_days[j] and ends at the
+        last row; its initial value counts as a contribution at time 0.
+
+        Returns:
+            Dict with annualized (`annualized`) and period (`period`) rates
+        """
+        n_days, n = values.shape
+        days = np.arange(n_days)
+
+        # Columns: start value, one flow per day, final value
+        amounts = np.zeros((n, n_days + 2))
+        years = np.zeros((n, n_days + 2))
+        active = days[None, :] >= first_days[:, None]
+        amounts[:, 0] = -start_values
+        amounts[:, 1:-1] = np.where(active, -flows.T, 0.0)
+        amounts[:, -1] = values[-1]
+        years[:, 1:-1] = np.maximum(days[None, :] - first_days[:, None], 0) / 365.0
+        span = (n_days - first_days) / 365.0
+        years[:, -1] = span
+
+        annualized = PerformanceService.xirr(amounts, years)
+        with np.errstate(invalid="ignore"):
+            period = (1.0 + annualized) ** span - 1.0
+        return {"annualized": annualized, "period": period}
+
+    @staticmethod
+    async def get_portfolio_performance(
+        db: Session,
+        user_id: int,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> Dict[str, Any]:
+        """
+        Portfolio TWR/MWR for the standard periods, or for [start, end]
+        when a custom range is given.
+        """
+        custom = start is not None or end is not None
+        key = f"portfolio:{start}:{end}"
+        cached = PerformanceService._get_cached(user_id, key)
+        if cached is not None:
+            return cached
+
+        await PortfolioHistoryService.ensure(db, user_id)
+        today = date.today()
+        end = min(end or today, today)
+        rows = PortfolioHistoryService.get_range(db, user_id, date.min, end)
+        if not rows:
+            result = {"end": end.isoformat(), "periods": {}}
+            return PerformanceService._set_cached(user_id, key, result)
+
+        dates = [row.date for row in rows]
+        values = np.array([row.value for row in rows])
+        flows = np.array([row.net_cash_flow for row in rows])
+        inception = dates[0]
+
+        if custom:
+            periods = {"custom": max(start or inception, inception)}
+        else:
+            periods = {
+                period: max(PerformanceService.period_start(period, end) or inception, inception)
+                for period in PerformanceService.PERIODS
+            }
+
+        names = list(periods)
+        first_days = np.array([(periods[name] - inception).days for name in names])
+        first_days = np.clip(first_days, 0, len(dates) - 1)
+        start_values = np.where(first_days > 0, values[first_days - 1], 0.0)
+
+        # One column per period: days before the period are held flat at its
+        # start value with no flows, so they chain-link as 0%
+        active = np.arange(len(dates))[:, None] >= first_days[None, :]
+        period_flows = np.where(active, flows[:, None], 0.0)
+
+        twr = PerformanceService.twr(
+            np.where(active, values[:, None], start_values[None, :]),
+            period_flows,
+            start_values,
+        )
+        mwr = PerformanceService.mwr(
+            np.repeat(values[:, None], len(names), axis=1),
+            period_flows,
+            start_values,
+            first_days,
+        )
+
+        result = {
+            "end": end.isoformat(),
+            "inception": inception.isoformat(),
+            "periods": {
+                name: {
+                    "start": dates[first_days[i]].isoformat(),
+                    "start_value": round(float(start_values[i]), 2),
+                    "end_value": round(float(values[-1]), 2),
+                    "net_cash_flow": round(float(period_flows[:, i].sum()), 2),
+                    "twr": PerformanceService._pct(twr[i]),
+                    "mwr": PerformanceService._pct(mwr["period"][i]),
+                    "mwr_annualized": PerformanceService._pct(mwr["annualized"][i]),
+                }
+                for i, name in enumerate(names)
+            },
+        }
+        return PerformanceService._set_cached(user_id, key, result)
+
+    @staticmethod
+    async def get_asset_performance(db: Session, user_id: int, period: str = "1y") -> List[Dict[str, Any]]:
+        """TWR/MWR of every asset held during a standard period"""
+        key = f"assets:{period}"
+        cached = PerformanceService._get_cached(user_id, key)
+        if cached is not None:
+            return cached
+
+        await PortfolioHistoryService.ensure(db, user_id)
+        today = date.today()
+        start = PerformanceService.period_start(period, today)
+        if start is None:
+            rows = PortfolioHistoryService.get_range(db, user_id, date.min, today)
+            if not rows:
+                return PerformanceService._set_cached(user_id, key, [])
+            start = rows[0].date
+
+        # One extra day before the period gives each asset's start value
+        grid = PortfolioHistoryService.replay_grid(db, user_id, start - timedelta(days=1), today)
+        tickers = grid["tickers"]
+        if not tickers:
+            return PerformanceService._set_cached(user_id, key, [])
+
+        values = grid["values"][1:]
+        flows = grid["flows"][1:]
+        start_values = grid["values"][0]
+
+        twr = PerformanceService.twr(values, flows, start_values)
+        mwr = PerformanceService.mwr(
+            values, flows, start_values, np.zeros(len(tickers), dtype=np.int64)
+        )
+
+        held = (values > 0).any(axis=0) | (start_values > 0)
+        result = [
+            {
+                "ticker": ticker,
+                "start_value": round(float(start_values[j]), 2),
+                "end_value": round(float(values[-1, j]), 2),
+                "net_cash_flow": round(float(flows[:, j].sum()), 2),
+                "twr": PerformanceService._pct(twr[j]),
+                "mwr": PerformanceService._pct(mwr["period"][j]),
+                "mwr_annualized": PerformanceService._pct(mwr["annualized"][j]),
+            }
+            for j, ticker in enumerate(tickers)
+            if held[j]
+        ]
+        result.sort(key=lambda item: item["end_value"], reverse=True)
+        return PerformanceService._set_cached(user_id, key, result)
+
+    @staticmethod
+    def _pct(rate: float) -> Optional[float]:
+        """Rate as a rounded percentage (None when undefined)"""
+        if rate is None or not np.isfinite(rate):
+            return None
+        return round(float(rate) * 100, 2)
+
+    @staticmethod
+    def _get_cached(user_id: int, key: str) -> Optional[Any]:
+        now = datetime.utcnow().timestamp()
+        if now >= PerformanceService._cache_expiry.get(user_id, 0):
+            PerformanceService.invalidate(user_id)
+            return None
+        return PerformanceService._cache.get(user_id, {}).get(key)
+
+    @staticmethod
+    def _set_cached(user_id: int, key: str, result: Any) -> Any:
+        now = datetime.utcnow().timestamp()
+        if user_id not in PerformanceService._cache_expiry:
+            PerformanceService._cache_expiry[user_id] = now + PerformanceService.CACHE_DURATION
+        PerformanceService._cache.setdefault(user_id, {})[key] = result
+        return result
@@ -0,0 +1,82 @@
+"""
+Portfolio change hooks
+
+Called after writes to positions or prices so that materialized data
+derived from them (snapshots, caches) stays in sync. Every hook bumps the
+affected users' `data_version`, which keys the cached read responses.
+"""
+from datetime import date
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from typing import Iterable, Optional
+from app.models.user import User
+from app.services.portfolio_snapshot_service import PortfolioSnapshotService
+from app.services.portfolio_history_service import PortfolioHistoryService
+from app.services.position_checkpoint_service import PositionCheckpointService
+from app.services.performance_service import PerformanceService
+from app.services.tax_service import TaxService
+from app.services.proceeds_service import ProceedsService
+
+
+def bump_data_version(db: Session, user_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Invalidate the cached read responses of the given users
+
+    Args:
+        db: Database session
+        user_ids: Affected users (None = every user)
+    """
+    statement = update(User).values(data_version=User.data_version + 1)
+    if user_ids is not None:
+        user_ids = list(set(user_ids))
+        if not user_ids:
+            return
+        statement = statement.where(User.id.in_(user_ids))
+    db.execute(statement.execution_options(synchronize_session=False))
+    db.commit()
+
+
+def on_positions_changed(db: Session, user_id: int) -> None:
+    """A user's positions (quantities, costs or prices) were rewritten"""
+    bump_data_version(db, [user_id])
+    PortfolioSnapshotService.refresh(db, user_id)
+
+
+def on_transactions_changed(
+    db: Session,
+    user_id: int,
+    since: Optional[date] = None,
+    asset_ids: Optional[Iterable[int]] = None,
+) -> None:
+    """
+    Transactions of `asset_ids` dated on or after `since` were added or removed
+
+    Positions are refreshed, the daily value series is backfilled from
+    `since`, cached returns are dropped, the affected sales are re-booked
+    in the tax ledger and position checkpoints from `since` on are
+    dropped. Users without a series yet get it built on first read.
+    """
+    on_positions_changed(db, user_id)
+    PositionCheckpointService.invalidate(db, user_id, since=since)
+    TaxService.on_transactions_changed(db, user_id, asset_ids=asset_ids, since=since)
+    if PortfolioHistoryService.has_history(db, user_id):
+        PortfolioHistoryService.backfill(db, user_id, since=since)
+    PerformanceService.invalidate(user_id)
+
+
+def on_proceeds_changed(db: Session, user_id: int, since: Optional[date] = None) -> None:
+    """Proceeds dated on or after `since` were added or removed"""
+    bump_data_version(db, [user_id])
+    ProceedsService.on_proceeds_changed(db, user_id, since=since)
+
+
+def on_prices_changed(db: Session, user_ids: Optional[Iterable[int]] = None) -> None:
+    """
+    Current prices were updated for the given users' positions
+
+    Args:
+        db: Database session
+        user_ids: Affected users (None = every user holding a position)
+    """
+    bump_data_version(db, user_ids)
+    PortfolioSnapshotService.refresh_many(db, user_ids)
@@ -0,0 +1,369 @@
+"""
+Portfolio History Service
+
+Maintains the persisted daily portfolio value series (`portfolio_daily_values`).
+
+- Transaction edits backfill the series from the edited date
+- The nightly job appends the new day (and re-prices days that got new bars)
+- History charts read the series with a range scan
+"""
+from collections import defaultdict
+import numpy as np
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.models.asset import Asset, AssetType
+from app.models.position import AssetPosition
+from app.models.portfolio_history import PortfolioDailyValue
+from app.models.price_history import PriceBar
+from app.models.transaction import Transaction, TransactionType
+from app.services.corporate_action_service import CorporateActionService
+from app.services.price_history_service import PriceHistoryService
+from app.core.logging import logger
+
+
+def _as_date(value) -> date:
+    """Transaction dates are DateTime columns but may hold plain dates"""
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _forward_fill(grid: np.ndarray) -> np.ndarray:
+    """Carry the last non-NaN value of each column down the rows"""
+    rows = np.where(np.isnan(grid), 0, np.arange(grid.shape[0])[:, None])
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return grid[rows, np.arange(grid.shape[1])]
+
+
+class PortfolioHistoryService:
+    """Service for the persisted daily portfolio value series"""
+
+    @staticmethod
+    def get_range(db: Session, user_id: int, start: date, end: date) -> List[PortfolioDailyValue]:
+        """Stored daily values of a user between start and end (inclusive)"""
+        return (
+            db.query(PortfolioDailyValue)
+            .filter(
+                PortfolioDailyValue.user_id == user_id,
+                PortfolioDailyValue.date >= start,
+                PortfolioDailyValue.date <= end,
+            )
+            .order_by(PortfolioDailyValue.date.asc())
+            .all()
+        )
+
+    @staticmethod
+    def last_stored_date(db: Session, user_id: int) -> Optional[date]:
+        """Date of the user's most recent stored value"""
+        row = (
+            db.query(PortfolioDailyValue.date)
+            .filter(PortfolioDailyValue.user_id == user_id)
+            .order_by(PortfolioDailyValue.date.desc())
+            .first()
+        )
+        return row[0] if row else None
+
+    @staticmethod
+    def backfill(db: Session, user_id: int, since: Optional[date] = None) -> int:
+        """
+        Rebuild the user's daily values from `since` (None = full history) to today.
+
+        Prices come from the local price store only; days without a stored
+        bar fall back to the last known close or transaction price.
+
+        Returns:
+            Number of daily rows written
+        """
+        if since:
+            since = _as_date(since)
+
+        delete_query = db.query(PortfolioDailyValue).filter(
+            PortfolioDailyValue.user_id == user_id
+        )
+        if since:
+            delete_query = delete_query.filter(PortfolioDailyValue.date >= since)
+        delete_query.delete(synchronize_session=False)
+
+        transactions = PortfolioHistoryService._load_transactions(db, user_id)
+        end = date.today()
+        if not transactions:
+            db.commit()
+            return 0
+
+        start = _as_date(transactions[0][0].date)
+        if since and since > start:
+            start = since
+        if start > end:
+            db.commit()
+            return 0
+
+        tickers = {ticker for _, ticker in transactions}
+        closes = PriceHistoryService.load_closes(db, tickers, start, end)
+        rows = PortfolioHistoryService._replay(transactions, closes, start, end)
+
+        db.bulk_insert_mappings(
+            PortfolioDailyValue, [{"user_id": user_id, **row} for row in rows]
+        )
+        db.commit()
+        return len(rows)
+
+    @staticmethod
+    def append_day(db: Session, user_id: int, new_bars_since: Optional[date] = None) -> int:
+        """
+        Append today's value, re-pricing from `new_bars_since` if older
+        stored days just received price bars.
+        """
+        today = date.today()
+        last = PortfolioHistoryService.last_stored_date(db, user_id)
+        if last is None:
+            return PortfolioHistoryService.backfill(db, user_id)
+
+        since = min(last + timedelta(days=1), today)
+        if new_bars_since and new_bars_since < since:
+            since = new_bars_since
+        return PortfolioHistoryService.backfill(db, user_id, since=since)
+
+    @staticmethod
+    def has_history(db: Session, user_id: int) -> bool:
+        """Whether the user's series has already been built"""
+        return PortfolioHistoryService.last_stored_date(db, user_id) is not None
+
+    @staticmethod
+    async def ensure(db: Session, user_id: int) -> None:
+        """
+        Build the series on first access, fetching price history for
+        every ticker the user ever traded into the local store.
+        """
+        if PortfolioHistoryService.has_history(db, user_id):
+            return
+
+        transactions = PortfolioHistoryService._load_transactions(db, user_id)
+        if not transactions:
+            return
+
+        first_day = _as_date(transactions[0][0].date)
+        tickers = {ticker for _, ticker in transactions}
+        await PriceHistoryService.refresh(
+            db, tickers, range=PortfolioHistoryService._range_covering(first_day)
+        )
+        PortfolioHistoryService.backfill(db, user_id)
+
+    @staticmethod
+    async def run_nightly(db: Session) -> Dict[str, int]:
+        """
+        Nightly job: refresh bars for held tickers and append the new
+        day to every user's series.
+        """
+        held = (
+            db.query(Asset.ticker)
+            .join(AssetPosition, AssetPosition.asset_id == Asset.id)
+            .filter(AssetPosition.quantity > 0, Asset.type != AssetType.RENDA_FIXA)
+            .distinct()
+            .all()
+        )
+        held = {t for (t,) in held}
+        known = {
+            t for (t,) in db.query(PriceBar.ticker)
+            .filter(PriceBar.ticker.in_(held))
+            .distinct()
+            .all()
+        }
+
+        new_since = {}
+        if known:
+            new_since.update(await PriceHistoryService.refresh(db, known, range="5d"))
+        if held - known:
+            new_since.update(await PriceHistoryService.refresh(db, held - known, range="1y"))
+
+        user_tickers = defaultdict(set)
+        rows = (
+            db.query(Transaction.user_id, Asset.ticker)
+            .join(Asset, Asset.id == Transaction.asset_id)
+            .distinct()
+            .all()
+        )
+        for user_id, ticker in rows:
+            user_tickers[user_id].add(ticker)
+
+        written = 0
+        for user_id, tickers in user_tickers.items():
+            repriced = [new_since[t] for t in tickers if new_since.get(t)]
+            written += PortfolioHistoryService.append_day(
+                db, user_id, new_bars_since=min(repriced) if repriced else None
+            )
+
+        logger.info(
+            f"Portfolio history nightly job: {len(user_tickers)} users, {written} rows",
+            extra={"users": len(user_tickers), "rows": written},
+        )
+        return {"users": len(user_tickers), "rows": written}
+
+    @staticmethod
+    def _load_transactions(db: Session, user_id: int) -> List[Tuple[Transaction, str]]:
+        """All user transactions with their ticker, oldest first, in today's shares"""
+        rows = (
+            db.query(Transaction, Asset.ticker)
+            .join(Asset, Asset.id == Transaction.asset_id)
+            .filter(Transaction.user_id == user_id)
+            .order_by(Transaction.date.asc(), Transaction.id.asc())
+            .all()
+        )
+        tickers = [ticker for _, ticker in rows]
+        adjusted = CorporateActionService.adjust_transactions(db, [tx for tx, _ in rows], tickers)
+        return list(zip(adjusted, tickers))
+
+    @staticmethod
+    def _range_covering(first_day: date) -> str:
+        """Smallest BrAPI range that covers history since first_day"""
+        days = (date.today() - first_day).days
+        for limit, brapi_range in [
+            (30, "1mo"), (90, "3mo"), (180, "6mo"), (365, "1y"), (730, "2y"), (1825, "5y")
+        ]:
+            if days <= limit:
+                return brapi_range
+        return "max"
+
+    @staticmethod
+    def replay_grid(db: Session, user_id: int, start: date, end: date) -> Dict[str, Any]:
+        """Per-ticker replay of the user's transactions (see `_replay_grid`)"""
+        transactions = PortfolioHistoryService._load_transactions(db, user_id)
+        tickers = {ticker for _, ticker in transactions}
+        closes = PriceHistoryService.load_closes(db, tickers, start, end)
+        return PortfolioHistoryService._replay_grid(transactions, closes, start, end)
+
+    @staticmethod
+    def _replay(
+        transactions: List[Tuple[Transaction, str]],
+        closes: Dict[str, Dict[date, float]],
+        start: date,
+        end: date,
+    ) -> List[Dict[str, Any]]:
+        """Replay transactions and value the portfolio for each day in [start, end]"""
+        grid = PortfolioHistoryService._replay_grid(transactions, closes, start, end)
+
+        values = np.round(grid["values"].sum(axis=1), 2).tolist()
+        invested = np.round(grid["invested"].sum(axis=1), 2).tolist()
+        day_flows = np.round(grid["flows"].sum(axis=1), 2).tolist()
+        return [
+            {
+                "date": start + timedelta(days=i),
+                "value": values[i],
+                "invested": invested[i],
+                "net_cash_flow": day_flows[i],
+            }
+            for i in range(len(values))
+        ]
+
+    @staticmethod
+    def _replay_grid(
+        transactions: List[Tuple[Transaction, str]],
+        closes: Dict[str, Dict[date, float]],
+        start: date,
+        end: date,
+    ) -> Dict[str, Any]:
+        """
+        Replay transactions over a (days x tickers) grid for [start, end].
+
+        - quantities and cost basis are cumulative sums of per-transaction deltas
+        - prices are closes forward-filled, falling back to the last
+          transaction price while a ticker has no close yet
+        - the daily value is the product of both matrices
+
+        Only the average cost of sells is computed sequentially, in one
+        O(transactions) pass.
+
+        Returns:
+            Dict with `tickers` (column order) and the `values`, `invested`
+            and `flows` (net cash flow) matrices
+        """
+        n_days = (end - start).days + 1
+        tickers = sorted({ticker for _, ticker in transactions} | set(closes))
+        column = {ticker: j for j, ticker in enumerate(tickers)}
+        shape = (n_days, len(tickers))
+
+        n_tx = len(transactions)
+        tx_rows = np.empty(n_tx, dtype=np.int64)
+        tx_cols = np.empty(n_tx, dtype=np.int64)
+        tx_prices = np.empty(n_tx)
+        qty_deltas = np.empty(n_tx)
+        cost_deltas = np.empty(n_tx)
+        flows = np.empty(n_tx)
+        in_range = np.ones(n_tx, dtype=bool)  # Counts towards the day's cash flow
+        applied = np.ones(n_tx, dtype=bool)  # Counts towards positions
+
+        # Average cost method: a sell removes avg_cost * quantity from the basis
+        quantities: Dict[str, float] = defaultdict(float)
+        costs: Dict[str, float] = defaultdict(float)
+        for k, (tx, ticker) in enumerate(transactions):
+            offset = (_as_date(tx.date) - start).days
+            if offset > n_days - 1:
+                in_range[k] = applied[k] = False
+                offset = n_days - 1
+            elif offset < 0:
+                # Before the range: fold into the first row, but not into its cash flow
+                in_range[k] = False
+                offset = 0
+            tx_rows[k] = offset
+            tx_cols[k] = column[ticker]
+            tx_prices[k] = tx.price
+
+            fees = tx.fees or 0.0
+            if tx.type == TransactionType.BUY:
+                cost_delta = tx.quantity * tx.price + fees
+                qty_delta = tx.quantity
+                flows[k] = tx.quantity * tx.price + fees
+            else:
+                cost_delta = 0.0
+                if quantities[ticker] > 0:
+                    avg_cost = costs[ticker] / quantities[ticker]
+                    cost_delta = -min(costs[ticker], avg_cost * tx.quantity)
+                qty_delta = -tx.quantity
+                flows[k] = -(tx.quantity * tx.price - fees)
+            quantities[ticker] += qty_delta
+            costs[ticker] += cost_delta
+            qty_deltas[k] = qty_delta
+            cost_deltas[k] = cost_delta
+
+        qty = np.zeros(shape)
+        cost = np.zeros(shape)
+        np.add.at(qty, (tx_rows[applied], tx_cols[applied]), qty_deltas[applied])
+        np.add.at(cost, (tx_rows[applied], tx_cols[applied]), cost_deltas[applied])
+        qty = np.cumsum(qty, axis=0)
+        cost = np.cumsum(cost, axis=0)
+
+        # Prices: closes forward-filled, seeded with the last close before start
+        close_grid = np.full(shape, np.nan)
+        for ticker, series in closes.items():
+            if not series:
+                continue
+            j = column[ticker]
+            offsets = np.fromiter(
+                (d.toordinal() for d in series), dtype=np.int64, count=len(series)
+            ) - start.toordinal()
+            values = np.fromiter(series.values(), dtype=float, count=len(series))
+            inside = (offsets >= 0) & (offsets < n_days)
+            close_grid[offsets[inside], j] = values[inside]
+            before = offsets < 0
+            if before.any() and np.isnan(close_grid[0, j]):
+                close_grid[0, j] = values[before][np.argmax(offsets[before])]
+
+        # Last transaction price per cell (transactions are in date order)
+        tx_price_grid = np.full(shape, np.nan)
+        cells = tx_rows[applied] * len(tickers) + tx_cols[applied]
+        _, last = np.unique(cells[::-1], return_index=True)
+        last = len(cells) - 1 - last
+        tx_price_grid.flat[cells[last]] = tx_prices[applied][last]
+
+        close_grid = _forward_fill(close_grid)
+        prices = np.where(np.isnan(close_grid), _forward_fill(tx_price_grid), close_grid)
+        prices = np.nan_to_num(prices)
+
+        held = qty > 0
+        flow_grid = np.zeros(shape)
+        np.add.at(flow_grid, (tx_rows[in_range], tx_cols[in_range]), flows[in_range])
+
+        return {
+            "tickers": tickers,
+            "values": np.where(held, qty, 0.0) * prices,
+            "invested": np.where(held, cost, 0.0),
+            "flows": flow_grid,
+        }
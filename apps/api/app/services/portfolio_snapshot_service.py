@@ -0,0 +1,138 @@
+"""
+Portfolio Snapshot Service
+
+Maintains the materialized per-user portfolio overview (totals, allocation
+by type/sector and top positions) read by `/portfolio/overview`.
+"""
+from sqlalchemy.orm import Session
+from typing import Dict, Any, Iterable, List, Optional
+from app.models.asset import Asset
+from app.models.position import AssetPosition
+from app.models.portfolio_snapshot import PortfolioSnapshot
+from app.core.logging import logger
+
+
+class PortfolioSnapshotService:
+    """Service for building and reading portfolio snapshots"""
+
+    TOP_POSITIONS = 5
+
+    @staticmethod
+    def get_or_build(db: Session, user_id: int) -> PortfolioSnapshot:
+        """Return the user's snapshot, building it on first access"""
+        snapshot = (
+            db.query(PortfolioSnapshot)
+            .filter(PortfolioSnapshot.user_id == user_id)
+            .first()
+        )
+        if snapshot is None:
+            snapshot = PortfolioSnapshotService.refresh(db, user_id)
+        return snapshot
+
+    @staticmethod
+    def refresh(db: Session, user_id: int) -> PortfolioSnapshot:
+        """Recompute the snapshot of a single user"""
+        return PortfolioSnapshotService.refresh_many(db, [user_id])[user_id]
+
+    @staticmethod
+    def refresh_many(
+        db: Session, user_ids: Optional[Iterable[int]] = None
+    ) -> Dict[int, PortfolioSnapshot]:
+        """
+        Recompute snapshots for several users with a single positions query.
+
+        Args:
+            db: Database session
+            user_ids: Users to refresh (None = every user holding a position)
+
+        Returns:
+            Dict mapping user_id to its refreshed snapshot
+        """
+        query = db.query(AssetPosition, Asset).join(
+            Asset, Asset.id == AssetPosition.asset_id
+        )
+        if user_ids is not None:
+            user_ids = list(set(user_ids))
+            if not user_ids:
+                return {}
+            query = query.filter(AssetPosition.user_id.in_(user_ids))
+
+        rows_by_user: Dict[int, List] = {uid: [] for uid in (user_ids or [])}
+        for position, asset in query.all():
+            rows_by_user.setdefault(position.user_id, []).append((position, asset))
+
+        existing = {
+            s.user_id: s
+            for s in db.query(PortfolioSnapshot)
+            .filter(PortfolioSnapshot.user_id.in_(list(rows_by_user.keys())))
+            .all()
+        }
+
+        snapshots = {}
+        for uid, rows in rows_by_user.items():
+            snapshot = existing.get(uid)
+            if snapshot is None:
+                snapshot = PortfolioSnapshot(user_id=uid)
+                db.add(snapshot)
+            PortfolioSnapshotService._apply(snapshot, rows)
+            snapshots[uid] = snapshot
+
+        db.commit()
+        logger.debug(f"Refreshed portfolio snapshots for {len(snapshots)} users")
+        return snapshots
+
+    @staticmethod
+    def to_overview(snapshot: PortfolioSnapshot) -> Dict[str, Any]:
+        """Format a snapshot as the `/portfolio/overview` payload"""
+        return {
+            "total_value": round(snapshot.total_value, 2),
+            "total_invested": round(snapshot.total_invested, 2),
+            "profit_loss": round(snapshot.profit_loss, 2),
+            "profit_loss_percentage": round(snapshot.profit_loss_percentage, 2),
+            "allocation_by_type": snapshot.allocation_by_type or [],
+            "allocation_by_sector": snapshot.allocation_by_sector or [],
+            "top_positions": snapshot.top_positions or [],
+            "positions_count": snapshot.positions_count,
+        }
+
+    @staticmethod
+    def _apply(snapshot: PortfolioSnapshot, rows: List) -> None:
+        """Fill snapshot fields from (position, asset) rows"""
+        total_value = sum(p.total_value for p, _ in rows)
+        total_invested = sum(p.total_invested for p, _ in rows)
+
+        def pct(value: float) -> float:
+            return round((value / total_value * 100) if total_value > 0 else 0, 2)
+
+        by_type: Dict[str, float] = {}
+        by_sector: Dict[str, float] = {}
+        for position, asset in rows:
+            asset_type = asset.type.value
+            by_type[asset_type] = by_type.get(asset_type, 0.0) + position.total_value
+            if asset.sector:
+                by_sector[asset.sector] = by_sector.get(asset.sector, 0.0) + position.total_value
+
+        top = sorted(rows, key=lambda r: r[0].total_value, reverse=True)
+        top = top[:PortfolioSnapshotService.TOP_POSITIONS]
+
+        snapshot.total_value = total_value
+        snapshot.total_invested = total_invested
+        snapshot.positions_count = len(rows)
+        snapshot.allocation_by_type = [
+            {"type": name, "value": value, "percentage": pct(value)}
+            for name, value in by_type.items()
+        ]
+        snapshot.allocation_by_sector = [
+            {"sector": name, "value": value, "percentage": pct(value)}
+            for name, value in by_sector.items()
+        ]
+        snapshot.top_positions = [
+            {
+                "ticker": asset.ticker,
+                "name": asset.name,
+                "value": round(position.total_value, 2),
+                "percentage": pct(position.total_value),
+                "profit_loss_percentage": round(position.profit_loss_percentage, 2),
+            }
+            for position, asset in top
+        ]
@@ -0,0 +1,258 @@
+"""
+Position Checkpoint Service
+
+Point-in-time positions ("what did I hold on date X") without replaying
+the whole transaction log.
+
+- Month-end checkpoints (`position_checkpoints`) store the quantity and
+  cost basis of every asset held; the nightly job appends the months
+  closed since each user's last checkpoint
+- An as-of query loads the nearest checkpoint on or before the date and
+  applies only the transactions after it
+- Transaction edits drop the checkpoints from the edited date on, so they
+  are rebuilt from the last one still valid
+- Checkpoints keep the shares of their own date and corporate actions are
+  applied when reading, so a new action only invalidates checkpoints from
+  its ex-date on
+"""
+import calendar
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.asset import Asset
+from app.models.position import PositionCheckpoint
+from app.models.transaction import Transaction, TransactionType
+from app.services.corporate_action_service import CorporateActionService
+from app.services.price_history_service import PriceHistoryService
+from app.core.logging import logger
+
+# asset_id -> [ticker, quantity (today's shares), cost basis]
+Holdings = Dict[int, List[Any]]
+
+
+def _as_date(value) -> date:
+    """Transaction dates are DateTime columns but may hold plain dates"""
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _end_of(day: date) -> datetime:
+    """First instant after `day`, the exclusive bound of its transactions"""
+    return datetime.combine(day + timedelta(days=1), time.min)
+
+
+class PositionCheckpointService:
+    """Service for month-end position checkpoints and as-of positions"""
+
+    @staticmethod
+    def month_ends(start: date, end: date) -> List[date]:
+        """Last days of the months ending between start and end (inclusive)"""
+        ends = []
+        year, month = start.year, start.month
+        while True:
+            last = date(year, month, calendar.monthrange(year, month)[1])
+            if last > end:
+                return ends
+            ends.append(last)
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    @staticmethod
+    def latest(db: Session, user_id: int, on_or_before: Optional[date] = None) -> Optional[date]:
+        """Date of the user's most recent checkpoint (on or before a date)"""
+        query = db.query(func.max(PositionCheckpoint.date)).filter(
+            PositionCheckpoint.user_id == user_id
+        )
+        if on_or_before:
+            query = query.filter(PositionCheckpoint.date <= on_or_before)
+        return query.scalar()
+
+    @staticmethod
+    def invalidate(db: Session, user_id: int, since: Optional[date] = None) -> int:
+        """Drop the user's checkpoints dated on or after `since` (None = all)"""
+        query = db.query(PositionCheckpoint).filter(PositionCheckpoint.user_id == user_id)
+        if since:
+            query = query.filter(PositionCheckpoint.date >= _as_date(since))
+        deleted = query.delete(synchronize_session=False)
+        db.commit()
+        return deleted
+
+    @staticmethod
+    def build(db: Session, user_id: int, until: Optional[date] = None) -> int:
+        """
+        Append the month-end checkpoints closed since the user's last one.
+
+        Args:
+            db: Database session
+            user_id: User ID
+            until: Last day that may be checkpointed (default: yesterday)
+
+        Returns:
+            Number of rows written
+        """
+        until = until or date.today() - timedelta(days=1)
+        last = PositionCheckpointService.latest(db, user_id)
+        if last is None:
+            first = db.query(func.min(Transaction.date)).filter(Transaction.user_id == user_id).scalar()
+            if first is None:
+                return 0
+            start = _as_date(first)
+        else:
+            start = last + timedelta(days=1)
+
+        ends = PositionCheckpointService.month_ends(start, until)
+        if not ends:
+            return 0
+
+        holdings = PositionCheckpointService._load_checkpoint(db, user_id, last) if last else {}
+        deltas = PositionCheckpointService._load_deltas(db, user_id, last, ends[-1])
+
+        rows = []
+        k = 0
+        for end in ends:
+            first_after = k
+            while first_after < len(deltas) and _as_date(deltas[first_after][0].date) <= end:
+                first_after += 1
+            PositionCheckpointService._apply(holdings, deltas[k:first_after])
+            k = first_after
+
+            held = PositionCheckpointService._held(holdings)
+            # Back to the shares of the checkpoint date
+            factors = CorporateActionService.factors(
+                db, [ticker for ticker, _, _ in held.values()], [end] * len(held)
+            )
+            rows.extend(
+                {
+                    "user_id": user_id,
+                    "asset_id": asset_id,
+                    "date": end,
+                    "quantity": round(quantity / factor, 8),
+                    "cost": cost,
+                }
+                for (asset_id, (_, quantity, cost)), factor in zip(held.items(), factors.tolist())
+            )
+
+        db.bulk_insert_mappings(PositionCheckpoint, rows)
+        db.commit()
+        return len(rows)
+
+    @staticmethod
+    async def run_nightly(db: Session) -> Dict[str, int]:
+        """Nightly job: append the month-end checkpoints of every user"""
+        user_ids = [user_id for (user_id,) in db.query(Transaction.user_id).distinct()]
+        written = sum(PositionCheckpointService.build(db, user_id) for user_id in user_ids)
+
+        logger.info(
+            f"Position checkpoints nightly job: {len(user_ids)} users, {written} rows",
+            extra={"users": len(user_ids), "rows": written},
+        )
+        return {"users": len(user_ids), "rows": written}
+
+    @staticmethod
+    def holdings_as_of(db: Session, user_id: int, as_of: date) -> Tuple[Optional[date], Holdings]:
+        """
+        Holdings at the end of `as_of`, in today's shares.
+
+        Returns:
+            Tuple of the checkpoint used (None = replayed from the first
+            transaction) and the assets held
+        """
+        checkpoint = PositionCheckpointService.latest(db, user_id, on_or_before=as_of)
+        holdings = PositionCheckpointService._load_checkpoint(db, user_id, checkpoint) if checkpoint else {}
+        PositionCheckpointService._apply(
+            holdings, PositionCheckpointService._load_deltas(db, user_id, checkpoint, as_of)
+        )
+        return checkpoint, PositionCheckpointService._held(holdings)
+
+    @staticmethod
+    def positions_as_of(db: Session, user_id: int, as_of: date) -> Dict[str, Any]:
+        """
+        Positions at the end of `as_of`, in the shares of that date, valued
+        at the last close on or before it.
+        """
+        checkpoint, holdings = PositionCheckpointService.holdings_as_of(db, user_id, as_of)
+        asset_ids = list(holdings)
+        tickers = [holdings[asset_id][0] for asset_id in asset_ids]
+        assets = {
+            asset.id: asset for asset in db.query(Asset).filter(Asset.id.in_(asset_ids))
+        } if asset_ids else {}
+        closes = PriceHistoryService.load_closes(db, tickers, as_of, as_of)
+        factors = CorporateActionService.factors(db, tickers, [as_of] * len(tickers))
+
+        positions = []
+        for asset_id, factor in zip(asset_ids, factors.tolist()):
+            ticker, quantity, cost = holdings[asset_id]
+            series = closes.get(ticker.upper()) or {}
+            close = series[max(series)] if series else None
+            asset = assets[asset_id]
+            positions.append({
+                "ticker": ticker,
+                "name": asset.name or ticker,
+                "type": asset.type.value,
+                "quantity": round(quantity / factor, 8),
+                "average_price": round(cost / quantity * factor, 2),
+                "total_invested": round(cost, 2),
+                "price": round(close * factor, 2) if close is not None else None,
+                "total_value": round(quantity * close, 2) if close is not None else None,
+            })
+        positions.sort(key=lambda p: p["ticker"])
+
+        return {
+            "date": as_of.isoformat(),
+            "checkpoint": checkpoint.isoformat() if checkpoint else None,
+            "positions": positions,
+            "total_invested": round(sum(p["total_invested"] for p in positions), 2),
+            "total_value": round(sum(p["total_value"] or 0.0 for p in positions), 2),
+        }
+
+    @staticmethod
+    def _load_checkpoint(db: Session, user_id: int, day: date) -> Holdings:
+        """Holdings of a checkpoint, converted to today's shares"""
+        rows = (
+            db.query(PositionCheckpoint.asset_id, Asset.ticker, PositionCheckpoint.quantity, PositionCheckpoint.cost)
+            .join(Asset, Asset.id == PositionCheckpoint.asset_id)
+            .filter(PositionCheckpoint.user_id == user_id, PositionCheckpoint.date == day)
+            .all()
+        )
+        factors = CorporateActionService.factors(db, [row[1] for row in rows], [day] * len(rows))
+        return {
+            asset_id: [ticker, quantity * factor, cost]
+            for (asset_id, ticker, quantity, cost), factor in zip(rows, factors.tolist())
+        }
+
+    @staticmethod
+    def _load_deltas(db: Session, user_id: int, after: Optional[date], until: date) -> List[Tuple[Any, str]]:
+        """Transactions dated after `after` up to `until` with their ticker, in today's shares"""
+        query = (
+            db.query(Transaction, Asset.ticker)
+            .join(Asset, Asset.id == Transaction.asset_id)
+            .filter(Transaction.user_id == user_id, Transaction.date < _end_of(until))
+        )
+        if after:
+            query = query.filter(Transaction.date >= _end_of(after))
+        rows = query.order_by(Transaction.date.asc(), Transaction.id.asc()).all()
+
+        tickers = [ticker for _, ticker in rows]
+        adjusted = CorporateActionService.adjust_transactions(db, [tx for tx, _ in rows], tickers)
+        return list(zip(adjusted, tickers))
+
+    @staticmethod
+    def _apply(holdings: Holdings, transactions: List[Tuple[Any, str]]) -> None:
+        """Apply transactions in place, with the average cost of `update_position`"""
+        for tx, ticker in transactions:
+            holding = holdings.setdefault(tx.asset_id, [ticker, 0.0, 0.0])
+            if tx.type == TransactionType.BUY:
+                holding[1] += tx.quantity
+                holding[2] += tx.quantity * tx.price + (tx.fees or 0.0)
+            elif holding[1] > 0:
+                avg_cost = holding[2] / holding[1]
+                holding[1] -= tx.quantity
+                holding[2] = max(0.0, holding[2] - avg_cost * tx.quantity)
+
+    @staticmethod
+    def _held(holdings: Holdings) -> Holdings:
+        """Assets still held (adjusted quantities carry float noise)"""
+        return {
+            asset_id: [ticker, round(quantity, 8), cost]
+            for asset_id, (ticker, quantity, cost) in holdings.items()
+            if round(quantity, 8) > 0
+        }
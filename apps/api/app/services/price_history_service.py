@@ -0,0 +1,152 @@
+"""
+Price History Service
+
+Keeps the local `price_bars` store filled from BrAPI and serves
+close prices for history/analytics without per-request provider calls.
+"""
+import asyncio
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, Iterable, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.price_history import PriceBar
+from app.services.corporate_action_service import CorporateActionService
+from app.services.rolling_stats import RollingStatsService
+from app.core.logging import logger
+
+
+class PriceHistoryService:
+    """Service for storing and reading daily price bars"""
+
+    @staticmethod
+    def parse_bar_date(value: Any) -> Optional[date]:
+        """Parse a BrAPI bar date (unix timestamp or ISO string)"""
+        if value is None:
+            return None
+        try:
+            if isinstance(value, (int, float)):
+                return datetime.fromtimestamp(value).date()
+            value = str(value)
+            if value.isdigit():
+                return datetime.fromtimestamp(int(value)).date()
+            return datetime.fromisoformat(value.replace("Z", "+00:00")[:10]).date()
+        except (ValueError, OSError, OverflowError):
+            return None
+
+    @staticmethod
+    def store_bars(db: Session, ticker: str, historical: List[Dict[str, Any]]) -> Optional[date]:
+        """
+        Upsert BrAPI `historicalDataPrice` entries for a ticker.
+
+        Returns:
+            Earliest date of a newly inserted bar (None if nothing new)
+        """
+        ticker = ticker.upper()
+        bars = {}
+        for day in historical:
+            bar_date = PriceHistoryService.parse_bar_date(day.get("date"))
+            close = day.get("close")
+            if bar_date and close:
+                bars[bar_date] = day
+
+        if not bars:
+            return None
+
+        existing = {
+            bar.date: bar
+            for bar in db.query(PriceBar).filter(
+                PriceBar.ticker == ticker,
+                PriceBar.date >= min(bars),
+                PriceBar.date <= max(bars),
+            )
+        }
+
+        # Bars dated before a recorded ex-date are stored adjusted as well
+        factors = dict(zip(bars, CorporateActionService.factors(db, [ticker] * len(bars), list(bars)).tolist()))
+
+        first_new = None
+        for bar_date, day in bars.items():
+            bar = existing.get(bar_date)
+            if bar is None:
+                bar = PriceBar(ticker=ticker, date=bar_date)
+                db.add(bar)
+                first_new = bar_date if first_new is None else min(first_new, bar_date)
+            bar.open = day.get("open")
+            bar.high = day.get("high")
+            bar.low = day.get("low")
+            bar.close = day.get("close")
+            bar.volume = day.get("volume")
+            bar.adj_close = None if factors[bar_date] == 1.0 else bar.close / factors[bar_date]
+
+        db.commit()
+
+        # Keep the in-memory anomaly statistics current (older bars are ignored),
+        # on the same adjusted series `warm_up` reads
+        if RollingStatsService.has_state(ticker):
+            for bar_date in sorted(bars):
+                day = bars[bar_date]
+                RollingStatsService.update_bar(
+                    ticker, bar_date, day.get("close") / factors[bar_date],
+                    day.get("high"), day.get("low"), day.get("volume"),
+                )
+        return first_new
+
+    @staticmethod
+    async def refresh(db: Session, tickers: Iterable[str], range: str = "1mo") -> Dict[str, Optional[date]]:
+        """
+        Fetch recent history for tickers concurrently and store it.
+
+        Returns:
+            Dict mapping ticker to the earliest newly inserted bar date
+        """
+        from app.services.brapi_service import BrapiService
+
+        tickers = sorted({t.upper() for t in tickers})
+        results = await asyncio.gather(
+            *[BrapiService.get_historical(t, range=range) for t in tickers],
+            return_exceptions=True,
+        )
+
+        new_since = {}
+        for ticker, result in zip(tickers, results):
+            if isinstance(result, Exception) or not result.get("success"):
+                logger.warning(f"Could not refresh price history for {ticker}")
+                continue
+            new_since[ticker] = PriceHistoryService.store_bars(
+                db, ticker, result["data"].get("historical", [])
+            )
+        return new_since
+
+    @staticmethod
+    def load_closes(
+        db: Session,
+        tickers: Iterable[str],
+        start: date,
+        end: date,
+        lookback_days: int = 10,
+    ) -> Dict[str, Dict[date, float]]:
+        """
+        Load close prices for several tickers in one query.
+
+        Closes are adjusted for corporate actions (today's shares). A few
+        days before `start` are included so callers can forward-fill the
+        first days of the range.
+        """
+        tickers = [t.upper() for t in tickers]
+        closes: Dict[str, Dict[date, float]] = {t: {} for t in tickers}
+        if not tickers:
+            return closes
+
+        rows = (
+            db.query(PriceBar.ticker, PriceBar.date, func.coalesce(PriceBar.adj_close, PriceBar.close))
+            .filter(
+                PriceBar.ticker.in_(tickers),
+                PriceBar.date >= start - timedelta(days=lookback_days),
+                PriceBar.date <= end,
+            )
+            .order_by(PriceBar.date.asc())
+            .all()
+        )
+        for ticker, bar_date, close in rows:
+            closes[ticker][bar_date] = close
+        return closes
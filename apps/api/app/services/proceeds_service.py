@@ -0,0 +1,184 @@
+"""
+Proceeds Service
+
+Proceeds (dividends, JCP, rendimentos) aggregated in the database.
+
+- Monthly and per-asset totals are GROUP BY queries, never a Python loop
+  over every proceed row
+- Users with large histories get a monthly rollup table
+  (`proceed_monthly_rollups`), built by the nightly job and refreshed
+  from the edited month onwards whenever their proceeds change
+"""
+from datetime import date, timedelta
+from typing import Dict, Any, List, Optional
+from sqlalchemy import Integer, cast, extract, func, insert, select
+from sqlalchemy.orm import Session
+from app.models.asset import Asset
+from app.models.proceed import Proceed, ProceedMonthlyRollup
+from app.core.logging import logger
+
+
+def _month_start(value: date) -> date:
+    return value.replace(day=1)
+
+
+def _next_month(value: date) -> date:
+    return (value.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+class ProceedsService:
+    """Service for proceeds aggregations and the monthly rollup"""
+
+    ROLLUP_MIN_ROWS = 2000  # Proceeds needed before a user gets a rollup
+
+    @staticmethod
+    def _month_columns():
+        """(year, month) of the payment date, portable across backends"""
+        return (
+            cast(extract("year", Proceed.date), Integer),
+            cast(extract("month", Proceed.date), Integer),
+        )
+
+    @staticmethod
+    def has_rollup(db: Session, user_id: int) -> bool:
+        """Whether the user's monthly totals are served from the rollup"""
+        return db.query(ProceedMonthlyRollup.id).filter(
+            ProceedMonthlyRollup.user_id == user_id
+        ).first() is not None
+
+    @staticmethod
+    def refresh_rollup(db: Session, user_id: int, since: Optional[date] = None) -> int:
+        """
+        Rebuild the user's rollup rows from the month of `since` onwards
+        with a single INSERT ... SELECT ... GROUP BY.
+
+        Returns:
+            Number of rollup rows written
+        """
+        delete_query = db.query(ProceedMonthlyRollup).filter(ProceedMonthlyRollup.user_id == user_id)
+        if since:
+            delete_query = delete_query.filter(
+                (ProceedMonthlyRollup.year > since.year)
+                | ((ProceedMonthlyRollup.year == since.year) & (ProceedMonthlyRollup.month >= since.month))
+            )
+        delete_query.delete(synchronize_session=False)
+
+        year_col, month_col = ProceedsService._month_columns()
+        source = (
+            select(
+                Proceed.user_id, year_col, month_col, Proceed.type,
+                func.sum(Proceed.total_value), func.count(Proceed.id),
+            )
+            .where(Proceed.user_id == user_id)
+            .group_by(Proceed.user_id, year_col, month_col, Proceed.type)
+        )
+        if since:
+            source = source.where(Proceed.date >= _month_start(since))
+
+        result = db.execute(
+            insert(ProceedMonthlyRollup).from_select(
+                ["user_id", "year", "month", "type", "total_value", "count"], source
+            )
+        )
+        db.commit()
+        return result.rowcount or 0
+
+    @staticmethod
+    def on_proceeds_changed(db: Session, user_id: int, since: Optional[date] = None) -> None:
+        """Keep an existing rollup in sync after proceeds were added or removed"""
+        if ProceedsService.has_rollup(db, user_id):
+            ProceedsService.refresh_rollup(db, user_id, since)
+
+    @staticmethod
+    async def run_nightly(db: Session) -> Dict[str, int]:
+        """Nightly job: build the rollup of users whose history got large"""
+        users = (
+            db.query(Proceed.user_id)
+            .group_by(Proceed.user_id)
+            .having(func.count(Proceed.id) >= ProceedsService.ROLLUP_MIN_ROWS)
+            .all()
+        )
+        built = 0
+        for (user_id,) in users:
+            if not ProceedsService.has_rollup(db, user_id):
+                ProceedsService.refresh_rollup(db, user_id)
+                built += 1
+
+        logger.info(f"Proceeds rollup built for {built} users", extra={"users": built})
+        return {"users": built}
+
+    @staticmethod
+    def monthly_totals(
+        db: Session,
+        user_id: int,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Proceeds summed per month, oldest first.
+
+        `start` and `end` are widened to whole months, so the result is the
+        same whether it comes from the rollup or from the proceeds table.
+
+        Returns:
+            List of {"month": "YYYY-MM", "total", "count"}
+        """
+        if ProceedsService.has_rollup(db, user_id):
+            year_col, month_col = ProceedMonthlyRollup.year, ProceedMonthlyRollup.month
+            query = db.query(
+                year_col, month_col,
+                func.sum(ProceedMonthlyRollup.total_value), func.sum(ProceedMonthlyRollup.count),
+            ).filter(ProceedMonthlyRollup.user_id == user_id)
+            if start:
+                query = query.filter(
+                    (year_col > start.year) | ((year_col == start.year) & (month_col >= start.month))
+                )
+            if end:
+                query = query.filter(
+                    (year_col < end.year) | ((year_col == end.year) & (month_col <= end.month))
+                )
+        else:
+            year_col, month_col = ProceedsService._month_columns()
+            query = db.query(
+                year_col, month_col, func.sum(Proceed.total_value), func.count(Proceed.id),
+            ).filter(Proceed.user_id == user_id)
+            if start:
+                query = query.filter(Proceed.date >= _month_start(start))
+            if end:
+                query = query.filter(Proceed.date < _next_month(end))
+
+        rows = query.group_by(year_col, month_col).order_by(year_col, month_col).all()
+        return [
+            {"month": f"{int(year)}-{int(month):02d}", "total": round(total or 0.0, 2), "count": int(count or 0)}
+            for year, month, total, count in rows
+        ]
+
+    @staticmethod
+    def asset_totals(
+        db: Session,
+        user_id: int,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Proceeds summed per asset, largest first.
+
+        Returns:
+            List of {"ticker", "name", "total", "count"}
+        """
+        query = (
+            db.query(Asset.ticker, Asset.name, func.sum(Proceed.total_value), func.count(Proceed.id))
+            .join(Asset, Asset.id == Proceed.asset_id)
+            .filter(Proceed.user_id == user_id)
+        )
+        if start:
+            query = query.filter(Proceed.date >= start)
+        if end:
+            query = query.filter(Proceed.date <= end)
+
+        total_col = func.sum(Proceed.total_value)
+        rows = query.group_by(Asset.ticker, Asset.name).order_by(total_col.desc()).all()
+        return [
+            {"ticker": ticker, "name": name or ticker, "total": round(total or 0.0, 2), "count": int(count)}
+            for ticker, name, total, count in rows
+        ]
@@ -0,0 +1,381 @@
+"""
+Rebalance Service
+
+Ticker-level rebalancing plans with lot sizes.
+
+- Targets can be given by asset type, sector and ticker; they are resolved
+  into one target weight per ticker (ticker > sector > type)
+- "full" mode buys and sells towards the targets
+- "contribution_only" mode only buys with new money, using a vectorized
+  water-filling allocation so no sale is ever needed
+- The lot plan is then pruned: trades are dropped, smallest first, while
+  the final drift stays within a tolerance. This greedy pass approximates
+  the minimum set of trades (an exact minimum is an integer program)
+"""
+from typing import Dict, Any, List, Optional
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.asset import Asset
+from app.models.position import AssetPosition
+from app.models.price_history import PriceBar
+
+
+class RebalanceService:
+    """Service for rebalancing plans"""
+
+    MODES = ["full", "contribution_only"]
+    DEFAULT_SECTOR = "Outros"
+    MAX_FILL_STEPS = 10000  # Safety bound for the greedy lot fill
+
+    @staticmethod
+    def load_holdings(
+        db: Session,
+        user_id: int,
+        extra_tickers: List[str],
+        prices: Optional[Dict[str, float]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Current positions plus target tickers not held yet.
+
+        Prices come from `prices`, the position's current price, or the
+        latest stored close for tickers not held.
+        """
+        prices = {t.upper(): p for t, p in (prices or {}).items()}
+        rows = (
+            db.query(AssetPosition, Asset)
+            .join(Asset, Asset.id == AssetPosition.asset_id)
+            .filter(AssetPosition.user_id == user_id, AssetPosition.quantity > 0)
+            .all()
+        )
+
+        holdings = {}
+        for position, asset in rows:
+            price = position.current_price if position.current_price is not None else position.average_price
+            holdings[asset.ticker] = {
+                "ticker": asset.ticker,
+                "type": asset.type.value,
+                "sector": asset.sector or RebalanceService.DEFAULT_SECTOR,
+                "quantity": position.quantity,
+                "price": prices.get(asset.ticker, price),
+            }
+
+        missing = sorted({t.upper() for t in extra_tickers} - set(holdings))
+        if missing:
+            assets = {a.ticker: a for a in db.query(Asset).filter(Asset.ticker.in_(missing))}
+            latest = (
+                db.query(PriceBar.ticker, func.max(PriceBar.date).label("date"))
+                .filter(PriceBar.ticker.in_(missing))
+                .group_by(PriceBar.ticker)
+                .subquery()
+            )
+            closes = dict(
+                db.query(PriceBar.ticker, PriceBar.close)
+                .join(latest, (PriceBar.ticker == latest.c.ticker) & (PriceBar.date == latest.c.date))
+                .all()
+            )
+            for ticker in missing:
+                asset = assets.get(ticker)
+                holdings[ticker] = {
+                    "ticker": ticker,
+                    "type": asset.type.value if asset else None,
+                    "sector": (asset.sector if asset else None) or RebalanceService.DEFAULT_SECTOR,
+                    "quantity": 0.0,
+                    "price": prices.get(ticker, closes.get(ticker)),
+                }
+
+        return list(holdings.values())
+
+    @staticmethod
+    def resolve_weights(
+        holdings: List[Dict[str, Any]],
+        values: np.ndarray,
+        total: float,
+        type_targets: Dict[str, float],
+        sector_targets: Dict[str, float],
+        ticker_targets: Dict[str, float],
+    ) -> np.ndarray:
+        """
+        Resolve percentage targets into one weight per ticker (sums to 1).
+
+        Ticker targets are fixed first. Sector and then type targets are
+        split among their remaining tickers proportionally to current value
+        (equally when none is held). Tickers without any target keep their
+        current value; the resolved targets are scaled to fill the rest.
+
+        Raises:
+            ValueError: If targets are inconsistent
+        """
+        n = len(holdings)
+        weights = np.full(n, np.nan)
+        tickers = np.array([h["ticker"] for h in holdings])
+        sectors = np.array([h["sector"] for h in holdings])
+        types = np.array([h["type"] or "" for h in holdings])
+
+        for ticker, pct in ticker_targets.items():
+            weights[tickers == ticker.upper()] = pct / 100
+
+        for level, labels, targets in (("setor", sectors, sector_targets), ("tipo", types, type_targets)):
+            for label, pct in targets.items():
+                in_group = labels == label
+                open_slots = in_group & np.isnan(weights)
+                remaining = pct / 100 - np.nansum(weights[in_group])
+                if remaining < -1e-9:
+                    raise ValueError(f"Metas por ativo excedem a meta do {level} {label}")
+                if not open_slots.any():
+                    if remaining > 1e-9:
+                        raise ValueError(f"Nenhum ativo na carteira para o {level} {label}")
+                    continue
+                group_values = values[open_slots]
+                share = (
+                    group_values / group_values.sum() if group_values.sum() > 0
+                    else np.full(open_slots.sum(), 1.0 / open_slots.sum())
+                )
+                weights[open_slots] = remaining * share
+
+        # Tickers without targets are held as they are
+        untargeted = np.isnan(weights)
+        kept = values[untargeted].sum() / total if total > 0 else 0.0
+        weights[untargeted] = values[untargeted] / total if total > 0 else 0.0
+
+        assigned = weights[~untargeted].sum()
+        if assigned + kept > 1 + 1e-6:
+            raise ValueError("As metas somam mais de 100%")
+        if assigned > 0:
+            weights[~untargeted] *= (1 - kept) / assigned
+        return weights
+
+    @staticmethod
+    def water_fill(weights: np.ndarray, values: np.ndarray, contribution: float) -> np.ndarray:
+        """
+        Split new money so the portfolio gets as close as possible to the
+        target weights without selling.
+
+        Finds the total T such that sum(max(0, w * T - v)) == contribution,
+        using the sorted breakpoints v / w (vectorized, O(n log n)).
+
+        Returns:
+            Amount to buy per ticker
+        """
+        buys = np.zeros_like(values)
+        active = weights > 0
+        if contribution <= 0 or not active.any():
+            return buys
+
+        w = weights[active]
+        v = values[active]
+        breakpoints = v / w
+        order = np.argsort(breakpoints)
+        b, w_sorted, v_sorted = breakpoints[order], w[order], v[order]
+
+        cum_w = np.cumsum(w_sorted)
+        cum_v = np.cumsum(v_sorted)
+        # Money needed to lift every ticker up to breakpoint k
+        needed = b * cum_w - cum_v
+        k = np.searchsorted(needed, contribution, side="right") - 1
+        k = max(k, 0)
+        level = (contribution + cum_v[k]) / cum_w[k]
+
+        buys[active] = np.maximum(0.0, w * level - v)
+        return buys
+
+    @staticmethod
+    def _fill_cash(
+        lots: np.ndarray,
+        lot_values: np.ndarray,
+        targets: np.ndarray,
+        values: np.ndarray,
+        cash: float,
+        allowed: np.ndarray,
+    ) -> float:
+        """Greedily buy single lots of the most underweight affordable tickers"""
+        for _ in range(RebalanceService.MAX_FILL_STEPS):
+            deficit = targets - (values + lots * lot_values)
+            candidates = allowed & (lot_values <= cash + 1e-9) & (deficit > lot_values / 2)
+            if not candidates.any():
+                break
+            i = np.argmax(np.where(candidates, deficit, -np.inf))
+            lots[i] += 1
+            cash -= lot_values[i]
+        return cash
+
+    @staticmethod
+    def _trim_buys(
+        lots: np.ndarray,
+        lot_values: np.ndarray,
+        targets: np.ndarray,
+        values: np.ndarray,
+        cash: float,
+    ) -> float:
+        """Drop single bought lots of the most overweight tickers until cash >= 0"""
+        for _ in range(RebalanceService.MAX_FILL_STEPS):
+            if cash >= -1e-9:
+                break
+            excess = values + lots * lot_values - targets
+            candidates = lots > 0
+            if not candidates.any():
+                break
+            i = np.argmax(np.where(candidates, excess, -np.inf))
+            lots[i] -= 1
+            cash += lot_values[i]
+        return cash
+
+    @staticmethod
+    def _prune_trades(
+        lots: np.ndarray,
+        lot: np.ndarray,
+        quantities: np.ndarray,
+        prices: np.ndarray,
+        weights: np.ndarray,
+        values: np.ndarray,
+        cash: float,
+        tolerance: float,
+    ) -> float:
+        """
+        Drop trades, smallest first, while cash stays >= 0 and the drift
+        after the plan stays within max(tolerance, drift of the full plan)
+        """
+        def drift(plan_lots: np.ndarray) -> float:
+            final = values + np.maximum(plan_lots * lot, -quantities) * prices
+            final_total = final.sum()
+            if final_total <= 0:
+                return 0.0
+            return float(np.abs(final / final_total - weights).sum() / 2 * 100)
+
+        limit = max(tolerance, drift(lots)) + 1e-9
+        trade_values = np.maximum(lots * lot, -quantities) * prices
+        for i in np.argsort(np.abs(trade_values)):
+            if lots[i] == 0:
+                continue
+            pruned_cash = cash + trade_values[i]
+            if pruned_cash < -1e-9:
+                continue
+            kept = lots[i]
+            lots[i] = 0
+            if drift(lots) <= limit:
+                cash = pruned_cash
+            else:
+                lots[i] = kept
+        return cash
+
+    @staticmethod
+    def optimize(
+        holdings: List[Dict[str, Any]],
+        type_targets: Dict[str, float],
+        sector_targets: Dict[str, float],
+        ticker_targets: Dict[str, float],
+        contribution: float = 0.0,
+        mode: str = "full",
+        lot_sizes: Optional[Dict[str, int]] = None,
+        default_lot_size: int = 1,
+        min_trade_value: float = 0.0,
+        drift_tolerance: float = 0.5,
+    ) -> Dict[str, Any]:
+        """
+        Build a rebalancing plan in whole lots.
+
+        Args:
+            drift_tolerance: Final drift (percentage points) accepted when
+                dropping small trades; 0 keeps every trade that helps
+
+        Raises:
+            ValueError: If targets are inconsistent, a price is missing or
+                a lot size is not positive
+        """
+        if mode not in RebalanceService.MODES:
+            raise ValueError(f"Modo inválido. Use: {', '.join(RebalanceService.MODES)}")
+
+        missing_prices = [h["ticker"] for h in holdings if not h["price"] or h["price"] <= 0]
+        if missing_prices:
+            raise ValueError(f"Sem cotação para: {', '.join(missing_prices)}")
+
+        lot_sizes = {t.upper(): s for t, s in (lot_sizes or {}).items()}
+        if default_lot_size < 1 or any(size < 1 for size in lot_sizes.values()):
+            raise ValueError("Tamanho de lote deve ser maior que zero")
+        quantities = np.array([h["quantity"] for h in holdings], dtype=float)
+        prices = np.array([h["price"] for h in holdings], dtype=float)
+        lot = np.array([lot_sizes.get(h["ticker"], default_lot_size) for h in holdings], dtype=float)
+        lot_values = prices * lot
+
+        values = quantities * prices
+        current_total = values.sum()
+        total = current_total + contribution
+
+        weights = RebalanceService.resolve_weights(
+            holdings, values, total, type_targets, sector_targets, ticker_targets
+        )
+        targets = weights * total
+
+        if mode == "contribution_only":
+            buys = RebalanceService.water_fill(weights, values, contribution)
+            lots = np.floor(buys / lot_values + 1e-9)
+            cash = contribution - (lots * lot_values).sum()
+            cash = RebalanceService._fill_cash(
+                lots, lot_values, targets, values, cash, np.ones(len(holdings), dtype=bool)
+            )
+        else:
+            lots = np.round((targets - values) / lot_values)
+            # Never sell more than is held (sells of a whole odd position are allowed)
+            lots = np.maximum(lots, -np.ceil(quantities / lot - 1e-9))
+            if min_trade_value > 0:
+                lots[np.abs(lots * lot_values) < min_trade_value] = 0
+            trade_qty = np.maximum(lots * lot, -quantities)
+            cash = contribution - (trade_qty * prices).sum()
+            cash = RebalanceService._trim_buys(lots, lot_values, targets, values, cash)
+            cash = RebalanceService._fill_cash(lots, lot_values, targets, values, cash, lots >= 0)
+
+        cash = RebalanceService._prune_trades(
+            lots, lot, quantities, prices, weights, values, cash, drift_tolerance
+        )
+
+        trade_qty = np.maximum(lots * lot, -quantities)
+        trade_values = trade_qty * prices
+        final_values = values + trade_values
+        final_total = final_values.sum()
+
+        items = []
+        for i, holding in enumerate(holdings):
+            action = "MANTER"
+            if trade_qty[i] > 0:
+                action = "COMPRAR"
+            elif trade_qty[i] < 0:
+                action = "VENDER"
+            items.append({
+                "ticker": holding["ticker"],
+                "type": holding["type"],
+                "sector": holding["sector"],
+                "price": round(float(prices[i]), 2),
+                "lot_size": int(lot[i]),
+                "current_quantity": float(quantities[i]),
+                "current_value": round(float(values[i]), 2),
+                "current_percentage": RebalanceService._pct(values[i], current_total),
+                "target_percentage": round(float(weights[i]) * 100, 2),
+                "target_value": round(float(targets[i]), 2),
+                "trade_quantity": float(trade_qty[i]),
+                "trade_value": round(float(trade_values[i]), 2),
+                "final_percentage": RebalanceService._pct(final_values[i], final_total),
+                "action": action,
+            })
+        items.sort(key=lambda item: abs(item["trade_value"]), reverse=True)
+
+        def drift(current: np.ndarray, current_sum: float) -> float:
+            if current_sum <= 0:
+                return 0.0
+            return round(float(np.abs(current / current_sum - weights).sum() / 2 * 100), 2)
+
+        return {
+            "mode": mode,
+            "total_value": round(float(current_total), 2),
+            "contribution": round(float(contribution), 2),
+            "total_buy": round(float(trade_values[trade_values > 0].sum()), 2),
+            "total_sell": round(float(-trade_values[trade_values < 0].sum()), 2),
+            "cash_left": round(float(cash), 2),
+            "drift_before": drift(values, current_total),
+            "drift_after": drift(final_values, final_total),
+            "trades": sum(1 for item in items if item["action"] != "MANTER"),
+            "items": items,
+        }
+
+    @staticmethod
+    def _pct(value: float, total: float) -> float:
+        return round(float(value / total * 100), 2) if total > 0 else 0.0
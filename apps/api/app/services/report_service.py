@@ -162,12 +162,14 @@ class ReportService:
         return enriched
     
     @staticmethod
-    async def generate_report(portfolio_assets: List[Dict]) -> PortfolioReport:
+    async def generate_report(portfolio_assets: List[Dict], dividend_projection: str = "") -> PortfolioReport:
         """
         Gera um relatório completo da carteira.
         
         Args:
             portfolio_assets: Lista de ativos com ticker, quantity, average_price
+            dividend_projection: Projeção de dividendos já calculada
+                (DividendService), incluída no relatório sem passar pela IA
             
         Returns:
             PortfolioReport: Relatório completo com análise IA
@@ -200,6 +202,7 @@ class ReportService:
             total_profit_loss_pct,
             macro_context
         )
+        ai_analysis["dividend_projection"] = dividend_projection
         
         return PortfolioReport(
             generated_at=datetime.now().isoformat(),
@@ -261,7 +264,7 @@ Resultado: {'+' if profit_loss_pct >= 0 else ''}{profit_loss_pct:.1f}%
 {macro_context.get('resumo', 'N/A')}
 
 === INSTRUÇÕES ===
-Gere um relatório com EXATAMENTE estas 5 seções, separadas por "###":
+Gere um relatório com EXATAMENTE estas 4 seções, separadas por "###":
 
 ### RESUMO EXECUTIVO
 (3-4 parágrafos com visão geral da carteira, perfil de risco, e situação atual)
@@ -275,9 +278,6 @@ Gere um relatório com EXATAMENTE estas 5 seções, separadas por "###":
 ### RECOMENDAÇÕES
 (Sugestões práticas de ajustes, rebalanceamento ou monitoramento)
 
-### PROJEÇÃO DE DIVIDENDOS
-(Estimar dividendos anuais esperados com base no DY dos ativos)
-
 REGRAS:
 - Seja específico sobre CADA ativo quando relevante
 - Use dados reais fornecidos, não invente números
@@ -0,0 +1,365 @@
+"""
+Risk Service
+
+Covariance-based portfolio risk over the local price history (`price_bars`).
+
+- Close prices are aligned on a common date grid (forward-filled) and turned
+  into a daily returns matrix, one column per ticker
+- Covariance and correlation are computed on the whole matrix at once,
+  either equally weighted ("sample") or exponentially weighted ("ewma")
+- Return matrices and covariances depend only on the ticker set, so they
+  are cached per ticker set and shared by every user holding it
+"""
+import numpy as np
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from sqlalchemy.orm import Session
+from app.models.asset import Asset, AssetType
+from app.models.position import AssetPosition
+from app.models.price_history import PriceBar
+from app.services.price_history_service import PriceHistoryService
+from app.services.portfolio_history_service import _forward_fill
+from app.core.logging import logger
+
+METHODS = ("sample", "ewma")
+
+
+class RiskService:
+    """Service for return matrices, covariance and portfolio risk"""
+
+    TRADING_DAYS = 252
+    MIN_OBSERVATIONS = 20  # Daily returns needed to estimate a covariance
+    DEFAULT_LOOKBACK_DAYS = 365
+    DEFAULT_HALFLIFE = 30  # Trading days, for the EWMA variant
+
+    # Keyed by ticker set, lookback and end date: shared across users
+    _cache: Dict[Tuple, Dict[str, Any]] = {}
+    _cache_expiry: Dict[Tuple, float] = {}
+    CACHE_DURATION = 3600  # 1 hour (the nightly job brings new bars)
+
+    @staticmethod
+    def invalidate() -> None:
+        """Drop every cached matrix"""
+        RiskService._cache.clear()
+        RiskService._cache_expiry.clear()
+
+    @staticmethod
+    def _matrix_key(tickers: Iterable[str], lookback_days: int, end: date) -> Tuple:
+        return (tuple(sorted({t.upper() for t in tickers})), lookback_days, end.isoformat())
+
+    @staticmethod
+    def _get_cached(key: Tuple, name: str) -> Optional[Any]:
+        now = datetime.utcnow().timestamp()
+        if now >= RiskService._cache_expiry.get(key, 0):
+            RiskService._cache.pop(key, None)
+            RiskService._cache_expiry.pop(key, None)
+            return None
+        return RiskService._cache.get(key, {}).get(name)
+
+    @staticmethod
+    def _set_cached(key: Tuple, name: str, result: Any) -> Any:
+        now = datetime.utcnow().timestamp()
+        if key not in RiskService._cache_expiry:
+            RiskService._cache_expiry[key] = now + RiskService.CACHE_DURATION
+        RiskService._cache.setdefault(key, {})[name] = result
+        return result
+
+    @staticmethod
+    def returns_matrix(
+        db: Session,
+        tickers: Iterable[str],
+        lookback_days: int = DEFAULT_LOOKBACK_DAYS,
+        end: Optional[date] = None,
+    ) -> Dict[str, Any]:
+        """
+        Aligned daily simple returns of several tickers.
+
+        Tickers with fewer than MIN_OBSERVATIONS bars are left out. The
+        matrix starts on the first day every remaining ticker has a price,
+        so all columns cover the same window.
+
+        Returns:
+            Dict with "tickers" (column order), "dates" (return dates),
+            "returns" (T x N array) and "without_history"
+        """
+        end = end or date.today()
+        key = RiskService._matrix_key(tickers, lookback_days, end)
+        cached = RiskService._get_cached(key, "returns")
+        if cached is not None:
+            return cached
+
+        closes = PriceHistoryService.load_closes(
+            db, key[0], end - timedelta(days=lookback_days), end, lookback_days=0
+        )
+        usable = [t for t in key[0] if len(closes[t]) > RiskService.MIN_OBSERVATIONS]
+        without_history = [t for t in key[0] if t not in usable]
+
+        dates = sorted(set().union(*(closes[t].keys() for t in usable))) if usable else []
+        grid = np.full((len(dates), len(usable)), np.nan)
+        row_of = {d: i for i, d in enumerate(dates)}
+        for j, ticker in enumerate(usable):
+            for bar_date, close in closes[ticker].items():
+                if close and close > 0:
+                    grid[row_of[bar_date], j] = close
+
+        if usable:
+            grid = _forward_fill(grid)
+            complete = ~np.isnan(grid).any(axis=1)
+            first = int(np.argmax(complete)) if complete.any() else len(dates)
+            grid, dates = grid[first:], dates[first:]
+
+        returns = grid[1:] / grid[:-1] - 1.0 if len(dates) > 1 else np.empty((0, len(usable)))
+        result = {
+            "tickers": usable,
+            "dates": dates[1:],
+            "returns": returns,
+            "without_history": without_history,
+        }
+        return RiskService._set_cached(key, "returns", result)
+
+    @staticmethod
+    def covariance(
+        returns: np.ndarray,
+        method: str = "sample",
+        halflife: int = DEFAULT_HALFLIFE,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Mean vector and covariance matrix of a T x N returns matrix.
+
+        "ewma" weights day t by 0.5 ** ((T - 1 - t) / halflife), so the
+        most recent `halflife` days carry half of the total weight.
+        """
+        if method not in METHODS:
+            raise ValueError(f"Método inválido: {method}. Use {', '.join(METHODS)}")
+
+        n_obs = returns.shape[0]
+        if method == "ewma":
+            decay = 0.5 ** (1.0 / max(halflife, 1))
+            weights = decay ** np.arange(n_obs - 1, -1, -1, dtype=float)
+        else:
+            weights = np.ones(n_obs)
+        weights /= weights.sum()
+
+        mean = weights @ returns
+        centered = returns - mean
+        # Unbiased for any weights (reduces to 1 / (T - 1) when equal)
+        correction = 1.0 - np.sum(weights ** 2)
+        cov = (centered * weights[:, None]).T @ centered / correction
+        return mean, cov
+
+    @staticmethod
+    def correlation(cov: np.ndarray) -> np.ndarray:
+        """Correlation matrix of a covariance matrix (constant series get 0)"""
+        std = np.sqrt(np.clip(np.diag(cov), 0.0, None))
+        denom = np.outer(std, std)
+        corr = np.divide(cov, denom, out=np.zeros_like(cov), where=denom > 0)
+        np.fill_diagonal(corr, 1.0)
+        return np.clip(corr, -1.0, 1.0)
+
+    @staticmethod
+    def covariance_matrix(
+        db: Session,
+        tickers: Iterable[str],
+        lookback_days: int = DEFAULT_LOOKBACK_DAYS,
+        method: str = "sample",
+        halflife: int = DEFAULT_HALFLIFE,
+        end: Optional[date] = None,
+    ) -> Dict[str, Any]:
+        """
+        Cached daily mean, covariance and correlation of a ticker set.
+
+        Returns:
+            Dict with "tickers", "observations", "start", "end", "mean",
+            "cov", "corr" and "without_history"
+        """
+        if method not in METHODS:
+            raise ValueError(f"Método inválido: {method}. Use {', '.join(METHODS)}")
+
+        end = end or date.today()
+        key = RiskService._matrix_key(tickers, lookback_days, end)
+        name = f"cov:{method}:{halflife if method == 'ewma' else ''}"
+        cached = RiskService._get_cached(key, name)
+        if cached is not None:
+            return cached
+
+        matrix = RiskService.returns_matrix(db, tickers, lookback_days, end)
+        returns = matrix["returns"]
+        result = {
+            "tickers": matrix["tickers"],
+            "observations": returns.shape[0],
+            "start": matrix["dates"][0] if matrix["dates"] else None,
+            "end": matrix["dates"][-1] if matrix["dates"] else None,
+            "without_history": matrix["without_history"],
+            "mean": None,
+            "cov": None,
+            "corr": None,
+        }
+        if returns.shape[0] >= RiskService.MIN_OBSERVATIONS and returns.shape[1]:
+            mean, cov = RiskService.covariance(returns, method=method, halflife=halflife)
+            result.update(mean=mean, cov=cov, corr=RiskService.correlation(cov))
+        return RiskService._set_cached(key, name, result)
+
+    @staticmethod
+    def portfolio_metrics(weights: np.ndarray, cov: np.ndarray) -> Dict[str, Any]:
+        """
+        Volatility and its decomposition for a weight vector.
+
+        The risk contributions w_i * (Cov w)_i / vol add up to the portfolio
+        volatility; the diversification ratio is the weighted average of the
+        assets' volatilities over the portfolio volatility (1 = no benefit).
+        """
+        variance = float(weights @ cov @ weights)
+        volatility = float(np.sqrt(max(variance, 0.0)))
+        asset_vol = np.sqrt(np.clip(np.diag(cov), 0.0, None))
+
+        if volatility > 0:
+            marginal = cov @ weights / volatility
+            contribution = weights * marginal
+            diversification = float(weights @ asset_vol / volatility)
+        else:
+            marginal = np.zeros_like(weights)
+            contribution = np.zeros_like(weights)
+            diversification = 1.0
+
+        return {
+            "volatility": volatility,
+            "asset_volatility": asset_vol,
+            "marginal": marginal,
+            "contribution": contribution,
+            "diversification_ratio": diversification,
+        }
+
+    @staticmethod
+    async def ensure_history(db: Session, tickers: Iterable[str]) -> None:
+        """Fetch a year of bars for tickers missing from the local store"""
+        tickers = {t.upper() for t in tickers}
+        known = {
+            t for (t,) in db.query(PriceBar.ticker)
+            .filter(PriceBar.ticker.in_(tickers))
+            .distinct()
+            .all()
+        }
+        if tickers - known:
+            await PriceHistoryService.refresh(db, tickers - known, range="1y")
+            RiskService.invalidate()
+
+    @staticmethod
+    def holdings(db: Session, user_id: int) -> Dict[str, float]:
+        """Market value of each variable-income ticker held by the user"""
+        rows = (
+            db.query(Asset.ticker, AssetPosition.quantity, AssetPosition.current_price, AssetPosition.average_price)
+            .join(Asset, Asset.id == AssetPosition.asset_id)
+            .filter(
+                AssetPosition.user_id == user_id,
+                AssetPosition.quantity > 0,
+                Asset.type != AssetType.RENDA_FIXA,
+            )
+            .all()
+        )
+        values: Dict[str, float] = {}
+        for ticker, quantity, current_price, average_price in rows:
+            values[ticker] = values.get(ticker, 0.0) + quantity * (current_price or average_price or 0.0)
+        return values
+
+    @staticmethod
+    async def analyze_tickers(
+        db: Session,
+        tickers: List[str],
+        weights: Optional[Dict[str, float]] = None,
+        lookback_days: int = DEFAULT_LOOKBACK_DAYS,
+        method: str = "sample",
+        halflife: int = DEFAULT_HALFLIFE,
+    ) -> Dict[str, Any]:
+        """
+        Covariance-based risk report of a set of tickers.
+
+        Args:
+            db: Database session
+            tickers: Tickers to analyse
+            weights: Value (or weight) per ticker; equal weights if None
+            lookback_days: Calendar days of history used
+            method: "sample" or "ewma"
+            halflife: EWMA half-life in trading days
+
+        Returns:
+            Portfolio volatility (daily and annualized, in %), diversification
+            ratio, per-position weight/volatility/marginal risk/contribution
+            and the correlation matrix
+        """
+        await RiskService.ensure_history(db, tickers)
+        stats = RiskService.covariance_matrix(
+            db, tickers, lookback_days=lookback_days, method=method, halflife=halflife
+        )
+
+        result = {
+            "method": method,
+            "halflife": halflife if method == "ewma" else None,
+            "lookback_days": lookback_days,
+            "observations": stats["observations"],
+            "start": stats["start"].isoformat() if stats["start"] else None,
+            "end": stats["end"].isoformat() if stats["end"] else None,
+            "without_history": stats["without_history"],
+            "portfolio_volatility_daily": None,
+            "portfolio_volatility_annual": None,
+            "diversification_ratio": None,
+            "positions": [],
+            "correlation": {"tickers": stats["tickers"], "matrix": []},
+        }
+        if stats["cov"] is None:
+            return result
+
+        columns = stats["tickers"]
+        if weights is None:
+            raw = np.ones(len(columns))
+        else:
+            raw = np.array([weights.get(t, 0.0) for t in columns], dtype=float)
+        if raw.sum() <= 0:
+            return result
+        w = raw / raw.sum()
+
+        metrics = RiskService.portfolio_metrics(w, stats["cov"])
+        annualize = np.sqrt(RiskService.TRADING_DAYS)
+        volatility = metrics["volatility"]
+
+        result.update(
+            portfolio_volatility_daily=round(volatility * 100, 4),
+            portfolio_volatility_annual=round(volatility * annualize * 100, 2),
+            diversification_ratio=round(metrics["diversification_ratio"], 4),
+            positions=sorted(
+                [
+                    {
+                        "ticker": ticker,
+                        "weight": round(float(w[i]) * 100, 2),
+                        "volatility_annual": round(float(metrics["asset_volatility"][i]) * annualize * 100, 2),
+                        "marginal_risk": round(float(metrics["marginal"][i]) * annualize * 100, 4),
+                        "risk_contribution": round(
+                            float(metrics["contribution"][i]) / volatility * 100 if volatility else 0.0, 2
+                        ),
+                    }
+                    for i, ticker in enumerate(columns)
+                ],
+                key=lambda p: p["risk_contribution"],
+                reverse=True,
+            ),
+            correlation={
+                "tickers": columns,
+                "matrix": np.round(stats["corr"], 4).tolist(),
+            },
+        )
+        logger.debug(f"Risk analysis of {len(columns)} tickers over {stats['observations']} days")
+        return result
+
+    @staticmethod
+    async def analyze_user(
+        db: Session,
+        user_id: int,
+        lookback_days: int = DEFAULT_LOOKBACK_DAYS,
+        method: str = "sample",
+        halflife: int = DEFAULT_HALFLIFE,
+    ) -> Dict[str, Any]:
+        """Risk report of a user's variable-income positions, weighted by market value"""
+        values = RiskService.holdings(db, user_id)
+        return await RiskService.analyze_tickers(
+            db, list(values), weights=values,
+            lookback_days=lookback_days, method=method, halflife=halflife,
+        )
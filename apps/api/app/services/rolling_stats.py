@@ -0,0 +1,256 @@
+"""
+Rolling Statistics Service
+
+Incremental mean/variance per ticker for anomaly detection, so a z-score
+is O(1) per bar or quote instead of a pass over the whole window.
+
+- Each ticker keeps the state of three series: absolute daily return (%),
+  daily range (%) and volume
+- The first SPAN observations use Welford's algorithm (exact mean and
+  variance); after that the state becomes an exponentially weighted
+  moving average with the same span, so old bars fade out
+- Bars stored in `price_bars` feed the state as they arrive; states of
+  tickers seen for the first time are warmed up from the local store
+- Prices are the split/dividend adjusted series, both when warming up and
+  when new bars arrive
+- A live quote carries the volume traded so far in the session, so it is
+  projected to the full day before being compared with daily volumes
+"""
+import math
+from datetime import date, datetime, time, timedelta, timezone
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.logging import logger
+
+if TYPE_CHECKING:
+    from app.services.market_intelligence import AnomalyAlert
+
+
+class RollingStat:
+    """Welford mean/variance that turns into an EWMA after `span` observations"""
+
+    __slots__ = ("span", "alpha", "count", "mean", "var")
+
+    def __init__(self, span: int):
+        self.span = span
+        self.alpha = 2.0 / (span + 1)
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+
+    def update(self, value: float) -> None:
+        self.count += 1
+        delta = value - self.mean
+        if self.count <= self.span:
+            self.mean += delta / self.count
+            # Running population variance: var_n = var_{n-1} + (d * d' - var_{n-1}) / n
+            self.var += (delta * (value - self.mean) - self.var) / self.count
+        else:
+            self.mean += self.alpha * delta
+            self.var = (1 - self.alpha) * (self.var + self.alpha * delta * delta)
+
+    def zscore(self, value: float) -> Optional[float]:
+        """Standard score of `value` against the state (None while too short or flat)"""
+        if self.count < RollingStatsService.MIN_OBSERVATIONS or self.var <= 0:
+            return None
+        return (value - self.mean) / math.sqrt(self.var)
+
+
+class TickerState:
+    """Rolling state of one ticker"""
+
+    __slots__ = ("last_date", "last_close", "returns", "ranges", "volume")
+
+    def __init__(self, span: int):
+        self.last_date: Optional[date] = None
+        self.last_close: Optional[float] = None
+        self.returns = RollingStat(span)
+        self.ranges = RollingStat(span)
+        self.volume = RollingStat(span)
+
+
+class RollingStatsService:
+    """Service keeping per-ticker rolling statistics in memory"""
+
+    SPAN = 20  # ~1 month of trading days
+    MIN_OBSERVATIONS = 10
+    WARMUP_DAYS = 90
+
+    # B3 regular session (Brasília time, no daylight saving)
+    SESSION_TZ = timezone(timedelta(hours=-3))
+    SESSION_OPEN = time(10, 0)
+    SESSION_CLOSE = time(17, 0)
+    # Early in the session the projected volume is too noisy to score
+    MIN_SESSION_ELAPSED = 0.1
+
+    _states: Dict[str, TickerState] = {}
+
+    @staticmethod
+    def reset(ticker: Optional[str] = None) -> None:
+        """Forget the state of a ticker (None = every ticker)"""
+        if ticker is None:
+            RollingStatsService._states.clear()
+        else:
+            RollingStatsService._states.pop(ticker.upper(), None)
+
+    @staticmethod
+    def has_state(ticker: str) -> bool:
+        return ticker.upper() in RollingStatsService._states
+
+    @staticmethod
+    def session_elapsed(now: Optional[datetime] = None) -> float:
+        """
+        Fraction of today's trading session already elapsed (0 before the
+        open, 1 after the close and on weekends, when quotes carry a full
+        day's volume).
+        """
+        now = (now or datetime.now(timezone.utc)).astimezone(RollingStatsService.SESSION_TZ)
+        if now.weekday() >= 5:
+            return 1.0
+        open_at = datetime.combine(now.date(), RollingStatsService.SESSION_OPEN, now.tzinfo)
+        close_at = datetime.combine(now.date(), RollingStatsService.SESSION_CLOSE, now.tzinfo)
+        elapsed = (now - open_at) / (close_at - open_at)
+        return min(max(elapsed, 0.0), 1.0)
+
+    @staticmethod
+    def update_bar(
+        ticker: str,
+        bar_date: date,
+        close: float,
+        high: Optional[float] = None,
+        low: Optional[float] = None,
+        volume: Optional[float] = None,
+    ) -> Dict[str, Optional[float]]:
+        """
+        Feed a daily bar, older or repeated bars are ignored.
+
+        Returns:
+            Z-scores of the bar against the state before it ("return",
+            "range", "volume"; None when not available)
+        """
+        state = RollingStatsService._states.setdefault(
+            ticker.upper(), TickerState(RollingStatsService.SPAN)
+        )
+        scores: Dict[str, Optional[float]] = {"return": None, "range": None, "volume": None}
+        if not close or close <= 0 or (state.last_date is not None and bar_date <= state.last_date):
+            return scores
+
+        if state.last_close:
+            move = abs(close / state.last_close - 1) * 100
+            scores["return"] = state.returns.zscore(move)
+            state.returns.update(move)
+        if high and low and low > 0:
+            day_range = (high - low) / low * 100
+            scores["range"] = state.ranges.zscore(day_range)
+            state.ranges.update(day_range)
+        if volume and volume > 0:
+            scores["volume"] = state.volume.zscore(volume)
+            state.volume.update(volume)
+
+        state.last_date = bar_date
+        state.last_close = close
+        return scores
+
+    @staticmethod
+    def check_quote(
+        ticker: str,
+        price: float,
+        volume: Optional[float] = None,
+        elapsed: float = 1.0,
+    ) -> Dict[str, Optional[float]]:
+        """
+        Z-scores of a live quote against the ticker's state, without
+        changing it (a day's ticks become one bar when it closes).
+
+        Args:
+            ticker: Ticker symbol
+            price: Last price
+            volume: Volume traded so far in the session
+            elapsed: Fraction of the session elapsed (see `session_elapsed`);
+                the volume is projected to the full day and not scored
+                before MIN_SESSION_ELAPSED
+
+        Returns:
+            Dict with "change" (% against the last close), the projected
+            "day_volume" and the "return"/"volume" z-scores (None when not
+            available)
+        """
+        state = RollingStatsService._states.get(ticker.upper())
+        scores: Dict[str, Optional[float]] = {
+            "change": None, "day_volume": None, "return": None, "volume": None,
+        }
+        if state is None or not state.last_close or not price:
+            return scores
+
+        change = (price / state.last_close - 1) * 100
+        scores["change"] = change
+        scores["return"] = state.returns.zscore(abs(change))
+        if volume and elapsed >= RollingStatsService.MIN_SESSION_ELAPSED:
+            scores["day_volume"] = volume / elapsed
+            scores["volume"] = state.volume.zscore(scores["day_volume"])
+        return scores
+
+    @staticmethod
+    def quote_anomalies(
+        ticker: str,
+        price: float,
+        volume: Optional[float] = None,
+        elapsed: Optional[float] = None,
+    ) -> List["AnomalyAlert"]:
+        """
+        Anomaly alerts of a live quote, with the thresholds of
+        MarketIntelligence (`elapsed` defaults to the current session).
+        """
+        from app.services.market_intelligence import MarketIntelligence
+
+        if elapsed is None:
+            elapsed = RollingStatsService.session_elapsed()
+        scores = RollingStatsService.check_quote(ticker, price, volume, elapsed)
+        state = RollingStatsService._states.get(ticker.upper())
+        threshold = MarketIntelligence.ANOMALY_THRESHOLD
+
+        alerts = []
+        if scores["volume"] is not None and abs(scores["volume"]) > threshold:
+            alerts.append(MarketIntelligence._volume_alert(
+                ticker, scores["day_volume"], state.volume.mean, scores["volume"]
+            ))
+        if scores["return"] is not None and scores["return"] > threshold:
+            alerts.append(MarketIntelligence._price_alert(
+                ticker, scores["change"], state.returns.mean, scores["return"]
+            ))
+        return alerts
+
+    @staticmethod
+    def warm_up(db: Session, tickers: Iterable[str]) -> int:
+        """
+        Build the state of tickers seen for the first time from the last
+        WARMUP_DAYS of local bars, in one query.
+
+        Returns:
+            Number of tickers warmed up
+        """
+        from app.models.price_history import PriceBar
+
+        missing = sorted({t.upper() for t in tickers} - set(RollingStatsService._states))
+        if not missing:
+            return 0
+
+        rows = (
+            db.query(
+                PriceBar.ticker, PriceBar.date, func.coalesce(PriceBar.adj_close, PriceBar.close),
+                PriceBar.high, PriceBar.low, PriceBar.volume,
+            )
+            .filter(
+                PriceBar.ticker.in_(missing),
+                PriceBar.date >= date.today() - timedelta(days=RollingStatsService.WARMUP_DAYS),
+            )
+            .order_by(PriceBar.ticker, PriceBar.date)
+            .all()
+        )
+        for ticker, bar_date, close, high, low, volume in rows:
+            RollingStatsService.update_bar(ticker, bar_date, close, high, low, volume)
+
+        warmed = len({row[0] for row in rows})
+        logger.debug(f"Rolling stats warmed up for {warmed} tickers")
+        return warmed
@@ -70,6 +70,7 @@ class SyncScheduler:
         while self.is_running:
             try:
                 await self._sync_all_users()
+                await self._run_nightly_jobs()
             except Exception as e:
                 logger.error(f"Error in scheduler loop: {str(e)}", exc_info=True)
 
@@ -137,6 +138,50 @@ class SyncScheduler:
         finally:
             db.close()
 
+    async def _run_nightly_jobs(self):
+        """Run derived-data jobs after the sync (each with its own session)"""
+        from app.services.portfolio_history_service import PortfolioHistoryService
+        from app.services.performance_service import PerformanceService
+        from app.services.proceeds_service import ProceedsService
+        from app.services.dividend_service import DividendService
+        from app.services.barsi_calculator import BarsiCalculator
+        from app.services.risk_service import RiskService
+        from app.services.optimizer_service import OptimizerService
+        from app.services.market_intelligence import MarketIntelligence
+        from app.services.fixed_income_service import FixedIncomeService
+        from app.services.position_checkpoint_service import PositionCheckpointService
+
+        jobs = [
+            ("portfolio_history", PortfolioHistoryService.run_nightly),
+            ("position_checkpoints", PositionCheckpointService.run_nightly),
+            ("proceeds_rollup", ProceedsService.run_nightly),
+            ("dividend_estimates", DividendService.run_nightly),
+            # After the event refresh above
+            ("proceeds_credit", DividendService.run_proceeds_credit),
+            ("barsi_screener", BarsiCalculator.run_nightly),
+            # After the price refreshes above, so the scan sees today's bars
+            ("anomaly_scan", MarketIntelligence.scan_holdings),
+            ("fixed_income_revaluation", FixedIncomeService.run_nightly),
+        ]
+
+        for name, job in jobs:
+            db = SessionLocal()
+            try:
+                await job(db)
+            except Exception as e:
+                logger.error(
+                    f"Error in nightly job {name}: {str(e)}",
+                    extra={"job": name, "error": str(e)},
+                )
+            finally:
+                db.close()
+
+        # Returns are derived from the series that was just extended,
+        # covariances from the bars that were just fetched
+        PerformanceService.invalidate()
+        RiskService.invalidate()
+        OptimizerService.invalidate()
+
     def _should_sync(self, credentials: CEICredentials) -> bool:
         """
         Check if user should be synced
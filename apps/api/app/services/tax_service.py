@@ -0,0 +1,505 @@
+"""
+Tax Service
+
+Incremental capital gains ledger for the monthly income tax (IR) on
+stock exchange sales.
+
+- Each sale is booked into `realized_gains` (gain, cost basis, bucket)
+- `monthly_tax_summaries` keeps the running monthly result per bucket,
+  with exemption, loss carry-forward, IRRF and tax due
+- Transaction edits re-book only the affected assets from the edited date
+  and roll the monthly summaries forward from that month, so a DARF
+  lookup never replays the whole history
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from sqlalchemy import func, extract
+from sqlalchemy.orm import Session
+from app.models.asset import Asset, AssetType
+from app.models.tax import MonthlyTaxSummary, RealizedGain, TaxBucket
+from app.models.transaction import Transaction, TransactionType
+from app.services.corporate_action_service import CorporateActionService
+from app.core.logging import logger
+
+
+def _as_date(value) -> date:
+    """Transaction dates are DateTime columns but may hold plain dates"""
+    return value.date() if isinstance(value, datetime) else value
+
+
+class TaxService:
+    """Service for realized gains and monthly tax (DARF) summaries"""
+
+    TAX_RATES = {
+        TaxBucket.ACOES: 0.15,
+        TaxBucket.OUTROS: 0.15,
+        TaxBucket.FII: 0.20,
+        TaxBucket.DAY_TRADE: 0.20,
+    }
+
+    # Buckets sharing a loss pool compensate each other
+    LOSS_POOLS = {
+        TaxBucket.ACOES: "COMUM",
+        TaxBucket.OUTROS: "COMUM",
+        TaxBucket.FII: "FII",
+        TaxBucket.DAY_TRADE: "DAY_TRADE",
+    }
+
+    MONTHLY_EXEMPTION = 20000.0  # Vendas de ações até R$20 mil/mês
+    IRRF_SWING_RATE = 0.00005  # 0,005% sobre o valor das vendas
+    IRRF_DAY_TRADE_RATE = 0.01  # 1% sobre o lucro
+    DARF_MINIMUM = 10.0  # DARF abaixo de R$10 é pago junto com o do mês seguinte
+    DARF_CODE = "6015"
+
+    @staticmethod
+    def bucket_for(asset_type: AssetType, day_trade: bool = False) -> Optional[TaxBucket]:
+        """Tax bucket of a sale (None = not taxed through this ledger)"""
+        if day_trade:
+            return TaxBucket.DAY_TRADE
+        if asset_type == AssetType.ACAO:
+            return TaxBucket.ACOES
+        if asset_type in (AssetType.ETF, AssetType.BDR):
+            return TaxBucket.OUTROS
+        if asset_type == AssetType.FII:
+            return TaxBucket.FII
+        return None
+
+    @staticmethod
+    def on_transactions_changed(
+        db: Session,
+        user_id: int,
+        asset_ids: Optional[Iterable[int]] = None,
+        since: Optional[date] = None,
+    ) -> None:
+        """
+        Re-book the ledger after transactions changed.
+
+        Args:
+            asset_ids: Affected assets (None = every asset of the user)
+            since: Earliest affected transaction date (None = full history)
+        """
+        since = _as_date(since) if since else None
+        if asset_ids is None:
+            asset_ids = [
+                asset_id for (asset_id,) in db.query(Transaction.asset_id)
+                .filter(Transaction.user_id == user_id)
+                .distinct()
+            ]
+
+        for asset_id in set(asset_ids):
+            TaxService.book_asset(db, user_id, asset_id, since)
+
+        TaxService.roll_months(db, user_id, since)
+        db.commit()
+
+    @staticmethod
+    def book_asset(db: Session, user_id: int, asset_id: int, since: Optional[date] = None) -> int:
+        """
+        Rebuild the ledger entries of one asset for sales on/after `since`.
+
+        Returns:
+            Number of entries written
+        """
+        delete_query = db.query(RealizedGain).filter(
+            RealizedGain.user_id == user_id, RealizedGain.asset_id == asset_id
+        )
+        if since:
+            delete_query = delete_query.filter(RealizedGain.date >= since)
+        delete_query.delete(synchronize_session=False)
+
+        asset = db.query(Asset).filter(Asset.id == asset_id).first()
+        if not asset or TaxService.bucket_for(asset.type) is None:
+            return 0
+
+        transactions = (
+            db.query(Transaction)
+            .filter(Transaction.user_id == user_id, Transaction.asset_id == asset_id)
+            .order_by(Transaction.date.asc(), Transaction.id.asc())
+            .all()
+        )
+        transactions = CorporateActionService.adjust_transactions(
+            db, transactions, [asset.ticker] * len(transactions)
+        )
+
+        entries = [
+            entry for entry in TaxService._book(transactions, asset.type)
+            if since is None or entry["date"] >= since
+        ]
+        db.bulk_insert_mappings(
+            RealizedGain,
+            [{"user_id": user_id, "asset_id": asset_id, **entry} for entry in entries],
+        )
+        return len(entries)
+
+    @staticmethod
+    def _book(transactions: List[Transaction], asset_type: AssetType) -> List[Dict[str, Any]]:
+        """
+        Replay one asset's transactions (average cost) and book its sales.
+
+        Same-day buys and sells are matched first as day trade; the rest of
+        the sales are swing trade against the average cost of the position.
+        """
+        quantity = 0.0
+        cost = 0.0
+        entries = []
+
+        by_day: Dict[date, List[Transaction]] = defaultdict(list)
+        for tx in transactions:
+            by_day[_as_date(tx.date)].append(tx)
+
+        for day in sorted(by_day):
+            buys = [tx for tx in by_day[day] if tx.type == TransactionType.BUY]
+            sells = [tx for tx in by_day[day] if tx.type == TransactionType.SELL]
+
+            bought = sum(tx.quantity for tx in buys)
+            sold = sum(tx.quantity for tx in sells)
+            day_trade_qty = min(bought, sold)
+            day_buy_cost = sum(tx.quantity * tx.price + (tx.fees or 0.0) for tx in buys)
+            day_buy_avg = day_buy_cost / bought if bought else 0.0
+
+            # Sales: day trade quantity first, then swing trade
+            remaining_dt = day_trade_qty
+            for tx in sells:
+                unit_net = tx.price - (tx.fees or 0.0) / tx.quantity
+                dt_qty = min(tx.quantity, remaining_dt)
+                remaining_dt -= dt_qty
+                swing_qty = tx.quantity - dt_qty
+
+                if dt_qty > 0:
+                    entries.append(TaxService._entry(
+                        tx, day, TaxBucket.DAY_TRADE, dt_qty, unit_net * dt_qty, day_buy_avg * dt_qty
+                    ))
+                if swing_qty > 0:
+                    avg_cost = cost / quantity if quantity > 0 else 0.0
+                    sold_cost = min(cost, avg_cost * swing_qty)
+                    entries.append(TaxService._entry(
+                        tx, day, TaxService.bucket_for(asset_type), swing_qty,
+                        unit_net * swing_qty, sold_cost,
+                    ))
+                    quantity -= swing_qty
+                    cost = max(0.0, cost - sold_cost)
+
+            # Buys not matched by day trade join the position
+            if bought > day_trade_qty:
+                quantity += bought - day_trade_qty
+                cost += day_buy_avg * (bought - day_trade_qty)
+
+        return entries
+
+    @staticmethod
+    def _entry(tx: Transaction, day: date, bucket: TaxBucket, quantity: float,
+               sale_value: float, cost_basis: float) -> Dict[str, Any]:
+        return {
+            "transaction_id": tx.id,
+            "date": day,
+            "bucket": bucket,
+            "quantity": quantity,
+            "sale_value": round(sale_value, 2),
+            "cost_basis": round(cost_basis, 2),
+            "gain": round(sale_value - cost_basis, 2),
+        }
+
+    @staticmethod
+    def roll_months(db: Session, user_id: int, since: Optional[date] = None) -> int:
+        """
+        Recompute monthly summaries from the month of `since` onwards,
+        starting from the loss pools carried by the previous months.
+
+        Returns:
+            Number of monthly rows written
+        """
+        first = (since.year, since.month) if since else None
+
+        delete_query = db.query(MonthlyTaxSummary).filter(MonthlyTaxSummary.user_id == user_id)
+        if first:
+            delete_query = delete_query.filter(
+                (MonthlyTaxSummary.year > first[0])
+                | ((MonthlyTaxSummary.year == first[0]) & (MonthlyTaxSummary.month >= first[1]))
+            )
+        delete_query.delete(synchronize_session=False)
+
+        pools = TaxService._carried_pools(db, user_id) if first else defaultdict(float)
+
+        # Monthly aggregates straight from the ledger
+        year_col = extract("year", RealizedGain.date)
+        month_col = extract("month", RealizedGain.date)
+        query = db.query(
+            year_col, month_col, RealizedGain.bucket,
+            func.sum(RealizedGain.sale_value), func.sum(RealizedGain.gain),
+        ).filter(RealizedGain.user_id == user_id)
+        if first:
+            query = query.filter(RealizedGain.date >= date(first[0], first[1], 1))
+        aggregates = query.group_by(year_col, month_col, RealizedGain.bucket).all()
+
+        months: Dict[Tuple[int, int], Dict[TaxBucket, Tuple[float, float]]] = defaultdict(dict)
+        for year, month, bucket, sales, gain in aggregates:
+            months[(int(year), int(month))][bucket] = (sales or 0.0, gain or 0.0)
+
+        rows = []
+        for year, month in sorted(months):
+            rows.extend(TaxService._summarize_month(user_id, year, month, months[(year, month)], pools))
+
+        db.bulk_insert_mappings(MonthlyTaxSummary, rows)
+        return len(rows)
+
+    @staticmethod
+    def _carried_pools(db: Session, user_id: int) -> Dict[str, float]:
+        """Loss pool balances left by the latest stored month of each pool"""
+        pools: Dict[str, float] = defaultdict(float)
+        rows = (
+            db.query(MonthlyTaxSummary)
+            .filter(MonthlyTaxSummary.user_id == user_id)
+            .order_by(MonthlyTaxSummary.year.asc(), MonthlyTaxSummary.month.asc())
+            .all()
+        )
+        for row in rows:
+            pools[TaxService.LOSS_POOLS[row.bucket]] = row.loss_carry_forward
+        return pools
+
+    @staticmethod
+    def _summarize_month(
+        user_id: int,
+        year: int,
+        month: int,
+        buckets: Dict[TaxBucket, Tuple[float, float]],
+        pools: Dict[str, float],
+    ) -> List[Dict[str, Any]]:
+        """Apply exemption and loss compensation to one month (updates pools)"""
+        acoes_sales = buckets.get(TaxBucket.ACOES, (0.0, 0.0))[0]
+        acoes_exempt = acoes_sales <= TaxService.MONTHLY_EXEMPTION
+
+        # Losses of the month join their pool before any gain is compensated
+        for bucket, (_, net) in buckets.items():
+            if net < 0:
+                pools[TaxService.LOSS_POOLS[bucket]] += -net
+
+        rows = []
+        for bucket in TaxBucket:
+            if bucket not in buckets:
+                continue
+            sales, net = buckets[bucket]
+            pool = TaxService.LOSS_POOLS[bucket]
+            exempt = bucket == TaxBucket.ACOES and acoes_exempt
+
+            loss_used = 0.0
+            taxable_base = 0.0
+            if net > 0 and not exempt:
+                loss_used = min(pools[pool], net)
+                pools[pool] -= loss_used
+                taxable_base = net - loss_used
+
+            rate = TaxService.TAX_RATES[bucket]
+            if bucket == TaxBucket.DAY_TRADE:
+                irrf = max(net, 0.0) * TaxService.IRRF_DAY_TRADE_RATE
+            else:
+                irrf = sales * TaxService.IRRF_SWING_RATE
+            tax = taxable_base * rate
+
+            rows.append({
+                "user_id": user_id,
+                "year": year,
+                "month": month,
+                "bucket": bucket,
+                "sales_total": round(sales, 2),
+                "net_result": round(net, 2),
+                "exempt": exempt,
+                "loss_used": round(loss_used, 2),
+                "loss_carry_forward": 0.0,
+                "taxable_base": round(taxable_base, 2),
+                "tax_rate": rate,
+                "irrf": round(irrf, 2),
+                "tax_due": round(max(0.0, tax - irrf), 2),
+            })
+
+        # Pool balances after the whole month
+        for row in rows:
+            row["loss_carry_forward"] = round(pools[TaxService.LOSS_POOLS[row["bucket"]]], 2)
+        return rows
+
+    @staticmethod
+    def ensure(db: Session, user_id: int) -> None:
+        """Build the ledger on first access for users with sales booked before it existed"""
+        has_entries = db.query(RealizedGain.id).filter(RealizedGain.user_id == user_id).first()
+        if has_entries:
+            return
+        has_sales = db.query(Transaction.id).filter(
+            Transaction.user_id == user_id, Transaction.type == TransactionType.SELL
+        ).first()
+        if has_sales:
+            logger.info(f"Building tax ledger for user {user_id}")
+            TaxService.on_transactions_changed(db, user_id)
+
+    @staticmethod
+    def get_month(db: Session, user_id: int, year: int, month: int) -> Dict[str, Any]:
+        """DARF summary of a month (lookup on the monthly summaries)"""
+        TaxService.ensure(db, user_id)
+        rows = (
+            db.query(MonthlyTaxSummary)
+            .filter(
+                MonthlyTaxSummary.user_id == user_id,
+                MonthlyTaxSummary.year == year,
+                MonthlyTaxSummary.month == month,
+            )
+            .all()
+        )
+        carried = TaxService._pools_before(db, user_id, year, month)
+        darf_carry_in = TaxService._darf_carry_in(db, user_id, year, month)
+        return TaxService._month_payload(year, month, rows, carried, darf_carry_in)
+
+    @staticmethod
+    def get_year(db: Session, user_id: int, year: int) -> Dict[str, Any]:
+        """Monthly DARF summaries of a year"""
+        TaxService.ensure(db, user_id)
+        rows = (
+            db.query(MonthlyTaxSummary)
+            .filter(MonthlyTaxSummary.user_id == user_id, MonthlyTaxSummary.year == year)
+            .order_by(MonthlyTaxSummary.month.asc())
+            .all()
+        )
+        by_month = defaultdict(list)
+        for row in rows:
+            by_month[row.month].append(row)
+
+        # Sub-minimum DARFs roll from month to month within the year
+        darf_carry_in = TaxService._darf_carry_in(db, user_id, year, 1)
+        months = []
+        for month in sorted(by_month):
+            payload = TaxService._month_payload(year, month, by_month[month], {}, darf_carry_in)
+            darf_carry_in = payload["darf"]["deferred"]
+            months.append(payload)
+
+        return {
+            "year": year,
+            "months": months,
+            "total_tax_due": round(sum(m["darf"]["amount"] for m in months), 2),
+            "deferred_to_next_year": darf_carry_in,
+            "total_exempt_gains": round(sum(
+                row.net_result for row in rows if row.exempt and row.net_result > 0
+            ), 2),
+        }
+
+    @staticmethod
+    def _pools_before(db: Session, user_id: int, year: int, month: int) -> Dict[str, float]:
+        """Loss pools carried into a month without activity in some buckets"""
+        rows = (
+            db.query(MonthlyTaxSummary)
+            .filter(
+                MonthlyTaxSummary.user_id == user_id,
+                (MonthlyTaxSummary.year < year)
+                | ((MonthlyTaxSummary.year == year) & (MonthlyTaxSummary.month < month)),
+            )
+            .order_by(MonthlyTaxSummary.year.asc(), MonthlyTaxSummary.month.asc())
+            .all()
+        )
+        pools: Dict[str, float] = {}
+        for row in rows:
+            pools[TaxService.LOSS_POOLS[row.bucket]] = row.loss_carry_forward
+        return pools
+
+    @staticmethod
+    def _darf_carry_in(db: Session, user_id: int, year: int, month: int) -> float:
+        """
+        Tax of earlier months not paid yet because it stayed below the
+        DARF minimum (it accumulates until the total reaches R$10)
+        """
+        totals = (
+            db.query(MonthlyTaxSummary.year, MonthlyTaxSummary.month, func.sum(MonthlyTaxSummary.tax_due))
+            .filter(
+                MonthlyTaxSummary.user_id == user_id,
+                (MonthlyTaxSummary.year < year)
+                | ((MonthlyTaxSummary.year == year) & (MonthlyTaxSummary.month < month)),
+            )
+            .group_by(MonthlyTaxSummary.year, MonthlyTaxSummary.month)
+            .order_by(MonthlyTaxSummary.year.asc(), MonthlyTaxSummary.month.asc())
+            .all()
+        )
+        pending = 0.0
+        for _, _, total in totals:
+            pending = round(pending + (total or 0.0), 2)
+            if pending >= TaxService.DARF_MINIMUM:
+                pending = 0.0
+        return pending
+
+    @staticmethod
+    def _month_payload(
+        year: int,
+        month: int,
+        rows: List[MonthlyTaxSummary],
+        carried: Dict[str, float],
+        darf_carry_in: float = 0.0,
+    ) -> Dict[str, Any]:
+        total = round(sum(row.tax_due for row in rows), 2)
+        darf_total = round(total + darf_carry_in, 2)
+        below_minimum = 0 < darf_total < TaxService.DARF_MINIMUM
+        pools = dict(carried)
+        for row in rows:
+            pools[TaxService.LOSS_POOLS[row.bucket]] = row.loss_carry_forward
+
+        # DARF is due on the last business day of the following month
+        due = (date(year + (month // 12), month % 12 + 1, 28) + timedelta(days=4)).replace(day=1)
+        due -= timedelta(days=1)
+        while due.weekday() >= 5:
+            due -= timedelta(days=1)
+
+        return {
+            "year": year,
+            "month": month,
+            "buckets": [
+                {
+                    "bucket": row.bucket.value,
+                    "sales_total": row.sales_total,
+                    "net_result": row.net_result,
+                    "exempt": row.exempt,
+                    "loss_used": row.loss_used,
+                    "taxable_base": row.taxable_base,
+                    "tax_rate": row.tax_rate,
+                    "irrf": row.irrf,
+                    "tax_due": row.tax_due,
+                }
+                for row in sorted(rows, key=lambda r: list(TaxBucket).index(r.bucket))
+            ],
+            "loss_carry_forward": {pool: round(value, 2) for pool, value in pools.items()},
+            "total_tax_due": total,
+            "darf": {
+                "code": TaxService.DARF_CODE,
+                "due_date": due.isoformat(),
+                "amount": 0.0 if below_minimum else darf_total,
+                "carried_in": round(darf_carry_in, 2),  # De meses anteriores abaixo do mínimo
+                "deferred": darf_total if below_minimum else 0.0,  # Vai para o mês seguinte
+                "below_minimum": below_minimum,
+            },
+        }
+
+    @staticmethod
+    def list_gains(db: Session, user_id: int, year: int, month: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Ledger entries of a year or month"""
+        TaxService.ensure(db, user_id)
+        start = date(year, month or 1, 1)
+        end = date(year + 1, 1, 1) if not month else (start + timedelta(days=32)).replace(day=1)
+
+        entries = (
+            db.query(RealizedGain, Asset.ticker)
+            .join(Asset, Asset.id == RealizedGain.asset_id)
+            .filter(
+                RealizedGain.user_id == user_id,
+                RealizedGain.date >= start,
+                RealizedGain.date < end,
+            )
+            .order_by(RealizedGain.date.asc(), RealizedGain.id.asc())
+            .all()
+        )
+        return [
+            {
+                "id": entry.id,
+                "transaction_id": entry.transaction_id,
+                "ticker": ticker,
+                "date": entry.date.isoformat(),
+                "bucket": entry.bucket.value,
+                "quantity": entry.quantity,
+                "sale_value": entry.sale_value,
+                "cost_basis": entry.cost_basis,
+                "gain": entry.gain,
+            }
+            for entry, ticker in entries
+        ]
@@ -0,0 +1,226 @@
+"""
+Tesouro Service
+
+Mark-to-market of Tesouro Direto bonds from the Tesouro Transparente
+price file ("PrecoTaxaTesouroDireto.csv": one row per bond, maturity and
+day with buy/sell rates and unit prices).
+
+- The file (uploaded, downloaded or read from a local path) is parsed
+  once and only rows after the last stored day of each bond are inserted
+- An investment holds invested / buy PU on its purchase day units of the
+  bond; its market value is units x sell PU on the valuation day
+- Prices are found for all investments at once with a binary search over
+  the (bond, maturity, day) keys, taking the last published day on or
+  before each date
+"""
+import csv
+import io
+import unicodedata
+from datetime import date, datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple
+import httpx
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.models.fixed_income import FixedIncomeType, TesouroPrice
+from app.core.logging import logger
+
+# Key spacing of (bond, day) composite keys: day numbers stay far below it
+_DAYS_SPAN = 1_000_000
+
+
+def _normalize(header: str) -> str:
+    text = unicodedata.normalize("NFKD", header).encode("ascii", "ignore").decode()
+    return " ".join(text.lower().split())
+
+
+def _parse_number(value: Optional[str]) -> Optional[float]:
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        return float(value.replace(".", "").replace(",", ".") if "," in value else value)
+    except ValueError:
+        return None
+
+
+class TesouroService:
+    """Service for Tesouro Direto prices and mark-to-market"""
+
+    # FixedIncomeType -> "Tipo Titulo" of the price file
+    BOND_TYPES = {
+        FixedIncomeType.TESOURO_SELIC: "Tesouro Selic",
+        FixedIncomeType.TESOURO_PREFIXADO: "Tesouro Prefixado",
+        FixedIncomeType.TESOURO_PREFIXADO_JUROS: "Tesouro Prefixado com Juros Semestrais",
+        FixedIncomeType.TESOURO_IPCA: "Tesouro IPCA+",
+        FixedIncomeType.TESOURO_IPCA_JUROS: "Tesouro IPCA+ com Juros Semestrais",
+    }
+
+    COLUMNS = {
+        "tipo titulo": "bond_type",
+        "data vencimento": "maturity_date",
+        "data base": "date",
+        "taxa compra manha": "buy_rate",
+        "taxa venda manha": "sell_rate",
+        "pu compra manha": "buy_price",
+        "pu venda manha": "sell_price",
+        "pu base manha": "base_price",
+    }
+
+    @staticmethod
+    def parse_csv(content: bytes) -> List[Dict[str, Any]]:
+        """
+        Parse a Tesouro Transparente price file (";" separated, dd/mm/yyyy
+        dates, decimal commas).
+
+        Raises:
+            ValueError: If a required column is missing
+        """
+        try:
+            text = content.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            text = content.decode("latin-1")
+
+        reader = csv.reader(io.StringIO(text), delimiter=";")
+        header = [_normalize(h) for h in next(reader, [])]
+        positions = {TesouroService.COLUMNS[h]: i for i, h in enumerate(header) if h in TesouroService.COLUMNS}
+        missing = {"bond_type", "maturity_date", "date"} - set(positions)
+        if missing:
+            raise ValueError(f"Colunas ausentes no arquivo: {', '.join(sorted(missing))}")
+
+        rows = []
+        for values in reader:
+            if len(values) < len(header):
+                continue
+            try:
+                row = {
+                    "bond_type": values[positions["bond_type"]].strip(),
+                    "maturity_date": datetime.strptime(values[positions["maturity_date"]].strip(), "%d/%m/%Y").date(),
+                    "date": datetime.strptime(values[positions["date"]].strip(), "%d/%m/%Y").date(),
+                }
+            except ValueError:
+                continue
+            for field in ("buy_rate", "sell_rate", "buy_price", "sell_price", "base_price"):
+                row[field] = _parse_number(values[positions[field]]) if field in positions else None
+            rows.append(row)
+        return rows
+
+    @staticmethod
+    def import_prices(db: Session, content: bytes) -> Dict[str, int]:
+        """
+        Store the rows of a price file that are newer than the last stored
+        day of their bond (the file carries the whole history).
+
+        Returns:
+            Dict with the rows read and inserted and the bonds covered
+        """
+        rows = TesouroService.parse_csv(content)
+        last_stored = {
+            (bond_type, maturity): last
+            for bond_type, maturity, last in db.query(
+                TesouroPrice.bond_type, TesouroPrice.maturity_date, func.max(TesouroPrice.date)
+            ).group_by(TesouroPrice.bond_type, TesouroPrice.maturity_date)
+        }
+
+        new = {}
+        for row in rows:
+            bond = (row["bond_type"], row["maturity_date"])
+            if bond in last_stored and row["date"] <= last_stored[bond]:
+                continue
+            new[bond + (row["date"],)] = row
+
+        db.bulk_insert_mappings(TesouroPrice, [new[key] for key in sorted(new)])
+        db.commit()
+
+        result = {
+            "rows": len(rows),
+            "inserted": len(new),
+            "bonds": len({(r["bond_type"], r["maturity_date"]) for r in rows}),
+        }
+        logger.info(f"Tesouro prices imported: {result['inserted']} of {result['rows']} rows")
+        return result
+
+    @staticmethod
+    async def import_from_source(db: Session, source: str) -> Dict[str, int]:
+        """Import the price file from a URL or a local path"""
+        if source.startswith(("http://", "https://")):
+            async with httpx.AsyncClient(timeout=120.0, follow_redirects=True) as client:
+                response = await client.get(source)
+                response.raise_for_status()
+                content = response.content
+        else:
+            content = Path(source).read_bytes()
+        return TesouroService.import_prices(db, content)
+
+    @staticmethod
+    def market_values(
+        db: Session,
+        bonds: List[Optional[Tuple[str, date]]],
+        invested: np.ndarray,
+        purchase: np.ndarray,
+        valuation: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Mark-to-market value of each investment.
+
+        Args:
+            db: Database session
+            bonds: (bond type, maturity) of each investment, None if not a
+                Tesouro bond
+            invested: Amounts invested
+            purchase: Purchase dates (datetime64[D])
+            valuation: Valuation dates (datetime64[D])
+
+        Returns:
+            Array of values, NaN where the bond has no price on or before
+            the purchase or valuation date
+        """
+        values = np.full(len(bonds), np.nan)
+        wanted = sorted({bond for bond in bonds if bond})
+        if not wanted:
+            return values
+
+        code = {bond: i for i, bond in enumerate(wanted)}
+        rows = (
+            db.query(
+                TesouroPrice.bond_type, TesouroPrice.maturity_date, TesouroPrice.date,
+                TesouroPrice.buy_price, TesouroPrice.sell_price, TesouroPrice.base_price,
+            )
+            .filter(
+                TesouroPrice.bond_type.in_({bond for bond, _ in wanted}),
+                TesouroPrice.maturity_date.in_({maturity for _, maturity in wanted}),
+            )
+            .all()
+        )
+        rows = [row for row in rows if (row[0], row[1]) in code]
+        if not rows:
+            return values
+
+        price_codes = np.array([code[(row[0], row[1])] for row in rows])
+        price_days = np.array([row[2] for row in rows], dtype="datetime64[D]").astype(np.int64)
+        keys = price_codes * _DAYS_SPAN + price_days
+        order = np.argsort(keys)
+        keys, price_codes = keys[order], price_codes[order]
+        base = np.array([row[5] for row in rows], dtype=float)[order]
+        buy = np.array([row[3] for row in rows], dtype=float)[order]
+        sell = np.array([row[4] for row in rows], dtype=float)[order]
+        # Bonds no longer sold have no buy PU, matured ones no sell PU
+        buy = np.where(buy > 0, buy, base)
+        sell = np.where(sell > 0, sell, base)
+
+        investment_codes = np.array([code[bond] if bond else -1 for bond in bonds])
+
+        def last_on_or_before(days: np.ndarray) -> np.ndarray:
+            idx = np.searchsorted(keys, investment_codes * _DAYS_SPAN + days.astype(np.int64), side="right") - 1
+            found = (investment_codes >= 0) & (idx >= 0) & (price_codes[np.maximum(idx, 0)] == investment_codes)
+            return np.where(found, idx, -1)
+
+        buy_idx = last_on_or_before(purchase)
+        sell_idx = last_on_or_before(valuation)
+        with np.errstate(invalid="ignore"):
+            unit_cost = np.where(buy_idx >= 0, buy[buy_idx], np.nan)
+            unit_value = np.where(sell_idx >= 0, sell[sell_idx], np.nan)
+            priced = (unit_cost > 0) & (unit_value > 0)
+        values[priced] = np.round(invested[priced] / unit_cost[priced] * unit_value[priced], 2)
+        return values
@@ -0,0 +1,243 @@
+"""
+VaR Service
+
+Tail risk (Value at Risk and Conditional VaR) of a user's portfolio by
+simulation, on top of the cached return matrices and covariances of
+RiskService.
+
+- "montecarlo" draws correlated normal daily returns from the covariance
+- "bootstrap" resamples whole days of the historical returns matrix, so
+  fat tails and co-movements come straight from the data
+- Paths are simulated in fixed-size shards, each with its own child seed,
+  so a seeded request gives the same result whether the shards run inline
+  or on the process pool (used for large requests)
+"""
+import asyncio
+import os
+import secrets
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional
+from sqlalchemy.orm import Session
+from app.services.risk_service import RiskService
+from app.core.logging import logger
+
+METHODS = ("montecarlo", "bootstrap")
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=min(VarService.MAX_WORKERS, os.cpu_count() or 1))
+    return _pool
+
+
+def simulate_shard(
+    method: str,
+    weights: np.ndarray,
+    horizons: List[int],
+    n_paths: int,
+    seed: np.random.SeedSequence,
+    mean: Optional[np.ndarray] = None,
+    chol: Optional[np.ndarray] = None,
+    history: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """
+    Simulate buy-and-hold portfolio returns for one shard of paths.
+
+    Module-level so the process pool can pickle it.
+
+    Returns:
+        n_paths x len(horizons) array of cumulative portfolio returns
+    """
+    rng = np.random.default_rng(seed)
+    growth = np.ones((n_paths, weights.shape[0]))
+    out = np.empty((n_paths, len(horizons)))
+    wanted = {h: i for i, h in enumerate(horizons)}
+
+    for day in range(1, max(horizons) + 1):
+        if method == "bootstrap":
+            daily = history[rng.integers(0, history.shape[0], n_paths)]
+        else:
+            daily = mean + rng.standard_normal((n_paths, weights.shape[0])) @ chol.T
+        growth *= np.maximum(1.0 + daily, 0.0)
+        if day in wanted:
+            out[:, wanted[day]] = growth @ weights - 1.0
+    return out
+
+
+def shutdown_pool() -> None:
+    """Stop the simulation workers (application shutdown)"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+class VarService:
+    """Service for simulated VaR/CVaR"""
+
+    DEFAULT_PATHS = 20000
+    MAX_PATHS = 200000
+    MAX_HORIZON = 252  # Trading days
+    SHARD_PATHS = 10000  # Paths per shard (fixed, keeps seeded runs reproducible)
+    POOL_MIN_WORK = 20_000_000  # paths x days x assets before using the pool
+    MAX_WORKERS = 4
+
+    @staticmethod
+    def tail_metrics(returns: np.ndarray, value: float, confidence: float) -> Dict[str, float]:
+        """VaR and CVaR (as positive losses, in currency and %) of simulated returns"""
+        cutoff = np.quantile(returns, 1.0 - confidence)
+        tail = returns[returns <= cutoff]
+        expected_tail = float(tail.mean()) if tail.size else float(cutoff)
+        return {
+            "var": round(-float(cutoff) * value, 2),
+            "var_percent": round(-float(cutoff) * 100, 4),
+            "cvar": round(-expected_tail * value, 2),
+            "cvar_percent": round(-expected_tail * 100, 4),
+        }
+
+    @staticmethod
+    async def simulate(
+        method: str,
+        weights: np.ndarray,
+        horizons: List[int],
+        n_paths: int,
+        seed: int,
+        mean: Optional[np.ndarray] = None,
+        cov: Optional[np.ndarray] = None,
+        history: Optional[np.ndarray] = None,
+        use_pool: Optional[bool] = None,
+    ) -> np.ndarray:
+        """
+        Simulate n_paths portfolio returns at each horizon, shard by shard.
+
+        Args:
+            use_pool: Force (True) or forbid (False) the process pool;
+                None decides from the amount of work
+
+        Returns:
+            n_paths x len(horizons) array of cumulative portfolio returns
+        """
+        chol = None
+        if method == "montecarlo":
+            # Jitter keeps the factorization valid for singular covariances
+            jitter = 1e-10 * max(float(np.trace(cov)), 1e-12) * np.eye(cov.shape[0])
+            chol = np.linalg.cholesky(cov + jitter)
+
+        sizes = [VarService.SHARD_PATHS] * (n_paths // VarService.SHARD_PATHS)
+        if n_paths % VarService.SHARD_PATHS:
+            sizes.append(n_paths % VarService.SHARD_PATHS)
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        args = [
+            (method, weights, horizons, size, child, mean, chol, history)
+            for size, child in zip(sizes, seeds)
+        ]
+
+        if use_pool is None:
+            work = n_paths * max(horizons) * weights.shape[0]
+            use_pool = len(sizes) > 1 and work >= VarService.POOL_MIN_WORK
+
+        loop = asyncio.get_running_loop()
+        if use_pool:
+            pool = _get_pool()
+            shards = await asyncio.gather(
+                *[loop.run_in_executor(pool, simulate_shard, *a) for a in args]
+            )
+        else:
+            # Small runs skip the pool, but still off the event loop
+            shards = await loop.run_in_executor(
+                None, lambda: [simulate_shard(*a) for a in args]
+            )
+        return np.concatenate(shards, axis=0)
+
+    @staticmethod
+    async def portfolio_var(
+        db: Session,
+        user_id: int,
+        horizons: List[int],
+        confidences: List[float],
+        n_paths: int = DEFAULT_PATHS,
+        method: str = "montecarlo",
+        seed: Optional[int] = None,
+        lookback_days: int = RiskService.DEFAULT_LOOKBACK_DAYS,
+    ) -> Dict[str, Any]:
+        """
+        Simulated VaR/CVaR of the user's variable-income positions.
+
+        Args:
+            db: Database session
+            user_id: User ID
+            horizons: Horizons in trading days
+            confidences: Confidence levels (e.g. 0.95, 0.99)
+            n_paths: Number of simulated paths
+            method: "montecarlo" or "bootstrap"
+            seed: Seed for a reproducible run (random if None, and returned)
+            lookback_days: Calendar days of history behind the estimates
+
+        Returns:
+            Portfolio value, seed used and VaR/CVaR per horizon and confidence
+        """
+        if method not in METHODS:
+            raise ValueError(f"Método inválido: {method}. Use {', '.join(METHODS)}")
+        if not horizons or min(horizons) < 1 or max(horizons) > VarService.MAX_HORIZON:
+            raise ValueError(f"Horizontes devem estar entre 1 e {VarService.MAX_HORIZON} dias")
+        if not confidences or not all(0.5 <= c < 1 for c in confidences):
+            raise ValueError("Níveis de confiança devem estar entre 0.5 e 1")
+        if not 1000 <= n_paths <= VarService.MAX_PATHS:
+            raise ValueError(f"paths deve estar entre 1000 e {VarService.MAX_PATHS}")
+
+        if seed is not None and seed < 0:
+            raise ValueError("seed deve ser um inteiro não negativo")
+
+        horizons = sorted(set(horizons))
+        confidences = sorted(set(confidences))
+        seed = secrets.randbits(32) if seed is None else seed
+
+        values = RiskService.holdings(db, user_id)
+        await RiskService.ensure_history(db, values)
+        stats = RiskService.covariance_matrix(db, values, lookback_days=lookback_days)
+
+        result = {
+            "method": method,
+            "paths": n_paths,
+            "seed": seed,
+            "lookback_days": lookback_days,
+            "observations": stats["observations"],
+            "portfolio_value": round(sum(values.values()), 2),
+            "without_history": stats["without_history"],
+            "results": [],
+        }
+        if stats["cov"] is None:
+            return result
+
+        columns = stats["tickers"]
+        value = sum(values[t] for t in columns)
+        weights = np.array([values[t] for t in columns]) / value
+        result["portfolio_value"] = round(value, 2)
+
+        history = None
+        if method == "bootstrap":
+            history = RiskService.returns_matrix(db, values, lookback_days)["returns"]
+
+        simulated = await VarService.simulate(
+            method, weights, horizons, n_paths, seed,
+            mean=stats["mean"], cov=stats["cov"], history=history,
+        )
+
+        result["results"] = [
+            {
+                "horizon_days": horizon,
+                "confidence": confidence,
+                **VarService.tail_metrics(simulated[:, i], value, confidence),
+            }
+            for i, horizon in enumerate(horizons)
+            for confidence in confidences
+        ]
+        logger.info(
+            f"Portfolio VaR for user {user_id}: {n_paths} paths, {len(columns)} assets",
+            extra={"user_id": user_id, "paths": n_paths, "method": method},
+        )
+        return result
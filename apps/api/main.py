@@ -7,8 +7,10 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
 from app.core.logging import logger
+from app.core.pagination import NEXT_CURSOR_HEADER
+from app.core.response_cache import ETAG_HEADER
 from app.core.middleware import setup_monitoring_middleware
-from app.routes import auth, health, cei, portfolio, notifications, market, portfolio_manage, fixed_income, analytics, personal_finance
+from app.routes import auth, health, cei, portfolio, notifications, market, portfolio_manage, fixed_income, analytics, personal_finance, tax
 
 
 @asynccontextmanager
@@ -20,6 +22,7 @@ async def lifespan(app: FastAPI):
     - Initialize scheduler if enabled
     
     Shutdown:
+    - Stop simulation worker pool
     - Stop scheduler
     """
     # Startup
@@ -36,6 +39,9 @@ async def lifespan(app: FastAPI):
     yield
     
     # Shutdown
+    from app.services.var_service import shutdown_pool
+    shutdown_pool()
+    
     if settings.ENABLE_SCHEDULER:
         from app.services.scheduler import stop_scheduler
         logger.info("Stopping background scheduler...")
@@ -61,6 +67,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, ETAG_HEADER],
 )
 
 # Setup monitoring middleware
@@ -77,6 +84,7 @@ app.include_router(portfolio_manage.router, tags=["Portfolio Management"])
 app.include_router(fixed_income.router, tags=["Fixed Income"])
 app.include_router(analytics.router, prefix="/analytics", tags=["Analytics"])
 app.include_router(personal_finance.router, tags=["Personal Finance"])
+app.include_router(tax.router, tags=["Tax"])
 
 
 @app.get("/")
@@ -11,12 +11,15 @@ CREATE TYPE notificationtype AS ENUM ('DIVIDEND', 'JCP', 'EARNINGS', 'CORPORATE_
 CREATE TYPE pf_transaction_type AS ENUM ('INCOME', 'EXPENSE', 'TRANSFER');
 CREATE TYPE fixedincometype AS ENUM ('TESOURO_SELIC', 'TESOURO_PREFIXADO', 'TESOURO_PREFIXADO_JUROS', 'TESOURO_IPCA', 'TESOURO_IPCA_JUROS', 'CDB', 'LCI', 'LCA', 'LC', 'DEBENTURE', 'CRI', 'CRA', 'POUPANCA', 'OUTRO');
 CREATE TYPE indexertype AS ENUM ('SELIC', 'CDI', 'IPCA', 'IGPM', 'PREFIXADO', 'TR', 'OUTRO');
+CREATE TYPE taxbucket AS ENUM ('ACOES', 'OUTROS', 'FII', 'DAY_TRADE');
+CREATE TYPE corporateactiontype AS ENUM ('SPLIT', 'REVERSE_SPLIT', 'BONUS');
 CREATE TABLE users (
 	id SERIAL NOT NULL, 
 	email VARCHAR NOT NULL, 
 	hashed_password VARCHAR NOT NULL, 
 	is_active BOOLEAN NOT NULL, 
 	is_superuser BOOLEAN NOT NULL, 
+	data_version INTEGER DEFAULT '0' NOT NULL, 
 	created_at TIMESTAMP WITH TIME ZONE DEFAULT now(), 
 	updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(), 
 	PRIMARY KEY (id)
@@ -71,6 +74,7 @@ CREATE INDEX ix_transactions_date ON transactions (date);
 CREATE INDEX ix_transactions_asset_id ON transactions (asset_id);
 CREATE INDEX ix_transactions_id ON transactions (id);
 CREATE INDEX ix_transactions_user_id ON transactions (user_id);
+CREATE INDEX ix_transactions_user_date_id ON transactions (user_id, date, id);
 CREATE TABLE proceeds (
 	id SERIAL NOT NULL, 
 	user_id INTEGER NOT NULL, 
@@ -89,6 +93,7 @@ CREATE INDEX ix_proceeds_date ON proceeds (date);
 CREATE INDEX ix_proceeds_user_id ON proceeds (user_id);
 CREATE INDEX ix_proceeds_id ON proceeds (id);
 CREATE INDEX ix_proceeds_asset_id ON proceeds (asset_id);
+CREATE INDEX ix_proceeds_user_date_id ON proceeds (user_id, date, id);
 CREATE TABLE cei_credentials (
 	id SERIAL NOT NULL, 
 	user_id INTEGER NOT NULL, 
@@ -121,6 +126,7 @@ CREATE TABLE notifications (
 );
 CREATE INDEX ix_notifications_user_id ON notifications (user_id);
 CREATE INDEX ix_notifications_id ON notifications (id);
+CREATE INDEX ix_notifications_user_id_id ON notifications (user_id, id);
 CREATE TABLE pf_accounts (
 	id SERIAL NOT NULL, 
 	user_id INTEGER NOT NULL, 
@@ -180,3 +186,199 @@ CREATE TABLE pf_transactions (
 	FOREIGN KEY(category_id) REFERENCES pf_categories (id)
 );
 CREATE INDEX ix_pf_transactions_id ON pf_transactions (id);
+CREATE TABLE portfolio_snapshots (
+	id SERIAL NOT NULL, 
+	user_id INTEGER NOT NULL, 
+	total_value FLOAT NOT NULL, 
+	total_invested FLOAT NOT NULL, 
+	positions_count INTEGER NOT NULL, 
+	allocation_by_type JSON NOT NULL, 
+	allocation_by_sector JSON NOT NULL, 
+	top_positions JSON NOT NULL, 
+	updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(), 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE UNIQUE INDEX ix_portfolio_snapshots_user_id ON portfolio_snapshots (user_id);
+CREATE INDEX ix_portfolio_snapshots_id ON portfolio_snapshots (id);
+CREATE TABLE price_bars (
+	id SERIAL NOT NULL, 
+	ticker VARCHAR NOT NULL, 
+	date DATE NOT NULL, 
+	open FLOAT, 
+	high FLOAT, 
+	low FLOAT, 
+	close FLOAT NOT NULL, 
+	volume FLOAT, 
+	adj_close FLOAT, 
+	updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(), 
+	PRIMARY KEY (id), 
+	CONSTRAINT uq_price_bars_ticker_date UNIQUE (ticker, date)
+);
+CREATE INDEX ix_price_bars_id ON price_bars (id);
+CREATE TABLE portfolio_daily_values (
+	id SERIAL NOT NULL, 
+	user_id INTEGER NOT NULL, 
+	date DATE NOT NULL, 
+	value FLOAT NOT NULL, 
+	invested FLOAT NOT NULL, 
+	net_cash_flow FLOAT NOT NULL, 
+	PRIMARY KEY (id), 
+	CONSTRAINT uq_portfolio_daily_values_user_date UNIQUE (user_id, date), 
+	FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE INDEX ix_portfolio_daily_values_id ON portfolio_daily_values (id);
+CREATE TABLE realized_gains (
+	id SERIAL NOT NULL, 
+	user_id INTEGER NOT NULL, 
+	transaction_id INTEGER NOT NULL, 
+	asset_id INTEGER NOT NULL, 
+	date DATE NOT NULL, 
+	bucket taxbucket NOT NULL, 
+	quantity FLOAT NOT NULL, 
+	sale_value FLOAT NOT NULL, 
+	cost_basis FLOAT NOT NULL, 
+	gain FLOAT NOT NULL, 
+	created_at TIMESTAMP WITH TIME ZONE DEFAULT now(), 
+	PRIMARY KEY (id), 
+	FOREIGN KEY(user_id) REFERENCES users (id), 
+	FOREIGN KEY(transaction_id) REFERENCES transactions (id) ON DELETE CASCADE, 
+	FOREIGN KEY(asset_id) REFERENCES assets (id)
+);
+CREATE INDEX ix_realized_gains_user_date ON realized_gains (user_id, date);
+CREATE INDEX ix_realized_gains_transaction_id ON realized_gains (transaction_id);
+CREATE INDEX ix_realized_gains_asset_id ON realized_gains (asset_id);
+CREATE INDEX ix_realized_gains_id ON realized_gains (id);
+CREATE TABLE monthly_tax_summaries (
+	id SERIAL NOT NULL, 
+	user_id INTEGER NOT NULL, 
+	year INTEGER NOT NULL, 
+	month INTEGER NOT NULL, 
+	bucket taxbucket NOT NULL, 
+	sales_total FLOAT NOT NULL, 
+	net_result FLOAT NOT NULL, 
+	exempt BOOLEAN NOT NULL, 
+	loss_used FLOAT NOT NULL, 
+	loss_carry_forward FLOAT NOT NULL, 
+	taxable_base FLOAT NOT NULL, 
+	tax_rate FLOAT NOT NULL, 
+	irrf FLOAT NOT NULL, 
+	tax_due FLOAT NOT NULL, 
+	updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(), 
+	PRIMARY KEY (id), 
+	CONSTRAINT uq_monthly_tax_summaries_period UNIQUE (user_id, year, month, bucket), 
+	FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE INDEX ix_monthly_tax_summaries_user_period ON monthly_tax_summaries (user_id, year, month);
+CREATE INDEX ix_monthly_tax_summaries_id ON monthly_tax_summaries (id);
+CREATE TABLE proceed_monthly_rollups (
+	id SERIAL NOT NULL, 
+	user_id INTEGER NOT NULL, 
+	year INTEGER NOT NULL, 
+	month INTEGER NOT NULL, 
+	type proceedtype NOT NULL, 
+	total_value FLOAT NOT NULL, 
+	count INTEGER NOT NULL, 
+	updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(), 
+	PRIMARY KEY (id), 
+	CONSTRAINT uq_proceed_monthly_rollups_period UNIQUE (user_id, year, month, type), 
+	FOREIGN KEY(user_id) REFERENCES users (id)
+);
+CREATE INDEX ix_proceed_monthly_rollups_id ON proceed_monthly_rollups (id);
+CREATE TABLE dividend_events (
+	id SERIAL NOT NULL, 
+	ticker VARCHAR NOT NULL, 
+	payment_date DATE NOT NULL, 
+	value_per_share FLOAT NOT NULL, 
+	ex_date DATE, 
+	label VARCHAR, 
+	source VARCHAR NOT NULL, 
+	created_at TIMESTAMP WITH TIME ZONE DEFAULT now(), 
+	PRIMARY KEY (id), 
+	CONSTRAINT uq_dividend_events_payment UNIQUE (ticker, payment_date, value_per_share)
+);
+CREATE INDEX ix_dividend_events_id ON dividend_events (id);
+CREATE TABLE dividend_estimates (
+	id SERIAL NOT NULL, 
+	ticker VARCHAR NOT NULL, 
+	trailing_12m FLOAT NOT NULL, 
+	annual_estimate FLOAT NOT NULL, 
+	monthly_profile JSON NOT NULL, 
+	years_analyzed INTEGER NOT NULL, 
+	last_payment_date DATE, 
+	computed_at TIMESTAMP WITH TIME ZONE DEFAULT now(), 
+	PRIMARY KEY (id), 
+	UNIQUE (ticker)
+);
+CREATE INDEX ix_dividend_estimates_id ON dividend_estimates (id);
+CREATE TABLE barsi_screener (
+	id SERIAL NOT NULL, 
+	ticker VARCHAR NOT NULL, 
+	name VARCHAR, 
+	sector VARCHAR, 
+	current_price FLOAT NOT NULL, 
+	price_date DATE NOT NULL, 
+	average_annual_dividend FLOAT NOT NULL, 
+	price_target FLOAT NOT NULL, 
+	current_yield FLOAT NOT NULL, 
+	upside_to_target FLOAT NOT NULL, 
+	margin_of_safety FLOAT NOT NULL, 
+	years_analyzed INTEGER NOT NULL, 
+	rank INTEGER NOT NULL, 
+	computed_at TIMESTAMP WITH TIME ZONE DEFAULT now(), 
+	PRIMARY KEY (id), 
+	UNIQUE (ticker)
+);
+CREATE INDEX ix_barsi_screener_id ON barsi_screener (id);
+CREATE INDEX ix_barsi_screener_rank ON barsi_screener (rank);
+CREATE TABLE indexer_rates (
+	id SERIAL NOT NULL, 
+	indexer indexertype NOT NULL, 
+	date DATE NOT NULL, 
+	value FLOAT NOT NULL, 
+	created_at TIMESTAMP WITH TIME ZONE DEFAULT now(), 
+	PRIMARY KEY (id), 
+	CONSTRAINT uq_indexer_rates_indexer_date UNIQUE (indexer, date)
+);
+CREATE INDEX ix_indexer_rates_id ON indexer_rates (id);
+CREATE TABLE tesouro_prices (
+	id SERIAL NOT NULL, 
+	bond_type VARCHAR NOT NULL, 
+	maturity_date DATE NOT NULL, 
+	date DATE NOT NULL, 
+	buy_rate FLOAT, 
+	sell_rate FLOAT, 
+	buy_price FLOAT, 
+	sell_price FLOAT, 
+	base_price FLOAT, 
+	PRIMARY KEY (id), 
+	CONSTRAINT uq_tesouro_prices_bond_date UNIQUE (bond_type, maturity_date, date)
+);
+CREATE INDEX ix_tesouro_prices_id ON tesouro_prices (id);
+CREATE INDEX ix_tesouro_prices_date ON tesouro_prices (date);
+CREATE TABLE corporate_actions (
+	id SERIAL NOT NULL, 
+	ticker VARCHAR NOT NULL, 
+	ex_date DATE NOT NULL, 
+	type corporateactiontype NOT NULL, 
+	factor FLOAT NOT NULL, 
+	description VARCHAR, 
+	created_at TIMESTAMP WITH TIME ZONE DEFAULT now(), 
+	PRIMARY KEY (id), 
+	CONSTRAINT uq_corporate_actions_event UNIQUE (ticker, ex_date, type)
+);
+CREATE INDEX ix_corporate_actions_id ON corporate_actions (id);
+CREATE INDEX ix_corporate_actions_ticker ON corporate_actions (ticker);
+CREATE TABLE position_checkpoints (
+	id SERIAL NOT NULL, 
+	user_id INTEGER NOT NULL, 
+	asset_id INTEGER NOT NULL, 
+	date DATE NOT NULL, 
+	quantity FLOAT NOT NULL, 
+	cost FLOAT NOT NULL, 
+	PRIMARY KEY (id), 
+	CONSTRAINT uq_position_checkpoints_user_date_asset UNIQUE (user_id, date, asset_id), 
+	FOREIGN KEY(user_id) REFERENCES users (id), 
+	FOREIGN KEY(asset_id) REFERENCES assets (id)
+);
+CREATE INDEX ix_position_checkpoints_id ON position_checkpoints (id);
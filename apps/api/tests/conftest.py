@@ -5,7 +5,12 @@ import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from app.core.database import Base, get_db
+from app.core.database import Base, get_db, get_session_factory
+from app.core.response_cache import ResponseCache
+from app.services.risk_service import RiskService
+from app.services.optimizer_service import OptimizerService
+from app.services.rolling_stats import RollingStatsService
+from app.services.corporate_action_service import CorporateActionService
 from main import app
 
 # Test database URL
@@ -41,6 +46,12 @@ def client(db):
             pass
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_session_factory] = lambda: TestingSessionLocal
+    ResponseCache.invalidate()
+    RiskService.invalidate()
+    OptimizerService.invalidate()
+    RollingStatsService.reset()
+    CorporateActionService.invalidate()
     yield TestClient(app)
     app.dependency_overrides.clear()
 
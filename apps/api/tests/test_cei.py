@@ -110,6 +110,30 @@ def test_cei_sync_with_connection(client: TestClient, auth_headers: dict, db, te
     assert len(positions) > 0
 
 
+def test_cei_sync_rebuilds_derived_data(client: TestClient, auth_headers: dict, db, test_user):
+    """Test back-dated synced transactions drop stale checkpoints and feed as-of positions"""
+    from datetime import date, timedelta
+    from app.models.position import PositionCheckpoint
+
+    asset = Asset(ticker="TEST3", name="Teste", type=AssetType.ACAO)
+    db.add(asset)
+    db.commit()
+    # Built before the sync, when the user held nothing else
+    db.add(PositionCheckpoint(
+        user_id=test_user.id, asset_id=asset.id, date=date.today() - timedelta(days=1), quantity=1, cost=10.0
+    ))
+    db.commit()
+
+    # Connecting runs the first sync
+    response = client.post("/cei/connect", json={"cpf": "12345678901", "password": "test_password"}, headers=auth_headers)
+    assert response.status_code == 201
+
+    assert db.query(PositionCheckpoint).filter(PositionCheckpoint.user_id == test_user.id).count() == 0
+    as_of = client.get(f"/portfolio/as-of/{date.today().isoformat()}", headers=auth_headers).json()
+    held = db.query(AssetPosition).filter(AssetPosition.user_id == test_user.id).count()
+    assert len(as_of["positions"]) == held
+
+
 def test_cei_status_without_connection(client: TestClient, auth_headers: dict):
     """Test getting status without connecting first"""
     response = client.get("/cei/status", headers=auth_headers)
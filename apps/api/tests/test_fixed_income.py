@@ -0,0 +1,171 @@
+"""
+Tests for fixed income revaluation, taxes and Tesouro Direto prices
+"""
+import pytest
+from fastapi.testclient import TestClient
+from datetime import date, timedelta
+
+
+def test_fixed_income_revaluation_from_indexer_series(client: TestClient, db, test_user, monkeypatch):
+    """Test every investment is revalued from the stored series in one vectorized pass"""
+    import asyncio
+    import math
+    import numpy as np
+    from app.models.fixed_income import FixedIncomeInvestment, FixedIncomeType, IndexerRate, IndexerType
+    from app.services.bcb_service import BCBService
+    from app.services.fixed_income_service import FixedIncomeService
+
+    as_of = date(2025, 7, 1)
+    cdi_days = np.arange(np.datetime64("2025-01-02"), np.datetime64("2025-07-01"))
+    cdi_days = [d.item() for d in cdi_days[np.is_busday(cdi_days)]]
+
+    fetched = []
+
+    async def fake_series(code, start, end):
+        fetched.append((code, start))
+        if code == FixedIncomeService.SGS_SERIES[IndexerType.CDI]:
+            return [(d, 0.05) for d in cdi_days if d >= start]
+        # IPCA de junho ainda não publicado
+        return [(date(2025, month, 1), 0.4) for month in range(1, 6)]
+    monkeypatch.setattr(BCBService, "get_series", staticmethod(fake_series))
+
+    def add(indexer, rate, percentage=True, purchase=date(2025, 1, 2), maturity=None, type=FixedIncomeType.CDB):
+        investment = FixedIncomeInvestment(
+            user_id=test_user.id, name=f"{indexer.value} {rate}", type=type, invested_amount=1000.0,
+            purchase_date=purchase, maturity_date=maturity, indexer=indexer, rate=rate,
+            is_percentage_of_indexer=1 if percentage else 0, current_value=1000.0,
+        )
+        db.add(investment)
+        return investment
+
+    cdi = add(IndexerType.CDI, 100)
+    cdi_110 = add(IndexerType.CDI, 110)
+    matured = add(IndexerType.CDI, 100, maturity=date(2025, 3, 31))
+    ipca = add(IndexerType.IPCA, 5, percentage=False, purchase=date(2025, 1, 1), type=FixedIncomeType.TESOURO_IPCA)
+    prefixed = add(IndexerType.PREFIXADO, 12, percentage=False)
+    savings = add(IndexerType.TR, 100, type=FixedIncomeType.POUPANCA)
+    db.commit()
+
+    fetched_counts = asyncio.run(FixedIncomeService.sync_rates(db, end=as_of))
+    assert fetched_counts == {"CDI": len(cdi_days), "IPCA": 5}
+    assert (12, date(2025, 1, 2)) in fetched and (433, date(2025, 1, 1)) in fetched
+
+    # Only values after the last stored one are fetched again
+    fetched.clear()
+    assert asyncio.run(FixedIncomeService.sync_rates(db, end=as_of)) == {"CDI": 0, "IPCA": 0}
+    assert (12, date(2025, 7, 1)) in fetched
+
+    result = FixedIncomeService.revalue(db, as_of=as_of)
+    assert result["investments"] == 6
+    assert result["updated"] == 5 and result["skipped"] == 1
+
+    for investment in (cdi, cdi_110, matured, ipca, prefixed, savings):
+        db.refresh(investment)
+    business_days = int(np.busday_count(date(2025, 1, 2), as_of))
+    assert cdi.current_value == round(1000 * 1.0005 ** business_days, 2)
+    assert cdi_110.current_value == round(1000 * (1 + 1.1 * 0.0005) ** business_days, 2)
+    assert matured.current_value == round(1000 * 1.0005 ** int(np.busday_count(date(2025, 1, 2), date(2025, 3, 31))), 2)
+    # Junho acumula o IPCA de maio, pro rata por dia
+    ipca_growth = 5 * math.log1p(0.004) + 30 / 31 * math.log1p(0.004)
+    spread_growth = int(np.busday_count(date(2025, 1, 1), as_of)) * math.log1p(0.05) / 252
+    assert ipca.current_value == pytest.approx(round(1000 * math.exp(ipca_growth + spread_growth), 2))
+    assert prefixed.current_value == pytest.approx(round(1000 * 1.12 ** (business_days / 252), 2))
+    assert prefixed.gross_value == prefixed.current_value
+    assert savings.current_value == 1000.0
+    assert db.query(IndexerRate).count() == len(cdi_days) + 5
+
+    # Every purchase after the valuation date: nothing is priced (no negative curve span)
+    result = FixedIncomeService.revalue(db, as_of=date(2024, 12, 1))
+    assert result["investments"] == 6 and result["updated"] == 0
+
+
+def test_fixed_income_net_values_regressive_ir_and_iof(client: TestClient, auth_headers: dict, db, test_user):
+    """Test IOF and regressive income tax are applied by days held, with exemptions"""
+    import numpy as np
+    from app.models.fixed_income import FixedIncomeInvestment, FixedIncomeType, IndexerType
+    from app.services.fixed_income_service import FixedIncomeService
+
+    days = np.array([0, 10, 29, 30, 180, 181, 360, 361, 720, 721, 2000, 400])
+    types = [FixedIncomeType.CDB] * 10 + [FixedIncomeType.LCI, FixedIncomeType.CDB]
+    purchase = np.full(len(days), np.datetime64("2024-01-01"))
+    invested = np.full(len(days), 1000.0)
+    gross = np.full(len(days), 1100.0)
+    gross[-1] = 900.0  # Prejuízo não paga imposto
+    taxes = FixedIncomeService.net_values(types, invested, gross, purchase, purchase + days)
+
+    iof_rates = [1.0, 0.66, 0.03, 0, 0, 0, 0, 0, 0, 0, 0, 0]
+    ir_rates = [0.225, 0.225, 0.225, 0.225, 0.225, 0.20, 0.20, 0.175, 0.175, 0.15, 0, 0]
+    expected_iof = np.array(iof_rates) * 100
+    expected_ir = (100 - expected_iof) * np.array(ir_rates)
+    expected_ir[-1] = 0
+    assert taxes["iof"].tolist() == pytest.approx(expected_iof.tolist())
+    assert taxes["income_tax"].tolist() == pytest.approx(np.round(expected_ir, 2).tolist())
+    assert taxes["net_value"][10] == 1100.0  # LCI isenta
+    assert taxes["net_value"][-1] == 900.0
+
+    today = date.today()
+    for name, type, held, value in [
+        ("CDB novo", FixedIncomeType.CDB, 10, 1010.0),
+        ("CDB longo", FixedIncomeType.CDB, 800, 1200.0),
+        ("LCA longa", FixedIncomeType.LCA, 800, 1200.0),
+    ]:
+        db.add(FixedIncomeInvestment(
+            user_id=test_user.id, name=name, type=type, invested_amount=1000.0,
+            purchase_date=today - timedelta(days=held), indexer=IndexerType.CDI, rate=100,
+            is_percentage_of_indexer=1, current_value=value,
+        ))
+    db.commit()
+
+    data = client.get("/fixed-income/list", headers=auth_headers).json()
+    by_name = {inv["name"]: inv for inv in data["investments"]}
+    assert by_name["CDB novo"]["iof"] == 6.6
+    assert by_name["CDB novo"]["income_tax"] == pytest.approx(3.4 * 0.225, abs=0.01)
+    assert by_name["CDB longo"]["net_value"] == 1170.0
+    assert by_name["LCA longa"]["net_value"] == 1200.0 and by_name["LCA longa"]["tax_exempt"]
+    assert data["total_net_value"] == round(sum(inv["net_value"] for inv in data["investments"]), 2)
+
+
+def test_tesouro_price_import_marks_bonds_to_market(client: TestClient, auth_headers: dict, db, test_user):
+    """Test the Tesouro price file is imported incrementally and drives bond values"""
+    from app.models.fixed_income import FixedIncomeInvestment, FixedIncomeType, IndexerType, TesouroPrice
+
+    today = date.today()
+    lines = ["Tipo Titulo;Data Vencimento;Data Base;Taxa Compra Manha;Taxa Venda Manha;PU Compra Manha;PU Venda Manha;PU Base Manha"]
+    for offset in range(15, 0, -1):
+        day = (today - timedelta(days=offset)).strftime("%d/%m/%Y")
+        pu = 1000 + (15 - offset) * 10
+        lines.append(f"Tesouro IPCA+;15/05/2035;{day};6,50;6,62;{pu},00;{pu - 5},00;{pu - 5},00")
+        lines.append(f"Tesouro Selic;01/03/2029;{day};0,05;0,06;15000,00;14990,00;14990,00")
+    content = "\n".join(lines).encode("utf-8")
+
+    bond = FixedIncomeInvestment(
+        user_id=test_user.id, name="Tesouro IPCA+ 2035", type=FixedIncomeType.TESOURO_IPCA,
+        invested_amount=2000.0, purchase_date=today - timedelta(days=10), maturity_date=date(2035, 5, 15),
+        indexer=IndexerType.IPCA, rate=6.5, is_percentage_of_indexer=0, current_value=2000.0,
+    )
+    db.add(bond)
+    db.commit()
+
+    files = {"file": ("PrecoTaxaTesouroDireto.csv", content, "text/csv")}
+    assert client.post("/fixed-income/tesouro/import", files=files, headers=auth_headers).status_code == 403
+
+    test_user.is_superuser = True
+    db.commit()
+    response = client.post("/fixed-income/tesouro/import", files=files, headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data == {"rows": 30, "inserted": 30, "bonds": 2, "revalued": 1, "marked_to_market": 1}
+
+    # Two units bought at 1050 (day of purchase), now worth 1135 each
+    db.refresh(bond)
+    assert bond.current_value == round(2000 / 1050 * 1135, 2)
+
+    # Only days after the last stored one are inserted again
+    lines.append(f"Tesouro Selic;01/03/2029;{today.strftime('%d/%m/%Y')};0,05;0,06;15010,00;15000,00;15000,00")
+    files = {"file": ("PrecoTaxaTesouroDireto.csv", "\n".join(lines).encode("utf-8"), "text/csv")}
+    data = client.post("/fixed-income/tesouro/import", files=files, headers=auth_headers).json()
+    assert data["inserted"] == 1
+    assert db.query(TesouroPrice).count() == 31
+
+    bad = {"file": ("precos.csv", b"a;b;c\n1;2;3", "text/csv")}
+    assert client.post("/fixed-income/tesouro/import", files=bad, headers=auth_headers).status_code == 400
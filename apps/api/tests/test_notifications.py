@@ -3,9 +3,10 @@ Tests for notifications API endpoints
 """
 import pytest
 from fastapi.testclient import TestClient
-from datetime import datetime
+from datetime import datetime, date, timedelta
 from app.models.notification import Notification, NotificationType
 from app.models.asset import Asset, AssetType
+from app.models.position import AssetPosition
 
 
 def test_get_notifications_empty(client: TestClient, auth_headers: dict):
@@ -314,3 +315,72 @@ def test_notification_service_generates_dividend_notifications(db, test_user):
     assert notifications[0].type == NotificationType.DIVIDEND
     assert "PETR4" in notifications[0].title
 
+
+
+def test_notifications_keyset_pagination(client: TestClient, auth_headers: dict, db, test_user):
+    """Test cursor pagination of notifications through the X-Next-Cursor header"""
+    for i in range(5):
+        db.add(Notification(
+            user_id=test_user.id,
+            type=NotificationType.INFO,
+            title=f"Notification {i}",
+            message="Message",
+        ))
+    db.commit()
+
+    response = client.get("/notifications/?limit=2", headers=auth_headers)
+    assert response.status_code == 200
+    ids = [n["id"] for n in response.json()]
+    cursor = response.headers["X-Next-Cursor"]
+
+    while cursor:
+        response = client.get(f"/notifications/?limit=2&cursor={cursor}", headers=auth_headers)
+        ids.extend(n["id"] for n in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+
+    assert len(ids) == 5
+    assert ids == sorted(ids, reverse=True)
+
+
+def test_anomaly_scan_notifies_holders_in_bulk(client: TestClient, db, test_user):
+    """Test the scheduled scan flags held tickers and notifies every holder once"""
+    import asyncio
+    import numpy as np
+    from app.models.user import User
+    from app.models.price_history import PriceBar
+    from app.services.market_intelligence import MarketIntelligence
+
+    other = User(email="other@example.com", hashed_password="x", is_active=True)
+    db.add(other)
+    rng = np.random.default_rng(11)
+    assets = {}
+    for ticker in ("JUMP3", "CALM3", "SOLD3"):
+        closes = 10.0 * np.cumprod(1 + rng.normal(0, 0.01, 30))
+        volumes = rng.uniform(9e5, 1.1e6, 30)
+        if ticker != "CALM3":
+            closes[-1] = closes[-2] * 1.12
+            volumes[-1] = 5e6
+        for offset in range(30):
+            db.add(PriceBar(
+                ticker=ticker, date=date.today() - timedelta(days=29 - offset),
+                close=float(closes[offset]), volume=float(volumes[offset]),
+            ))
+        assets[ticker] = Asset(ticker=ticker, name=ticker, type=AssetType.ACAO)
+        db.add(assets[ticker])
+    db.flush()
+    for user, ticker, quantity in [
+        (test_user, "JUMP3", 10), (other, "JUMP3", 5), (test_user, "CALM3", 10), (other, "SOLD3", 0),
+    ]:
+        db.add(AssetPosition(user_id=user.id, asset_id=assets[ticker].id, quantity=quantity, average_price=10.0))
+    db.commit()
+
+    result = asyncio.run(MarketIntelligence.scan_holdings(db))
+    assert result["tickers"] == 2  # SOLD3 has no open position
+    notifications = db.query(Notification).filter(Notification.type == NotificationType.ALERT).all()
+    assert result["notifications"] == len(notifications) == 4  # price + volume, two holders
+    assert {n.user_id for n in notifications} == {test_user.id, other.id}
+    assert {n.asset_id for n in notifications} == {assets["JUMP3"].id}
+
+    # A second scan on the same day does not duplicate alerts
+    assert asyncio.run(MarketIntelligence.scan_holdings(db))["notifications"] == 0
+    assert db.query(Notification).count() == 4
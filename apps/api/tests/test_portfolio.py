@@ -350,3 +350,1249 @@ def test_get_portfolio_requires_authentication(client: TestClient):
     response = client.get("/portfolio/assets/PETR4")
     assert response.status_code in [401, 403]
 
+
+
+def test_portfolio_overview_uses_snapshot(client: TestClient, auth_headers: dict, db, test_user):
+    """Test overview is materialized and refreshed when transactions change positions"""
+    from app.models.portfolio_snapshot import PortfolioSnapshot
+
+    response = client.post(
+        "/portfolio/manage/transaction",
+        json={
+            "ticker": "WEGE3",
+            "asset_type": "ACAO",
+            "transaction_type": "COMPRA",
+            "quantity": 10,
+            "price": 40.0,
+            "transaction_date": date.today().isoformat(),
+        },
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+
+    snapshot = db.query(PortfolioSnapshot).filter(
+        PortfolioSnapshot.user_id == test_user.id
+    ).first()
+    assert snapshot is not None
+    assert snapshot.total_invested == 400.0
+    assert snapshot.positions_count == 1
+
+    response = client.get("/portfolio/overview", headers=auth_headers)
+    data = response.json()
+    assert data["total_value"] == 400.0
+    assert data["top_positions"][0]["ticker"] == "WEGE3"
+
+    # Deleting the only transaction empties the snapshot
+    tx_id = client.get("/portfolio/manage/transactions", headers=auth_headers).json()[0]["id"]
+    client.delete(f"/portfolio/manage/transaction/{tx_id}", headers=auth_headers)
+
+    data = client.get("/portfolio/overview", headers=auth_headers).json()
+    assert data["positions_count"] == 0
+    assert data["total_value"] == 0.0
+
+
+def test_portfolio_history_persisted_series(client: TestClient, auth_headers: dict, db, test_user):
+    """Test history is served from the stored daily series and backfilled on new transactions"""
+    from app.models.price_history import PriceBar
+    from app.models.portfolio_history import PortfolioDailyValue
+    from app.services.portfolio_history_service import PortfolioHistoryService
+
+    today = date.today()
+    start = today - timedelta(days=4)
+
+    for offset in range(5):
+        db.add(PriceBar(ticker="WEGE3", date=start + timedelta(days=offset), close=40.0 + offset))
+    db.commit()
+
+    response = client.post(
+        "/portfolio/manage/transaction",
+        json={
+            "ticker": "WEGE3",
+            "asset_type": "ACAO",
+            "transaction_type": "COMPRA",
+            "quantity": 10,
+            "price": 40.0,
+            "transaction_date": start.isoformat(),
+        },
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+
+    assert PortfolioHistoryService.backfill(db, test_user.id) == 5
+
+    response = client.get("/analytics/history?period_range=1mo", headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert [point["value"] for point in data] == [400.0, 410.0, 420.0, 430.0, 440.0]
+    assert data[0]["date"] == start.isoformat()
+
+    # A new buy backfills the series from its date onwards
+    client.post(
+        "/portfolio/manage/transaction",
+        json={
+            "ticker": "WEGE3",
+            "asset_type": "ACAO",
+            "transaction_type": "COMPRA",
+            "quantity": 10,
+            "price": 42.0,
+            "transaction_date": (start + timedelta(days=2)).isoformat(),
+        },
+        headers=auth_headers,
+    )
+
+    data = client.get("/analytics/history?period_range=1mo", headers=auth_headers).json()
+    assert [point["value"] for point in data] == [400.0, 410.0, 840.0, 860.0, 880.0]
+
+    flow_day = db.query(PortfolioDailyValue).filter(
+        PortfolioDailyValue.user_id == test_user.id,
+        PortfolioDailyValue.date == start + timedelta(days=2),
+    ).first()
+    assert flow_day.net_cash_flow == 420.0
+    assert flow_day.invested == 820.0
+
+
+def test_portfolio_history_replay_engine():
+    """Test the vectorized replay: average cost on sells, forward-filled closes and price fallback"""
+    from app.services.portfolio_history_service import PortfolioHistoryService
+
+    start = date(2024, 1, 1)
+    transactions = [
+        (Transaction(type=TransactionType.BUY, date=datetime(2023, 12, 28), quantity=10, price=10.0, fees=None), "AAAA3"),
+        (Transaction(type=TransactionType.BUY, date=datetime(2024, 1, 2), quantity=10, price=20.0, fees=2.0), "AAAA3"),
+        (Transaction(type=TransactionType.SELL, date=datetime(2024, 1, 3), quantity=5, price=25.0, fees=1.0), "AAAA3"),
+        (Transaction(type=TransactionType.BUY, date=datetime(2024, 1, 3), quantity=4, price=50.0, fees=0.0), "BBBB11"),
+        (Transaction(type=TransactionType.BUY, date=datetime(2024, 1, 9), quantity=1, price=99.0, fees=0.0), "BBBB11"),
+    ]
+    # AAAA3 has a close before the range and a gap on Jan 2; BBBB11 never has a close
+    closes = {
+        "AAAA3": {date(2023, 12, 29): 12.0, date(2024, 1, 3): 24.0},
+        "BBBB11": {},
+    }
+
+    rows = PortfolioHistoryService._replay(transactions, closes, start, date(2024, 1, 4))
+
+    assert [r["date"] for r in rows] == [start + timedelta(days=i) for i in range(4)]
+    # Jan 1: 10 @ last close 12 (seeded from before the range)
+    # Jan 2: 20 @ 12 (forward-filled), Jan 3: 15 @ 24 + 4 @ 50 (transaction price)
+    assert [r["value"] for r in rows] == [120.0, 240.0, 560.0, 560.0]
+    # Cost 100 + 202 = 302, sell removes 5 x 15.1 at average cost
+    assert [r["invested"] for r in rows] == [100.0, 302.0, 426.5, 426.5]
+    assert [r["net_cash_flow"] for r in rows] == [0.0, 202.0, 76.0, 0.0]
+
+
+def test_portfolio_performance_twr_mwr(client: TestClient, auth_headers: dict, db, test_user):
+    """Test TWR/MWR periods and that cached returns are dropped on new transactions"""
+    from app.models.price_history import PriceBar
+    from app.services.portfolio_history_service import PortfolioHistoryService
+    from app.services.performance_service import PerformanceService
+
+    PerformanceService.invalidate()
+    today = date.today()
+    start = today - timedelta(days=4)
+    for offset in range(5):
+        db.add(PriceBar(ticker="WEGE3", date=start + timedelta(days=offset), close=40.0 + offset))
+    db.commit()
+
+    def buy(quantity, price, day):
+        client.post(
+            "/portfolio/manage/transaction",
+            json={
+                "ticker": "WEGE3",
+                "asset_type": "ACAO",
+                "transaction_type": "COMPRA",
+                "quantity": quantity,
+                "price": price,
+                "transaction_date": day.isoformat(),
+            },
+            headers=auth_headers,
+        )
+
+    buy(10, 40.0, start)
+    PortfolioHistoryService.backfill(db, test_user.id)
+
+    response = client.get("/analytics/performance", headers=auth_headers)
+    assert response.status_code == 200
+    periods = response.json()["periods"]
+    assert set(periods) == {"1m", "6m", "ytd", "1y", "inception"}
+    # 400 -> 440 with a single contribution: both returns are 10%
+    assert periods["inception"]["twr"] == 10.0
+    assert periods["inception"]["mwr"] == 10.0
+    assert periods["inception"]["net_cash_flow"] == 400.0
+
+    # Contribution mid-period: TWR ignores its timing, MWR does not
+    buy(10, 42.0, start + timedelta(days=2))
+    periods = client.get("/analytics/performance", headers=auth_headers).json()["periods"]
+    expected_twr = (410 / 400) * (840 / (410 + 420)) * (860 / 840) * (880 / 860) - 1
+    assert periods["inception"]["twr"] == round(expected_twr * 100, 2)
+    assert periods["inception"]["mwr"] != periods["inception"]["twr"]
+    assert periods["inception"]["end_value"] == 880.0
+
+    custom = client.get(
+        f"/analytics/performance?start_date={(start + timedelta(days=3)).isoformat()}",
+        headers=auth_headers,
+    ).json()["periods"]["custom"]
+    assert custom["start_value"] == 840.0
+    assert custom["twr"] == round((880 / 840 - 1) * 100, 2)
+
+    assets = client.get("/analytics/performance/assets?period=1m", headers=auth_headers).json()
+    assert assets[0]["ticker"] == "WEGE3"
+    assert assets[0]["twr"] == periods["inception"]["twr"]
+
+    response = client.get("/analytics/performance/assets?period=10y", headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_performance_twr_full_sale(client: TestClient, auth_headers: dict, db, test_user):
+    """Test selling a whole position keeps the return earned up to the sale"""
+    import numpy as np
+    from app.models.price_history import PriceBar
+    from app.services.portfolio_history_service import PortfolioHistoryService
+    from app.services.performance_service import PerformanceService
+
+    # Sold out at a gain (flow -110) and at a loss (flow -90) on the last day
+    values = np.array([[100.0, 100.0], [0.0, 0.0]])
+    flows = np.array([[0.0, 0.0], [-110.0, -90.0]])
+    returns = PerformanceService.twr(values, flows, np.array([100.0, 100.0]))
+    assert returns.tolist() == pytest.approx([0.10, -0.10])
+
+    today = date.today()
+    start = today - timedelta(days=2)
+    for offset, close in enumerate([40.0, 42.0, 44.0]):
+        db.add(PriceBar(ticker="WEGE3", date=start + timedelta(days=offset), close=close))
+    db.commit()
+    for tx_type, price, day in [("COMPRA", 40.0, start), ("VENDA", 36.0, today)]:
+        client.post("/portfolio/manage/transaction", json={
+            "ticker": "WEGE3", "asset_type": "ACAO", "transaction_type": tx_type,
+            "quantity": 10, "price": price, "transaction_date": day.isoformat(),
+        }, headers=auth_headers)
+    PortfolioHistoryService.backfill(db, test_user.id)
+
+    # 400 -> 420, then sold for 360: -10% overall, not -100%
+    periods = client.get("/analytics/performance", headers=auth_headers).json()["periods"]
+    assert periods["inception"]["twr"] == -10.0
+
+
+def test_rebalance_optimize(client: TestClient, auth_headers: dict, db, test_user):
+    """Test ticker-level rebalancing plans in full and contribution-only modes"""
+    holdings = [
+        ("AAAA3", AssetType.ACAO, "Financeiro", 100, 10.0),
+        ("BBBB3", AssetType.ACAO, "Energia", 10, 100.0),
+        ("CCCC11", AssetType.FII, "Logística", 20, 100.0),
+    ]
+    for ticker, asset_type, sector, quantity, price in holdings:
+        asset = Asset(ticker=ticker, name=ticker, type=asset_type, sector=sector)
+        db.add(asset)
+        db.flush()
+        db.add(AssetPosition(
+            user_id=test_user.id, asset_id=asset.id, quantity=quantity,
+            average_price=price, current_price=price,
+        ))
+    db.commit()
+
+    # New money only: R$1000 fills the ACAO deficit, nothing is sold
+    response = client.post(
+        "/portfolio/manage/rebalance/optimize",
+        json={"type_targets": {"ACAO": 60, "FII": 40}, "contribution": 1000, "mode": "contribution_only"},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    plan = response.json()
+    trades = {item["ticker"]: item["trade_quantity"] for item in plan["items"]}
+    assert trades == {"AAAA3": 50.0, "BBBB3": 5.0, "CCCC11": 0.0}
+    assert plan["total_sell"] == 0.0
+    assert plan["cash_left"] == 0.0
+    assert plan["drift_after"] == 0.0
+
+    # Full mode: sell FII to buy stocks
+    plan = client.post(
+        "/portfolio/manage/rebalance/optimize",
+        json={"type_targets": {"ACAO": 60, "FII": 40}},
+        headers=auth_headers,
+    ).json()
+    trades = {item["ticker"]: item["trade_quantity"] for item in plan["items"]}
+    assert trades == {"AAAA3": 20.0, "BBBB3": 2.0, "CCCC11": -4.0}
+    assert plan["cash_left"] == 0.0
+
+    # Lot of 100 makes the AAAA3 buy too small; its money stays as cash
+    plan = client.post(
+        "/portfolio/manage/rebalance/optimize",
+        json={"type_targets": {"ACAO": 60, "FII": 40}, "lot_sizes": {"AAAA3": 100}},
+        headers=auth_headers,
+    ).json()
+    trades = {item["ticker"]: item["trade_quantity"] for item in plan["items"]}
+    assert trades["AAAA3"] == 0.0
+    assert plan["cash_left"] == 200.0
+
+    # Ticker targets beyond their type target are rejected
+    response = client.post(
+        "/portfolio/manage/rebalance/optimize",
+        json={"type_targets": {"FII": 10}, "ticker_targets": {"CCCC11": 20}},
+        headers=auth_headers,
+    )
+    assert response.status_code == 400
+
+
+def test_rebalance_water_fill():
+    """Test contribution split when it cannot close every deficit"""
+    import numpy as np
+    from app.services.rebalance_service import RebalanceService
+
+    buys = RebalanceService.water_fill(np.array([0.5, 0.5]), np.array([0.0, 1000.0]), 500.0)
+    assert buys.tolist() == [500.0, 0.0]
+
+    buys = RebalanceService.water_fill(np.array([0.5, 0.25, 0.25]), np.array([0.0, 100.0, 300.0]), 1200.0)
+    # Total 1600: targets 800/400/400
+    assert buys.tolist() == [800.0, 300.0, 100.0]
+
+
+def test_export_transactions_csv_streams_chunks(client: TestClient, auth_headers: dict, db, test_user):
+    """Test transactions export streams every row across several chunks"""
+    from app.routes import portfolio_manage
+
+    asset = Asset(ticker="ITSA4", name="Itaúsa", type=AssetType.ACAO)
+    db.add(asset)
+    db.flush()
+    rows = portfolio_manage.EXPORT_CHUNK_ROWS * 2 + 7
+    db.add_all([
+        Transaction(
+            user_id=test_user.id, asset_id=asset.id, type=TransactionType.BUY,
+            date=datetime(2024, 1, 1) + timedelta(days=i), quantity=1, price=10.0,
+            total_amount=10.0, fees=0.0,
+        )
+        for i in range(rows)
+    ])
+    db.commit()
+
+    with client.stream("GET", "/portfolio/manage/export/transactions", headers=auth_headers) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        chunks = list(response.iter_text())
+
+    lines = "".join(chunks).strip().splitlines()
+    assert lines[0].startswith("Data,Ticker,Tipo")
+    assert len(lines) == rows + 1
+    assert lines[1].startswith((datetime(2024, 1, 1) + timedelta(days=rows - 1)).strftime("%d/%m/%Y") + ",ITSA4")
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_archive_export_import_roundtrip(client: TestClient, auth_headers: dict, db, test_user, fmt):
+    """Test ledger archive export and import with replace restores the ledger"""
+    pytest.importorskip("pyarrow")
+
+    asset = Asset(ticker="WEGE3", name="WEG", type=AssetType.ACAO)
+    db.add(asset)
+    db.flush()
+    db.add_all([
+        Transaction(
+            user_id=test_user.id, asset_id=asset.id, type=TransactionType.BUY,
+            date=datetime(2024, 1, 10), quantity=100, price=35.0, total_amount=3500.0, fees=1.5,
+        ),
+        Transaction(
+            user_id=test_user.id, asset_id=asset.id, type=TransactionType.SELL,
+            date=datetime(2024, 3, 5), quantity=40, price=40.0, total_amount=1600.0, fees=0.0,
+        ),
+        Proceed(
+            user_id=test_user.id, asset_id=asset.id, type=ProceedType.DIVIDEND,
+            date=date(2024, 2, 20), value_per_share=0.5, quantity=100, total_value=50.0,
+        ),
+    ])
+    db.commit()
+
+    response = client.get(f"/portfolio/manage/export/archive?format={fmt}", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+    archive = response.content
+
+    response = client.post(
+        "/portfolio/manage/import/archive",
+        headers=auth_headers,
+        files={"file": ("carteira.zip", archive, "application/zip")},
+        data={"replace": "true"},
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["transactions"] == 2
+    assert body["proceeds"] == 1
+
+    db.expire_all()
+    transactions = (
+        db.query(Transaction).filter(Transaction.user_id == test_user.id)
+        .order_by(Transaction.date).all()
+    )
+    assert [(t.type, t.quantity, t.price, t.fees) for t in transactions] == [
+        (TransactionType.BUY, 100, 35.0, 1.5),
+        (TransactionType.SELL, 40, 40.0, 0.0),
+    ]
+    assert transactions[0].date.replace(tzinfo=None) == datetime(2024, 1, 10)
+    proceed = db.query(Proceed).filter(Proceed.user_id == test_user.id).one()
+    assert proceed.date == date(2024, 2, 20) and proceed.total_value == 50.0
+
+    position = db.query(AssetPosition).filter(AssetPosition.user_id == test_user.id).one()
+    assert position.quantity == 60
+
+    response = client.get("/portfolio/manage/export/archive?format=csv", headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_list_transactions_and_proceeds_keyset_pagination(client: TestClient, auth_headers: dict, db, test_user):
+    """Test cursor pagination walks every row once, including same-day ties"""
+    asset = Asset(ticker="BBAS3", name="Banco do Brasil", type=AssetType.ACAO)
+    db.add(asset)
+    db.flush()
+    db.add_all([
+        Transaction(
+            user_id=test_user.id, asset_id=asset.id, type=TransactionType.BUY,
+            date=datetime(2024, 1, 1) + timedelta(days=i // 3), quantity=1, price=20.0,
+            total_amount=20.0, fees=0.0,
+        )
+        for i in range(11)
+    ])
+    db.add_all([
+        Proceed(
+            user_id=test_user.id, asset_id=asset.id, type=ProceedType.DIVIDEND,
+            date=date(2024, 1, 1) + timedelta(days=i // 2), value_per_share=0.1,
+            quantity=10, total_value=1.0,
+        )
+        for i in range(7)
+    ])
+    db.commit()
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        url = "/portfolio/manage/transactions?limit=4" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url, headers=auth_headers)
+        assert response.status_code == 200
+        seen.extend((tx["transaction_date"], tx["id"]) for tx in response.json())
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert pages == 3
+    assert len({row_id for _, row_id in seen}) == 11
+    assert seen == sorted(seen, reverse=True)
+
+    seen, cursor = [], None
+    while True:
+        url = "/portfolio/manage/proceeds?limit=3" + (f"&cursor={cursor}" if cursor else "")
+        response = client.get(url, headers=auth_headers)
+        seen.extend((p["proceed_date"], p["id"]) for p in response.json()["proceeds"])
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert len({row_id for _, row_id in seen}) == 7
+    assert seen == sorted(seen, reverse=True)
+
+    response = client.get("/portfolio/manage/transactions?cursor=not-a-cursor", headers=auth_headers)
+    assert response.status_code == 400
+
+    # A cursor the listing cannot move past is rejected, not a server error
+    from types import SimpleNamespace
+    from fastapi import HTTPException
+    from app.core.pagination import encode_cursor, paginate
+
+    class StuckQuery:
+        def filter(self, *args):
+            return self
+
+        def order_by(self, *args):
+            return self
+
+        def limit(self, n):
+            return self
+
+        def all(self):
+            return [SimpleNamespace(id=5), SimpleNamespace(id=5)]
+
+    with pytest.raises(HTTPException) as error:
+        paginate(StuckQuery(), None, Transaction.id, 1, encode_cursor(None, 5))
+    assert error.value.status_code == 400
+
+
+def test_rebalance_optimize_prunes_small_trades_and_validates_lots(client: TestClient, auth_headers: dict, db, test_user):
+    """Test trades within the drift tolerance are dropped and bad lots are rejected"""
+    for ticker, quantity in (("DDDD3", 100), ("EEEE3", 99), ("FFFF3", 101)):
+        asset = Asset(ticker=ticker, name=ticker, type=AssetType.ACAO, sector="Energia")
+        db.add(asset)
+        db.flush()
+        db.add(AssetPosition(
+            user_id=test_user.id, asset_id=asset.id, quantity=quantity,
+            average_price=10.0, current_price=10.0,
+        ))
+    db.commit()
+
+    targets = {"DDDD3": 33.34, "EEEE3": 33.33, "FFFF3": 33.33}
+    plan = client.post(
+        "/portfolio/manage/rebalance/optimize",
+        json={"ticker_targets": targets},
+        headers=auth_headers,
+    ).json()
+    assert plan["trades"] == 0
+    assert plan["drift_after"] <= 0.5
+
+    plan = client.post(
+        "/portfolio/manage/rebalance/optimize",
+        json={"ticker_targets": targets, "drift_tolerance": 0},
+        headers=auth_headers,
+    ).json()
+    trades = {item["ticker"]: item["trade_quantity"] for item in plan["items"]}
+    assert trades == {"DDDD3": 0.0, "EEEE3": 1.0, "FFFF3": -1.0}
+
+    for payload in ({"lot_sizes": {"DDDD3": 0}}, {"prices": {"DDDD3": 0}}):
+        response = client.post(
+            "/portfolio/manage/rebalance/optimize",
+            json={"ticker_targets": targets, **payload},
+            headers=auth_headers,
+        )
+        assert response.status_code == 422
+
+
+def test_export_csv_releases_connections_with_real_get_db(client: TestClient, auth_headers: dict, db, test_user):
+    """Test streamed exports return their connection to the pool with the real get_db"""
+    from app.core.database import get_db
+    from main import app
+    from tests.conftest import engine
+
+    asset = Asset(ticker="EGIE3", name="Engie", type=AssetType.ACAO)
+    db.add(asset)
+    db.flush()
+    db.add(Transaction(
+        user_id=test_user.id, asset_id=asset.id, type=TransactionType.BUY,
+        date=datetime(2024, 1, 2), quantity=10, price=40.0, total_amount=400.0, fees=0.0,
+    ))
+    db.add(Proceed(
+        user_id=test_user.id, asset_id=asset.id, type=ProceedType.DIVIDEND,
+        date=date(2024, 2, 2), value_per_share=1.0, quantity=10, total_value=10.0,
+    ))
+    db.add(AssetPosition(
+        user_id=test_user.id, asset_id=asset.id, quantity=10, average_price=40.0, current_price=41.0,
+    ))
+    db.commit()
+
+    app.dependency_overrides.pop(get_db)
+    for path in ("positions", "transactions", "proceeds"):
+        response = client.get(f"/portfolio/manage/export/{path}", headers=auth_headers)
+        assert response.status_code == 200
+        assert "EGIE3" in response.text
+        assert engine.pool.checkedout() == 0
+
+
+def test_proceeds_aggregations_in_sql_and_rollup(client: TestClient, auth_headers: dict, db, test_user):
+    """Test proceeds summaries are the same from GROUP BY queries and from the rollup"""
+    from app.services.proceeds_service import ProceedsService
+
+    assets = []
+    for ticker in ("TAEE11", "BBSE3"):
+        asset = Asset(ticker=ticker, name=ticker, type=AssetType.ACAO)
+        db.add(asset)
+        db.flush()
+        assets.append(asset)
+    rows = [
+        (assets[0], ProceedType.DIVIDEND, date(2024, 1, 15), 100.0),
+        (assets[0], ProceedType.JCP, date(2024, 1, 31), 50.0),
+        (assets[1], ProceedType.DIVIDEND, date(2024, 3, 10), 80.0),
+        (assets[1], ProceedType.DIVIDEND, date(2023, 12, 10), 30.0),
+    ]
+    db.add_all([
+        Proceed(
+            user_id=test_user.id, asset_id=asset.id, type=proceed_type, date=day,
+            value_per_share=1.0, quantity=value, total_value=value,
+        )
+        for asset, proceed_type, day, value in rows
+    ])
+    db.commit()
+
+    expected = {
+        "by_month": [
+            {"month": "2024-01", "total": 150.0, "count": 2},
+            {"month": "2024-03", "total": 80.0, "count": 1},
+        ],
+        "by_asset": [
+            {"ticker": "TAEE11", "total": 150.0, "count": 2},
+            {"ticker": "BBSE3", "total": 80.0, "count": 1},
+        ],
+        "total": 230.0,
+        "total_count": 3,
+    }
+    summary = client.get("/portfolio/manage/proceeds/summary?year=2024", headers=auth_headers).json()
+    assert summary == expected
+
+    ProceedsService.refresh_rollup(db, test_user.id)
+    assert ProceedsService.has_rollup(db, test_user.id)
+    summary = client.get("/portfolio/manage/proceeds/summary?year=2024", headers=auth_headers).json()
+    assert summary == expected
+
+    # New proceeds keep the rollup in sync from their month onwards
+    response = client.post(
+        "/portfolio/manage/proceeds",
+        json={"ticker": "BBSE3", "proceed_type": "DIVIDEND", "proceed_date": "2024-03-20",
+              "value_per_share": 1.0, "quantity": 20},
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    months = ProceedsService.monthly_totals(db, test_user.id, date(2024, 1, 1), date(2024, 12, 31))
+    assert months[-1] == {"month": "2024-03", "total": 100.0, "count": 2}
+
+    # Listing totals cover every page
+    response = client.get("/portfolio/manage/proceeds?limit=2", headers=auth_headers)
+    data = response.json()
+    assert len(data["proceeds"]) == 2
+    assert data["total_count"] == 5
+    assert data["total_value"] == 280.0
+    assert data["totals_by_type"] == {"DIVIDEND": 230.0, "JCP": 50.0}
+
+
+def test_dividend_projection_from_cached_estimates(client: TestClient, auth_headers: dict, db, test_user):
+    """Test seasonal/trailing estimates and the 12-month projection calendar"""
+    from app.models.dividend import DividendEvent, DividendEstimate
+    from app.services.dividend_service import DividendService
+
+    asset = Asset(ticker="TRPL4", name="ISA CTEEP", type=AssetType.ACAO)
+    db.add(asset)
+    db.flush()
+    db.add(AssetPosition(
+        user_id=test_user.id, asset_id=asset.id, quantity=100, average_price=25.0, current_price=26.0,
+    ))
+    # Pays every March and September; the last year doubled
+    db.add_all([
+        DividendEvent(ticker="TRPL4", payment_date=date(year, month, 15), value_per_share=value, source="provider")
+        for year, value in ((2022, 1.0), (2023, 1.0), (2024, 2.0))
+        for month in (3, 9)
+    ])
+    db.commit()
+
+    assert DividendService.compute_estimates(db, ["TRPL4"], as_of=date(2024, 12, 31)) == 1
+    estimate = db.query(DividendEstimate).filter(DividendEstimate.ticker == "TRPL4").one()
+    assert estimate.years_analyzed == 3
+    assert estimate.trailing_12m == 4.0
+    assert estimate.monthly_profile[2] == pytest.approx(4 / 3)
+    assert estimate.annual_estimate == pytest.approx(8 / 3)
+
+    projection = DividendService.project(db, test_user.id, start=date(2025, 1, 1))
+    calendar = {m["month"]: m["total"] for m in projection["calendar"]}
+    assert len(calendar) == 12
+    assert calendar["2025-03"] == 133.33
+    assert calendar["2025-09"] == 133.33
+    assert calendar["2025-01"] == 0.0
+    assert projection["total"] == 266.67
+
+    trailing = DividendService.project(db, test_user.id, method="trailing", start=date(2025, 1, 1))
+    assert trailing["total"] == 400.0
+
+    response = client.get("/analytics/dividends/projection?method=trailing", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["total"] == 400.0
+    response = client.get("/analytics/dividends/projection?method=dy", headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_portfolio_read_endpoints_etag_versioned_cache(client: TestClient, auth_headers: dict, db, test_user):
+    """Test read endpoints answer 304 until a write bumps the user's data version"""
+    from app.models.user import User
+
+    def add_purchase(ticker: str):
+        response = client.post(
+            "/portfolio/manage/transaction",
+            json={
+                "ticker": ticker,
+                "asset_type": "ACAO",
+                "transaction_type": "COMPRA",
+                "quantity": 10,
+                "price": 20.0,
+                "transaction_date": date.today().isoformat(),
+            },
+            headers=auth_headers,
+        )
+        assert response.status_code == 200
+
+    add_purchase("ABEV3")
+    version = db.query(User.data_version).filter(User.id == test_user.id).scalar()
+    assert version > 0
+
+    for path in ["/portfolio/overview", "/portfolio/assets", "/portfolio/manage/positions"]:
+        first = client.get(path, headers=auth_headers)
+        assert first.status_code == 200
+        etag = first.headers["ETag"]
+
+        revalidated = client.get(path, headers={**auth_headers, "If-None-Match": etag})
+        assert revalidated.status_code == 304
+        assert revalidated.content == b""
+
+        # A cached body is served as-is, even if the data changed behind the hooks
+        db.query(AssetPosition).filter(AssetPosition.user_id == test_user.id).update({"quantity": 999})
+        db.commit()
+        assert client.get(path, headers=auth_headers).json() == first.json()
+
+    # Any write through the hooks changes the version, so the old ETag is stale
+    add_purchase("BBAS3")
+    assert db.query(User.data_version).filter(User.id == test_user.id).scalar() > version
+
+    response = client.get("/portfolio/manage/positions", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert {p["ticker"] for p in response.json()} == {"ABEV3", "BBAS3"}
+
+    # Proceeds and prices bump it as well
+    etag = response.headers["ETag"]
+    response = client.post(
+        "/portfolio/manage/proceeds",
+        json={
+            "ticker": "ABEV3",
+            "proceed_type": "DIVIDEND",
+            "proceed_date": date.today().isoformat(),
+            "value_per_share": 0.5,
+            "quantity": 10,
+        },
+        headers=auth_headers,
+    )
+    assert response.status_code == 200
+    response = client.get("/portfolio/manage/positions", headers={**auth_headers, "If-None-Match": etag})
+    assert response.status_code == 200
+
+
+def test_covariance_risk_engine(client: TestClient, auth_headers: dict, db, test_user):
+    """Test portfolio volatility, risk contributions and correlation from local bars"""
+    import numpy as np
+    from app.models.price_history import PriceBar
+    from app.services.risk_service import RiskService
+
+    rng = np.random.default_rng(7)
+    market = rng.normal(0, 0.01, 120)
+    series = {
+        "ITUB4": market + rng.normal(0, 0.005, 120),
+        "BBDC4": market + rng.normal(0, 0.005, 120),
+        "TAEE11": rng.normal(0, 0.008, 120),
+    }
+    start = date.today() - timedelta(days=130)
+    for ticker, returns in series.items():
+        closes = 20.0 * np.cumprod(1 + returns)
+        for offset, close in enumerate(closes):
+            db.add(PriceBar(ticker=ticker, date=start + timedelta(days=offset), close=float(close)))
+    values = {"ITUB4": 5000.0, "BBDC4": 3000.0, "TAEE11": 2000.0}
+    for ticker, value in values.items():
+        asset = Asset(ticker=ticker, name=ticker, type=AssetType.ACAO)
+        db.add(asset)
+        db.flush()
+        db.add(AssetPosition(
+            user_id=test_user.id, asset_id=asset.id, quantity=100,
+            average_price=value / 100, current_price=value / 100,
+        ))
+    db.commit()
+
+    response = client.get("/analytics/risk", headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["observations"] == 119
+    assert data["without_history"] == []
+
+    # Same figure as a direct computation on the aligned returns
+    tickers = sorted(values)
+    grid = np.array([20.0 * np.cumprod(1 + series[t]) for t in tickers]).T
+    returns = grid[1:] / grid[:-1] - 1
+    weights = np.array([values[t] for t in tickers]) / sum(values.values())
+    expected = np.sqrt(weights @ np.cov(returns, rowvar=False) @ weights)
+    assert data["portfolio_volatility_daily"] == pytest.approx(expected * 100, abs=1e-3)
+
+    assert sum(p["risk_contribution"] for p in data["positions"]) == pytest.approx(100, abs=0.05)
+    assert data["diversification_ratio"] > 1
+    corr = dict(zip(data["correlation"]["tickers"], data["correlation"]["matrix"]))
+    index = data["correlation"]["tickers"].index
+    assert corr["ITUB4"][index("BBDC4")] > 0.5
+    assert abs(corr["ITUB4"][index("TAEE11")]) < 0.4
+
+    # The return matrix is cached per ticker set, not per user
+    assert RiskService._get_cached(RiskService._matrix_key(tickers, 365, date.today()), "returns") is not None
+
+    ewma = client.get("/analytics/risk?method=ewma&halflife=10", headers=auth_headers).json()
+    assert ewma["method"] == "ewma"
+    assert ewma["portfolio_volatility_daily"] != data["portfolio_volatility_daily"]
+
+    assert client.get("/analytics/risk?method=garch", headers=auth_headers).status_code == 400
+
+
+def test_portfolio_var_monte_carlo_and_bootstrap(client: TestClient, auth_headers: dict, db, test_user):
+    """Test simulated VaR/CVaR is ordered, close to the normal VaR and reproducible by seed"""
+    import asyncio
+    import numpy as np
+    from app.models.price_history import PriceBar
+    from app.services.var_service import VarService, shutdown_pool
+
+    rng = np.random.default_rng(11)
+    start = date.today() - timedelta(days=200)
+    for ticker in ["VALE3", "PETR4"]:
+        closes = 30.0 * np.cumprod(1 + rng.normal(0, 0.015, 180))
+        for offset, close in enumerate(closes):
+            db.add(PriceBar(ticker=ticker, date=start + timedelta(days=offset), close=float(close)))
+        asset = Asset(ticker=ticker, name=ticker, type=AssetType.ACAO)
+        db.add(asset)
+        db.flush()
+        db.add(AssetPosition(user_id=test_user.id, asset_id=asset.id, quantity=100, average_price=50.0, current_price=50.0))
+    db.commit()
+
+    params = "horizons=1,10&confidence=0.95,0.99&paths=20000&seed=42"
+    response = client.get(f"/market/intelligence/portfolio-var?{params}", headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["portfolio_value"] == 10000.0
+    assert data["seed"] == 42
+    results = {(r["horizon_days"], r["confidence"]): r for r in data["results"]}
+    assert len(results) == 4
+    for horizon in (1, 10):
+        assert results[(horizon, 0.99)]["var"] > results[(horizon, 0.95)]["var"] > 0
+        assert results[(horizon, 0.95)]["cvar"] >= results[(horizon, 0.95)]["var"]
+    assert results[(10, 0.99)]["var"] > results[(1, 0.99)]["var"]
+
+    # One day ahead the simulated VaR matches the parametric normal VaR
+    risk = client.get("/analytics/risk", headers=auth_headers).json()
+    normal_var = 1.645 * risk["portfolio_volatility_daily"] / 100 * 10000
+    assert results[(1, 0.95)]["var"] == pytest.approx(normal_var, rel=0.1)
+
+    # Seeded runs are reproducible, with or without the process pool
+    again = client.get(f"/market/intelligence/portfolio-var?{params}", headers=auth_headers).json()
+    assert again["results"] == data["results"]
+    weights = np.array([0.5, 0.5])
+    cov = np.array([[2e-4, 5e-5], [5e-5, 2e-4]])
+    inline = asyncio.run(VarService.simulate("montecarlo", weights, [1, 5], 25000, 7, mean=np.zeros(2), cov=cov, use_pool=False))
+    pooled = asyncio.run(VarService.simulate("montecarlo", weights, [1, 5], 25000, 7, mean=np.zeros(2), cov=cov, use_pool=True))
+    shutdown_pool()
+    assert np.array_equal(inline, pooled)
+
+    # Inline shards run off the event loop: other coroutines keep ticking
+    async def inline_with_ticker():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0.001)
+
+        task = asyncio.create_task(ticker())
+        await VarService.simulate("montecarlo", weights, [250], 200000, 7, mean=np.zeros(2), cov=cov, use_pool=False)
+        task.cancel()
+        return ticks
+
+    assert asyncio.run(inline_with_ticker()) > 5
+
+    bootstrap = client.get(
+        "/market/intelligence/portfolio-var?horizons=5&confidence=0.95&method=bootstrap&seed=1",
+        headers=auth_headers,
+    ).json()
+    assert bootstrap["results"][0]["var"] > 0
+
+    assert client.get(
+        "/market/intelligence/portfolio-var?horizons=400", headers=auth_headers
+    ).status_code == 400
+
+
+def test_allocation_optimizer_frontier(client: TestClient, auth_headers: dict, db, test_user):
+    """Test min-variance, risk-parity and frontier allocations from cached covariance"""
+    import numpy as np
+    from app.models.price_history import PriceBar
+    from app.services.optimizer_service import solve_box_qp, risk_parity_weights
+
+    # Solver: interior solution equals the closed-form minimum-variance weights
+    cov = np.array([[0.04, 0.006, 0.0], [0.006, 0.09, 0.01], [0.0, 0.01, 0.0625]])
+    inverse = np.linalg.inv(cov) @ np.ones(3)
+    assert np.allclose(solve_box_qp(cov, np.zeros(3), 1.0), inverse / inverse.sum(), atol=1e-6)
+    capped = solve_box_qp(cov, np.zeros(3), 0.4)
+    assert capped.max() <= 0.4 + 1e-9 and capped.sum() == pytest.approx(1.0)
+    parity = risk_parity_weights(cov)
+    contributions = parity * (cov @ parity)
+    assert np.allclose(contributions, contributions.mean(), rtol=1e-6)
+    assert parity.max() > 0.35
+    capped_parity = risk_parity_weights(cov, 0.35)
+    assert capped_parity.max() <= 0.35 + 1e-9 and capped_parity.sum() == pytest.approx(1.0)
+
+    rng = np.random.default_rng(3)
+    start = date.today() - timedelta(days=220)
+    for ticker, drift, vol in [("EGIE3", 0.0008, 0.008), ("PRIO3", 0.002, 0.025), ("KLBN11", 0.0004, 0.012)]:
+        closes = 15.0 * np.cumprod(1 + rng.normal(drift, vol, 200))
+        for offset, close in enumerate(closes):
+            db.add(PriceBar(ticker=ticker, date=start + timedelta(days=offset), close=float(close)))
+        asset = Asset(ticker=ticker, name=ticker, type=AssetType.ACAO)
+        db.add(asset)
+        db.flush()
+        db.add(AssetPosition(user_id=test_user.id, asset_id=asset.id, quantity=100, average_price=10.0, current_price=10.0))
+    db.commit()
+
+    response = client.get("/analytics/optimizer?max_weight=0.6", headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    frontier = data["frontier"]
+    assert len(frontier) >= 3
+    assert all(b["volatility"] > a["volatility"] for a, b in zip(frontier, frontier[1:]))
+    assert all(b["expected_return"] >= a["expected_return"] - 0.01 for a, b in zip(frontier, frontier[1:]))
+    assert frontier[0] == data["min_variance"]
+    assert data["min_variance"]["volatility"] <= data["current"]["volatility"]
+    assert data["min_variance"]["volatility"] <= data["risk_parity"]["volatility"]
+    for point in frontier:
+        assert max(point["weights"].values()) <= 60.01
+        assert sum(point["weights"].values()) == pytest.approx(100, abs=0.05)
+
+    # Cached per ticker set and bound
+    assert client.get("/analytics/optimizer?max_weight=0.6", headers=auth_headers).json() == data
+
+    # Risk parity honours the cap as well
+    capped = client.get("/analytics/optimizer?max_weight=0.4", headers=auth_headers).json()
+    assert max(capped["risk_parity"]["weights"].values()) <= 40.01
+    assert sum(capped["risk_parity"]["weights"].values()) == pytest.approx(100, abs=0.05)
+
+    assert client.get("/analytics/optimizer?max_weight=0.2", headers=auth_headers).status_code == 400
+
+
+def test_barsi_screener_ranks_universe_from_local_store(client: TestClient, db):
+    """Test the screener ranks every local dividend payer and filters the stored table"""
+    from app.models.dividend import DividendEvent
+    from app.models.price_history import PriceBar
+    from app.services.barsi_calculator import BarsiCalculator
+
+    today = date.today()
+    payers = {
+        # ticker: (sector, annual dividend per share, last close)
+        "BBAS3": ("Financeiro", 3.0, 25.0),   # teto 50 -> margem 100%
+        "TAEE11": ("Energia", 2.4, 36.0),     # teto 40 -> margem 11.11%
+        "CMIG4": ("Energia", 1.2, 24.0),      # teto 20 -> acima do teto
+    }
+    for ticker, (sector, annual, close) in payers.items():
+        db.add(Asset(ticker=ticker, name=ticker, type=AssetType.ACAO, sector=sector))
+        db.add(PriceBar(ticker=ticker, date=today - timedelta(days=3), close=close * 0.9))
+        db.add(PriceBar(ticker=ticker, date=today - timedelta(days=1), close=close))
+        for years_ago in range(1, 4):
+            for month in (3, 9):
+                db.add(DividendEvent(
+                    ticker=ticker, payment_date=date(today.year - years_ago, month, 15),
+                    value_per_share=annual / 2, source="provider",
+                ))
+    # Dividends without a quote stay out of the ranking
+    db.add(DividendEvent(ticker="XPTO3", payment_date=date(today.year - 1, 5, 1), value_per_share=1.0))
+    db.commit()
+
+    assert BarsiCalculator.compute_screener(db) == 3
+
+    response = client.get("/market/barsi/screener")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 3
+    assert [r["ticker"] for r in data["results"]] == ["BBAS3", "TAEE11", "CMIG4"]
+    top = data["results"][0]
+    assert top["rank"] == 1
+    assert top["price_target"] == 50.0
+    assert top["current_yield"] == 12.0
+    assert top["margin_of_safety"] == 100.0
+    assert top["years_analyzed"] == 3
+    assert data["results"][2]["margin_of_safety"] == 0.0
+
+    energy = client.get("/market/barsi/screener?sector=energia&sort=yield").json()
+    assert [r["ticker"] for r in energy["results"]] == ["TAEE11", "CMIG4"]
+    assert client.get("/market/barsi/screener?min_margin=5&min_yield=6.5").json()["total"] == 2
+    assert client.get("/market/barsi/screener?sort=price").status_code == 400
+
+
+def test_batch_volatility_and_anomalies_single_pass(client: TestClient, db):
+    """Test the batch path computes every ticker's indicators from the local store"""
+    import asyncio
+    import time
+    import numpy as np
+    from app.models.price_history import PriceBar
+    from app.services.market_intelligence import MarketIntelligence
+
+    rng = np.random.default_rng(5)
+    tickers = [f"TST{i}" for i in range(20)]
+    expected_vol = {}
+    for ticker in tickers:
+        closes = 10.0 * np.cumprod(1 + rng.normal(0, 0.01, 30))
+        volumes = rng.uniform(9e5, 1.1e6, 30)
+        if ticker == "TST0":
+            closes[-1] = closes[-2] * 1.12  # salto no último pregão
+            volumes[-1] = 5e6
+        for offset in range(30):
+            db.add(PriceBar(
+                ticker=ticker, date=date.today() - timedelta(days=29 - offset),
+                close=float(closes[offset]), high=float(closes[offset] * 1.01),
+                low=float(closes[offset] * 0.99), volume=float(volumes[offset]),
+            ))
+        window = closes[-MarketIntelligence.BATCH_WINDOW:]
+        expected_vol[ticker] = np.std(np.diff(window) / window[:-1] * 100)
+    db.add(PriceBar(ticker="NEW3", date=date.today(), close=5.0))
+    db.commit()
+
+    started = time.perf_counter()
+    volatilities, anomalies = asyncio.run(MarketIntelligence.analyze_batch(db, tickers + ["NEW3"]))
+    assert time.perf_counter() - started < 1.0
+
+    by_ticker = {v.ticker: v for v in volatilities}
+    for ticker in tickers:
+        assert by_ticker[ticker].volatility_daily == round(expected_vol[ticker], 2)
+        assert by_ticker[ticker].avg_daily_range == pytest.approx(2.02, abs=0.01)
+    assert by_ticker["NEW3"].volatility_level == "desconhecido"
+
+    flagged = {(a.ticker, a.anomaly_type) for a in anomalies}
+    assert ("TST0", "volume") in flagged
+    assert ("TST0", "price") in flagged
+    assert all(a.ticker == "TST0" or a.severity != "high" for a in anomalies)
+
+    response = client.get("/market/intelligence/portfolio-risk?tickers=TST0,TST1,TST2")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["assets_analyzed"] == 3
+    assert data["correlation_risk"]["observations"] == 29
+
+
+def test_rolling_stats_incremental_anomalies(client: TestClient, auth_headers: dict, db, test_user, monkeypatch):
+    """Test Welford/EWMA state matches batch statistics and flags live quotes in O(1)"""
+    import numpy as np
+    from app.models.price_history import PriceBar
+    from app.services.brapi_service import BrapiService
+    from app.services.price_history_service import PriceHistoryService
+    from app.services.rolling_stats import RollingStat, RollingStatsService
+
+    values = np.random.default_rng(9).normal(5, 2, 60)
+    stat = RollingStat(span=20)
+    for value in values[:20]:
+        stat.update(value)
+    assert stat.mean == pytest.approx(values[:20].mean())
+    assert stat.var == pytest.approx(values[:20].var())
+    for value in values[20:]:
+        stat.update(value)
+    # After the warm-up the state tracks an EWMA of span 20
+    ewma = values[:20].mean()
+    for value in values[20:]:
+        ewma += 2 / 21 * (value - ewma)
+    assert stat.mean == pytest.approx(ewma)
+
+    # Bars in the local store warm up the state; repeated bars are ignored
+    start = date.today() - timedelta(days=40)
+    closes = 20.0 * np.cumprod(1 + np.random.default_rng(4).normal(0, 0.01, 40))
+    for offset, close in enumerate(closes):
+        db.add(PriceBar(ticker="GGBR4", date=start + timedelta(days=offset), close=float(close),
+                        high=float(close) * 1.01, low=float(close) * 0.99, volume=1e6 + 1e4 * (offset % 3)))
+    asset = Asset(ticker="GGBR4", name="Gerdau", type=AssetType.ACAO)
+    db.add(asset)
+    db.flush()
+    db.add(AssetPosition(user_id=test_user.id, asset_id=asset.id, quantity=10, average_price=20.0, current_price=20.0))
+    db.commit()
+
+    assert RollingStatsService.warm_up(db, ["GGBR4"]) == 1
+    state = RollingStatsService._states["GGBR4"]
+    assert state.last_close == pytest.approx(closes[-1])
+    count = state.returns.count
+    RollingStatsService.update_bar("GGBR4", start, 99.0)
+    assert state.returns.count == count
+
+    # New bars written to the store are fed incrementally
+    PriceHistoryService.store_bars(db, "GGBR4", [
+        {"date": (start + timedelta(days=40)).isoformat(), "close": float(closes[-1]) * 1.001, "volume": 1e6},
+    ])
+    assert state.returns.count == count + 1
+
+    quiet = RollingStatsService.check_quote("GGBR4", state.last_close * 1.005)
+    assert abs(quiet["return"]) < 2
+    assert RollingStatsService.quote_anomalies("GGBR4", state.last_close * 1.08, 9e6)
+
+    # Intraday volume is projected to the full session before scoring
+    assert not RollingStatsService.quote_anomalies("GGBR4", state.last_close, 5e5, elapsed=0.5)
+    assert RollingStatsService.check_quote("GGBR4", state.last_close, 5e5, elapsed=0.5)["day_volume"] == 1e6
+    assert RollingStatsService.check_quote("GGBR4", state.last_close, 1e4, elapsed=0.05)["volume"] is None
+    brt = RollingStatsService.SESSION_TZ
+    assert RollingStatsService.session_elapsed(datetime(2024, 6, 3, 9, 0, tzinfo=brt)) == 0.0
+    assert RollingStatsService.session_elapsed(datetime(2024, 6, 3, 13, 30, tzinfo=brt)) == 0.5
+    assert RollingStatsService.session_elapsed(datetime(2024, 6, 3, 18, 0, tzinfo=brt)) == 1.0
+    assert RollingStatsService.session_elapsed(datetime(2024, 6, 1, 12, 0, tzinfo=brt)) == 1.0
+
+    async def fake_quotes(tickers, **kwargs):
+        return {"success": True, "data": [
+            {"ticker": "GGBR4", "price": round(state.last_close * 0.92, 2), "volume": 8e6, "change_percent": -8.0},
+        ]}
+    monkeypatch.setattr(BrapiService, "get_quotes", staticmethod(fake_quotes))
+    monkeypatch.setattr(RollingStatsService, "session_elapsed", staticmethod(lambda now=None: 1.0))
+
+    data = client.get("/portfolio/manage/sync_prices", headers=auth_headers).json()
+    assert data["updated_count"] == 1
+    assert {a["anomaly_type"] for a in data["anomalies"]} == {"price", "volume"}
+    assert all(a["ticker"] == "GGBR4" for a in data["anomalies"])
+
+    # Bars arriving before a recorded split feed the adjusted close, like warm_up
+    from app.models.corporate_action import CorporateAction, CorporateActionType
+    split_day = date.today() - timedelta(days=2)
+    db.add(CorporateAction(ticker="GOAU4", ex_date=split_day, type=CorporateActionType.SPLIT, factor=2.0))
+    db.commit()
+    for offset in range(12, 4, -1):
+        RollingStatsService.update_bar("GOAU4", date.today() - timedelta(days=offset), 10.0 + offset % 2 * 0.1)
+    split_state = RollingStatsService._states["GOAU4"]
+    PriceHistoryService.store_bars(db, "GOAU4", [
+        {"date": (split_day - timedelta(days=1)).isoformat(), "close": 20.0, "volume": 1e6},
+        {"date": split_day.isoformat(), "close": 10.0, "volume": 1e6},
+    ])
+    assert split_state.last_close == pytest.approx(10.0)
+    assert split_state.returns.mean < 5
+
+
+def test_corporate_action_adjusts_positions_and_prices(client: TestClient, auth_headers: dict, db, test_user):
+    """Test a split rebuilds holders' positions and adjusts the stored closes"""
+    from app.models.price_history import PriceBar
+    from app.models.position import AssetPosition
+    from app.services.price_history_service import PriceHistoryService
+
+    today = date.today()
+    ex_date = today - timedelta(days=10)
+    for quantity, price, offset, tx_type in [(100, 40.0, 30, "COMPRA"), (100, 50.0, 20, "COMPRA"), (50, 26.0, 5, "VENDA")]:
+        response = client.post("/portfolio/manage/transaction", json={
+            "ticker": "WEGE3", "asset_type": "ACAO", "transaction_type": tx_type, "quantity": quantity,
+            "price": price, "transaction_date": (today - timedelta(days=offset)).isoformat(),
+        }, headers=auth_headers)
+        assert response.status_code == 200
+    for offset in range(30, 0, -1):
+        day = today - timedelta(days=offset)
+        db.add(PriceBar(ticker="WEGE3", date=day, close=50.0 if day < ex_date else 25.0))
+    db.commit()
+
+    action = {"ticker": "wege3", "ex_date": ex_date.isoformat(), "action_type": "SPLIT", "factor": 2}
+    assert client.post("/portfolio/manage/corporate-actions", json=action, headers=auth_headers).status_code == 403
+
+    test_user.is_superuser = True
+    db.commit()
+    response = client.post("/portfolio/manage/corporate-actions", json=action, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["users_updated"] == 1
+
+    # 400 shares after the split at 22.50, 50 sold
+    position = db.query(AssetPosition).filter(AssetPosition.user_id == test_user.id).one()
+    assert position.quantity == 350
+    assert position.average_price == pytest.approx(22.5)
+
+    closes = PriceHistoryService.load_closes(db, ["WEGE3"], today - timedelta(days=30), today)["WEGE3"]
+    assert set(closes.values()) == {25.0}
+    assert db.query(PriceBar).filter(PriceBar.adj_close.isnot(None)).count() == 20
+
+    listed = client.get("/portfolio/manage/corporate-actions/WEGE3", headers=auth_headers).json()
+    assert [(a["action_type"], a["factor"]) for a in listed] == [("SPLIT", 2.0)]
+
+    assert client.post("/portfolio/manage/corporate-actions", json=action, headers=auth_headers).status_code == 400
+    reverse = {**action, "action_type": "REVERSE_SPLIT"}
+    assert client.post("/portfolio/manage/corporate-actions", json=reverse, headers=auth_headers).status_code == 400
+    announced = {**action, "ex_date": (today + timedelta(days=5)).isoformat()}
+    assert client.post("/portfolio/manage/corporate-actions", json=announced, headers=auth_headers).status_code == 400
+
+    # An action recorded by another worker is seen despite this one's cache
+    from app.models.corporate_action import CorporateAction, CorporateActionType
+    from app.services.corporate_action_service import CorporateActionService
+    assert CorporateActionService.factors(db, ["WEGE3"], [today - timedelta(days=30)]).tolist() == [2.0]
+    db.add(CorporateAction(
+        ticker="WEGE3", ex_date=today - timedelta(days=2), type=CorporateActionType.BONUS, factor=1.1
+    ))
+    db.commit()
+    assert CorporateActionService.factors(db, ["WEGE3"], [today - timedelta(days=30)]).tolist() == [pytest.approx(2.2)]
+
+
+def test_positions_as_of_use_checkpoints_plus_deltas(client: TestClient, auth_headers: dict, db, test_user):
+    """Test as-of positions from month-end checkpoints match a full replay"""
+    from app.models.position import PositionCheckpoint
+    from app.models.price_history import PriceBar
+    from app.services.position_checkpoint_service import PositionCheckpointService
+
+    for ticker, tx_type, quantity, price, day in [
+        ("PETR4", "COMPRA", 100, 30.0, "2025-01-10"),
+        ("PETR4", "COMPRA", 100, 40.0, "2025-02-15"),
+        ("PETR4", "VENDA", 50, 45.0, "2025-03-20"),
+        ("VALE3", "COMPRA", 10, 60.0, "2025-04-05"),
+    ]:
+        response = client.post("/portfolio/manage/transaction", json={
+            "ticker": ticker, "asset_type": "ACAO", "transaction_type": tx_type,
+            "quantity": quantity, "price": price, "transaction_date": day,
+        }, headers=auth_headers)
+        assert response.status_code == 200
+    db.add(PriceBar(ticker="PETR4", date=date(2025, 3, 24), close=44.0))
+    db.commit()
+
+    # Replayed from the first transaction while there is no checkpoint
+    replayed = client.get("/portfolio/as-of/2025-03-25", headers=auth_headers).json()
+    assert replayed["checkpoint"] is None
+
+    assert PositionCheckpointService.build(db, test_user.id, until=date(2025, 4, 30)) == 5
+    assert PositionCheckpointService.build(db, test_user.id, until=date(2025, 4, 30)) == 0
+
+    data = client.get("/portfolio/as-of/2025-03-25", headers=auth_headers).json()
+    assert data["checkpoint"] == "2025-02-28"
+    assert data["positions"] == replayed["positions"]
+    petr4 = data["positions"][0]
+    assert (petr4["ticker"], petr4["quantity"], petr4["average_price"]) == ("PETR4", 150, 35.0)
+    assert petr4["total_value"] == 150 * 44.0
+
+    assert client.get("/portfolio/as-of/2025-01-05", headers=auth_headers).json()["positions"] == []
+    assert client.get("/portfolio/as-of/2099-01-01", headers=auth_headers).status_code == 400
+
+    # A transaction dated before a checkpoint drops it and the later ones
+    client.post("/portfolio/manage/transaction", json={
+        "ticker": "PETR4", "asset_type": "ACAO", "transaction_type": "COMPRA",
+        "quantity": 50, "price": 35.0, "transaction_date": "2025-02-01",
+    }, headers=auth_headers)
+    assert [d for (d,) in db.query(PositionCheckpoint.date)] == [date(2025, 1, 31)]
+    PositionCheckpointService.build(db, test_user.id, until=date(2025, 4, 30))
+
+    # A split after a checkpoint is applied when reading it
+    test_user.is_superuser = True
+    db.commit()
+    client.post("/portfolio/manage/corporate-actions", json={
+        "ticker": "PETR4", "ex_date": "2025-03-03", "action_type": "SPLIT", "factor": 2,
+    }, headers=auth_headers)
+    PositionCheckpointService.build(db, test_user.id, until=date(2025, 4, 30))
+    before = client.get("/portfolio/as-of/2025-03-01", headers=auth_headers).json()
+    after = client.get("/portfolio/as-of/2025-03-25", headers=auth_headers).json()
+    assert before["checkpoint"] == "2025-02-28" and before["positions"][0]["quantity"] == 250
+    assert after["positions"][0]["quantity"] == 450  # 500 after the split, 50 sold
+
+
+def test_dividend_events_credit_holders_at_ex_date(client: TestClient, auth_headers: dict, db, test_user):
+    """Test provider payments become proceeds for everyone holding the ticker at the ex-date"""
+    from app.core.security import get_password_hash
+    from app.models.asset import Asset
+    from app.models.corporate_action import CorporateActionType
+    from app.models.dividend import DividendEvent
+    from app.models.proceed import Proceed, ProceedType
+    from app.models.transaction import Transaction, TransactionType
+    from app.models.user import User
+    from app.services.corporate_action_service import CorporateActionService
+    from app.services.dividend_service import DividendService
+
+    for tx_type, quantity, price, day in [("COMPRA", 100, 30.0, "2025-01-10"), ("VENDA", 40, 16.0, "2025-03-10")]:
+        client.post("/portfolio/manage/transaction", json={
+            "ticker": "PETR4", "asset_type": "ACAO", "transaction_type": tx_type,
+            "quantity": quantity, "price": price, "transaction_date": day,
+        }, headers=auth_headers)
+    asset = db.query(Asset).filter(Asset.ticker == "PETR4").one()
+    other = User(email="other@example.com", hashed_password=get_password_hash("x"), is_active=True)
+    db.add(other)
+    db.commit()
+    for quantity, day in [(200, date(2025, 2, 20)), (50, date(2025, 3, 20))]:
+        db.add(Transaction(
+            user_id=other.id, asset_id=asset.id, type=TransactionType.BUY, date=day,
+            quantity=quantity, price=15.0, total_amount=quantity * 15.0, fees=0.0,
+        ))
+    db.add(Proceed(
+        user_id=test_user.id, asset_id=asset.id, type=ProceedType.JCP, date=date(2025, 4, 20),
+        value_per_share=0.5, quantity=160, total_value=80.0,
+    ))
+    db.commit()
+    CorporateActionService.add_action(db, "PETR4", date(2025, 2, 15), CorporateActionType.SPLIT, 2.0)
+
+    DividendService.store_events(db, "PETR4", [
+        {"date": "2025-03-25", "value": 1.5, "type": "Dividendo", "last_date_prior": "2025-03-14T00:00:00.000Z"},
+        {"date": "2025-04-20", "value": 0.5, "type": "JCP", "ex_date": "2025-04-01"},
+        {"date": "2025-05-20", "value": 0.7, "type": "Dividendo"},
+    ])
+    assert db.query(DividendEvent).filter(DividendEvent.ex_date == date(2025, 3, 15)).count() == 1
+
+    result = DividendService.credit_proceeds(db, as_of=date(2025, 6, 1))
+    assert result == {"events": 2, "proceeds": 3, "users": 2}
+
+    credited = {
+        (p.user_id, p.type, p.date): (p.quantity, p.total_value)
+        for p in db.query(Proceed).filter(Proceed.description.like("%automático%"))
+    }
+    # 100 bought before the 1:2 split are 200 on the ex-date, 40 sold after it
+    assert credited[(test_user.id, ProceedType.DIVIDEND, date(2025, 3, 25))] == (160, 240.0)
+    assert credited[(other.id, ProceedType.DIVIDEND, date(2025, 3, 25))] == (200, 300.0)
+    assert credited[(other.id, ProceedType.JCP, date(2025, 4, 20))] == (250, 125.0)
+    assert (test_user.id, ProceedType.JCP, date(2025, 4, 20)) not in credited
+
+    assert DividendService.credit_proceeds(db, as_of=date(2025, 6, 1))["proceeds"] == 0
@@ -0,0 +1,123 @@
+"""
+Tests for the tax (IR) ledger endpoints
+"""
+from fastapi.testclient import TestClient
+
+
+def _add(client, headers, ticker, kind, quantity, price, day, asset_type="ACAO"):
+    response = client.post(
+        "/portfolio/manage/transaction",
+        json={
+            "ticker": ticker,
+            "asset_type": asset_type,
+            "transaction_type": kind,
+            "quantity": quantity,
+            "price": price,
+            "transaction_date": day,
+        },
+        headers=headers,
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+def _bucket(summary, name):
+    return next(b for b in summary["buckets"] if b["bucket"] == name)
+
+
+def test_exempt_month_and_loss_carry_forward(client: TestClient, auth_headers: dict):
+    """Test R$20k exemption, loss carry-forward and compensation"""
+    _add(client, auth_headers, "PETR4", "COMPRA", 100, 10.0, "2024-01-05")
+    _add(client, auth_headers, "VALE3", "COMPRA", 1000, 30.0, "2024-01-05")
+    _add(client, auth_headers, "ITUB4", "COMPRA", 2000, 20.0, "2024-01-05")
+
+    # Feb: small sale with gain -> exempt
+    _add(client, auth_headers, "PETR4", "VENDA", 50, 12.0, "2024-02-10")
+    feb = client.get("/tax/darf/2024/2", headers=auth_headers).json()
+    acoes = _bucket(feb, "ACOES")
+    assert acoes["exempt"] is True
+    assert acoes["net_result"] == 100.0
+    assert feb["total_tax_due"] == 0.0
+
+    # Mar: R$5k loss goes to the carry-forward pool
+    vale_sale = _add(client, auth_headers, "VALE3", "VENDA", 1000, 25.0, "2024-03-15")
+    mar = client.get("/tax/darf/2024/3", headers=auth_headers).json()
+    assert _bucket(mar, "ACOES")["net_result"] == -5000.0
+    assert mar["loss_carry_forward"]["COMUM"] == 5000.0
+
+    # Apr: R$45k sales, R$15k gain compensated by the R$5k loss
+    _add(client, auth_headers, "ITUB4", "VENDA", 1500, 30.0, "2024-04-20")
+    apr = client.get("/tax/darf/2024/4", headers=auth_headers).json()
+    acoes = _bucket(apr, "ACOES")
+    assert acoes["exempt"] is False
+    assert acoes["loss_used"] == 5000.0
+    assert acoes["taxable_base"] == 10000.0
+    assert acoes["tax_due"] == 1497.75  # 15% - IRRF (0,005% of 45k)
+    assert apr["loss_carry_forward"]["COMUM"] == 0.0
+    assert apr["darf"]["code"] == "6015"
+    assert apr["darf"]["due_date"] == "2024-05-31"
+
+    # Deleting the March sale rolls the later months forward
+    response = client.delete(
+        f"/portfolio/manage/transaction/{vale_sale['transaction']['id']}", headers=auth_headers
+    )
+    assert response.status_code == 200
+
+    apr = client.get("/tax/darf/2024/4", headers=auth_headers).json()
+    assert _bucket(apr, "ACOES")["loss_used"] == 0.0
+    assert _bucket(apr, "ACOES")["tax_due"] == 2247.75
+
+    year = client.get("/tax/darf/2024", headers=auth_headers).json()
+    assert [m["month"] for m in year["months"]] == [2, 4]
+    assert year["total_exempt_gains"] == 100.0
+
+
+def test_day_trade_and_fii_buckets(client: TestClient, auth_headers: dict):
+    """Test same-day buy/sell goes to day trade and FIIs to their own bucket"""
+    _add(client, auth_headers, "BBAS3", "COMPRA", 100, 40.0, "2024-05-02")
+    _add(client, auth_headers, "BBAS3", "COMPRA", 100, 50.0, "2024-05-03")
+    _add(client, auth_headers, "BBAS3", "VENDA", 150, 52.0, "2024-05-03")
+    _add(client, auth_headers, "HGLG11", "COMPRA", 10, 100.0, "2024-05-02", "FII")
+    _add(client, auth_headers, "HGLG11", "VENDA", 10, 110.0, "2024-05-20", "FII")
+
+    gains = client.get("/tax/gains?year=2024&month=5", headers=auth_headers).json()
+    by_bucket = {(g["ticker"], g["bucket"]): g for g in gains}
+
+    # 100 day trade against the same-day buy @ 50, 50 swing against avg cost 40
+    assert by_bucket[("BBAS3", "DAY_TRADE")]["gain"] == 200.0
+    assert by_bucket[("BBAS3", "ACOES")]["cost_basis"] == 2000.0
+    assert by_bucket[("BBAS3", "ACOES")]["gain"] == 600.0
+    assert by_bucket[("HGLG11", "FII")]["gain"] == 100.0
+
+    may = client.get("/tax/darf/2024/5", headers=auth_headers).json()
+    assert _bucket(may, "DAY_TRADE")["tax_due"] == 38.0  # 20% - 1% IRRF
+    assert _bucket(may, "ACOES")["exempt"] is True
+    assert _bucket(may, "FII")["taxable_base"] == 100.0
+
+
+def test_invalid_month(client: TestClient, auth_headers: dict):
+    """Test invalid month is rejected"""
+    response = client.get("/tax/darf/2024/13", headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_darf_below_minimum_carries_to_next_month(client: TestClient, auth_headers: dict):
+    """Test a DARF under R$10 is added to the next month's DARF"""
+    _add(client, auth_headers, "KNRI11", "COMPRA", 20, 100.0, "2024-06-03", "FII")
+    _add(client, auth_headers, "KNRI11", "VENDA", 10, 104.0, "2024-07-10", "FII")
+    _add(client, auth_headers, "KNRI11", "VENDA", 10, 104.0, "2024-08-12", "FII")
+
+    jul = client.get("/tax/darf/2024/7", headers=auth_headers).json()
+    assert jul["total_tax_due"] == 7.95  # 20% do lucro líquido de taxas - IRRF
+    assert jul["darf"]["below_minimum"] is True
+    assert jul["darf"]["amount"] == 0.0
+    assert jul["darf"]["deferred"] == 7.95
+
+    aug = client.get("/tax/darf/2024/8", headers=auth_headers).json()
+    assert aug["darf"]["carried_in"] == 7.95
+    assert aug["darf"]["amount"] == 15.9
+    assert aug["darf"]["below_minimum"] is False
+
+    year = client.get("/tax/darf/2024", headers=auth_headers).json()
+    assert year["total_tax_due"] == 15.9
+    assert year["deferred_to_next_year"] == 0.0